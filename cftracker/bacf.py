@@ -10,8 +10,11 @@ import numpy as np
 import cv2
 from .base import BaseCF
 from lib.utils import cos_window,gaussian2d_rolled_labels
-from lib.fft_tools import fft2,ifft2
-from .feature import extract_hog_feature,extract_cn_feature
+from lib.fft_tools import fft2,ifft2,rfft2,irfft2,full_spectrum,SpectrumStack
+from lib.feature_pyramid import FeaturePyramid
+from lib.frame_context import as_frame
+from lib.admm import BACFSolver
+from .feature import extract_hog_feature,extract_cn_feature,extract_hc_feature,get_cn_extractor,get_hc_extractor
 from .config.bacf_config import BACFConfig
 from .cf_utils import mex_resize,resp_newton,resize_dft2
 from .scale_estimator import LPScaleEstimator
@@ -33,9 +36,19 @@ class BACF(BaseCF):
         self.scale_step = config.scale_step
         self.admm_iterations = config.admm_iterations
         self.admm_lambda = config.admm_lambda
+        self.admm_solver = config.admm_solver
+        if self.admm_solver not in (None, 'workspace', 'adaptive'):
+            raise ValueError('unknown admm solver ' + str(self.admm_solver))
+        self.admm_tol = config.admm_tol
         self.scale_config = config.scale_config
+        self.use_fused_hc=config.use_fused_hc
+        self.feature_pyramid=config.feature_pyramid
+        self.pyramid_resolution=config.pyramid_resolution
+        self.use_rfft=config.use_rfft
+        self._scale_stack=SpectrumStack(half_spectrum=self.use_rfft)
 
     def init(self,first_frame,bbox):
+        first_frame=as_frame(first_frame)
         bbox = np.array(bbox).astype(np.int64)
         x, y, w, h = tuple(bbox)
         self._center = (x + w / 2, y + h / 2)
@@ -74,7 +87,7 @@ class BACF(BaseCF):
         self.feature_map_sz=(self.crop_size[0]//self.feature_ratio,self.crop_size[1]//self.feature_ratio)
         output_sigma=np.sqrt(np.floor(self.base_target_sz[0]/self.feature_ratio)*np.floor(self.base_target_sz[1]/self.feature_ratio))*self.output_sigma_factor
         y=gaussian2d_rolled_labels(self.feature_map_sz, output_sigma)
-        self.yf=fft2(y)
+        self.yf=self._fft2(y)
         if self.interpolate_response==1:
             self.interp_sz=(self.feature_map_sz[0]*self.feature_ratio,self.feature_map_sz[1]*self.feature_ratio)
         else:
@@ -93,6 +106,10 @@ class BACF(BaseCF):
                             -int(np.floor((self.feature_map_sz[0]-1)/2))).T
 
         self.small_filter_sz=(int(np.floor(self.base_target_sz[0]/self.feature_ratio)),int(np.floor(self.base_target_sz[1]/self.feature_ratio)))
+        self._pyramid=None
+        if self.feature_pyramid is not None and self.number_of_scales>1:
+            self._pyramid=FeaturePyramid(cell_size=self.feature_ratio,cn_extractor=get_cn_extractor(),
+                                         mode=self.feature_pyramid,resolution=self.pyramid_resolution)
 
         self.scale_estimator = LPScaleEstimator(self.target_sz, config=self.scale_config)
         self.scale_estimator.init(first_frame, self._center, self.base_target_sz, self.current_scale_factor)
@@ -101,30 +118,52 @@ class BACF(BaseCF):
                                    scaled_sz=(int(np.round(self.crop_size[0]*self.current_scale_factor)),
                                               int(np.round(self.crop_size[1]*self.current_scale_factor))))
         feature=self.extract_hc_feture(pixels, cell_size=self.feature_ratio)
-        self.model_xf=fft2(self._window[:,:,None]*feature)
+        self.model_xf=self._fft2(self._window[:,:,None]*feature)
 
+        self._solver=None
+        if self.admm_solver is not None:
+            # 'adaptive' warm-starts every frame from the last one and stops on the admm residuals
+            self._solver=BACFSolver(self.feature_map_sz,self.small_filter_sz,self.yf,self.admm_lambda,
+                                    self.admm_iterations,adaptive=self.admm_solver=='adaptive',tol=self.admm_tol,
+                                    half_spectrum=self.use_rfft)
+        self.num_admm_iterations=0
         self.g_f=self.ADMM(self.model_xf)
 
 
 
     def update(self,current_frame,vis=False):
-        x=None
-        for scale_ind in range(self.number_of_scales):
-            current_scale=self.current_scale_factor*self.scale_factors[scale_ind]
-            sub_window=self.get_sub_window(current_frame,self._center,model_sz=self.crop_size,
-                                        scaled_sz=(int(round(self.crop_size[0]*current_scale)),
-                                    int(round(self.crop_size[1]*current_scale))))
-            feature= self.extract_hc_feture(sub_window, self.cell_size)[:, :, :, np.newaxis]
-            if x is None:
-                x=feature
-            else:
-                x=np.concatenate((x,feature),axis=3)
-        xtf=fft2(x*self._window[:,:,None,None])
+        current_frame=as_frame(current_frame)
+        if self._pyramid is not None:
+            x=self._scale_stack.reset(self._pyramid.output_shape(self.crop_size,self.number_of_scales))
+            self._pyramid.extract(lambda scale,out_sz:self.get_sub_window(current_frame,self._center,model_sz=out_sz,
+                                  scaled_sz=(int(round(self.crop_size[0]*scale)),int(round(self.crop_size[1]*scale)))),
+                                  self.crop_size,self.current_scale_factor*self.scale_factors,out=x)
+        else:
+            if self.use_fused_hc is True:
+                # the fused features of every scale are written straight into the stack
+                x=self._scale_stack.reset(get_hc_extractor().output_shape(self.crop_size,self.cell_size)+
+                                          (self.number_of_scales,))
+            for scale_ind in range(self.number_of_scales):
+                current_scale=self.current_scale_factor*self.scale_factors[scale_ind]
+                sub_window=self.get_sub_window(current_frame,self._center,model_sz=self.crop_size,
+                                            scaled_sz=(int(round(self.crop_size[0]*current_scale)),
+                                        int(round(self.crop_size[1]*current_scale))))
+                if self.use_fused_hc is True:
+                    self.extract_hc_feture(sub_window,self.cell_size,out=x[:,:,:,scale_ind])
+                    continue
+                feature= self.extract_hc_feture(sub_window, self.cell_size)
+                if scale_ind==0:
+                    x=self._scale_stack.reset(feature.shape+(self.number_of_scales,))
+                x[:,:,:,scale_ind]=feature
+        xtf=self._scale_stack.transform(self._window)
         responsef=np.sum(np.conj(self.g_f)[:,:,:,None]*xtf,axis=2)
+        if self.use_rfft is True:
+            # resize_dft2 and resp_newton work on the whole grid, only the summed response is completed
+            responsef=full_spectrum(responsef,self.feature_map_sz[0])
 
         if self.interpolate_response==2:
-            self.interp_sz=(int(self.yf.shape[1]*self.feature_ratio*self.current_scale_factor),
-                            int(self.yf.shape[0]*self.feature_ratio*self.current_scale_factor))
+            self.interp_sz=(int(self.feature_map_sz[0]*self.feature_ratio*self.current_scale_factor),
+                            int(self.feature_map_sz[1]*self.feature_ratio*self.current_scale_factor))
         responsef_padded=resize_dft2(responsef,self.interp_sz)
         response=np.real(ifft2(responsef_padded))
         if self.interpolate_response==3:
@@ -170,8 +209,14 @@ class BACF(BaseCF):
                                               int(round(self.crop_size[1]*self.current_scale_factor))))
         feature=self.extract_hc_feture(pixels, cell_size=self.cell_size)
         #feature=cv2.resize(pixels,self.feature_map_sz)/255-0.5
-        xf=fft2(feature*self._window[:,:,None])
-        self.model_xf=(1-self.interp_factor)*self.model_xf+self.interp_factor*xf
+        xf=self._fft2(feature*self._window[:,:,None])
+        if self._solver is not None:
+            # the model is blended in place, g_f is the solver workspace and stays valid until the next ADMM
+            self.model_xf*=(1-self.interp_factor)
+            xf*=self.interp_factor
+            self.model_xf+=xf
+        else:
+            self.model_xf=(1-self.interp_factor)*self.model_xf+self.interp_factor*xf
         self.g_f = self.ADMM(self.model_xf)
 
         target_sz=(self.target_sz[0]*self.current_scale_factor,self.target_sz[1]*self.current_scale_factor)
@@ -190,6 +235,11 @@ class BACF(BaseCF):
         return xs,ys,out
 
     def ADMM(self,xf):
+        if self._solver is not None:
+            g_f=self._solver.solve(xf)
+            self.num_admm_iterations=self._solver.num_iterations
+            return g_f
+        self.num_admm_iterations=self.admm_iterations
         g_f = np.zeros_like(xf)
         h_f = np.zeros_like(g_f)
         l_f = np.zeros_like(g_f)
@@ -210,18 +260,28 @@ class BACF(BaseCF):
             # solve for g
             g_f = tmp0 - (tmp1 - tmp2 + tmp3) / B[:, :, None]
             # solve for h
-            h = (T / ((mu * T) + self.admm_lambda)) * ifft2(mu * g_f + l_f)
+            h = (T / ((mu * T) + self.admm_lambda)) * self._ifft2(mu * g_f + l_f)
             xs, ys, h = self.get_subwindow_no_window(h,
                                                      (int(self.feature_map_sz[0] / 2), int(self.feature_map_sz[1] / 2)),
                                                      self.small_filter_sz)
-            t = np.zeros((self.feature_map_sz[1], self.feature_map_sz[0], h.shape[2]),dtype=np.complex64)
+            t = np.zeros((self.feature_map_sz[1], self.feature_map_sz[0], h.shape[2]),dtype=h.dtype)
             t[ys,xs,:] = h
-            h_f = fft2(t)
+            h_f = self._fft2(t)
             l_f = l_f + (mu * (g_f - h_f))
             mu = min(beta * mu, mumax)
             i += 1
         return g_f
 
+    def _fft2(self,x):
+        if self.use_rfft is True:
+            return rfft2(x)
+        return fft2(x)
+
+    def _ifft2(self,xf):
+        if self.use_rfft is True:
+            return irfft2(xf,self._window.shape)
+        return ifft2(xf)
+
 
     def get_sub_window(self, img, center, model_sz, scaled_sz=None):
         model_sz = (int(model_sz[0]), int(model_sz[1]))
@@ -235,7 +295,9 @@ class BACF(BaseCF):
             im_patch = mex_resize(im_patch, model_sz)
         return im_patch.astype(np.uint8)
 
-    def extract_hc_feture(self,patch,cell_size):
+    def extract_hc_feture(self,patch,cell_size,out=None):
+        if self.use_fused_hc is True:
+            return extract_hc_feature(patch,cell_size,out=out)
         hog_feature=extract_hog_feature(patch,cell_size)
         cn_feature=extract_cn_feature(patch,cell_size)
         hc_feature=np.concatenate((hog_feature,cn_feature),axis=2)
@@ -35,6 +35,65 @@ def mex_resize(img, sz, method='auto'):
     return img
 
 
+def reuse_feature_map(features, shift, mode='circular', sample_fn=None, feature_fn=None, cell_size=1,
+                      max_shift=0.25, boundary=2):
+    """
+    training sample of a window displaced by shift=(dy,dx) cells taken from the feature map of the detection window,
+    cell (i,j) of the new window is cell (i+dy,j+dx) of the old one,
+    'circular' wraps the cells that leave the window around to the exposed side, as the circulant model does,
+    'border' keeps the overlapping cells and runs feature_fn only on the strips of the new window patch returned by
+    sample_fn() that are newly exposed or within boundary cells of either window edge (those cells depend on where
+    the window ends, e.g. gradients and block normalisation of hog),
+    returns None when the displacement is larger than max_shift of the window so the caller extracts afresh
+    """
+    if mode not in ('circular', 'border'):
+        raise ValueError('unknown feature reuse mode ' + str(mode))
+    h, w = features.shape[:2]
+    dy, dx = int(shift[0]), int(shift[1])
+    if abs(dy) > max_shift * h or abs(dx) > max_shift * w:
+        return None
+    if dy == 0 and dx == 0:
+        return features
+    if mode == 'circular':
+        return np.roll(features, (-dy, -dx), axis=(0, 1))
+    out = np.empty_like(features)
+    out[max(-dy, 0):h - max(dy, 0), max(-dx, 0):w - max(dx, 0)] = \
+        features[max(dy, 0):h + min(dy, 0), max(dx, 0):w + min(dx, 0)]
+    patch = sample_fn()
+    top, bottom = min(max(-dy, 0) + boundary, h), max(h - max(dy, 0) - boundary, 0)
+    left, right = min(max(-dx, 0) + boundary, w), max(w - max(dx, 0) - boundary, 0)
+    strips = [(slice(0, top), slice(0, w)), (slice(max(bottom, top), h), slice(0, w))]
+    if bottom > top:
+        strips += [(slice(top, bottom), slice(0, left)), (slice(top, bottom), slice(max(right, left), w))]
+    for rows, cols in strips:
+        if rows.stop > rows.start and cols.stop > cols.start:
+            out[rows, cols] = extract_cells(patch, feature_fn, cell_size, rows, cols, margin=boundary + 1)
+    return out
+
+
+def extract_cells(patch, feature_fn, cell_size, rows, cols, margin=1):
+    # features of the cells rows x cols of patch, computed on a sub-patch with margin cells of context around them
+    h, w = patch.shape[0] // cell_size, patch.shape[1] // cell_size
+    y0, y1 = max(rows.start - margin, 0), min(rows.stop + margin, h)
+    x0, x1 = max(cols.start - margin, 0), min(cols.stop + margin, w)
+    py, px = _same_parity(y0, y1, cell_size, patch.shape[0]), _same_parity(x0, x1, cell_size, patch.shape[1])
+    features = feature_fn(patch[py[0]:py[1], px[0]:px[1]])
+    y0, x0 = py[0] // cell_size, px[0] // cell_size
+    return features[rows.start - y0:rows.stop - y0, cols.start - x0:cols.stop - x0]
+
+
+def _same_parity(start, stop, cell_size, size):
+    # pixel span of the cells start:stop with the parity of the full patch size,
+    # the colour names table shifts odd sized patches by a pixel
+    start, stop = start * cell_size, stop * cell_size
+    if (stop - start) % 2 != size % 2:
+        if stop < size:
+            stop += 1
+        elif cell_size % 2 == 1:
+            start -= cell_size
+    return start, stop
+
+
 """
 I didn't know how to convert matlab function mtimesx to numpy
 Just finetune from 4kubo's implementation
@@ -11,9 +11,12 @@ import numpy as np
 import cv2
 from .base import BaseCF
 from lib.utils import gaussian2d_labels,cos_window
-from lib.fft_tools import fft2,ifft2
+from lib.fft_tools import fft2,ifft2,rfft2,irfft2
+from lib.kernel_correlation import KernelCorrelation
+from lib.frame_context import as_frame
 from cftracker.feature import extract_cn_feature
 from .config.cn_config import CNConfig
+from .cf_utils import reuse_feature_map
 class CN(BaseCF):
     def __init__(self,config=CNConfig()):
         super(CN).__init__()
@@ -22,15 +25,21 @@ class CN(BaseCF):
         self.lambda_ = config.lambda_
         self.padding=config.padding
         self.output_sigma_factor=config.output_sigma_factor
+        self.use_rfft=config.use_rfft
+        self.feature_reuse=config.feature_reuse
 
 
     def get_sub_window(self,im,pos,sz):
         patch=cv2.getRectSubPix(im,patchSize=sz,center=pos).astype(np.uint8)
-        feature=extract_cn_feature(patch,cell_size=1)
+        feature=self.get_features(patch)
         return feature
 
+    def get_features(self,patch):
+        return extract_cn_feature(patch,cell_size=1)
+
 
     def init(self,first_frame,bbox):
+        first_frame=as_frame(first_frame)
         bbox=np.array(bbox).astype(np.int64)
         x,y,w,h=tuple(bbox)
         self._center=(x+w/2,y+h/2)
@@ -39,21 +48,26 @@ class CN(BaseCF):
         self.crop_size=(self._window.shape[1],self._window.shape[0])
         s=np.sqrt(w*h)*self.output_sigma_factor
         self.y=gaussian2d_labels(self.crop_size,s)
-        self.yf=fft2(self.y)
+        self.yf=self._fft2(self.y)
         self._init_response_center=np.unravel_index(np.argmax(self.y,axis=None),self.y.shape)
         self.x=self.get_sub_window(first_frame, self._center, self.crop_size)
         self.x=self._window[:,:,None]*self.x
+        self._correlation=KernelCorrelation('gaussian',self.sigma,rfft_shape=self._window.shape if self.use_rfft else None)
 
-        kf=fft2(self._dgk(self.x,self.x))
+        xf=self._fft2(self.x)
+        kf=self._correlation.auto_correlate(xf)
+        self._correlation.set_model(xf)
         self.alphaf_num=(self.yf)*kf
         self.alphaf_den=kf*(kf+self.lambda_)
 
 
     def update(self,current_frame,vis=False):
-        z=self.get_sub_window(current_frame,self._center,self.crop_size)
-        z=self._window[:,:,None]*z
-        kf=fft2(self._dgk(self.x,z))
-        responses=np.real(ifft2(self.alphaf_num*kf.conj()/(self.alphaf_den)))
+        current_frame=as_frame(current_frame)
+        z_raw=self.get_sub_window(current_frame,self._center,self.crop_size)
+        z=self._window[:,:,None]*z_raw
+        # k(z,x) is the flipped k(x,z) of the reference code, its spectrum is already conjugated
+        kf=self._correlation.detect(self._fft2(z))
+        responses=np.real(self._ifft2(self.alphaf_num*kf/(self.alphaf_den)))
         if vis is True:
             self.score=responses
         curr=np.unravel_index(np.argmax(responses,axis=None),responses.shape)
@@ -63,29 +77,33 @@ class CN(BaseCF):
         x_c -= dx
         y_c -= dy
         self._center = (x_c, y_c)
-        new_x=self.get_sub_window(current_frame,self._center,self.crop_size)
+        new_x=None
+        if self.feature_reuse is not None:
+            new_x=reuse_feature_map(z_raw,(-dy,-dx),self.feature_reuse,
+                                    sample_fn=lambda:cv2.getRectSubPix(current_frame,patchSize=self.crop_size,
+                                                                       center=self._center).astype(np.uint8),
+                                    feature_fn=self.get_features)
+        if new_x is None:
+            new_x=self.get_sub_window(current_frame,self._center,self.crop_size)
         new_x=new_x*self._window[:,:,None]
 
-        kf = fft2(self._dgk(new_x,new_x))
+        kf = self._correlation.auto_correlate(self._fft2(new_x))
         new_alphaf_num=self.yf*kf
         new_alphaf_den=kf*(kf+self.lambda_)
         self.alphaf_num=(1-self.interp_factor)*self.alphaf_num+self.interp_factor*new_alphaf_num
         self.alphaf_den=(1-self.interp_factor)*self.alphaf_den+self.interp_factor*new_alphaf_den
         self.x = (1 - self.interp_factor) * self.x + self.interp_factor * new_x
+        self._correlation.set_model(self._fft2(self.x))
         return [self._center[0]-self.w/2,self._center[1]-self.h/2,self.w,self.h]
 
-    def _dgk(self, x1, x2):
-        xf = fft2(x1)
-        yf = fft2(x2)
-        xx=(x1.flatten().T).dot(x1.flatten())
-        yy=(x2.flatten().T).dot(x2.flatten())
-        xyf=xf*np.conj(yf)
-        if len(xyf.shape)==2:
-            xyf=xyf[:,:,np.newaxis]
-        xy = np.real(ifft2(np.sum(xyf, axis=2)))
-        d =xx + yy- 2 * xy
-        k = np.exp(-1 / self.sigma ** 2 * np.clip(d,a_min=0,a_max=None) / np.size(x1))
-        return k
+    def _fft2(self,x):
+        if self.use_rfft is True:
+            return rfft2(x)
+        return fft2(x)
 
+    def _ifft2(self,xf):
+        if self.use_rfft is True:
+            return irfft2(xf,self._window.shape)
+        return ifft2(xf)
 
 
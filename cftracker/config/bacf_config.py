@@ -1,5 +1,9 @@
 class BACFConfig:
     cell_size=4
+    use_fused_hc=False
+    # None, 'exact' or 'approx', see lib.feature_pyramid, only used with number_of_scales>1 (1 in this config)
+    feature_pyramid=None
+    pyramid_resolution=1.
     cell_selection_thresh=0.75**2
     search_area_shape='square'
     search_area_scale=5
@@ -12,6 +16,14 @@ class BACFConfig:
     scale_step=1.01
     admm_iterations=2
     admm_lambda=0.01
+    # rfft2 half spectra for the features, the model and the ADMM, see lib.fft_tools
+    use_rfft=False
+    # None, 'workspace' or 'adaptive', see lib.admm, 'workspace' gives the same filter in about 60% of the time,
+    # 'adaptive' warm-starts from the last filter and stops on admm_tol (admm_iterations is then the maximum per
+    # frame), it saves little over 'workspace', moved the tracked centre by 1.4 px on
+    # examples/admm_adaptive_benchmark.py at every admm_tol and has no OTB numbers yet, see eval/admm_adaptive_otb.py
+    admm_solver=None
+    admm_tol=5e-2
 
     class ScaleConfig:
         learning_rate_scale = 0.015
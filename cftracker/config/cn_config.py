@@ -5,3 +5,5 @@ class CNConfig:
     output_sigma_factor=1./16
     padding=1
     cn_type = 'pyECO'
+    use_rfft=False
+    feature_reuse=None  # None, 'circular' or 'border'
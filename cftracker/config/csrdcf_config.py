@@ -5,6 +5,7 @@ class CSRDCFConfig:
     y_sigma=1
     channels_weight_lr=interp_factor
     use_channel_weights=True
+    use_fused_hc=False
 
     # segmentation params
     hist_lr=0.04
@@ -26,6 +27,10 @@ class CSRDCFConfig:
         s_num_compressed_dim = 'MAX'  # number of compressed feature dimensions in the scale filter
         lamBda = 1e-2  # scale filter regularization
         do_poly_interp = False
+        scale_sampling = None  # None or 'pyramid', see lib.scale_pyramid
+        basis_update = None  # None or 'incremental', see lib.subspace
+        basis_refresh_interval = 10  # updates between exact recomputations of an incremental basis
+        basis_tol = 1e-2  # ritz residual above which an incremental basis is recomputed
 
     scale_config = ScaleConfig()
 
@@ -36,6 +41,7 @@ class CSRDCFLPConfig:
     y_sigma=1
     channels_weight_lr=interp_factor
     use_channel_weights=True
+    use_fused_hc=False
 
     # segmentation params
     hist_lr=0.04
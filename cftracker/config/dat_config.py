@@ -9,6 +9,7 @@ class DATConfig:
     distractor_aware=True
     adapt_thresh_prob_bins=np.arange(0,1.001,0.05)
     motion_estimation_history_size=5
+    history_size=None # None keeps every frame, or the frames kept in ring buffers, see lib.ring_buffer
     nms_scale=1
     nms_overlap=0.9
     nms_score_factor=0.5
@@ -4,6 +4,8 @@ class DSSTConfig:
     lambda_ = 0.01
     output_sigma_factor = 1. / 16
     padding = 1
+    use_rfft=False
+    feature_reuse=None  # None, 'circular' or 'border'
     scale_type='normal'
     class ScaleConfig:
         scale_sigma_factor = 1 / 16.  # scale label function sigma
@@ -17,6 +19,10 @@ class DSSTConfig:
         s_num_compressed_dim = 'MAX'  # number of compressed feature dimensions in the scale filter
         lamBda = 1e-2  # scale filter regularization
         do_poly_interp = False
+        scale_sampling = None  # None or 'pyramid', see lib.scale_pyramid
+        basis_update = None  # None or 'incremental', see lib.subspace
+        basis_refresh_interval = 10  # updates between exact recomputations of an incremental basis
+        basis_tol = 1e-2  # ritz residual above which an incremental basis is recomputed
 
     scale_config=ScaleConfig()
 
@@ -27,6 +33,8 @@ class DSSTLPConfig:
     lambda_ = 0.01
     output_sigma_factor = 1. / 16
     padding = 1
+    use_rfft=False
+    feature_reuse=None  # None, 'circular' or 'border'
     use_scale_filter=True
     scale_type='LP'
     class ScaleConfig:
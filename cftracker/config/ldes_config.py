@@ -5,6 +5,8 @@ class LDESOTBLinearConfig:
     output_sigma_factor=0.1
     interp_factor=0.01
     cell_size=4
+    use_fused_hc=False
+    use_rfft=False  # rfft2 half spectra for the correlation filter, see lib.fft_tools
 
     min_image_sample_size=100**2
     max_image_sample_size=350**2
@@ -36,6 +38,8 @@ class LDESOTBNoBGDLinearConfig:
     output_sigma_factor=0.1
     interp_factor=0.01
     cell_size=4
+    use_fused_hc=False
+    use_rfft=False  # rfft2 half spectra for the correlation filter, see lib.fft_tools
 
     min_image_sample_size=100**2
     max_image_sample_size=350**2
@@ -68,6 +72,8 @@ class LDESVOTLinearConfig:
     output_sigma_factor = 0.1
     interp_factor = 0.01
     cell_size = 4
+    use_fused_hc = False
+    use_rfft = False  # rfft2 half spectra for the correlation filter, see lib.fft_tools
 
     min_image_sample_size = 100 ** 2
     max_image_sample_size = 350 ** 2
@@ -98,6 +104,8 @@ class LDESVOTNoBGDLinearConfig:
     output_sigma_factor = 0.1
     interp_factor = 0.01
     cell_size = 4
+    use_fused_hc = False
+    use_rfft = False  # rfft2 half spectra for the correlation filter, see lib.fft_tools
 
     min_image_sample_size = 100 ** 2
     max_image_sample_size = 350 ** 2
@@ -128,6 +136,8 @@ class LDESDemoLinearConfig:
     output_sigma_factor=0.1
     interp_factor=0.01
     cell_size=4
+    use_fused_hc=False
+    use_rfft=False  # rfft2 half spectra for the correlation filter, see lib.fft_tools
 
     min_image_sample_size=100**2
     max_image_sample_size=350**2
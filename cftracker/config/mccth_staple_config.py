@@ -21,6 +21,8 @@ class MCCTHOTBConfig:
     period=5
     update_thresh=0.6
     expert_num=7
+    expert_model = None  # None or 'groups', see MCCTHStaple.get_expert_responses
+    history_size = None  # None keeps every frame, or the frames kept in ring buffers, see lib.ring_buffer
 
 class MCCTHVOTConfig:
     hog_cell_size = 4
@@ -45,6 +47,8 @@ class MCCTHVOTConfig:
     period = 5
     update_thresh = 0.6
     expert_num = 7
+    expert_model = None  # None or 'groups', see MCCTHStaple.get_expert_responses
+    history_size = None  # None keeps every frame, or the frames kept in ring buffers, see lib.ring_buffer
 
 
 
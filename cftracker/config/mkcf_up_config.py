@@ -8,8 +8,12 @@ class MKCFupConfig:
     lr_hog_gray=0.018
     num_compressed_dim_cn=4
     num_compressed_dim_hog=4
+    basis_update=None  # None or 'incremental', see lib.subspace
+    basis_refresh_interval=10  # updates between exact recomputations of an incremental pca basis
+    basis_tol=1e-2  # ritz residual above which an incremental pca basis is recomputed
 
     padding=1.5
+    use_fused_hc=False
     output_sigma_factor=1/16
     lambda_=1e-2
     interp_factor=0.025
@@ -23,6 +27,7 @@ class MKCFupConfig:
     translation_model_max_area=np.inf
 
     interpolate_response=1
+    use_rfft=False  # rfft2 half spectra for the kernels and the filter, see lib.fft_tools
 
     scale_type = 'normal'
 
@@ -38,6 +43,10 @@ class MKCFupConfig:
         s_num_compressed_dim = 'MAX'  # number of compressed feature dimensions in the scale filter
         lamBda = 1e-2  # scale filter regularization
         do_poly_interp = False
+        scale_sampling = None  # None or 'pyramid', see lib.scale_pyramid
+        basis_update = None  # None or 'incremental', see lib.subspace
+        basis_refresh_interval = 10  # updates between exact recomputations of an incremental basis
+        basis_tol = 1e-2  # ritz residual above which an incremental basis is recomputed
 
     scale_config = ScaleConfig()
 
@@ -50,8 +59,12 @@ class MKCFupLPConfig:
     lr_hog_gray = 0.018
     num_compressed_dim_cn = 4
     num_compressed_dim_hog = 4
+    basis_update = None  # None or 'incremental', see lib.subspace
+    basis_refresh_interval = 10  # updates between exact recomputations of an incremental pca basis
+    basis_tol = 1e-2  # ritz residual above which an incremental pca basis is recomputed
 
     padding = 1.5
+    use_fused_hc = False
     output_sigma_factor = 1 / 16
     lambda_ = 1e-2
     interp_factor = 0.025
@@ -65,6 +78,7 @@ class MKCFupLPConfig:
     translation_model_max_area = np.inf
 
     interpolate_response = 1
+    use_rfft = False  # rfft2 half spectra for the kernels and the filter, see lib.fft_tools
 
     scale_type = 'LP'
 
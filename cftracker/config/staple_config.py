@@ -18,7 +18,9 @@ class StapleConfig:
     scale_model_factor = 1.
     scale_step = 1.02
     scale_model_max_area = 32 * 16
+    scale_sampling = None  # None or 'pyramid', see lib.scale_pyramid
     padding = 1
+    use_rfft = False  # rfft2 half spectra for the correlation filter, see lib.fft_tools
 
     use_ca=False
 
@@ -43,9 +45,12 @@ class StapleCAConfig:
     scale_model_factor = 1.
     scale_step = 1.02
     scale_model_max_area = 32 * 16
+    scale_sampling = None  # None or 'pyramid', see lib.scale_pyramid
     padding = 1
+    use_rfft = False  # rfft2 half spectra for the correlation filter, see lib.fft_tools
 
     use_ca=True
+    context_sampling = None  # None or 'shared', see Staple.get_shared_feature_maps
 
 
 
@@ -69,7 +74,9 @@ class StapleVOTConfig:
     scale_model_factor = 1.
     scale_step = 1.0292
     scale_model_max_area = 32 * 16
+    scale_sampling = None  # None or 'pyramid', see lib.scale_pyramid
     padding = 1
+    use_rfft = False  # rfft2 half spectra for the correlation filter, see lib.fft_tools
 
     use_ca=False
 
@@ -93,9 +100,12 @@ class StapleCAVOTConfig:
     scale_model_factor = 1.
     scale_step = 1.0292
     scale_model_max_area = 32 * 16
+    scale_sampling = None  # None or 'pyramid', see lib.scale_pyramid
     padding = 1
+    use_rfft = False  # rfft2 half spectra for the correlation filter, see lib.fft_tools
 
     lambda_2 = 0.5
     use_ca = True
+    context_sampling = None  # None or 'shared', see Staple.get_shared_feature_maps
 
 
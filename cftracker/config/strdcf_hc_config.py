@@ -7,6 +7,10 @@ class STRDCFHCConfig:
     cn_use_for_gray=False
     cn_cell_size=4
     cn_n_dim=10
+    use_fused_hc=False
+    # None, 'exact' or 'approx', see lib.feature_pyramid, only used with number_of_scales>1 (1 in this config)
+    feature_pyramid=None
+    pyramid_resolution=1.
 
     search_area_shape = 'square'        # the shape of the samples
     search_area_scale = 5.0             # the scaling of the target size to get the search area
@@ -19,6 +23,8 @@ class STRDCFHCConfig:
     alpha=1000
     beta=0.4
     p=2
+    # rfft2 half spectra for the features, the filter and the ADMM, see lib.fft_tools
+    use_rfft=False
 
 
 
@@ -36,6 +42,12 @@ class STRDCFHCConfig:
     init_penalty_factor=1
     max_penalty_factor=0.1
     penalty_scale_step=10
+    # None, 'workspace' or 'adaptive', see lib.admm, 'workspace' gives the same filter in about half the time,
+    # 'adaptive' warm-starts from the last filter and stops on admm_tol (max_iterations is then the maximum per
+    # frame), it moved the tracked centre by 5-7 px (60 px target) on examples/admm_adaptive_benchmark.py at every
+    # admm_tol and has no OTB numbers yet, run eval/admm_adaptive_otb.py before using it
+    admm_solver=None
+    admm_tol=5e-2
 
     # scale parameters
     number_of_scales = 1      # number of scales to run the detector
@@ -66,6 +78,10 @@ class STRDCFHCConfig:
         s_num_compressed_dim = 'MAX'  # number of compressed feature dimensions in the scale filter
         lamBda = 1e-2  # scale filter regularization
         do_poly_interp = False
+        scale_sampling = None  # None or 'pyramid', see lib.scale_pyramid
+        basis_update = None  # None or 'incremental', see lib.subspace
+        basis_refresh_interval = 10  # updates between exact recomputations of an incremental basis
+        basis_tol = 1e-2  # ritz residual above which an incremental basis is recomputed
 
     scale_config = ScaleConfig()
     """
@@ -11,19 +11,26 @@ import numpy as np
 import cv2
 from .base import BaseCF
 from lib.utils import gaussian2d_labels,cos_window
-from lib.fft_tools import fft2,ifft2
+from lib.fft_tools import fft2,ifft2,rfft2,irfft2
+from lib.kernel_correlation import KernelCorrelation
+from lib.precision import real_dtype,complex_dtype
+from lib.frame_context import frame_context
+from .cf_utils import reuse_feature_map
 class CSK(BaseCF):
-    def __init__(self, interp_factor=0.075, sigma=0.2, lambda_=0.01):
+    def __init__(self, interp_factor=0.075, sigma=0.2, lambda_=0.01,use_rfft=False,feature_reuse=None):
         super(CSK).__init__()
+        # None, 'circular' or 'border', train on the detection patch shifted to the new position
+        self.feature_reuse=feature_reuse
         self.interp_factor = interp_factor
         self.sigma = sigma
         self.lambda_ = lambda_
+        self.use_rfft=use_rfft
 
     def init(self,first_frame,bbox):
-        if len(first_frame.shape)==3:
-            assert first_frame.shape[2]==3
-            first_frame=cv2.cvtColor(first_frame,cv2.COLOR_BGR2GRAY)
-        first_frame=first_frame.astype(np.float32)
+        ctx=frame_context(first_frame)
+        if len(ctx.frame.shape)==3:
+            assert ctx.frame.shape[2]==3
+        first_frame=ctx.float32('gray')
         bbox=np.array(bbox).astype(np.int64)
         x,y,w,h=tuple(bbox)
         self._center=(x+w/2,y+h/2)
@@ -35,17 +42,21 @@ class CSK(BaseCF):
         s=np.sqrt(w*h)/16
         self.y=gaussian2d_labels((int(round(2*w)),int(round(2*h))),s)
         self._init_response_center=np.unravel_index(np.argmax(self.y,axis=None),self.y.shape)
+        # k(x,x) stays within 1% of 1, so the transforms follow lib.precision, complex64 rounding flips detections
+        self._correlation=KernelCorrelation('gaussian',self.sigma,rfft_shape=self._window.shape if self.use_rfft else None,
+                                            dtype=complex_dtype())
         self.alphaf=self._training(self.x,self.y)
+        self._correlation.set_model(self._fft2(self.x))
 
     def update(self,current_frame,vis=False):
-        if len(current_frame.shape)==3:
-            assert current_frame.shape[2]==3
-            current_frame=cv2.cvtColor(current_frame,cv2.COLOR_BGR2GRAY)
-        current_frame=current_frame.astype(np.float32)
-        z=cv2.getRectSubPix(current_frame,(int(round(2*self.w)),int(round(2*self.h))),self._center)/255-0.5
-        z=z*self._window
+        ctx=frame_context(current_frame)
+        if len(ctx.frame.shape)==3:
+            assert ctx.frame.shape[2]==3
+        current_frame=ctx.float32('gray')
+        z_raw=cv2.getRectSubPix(current_frame,(int(round(2*self.w)),int(round(2*self.h))),self._center)/255-0.5
+        z=z_raw*self._window
         self.z=z
-        responses=self._detection(self.alphaf,self.x,z)
+        responses=self._detection(self.alphaf,z)
         if vis is True:
             self.score=responses
         curr=np.unravel_index(np.argmax(responses,axis=None),responses.shape)
@@ -55,27 +66,41 @@ class CSK(BaseCF):
         x_c -= dx
         y_c -= dy
         self._center = (x_c, y_c)
-        new_x=cv2.getRectSubPix(current_frame,(2*self.w,2*self.h),self._center)/255-0.5
+        new_x=None
+        if self.feature_reuse is not None:
+            new_x=reuse_feature_map(z_raw,(-dy,-dx),self.feature_reuse,
+                                    sample_fn=lambda:cv2.getRectSubPix(current_frame,(2*self.w,2*self.h),self._center),
+                                    feature_fn=lambda patch:patch/255-0.5)
+        if new_x is None:
+            new_x=cv2.getRectSubPix(current_frame,(2*self.w,2*self.h),self._center)/255-0.5
         new_x=new_x*self._window
         self.alphaf=self.interp_factor*self._training(new_x,self.y)+(1-self.interp_factor)*self.alphaf
         self.x=self.interp_factor*new_x+(1-self.interp_factor)*self.x
+        self._correlation.set_model(self._fft2(self.x))
         return [self._center[0]-self.w/2,self._center[1]-self.h/2,self.w,self.h]
 
 
-    def _dgk(self, x1, x2):
-        c = np.fft.fftshift(ifft2(fft2(x1)* np.conj(fft2(x2))))
-        d = np.dot(x1.flatten().conj(), x1.flatten()) + np.dot(x2.flatten().conj(), x2.flatten()) - 2 * c
-        k = np.exp(-1 / self.sigma ** 2 * np.clip(d,a_min=0,a_max=None) / np.size(x1))
-        return k
+    def _fft2(self,x):
+        if self.use_rfft is True:
+            return rfft2(x,dtype=complex_dtype())
+        return fft2(x,dtype=complex_dtype())
+
+    def _ifft2(self,xf):
+        if self.use_rfft is True:
+            return irfft2(xf,self._window.shape,dtype=real_dtype())
+        return ifft2(xf,dtype=complex_dtype())
 
     def _training(self, x, y):
-        k = self._dgk(x, x)
-        alphaf = fft2(y) / (fft2(k) + self.lambda_)
+        # the gaussian kernels are fftshifted like the reference code
+        k = np.fft.fftshift(self._correlation.auto_correlate(self._fft2(x),spatial=True))
+        alphaf = self._fft2(y) / (self._fft2(k) + self.lambda_)
         return alphaf
 
-    def _detection(self, alphaf, x, z):
-        k = self._dgk(x, z)
-        responses = np.real(ifft2(alphaf * fft2(k)))
+    def _detection(self, alphaf, z):
+        # k(x,z) of the model x cached by set_model
+        k = np.fft.fftshift(self._correlation.correlate(self._correlation.model_f,self._fft2(z),
+                                                        aa=self._correlation.model_norm,spatial=True))
+        responses = np.real(self._ifft2(alphaf * self._fft2(k)))
         return responses
 
 
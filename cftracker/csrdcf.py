@@ -13,12 +13,16 @@ from .base import BaseCF
 from lib.utils import cos_window
 from lib.fft_tools import fft2,ifft2
 from lib.utils import gaussian2d_rolled_labels
-from .feature import extract_hog_feature,extract_cn_feature
+from lib.precision import as_real,real_dtype
+from lib.colour_hist import bin_ids,histogram,back_project,update_model
+from lib.frame_context import frame_context
+from .feature import extract_hog_feature,extract_cn_feature,extract_hc_feature
 from .config import csrdcf_config
 from cftracker.scale_estimator import LPScaleEstimator,DSSTScaleEstimator
 
 
 def kernel_profile_epanechnikov(x):
+    x = as_real(x)
     res = np.zeros_like(x)
     res[np.where(x <= 1)] = 2 / 3.14 * (1 - x[x <= 1])
     return res
@@ -32,6 +36,7 @@ class CSRDCF(BaseCF):
         self.y_sigma =config.y_sigma
         self.channels_weight_lr=self.interp_factor
         self.use_channel_weights = config.use_channel_weights
+        self.use_fused_hc=config.use_fused_hc
 
         self.hist_lr=config.hist_lr
         self.nbins=config.nbins
@@ -48,7 +53,8 @@ class CSRDCF(BaseCF):
 
 
     def init(self,first_frame,bbox):
-
+        ctx=frame_context(first_frame)
+        first_frame=ctx.frame
         bbox=np.array(bbox).astype(np.int64)
         x,y,w,h=tuple(bbox)
         self.init_mask=np.ones((h,w),dtype=np.uint8)
@@ -109,14 +115,7 @@ class CSRDCF(BaseCF):
         self.target_dummy_mask[y0:y1,x0:x1]=1
         self.target_dummy_area=np.sum(self.target_dummy_mask)
         if self.use_segmentation:
-            if self.segcolor_space=='bgr':
-                seg_img=first_frame
-            elif self.segcolor_space=='hsv':
-                seg_img=cv2.cvtColor(first_frame,cv2.COLOR_BGR2HSV)
-                seg_img[:, :, 0] = (seg_img[:, :, 0].astype(np.float32)/180*255)
-                seg_img = seg_img.astype(np.uint8)
-            else:
-                raise ValueError
+            seg_img=self.get_segmentation_image(ctx)
             hist_fg=Histogram(3,self.nbins)
             hist_bg=Histogram(3,self.nbins)
             self.extract_histograms(seg_img,bbox,hist_fg,hist_bg)
@@ -151,6 +150,8 @@ class CSRDCF(BaseCF):
 
 
     def update(self,current_frame,vis=False):
+        ctx=frame_context(current_frame)
+        current_frame=ctx.frame
         f=self.get_csr_features(current_frame,self._center,self.current_scale_factor,
                                 self.template_size,self.rescale_template_size,self.cell_size)
         f=f*self._window[:,:,None]
@@ -214,20 +215,13 @@ class CSRDCF(BaseCF):
         region=[np.round(self._center[0] - self.target_sz[0] / 2),np.round( self._center[1] - self.target_sz[1] / 2),
                         self.target_sz[0], self.target_sz[1]]
         if self.use_segmentation:
-            if self.segcolor_space=='bgr':
-                seg_img=current_frame
-            elif self.segcolor_space=='hsv':
-                seg_img=cv2.cvtColor(current_frame,cv2.COLOR_BGR2HSV)
-                seg_img[:, :, 0] = (seg_img[:, :, 0].astype(np.float32)/180*255)
-                seg_img = seg_img.astype(np.uint8)
-            else:
-                raise ValueError
+            seg_img=self.get_segmentation_image(ctx)
 
             hist_fg=Histogram(3,self.nbins)
             hist_bg=Histogram(3,self.nbins)
             self.extract_histograms(seg_img,region,hist_fg,hist_bg)
-            self.hist_fg_p_bins=(1-self.hist_lr)*self.hist_fg_p_bins+self.hist_lr*hist_fg.p_bins
-            self.hist_bg_p_bins=(1-self.hist_lr)*self.hist_bg_p_bins+self.hist_lr*hist_bg.p_bins
+            self.hist_fg_p_bins=update_model(self.hist_fg_p_bins,hist_fg.p_bins,self.hist_lr)
+            self.hist_bg_p_bins=update_model(self.hist_bg_p_bins,hist_bg.p_bins,self.hist_lr)
 
             hist_fg.p_bins=self.hist_fg_p_bins
             hist_bg.p_bins=self.hist_bg_p_bins
@@ -266,11 +260,26 @@ class CSRDCF(BaseCF):
         return region
 
 
+    def get_segmentation_image(self,ctx):
+        # frame in the colour space of the segmentation, hsv hue stretched from [0,180) to [0,255]
+        if self.segcolor_space=='bgr':
+            return ctx.frame
+        elif self.segcolor_space=='hsv':
+            def build():
+                seg_img=ctx.image('hsv').copy()
+                seg_img[:, :, 0] = (seg_img[:, :, 0].astype(np.float32)/180*255)
+                return seg_img
+            return ctx.get(('csrdcf_hsv',),build)
+        else:
+            raise ValueError
+
     def get_csr_features(self,img,center,scale,template_sz,resize_sz,cell_size):
         center=(int(center[0]),int(center[1]))
         patch=cv2.getRectSubPix(img,patchSize=(int(scale*template_sz[0]),int(scale*template_sz[1])),
                                 center=center)
         patch=cv2.resize(patch,resize_sz).astype(np.uint8)
+        if self.use_fused_hc is True:
+            return extract_hc_feature(patch,cell_size,hog_channels=18)
         hog_feature=extract_hog_feature(patch,cell_size)[:,:,:18]
         # gray feature is included in the cn features
         cn_feature=extract_cn_feature(patch,cell_size)
@@ -308,6 +317,7 @@ class CSRDCF(BaseCF):
         mu_max=20
         max_iter=4
         lambda_=mu/100
+        P=as_real(P)
         F=fft2(img)
         Sxy=F*np.conj(Y)[:,:,None]
         Sxx=F*np.conj(F)
@@ -364,7 +374,7 @@ class CSRDCF(BaseCF):
         cx=x1+0.5*(x2-x1)
         cy=y1+0.5*(y2-y1)
 
-        kernel_weight=np.zeros((1+int(np.floor(y2-y1)),1+int(np.floor(-(x1-cx)+x2-cx))))
+        kernel_weight=np.zeros((1+int(np.floor(y2-y1)),1+int(np.floor(-(x1-cx)+x2-cx))),dtype=real_dtype())
         ys=np.arange(y1,y2+1)
         xs=np.arange(x1,x2+1)
         xs,ys=np.meshgrid(xs,ys)
@@ -433,7 +443,7 @@ class Histogram:
         self.num_dimensions=num_dimensions
         self.num_bins_perdimension=num_bins_perdimension
         self.p_size=int(np.floor(num_bins_perdimension**num_dimensions))
-        self.p_bins=np.zeros((self.p_size,))
+        self.p_bins=np.zeros((self.p_size,),dtype=real_dtype())
         self.p_dim_id_coef=np.power(num_bins_perdimension,(num_dimensions-1-np.arange(num_dimensions))).astype(np.int64)
 
 
@@ -452,7 +462,6 @@ class Histogram:
             xs,ys=np.meshgrid(xs,ys)
             kernel_weight[ys,xs]=kernel_profile_epanechnikov(((cx-xs)*kernel_size_width)**2+((cy-ys)*kernel_size_height)**2)
             weights=kernel_weight
-        range_perbin_inverse=self.num_bins_perdimension/256
         """
         sum=0
         for y in range(y1,y2+1):
@@ -463,15 +472,15 @@ class Histogram:
                 self.p_bins[id]+=weights[y,x]
                 sum+=weights[y,x]
         """
-        ids=np.sum(self.p_dim_id_coef[None,None,:]*(np.floor(
-            range_perbin_inverse*img_channels[y1:y2+1,x1:x2+1]).astype(np.int64)),axis=2)
-        self.p_bins[ids]+=weights[y1:y2+1,x1:x2+1]
+        # bincount adds every pixel, p_bins[ids]+=weights kept a single weight per bin
+        ids=bin_ids(img_channels[y1:y2+1,x1:x2+1],self.num_bins_perdimension)
+        self.p_bins=self.p_bins+histogram(ids,self.num_bins_perdimension,self.num_dimensions,
+                                          weights=weights[y1:y2+1,x1:x2+1],dtype=self.p_bins.dtype).ravel()
         self.p_bins=self.p_bins/np.sum(self.p_bins)
 
 
 
     def extract_background_histogram(self,img_channels,tl,br,outer_tl,outer_br):
-        range_per_bin_inverse=self.num_bins_perdimension/256
         #sum=0
         x1,y1=tl
         x2,y2=br
@@ -489,17 +498,15 @@ class Histogram:
                 sum+=1
         sum=1./sum
         """
-        mask=np.ones((outer_y2-outer_y1,outer_x2-outer_x1))
-        mask[y1-outer_y1:y2+1-outer_y1,x1-outer_x1:x2+1-outer_x1]=-1
-        ids = np.sum(self.p_dim_id_coef[None, None, :] * (np.floor(
-            range_per_bin_inverse *mask[:,:,None]*img_channels[outer_y1:outer_y2, outer_x1:outer_x2]).astype(np.int64)), axis=2)
-        # only statistic valid val
-        self.p_bins[ids[ids>=0]]+=1
+        mask=np.ones((outer_y2-outer_y1,outer_x2-outer_x1),dtype=np.uint8)
+        mask[y1-outer_y1:y2+1-outer_y1,x1-outer_x1:x2+1-outer_x1]=0
+        ids=bin_ids(img_channels[outer_y1:outer_y2,outer_x1:outer_x2],self.num_bins_perdimension)
+        self.p_bins=self.p_bins+histogram(ids,self.num_bins_perdimension,self.num_dimensions,
+                                          mask=mask,dtype=self.p_bins.dtype).ravel()
         self.p_bins=self.p_bins/np.sum(self.p_bins)
 
 
     def back_project(self,img_channels):
-        range_per_bin_inverse = self.num_bins_perdimension / 256
         """
         img=img_channels[:,:,0]
         back_project=np.zeros_like(img,dtype=np.float32)
@@ -510,10 +517,7 @@ class Histogram:
                     id+=self.p_dim_id_coef[dim]*int(np.floor(range_per_bin_inverse*img_channels[y,x,dim]))
                 back_project[y,x]=self.p_bins[int(id)]
         """
-        ids = np.sum(self.p_dim_id_coef[None, None, :] * (np.floor(
-            range_per_bin_inverse * img_channels).astype(np.int64)), axis=2)
-        back_project=self.p_bins[ids]
-        return back_project
+        return back_project(self.p_bins,bin_ids(img_channels,self.num_bins_perdimension))
 
 
 
@@ -533,7 +537,7 @@ class Segment:
         p_o=1-p_b
         factor = min(1, np.sqrt(1000 / ((x2 - x1) * (y2 - y1))))
         new_size = (int((x2 - x1) * factor), int((y2 - y1) * factor))
-        img_channels_roi_inner = np.zeros((new_size[1], new_size[0], img_channels.shape[2]), dtype=np.float32)
+        img_channels_roi_inner = np.zeros((new_size[1], new_size[0], img_channels.shape[2]), dtype=img_channels.dtype)
         for i in range(img_channels.shape[2]):
             img_channels_roi_inner[:, :, i] = cv2.resize(img_channels[y1:y2 + 1, x1:x2 + 1, i], new_size)
         if len(fg_prior.shape) < 2:
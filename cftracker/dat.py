@@ -11,6 +11,10 @@ import numpy as np
 import cv2
 from cftracker.base import BaseCF
 from lib.utils import cos_window
+from lib.precision import integral_sdepth
+from lib.colour_hist import bin_ids,histogram,back_project,update_model
+from lib.frame_context import frame_context
+from lib.ring_buffer import RingBuffer
 import copy
 from cftracker.config.dat_config import DATConfig
 
@@ -18,8 +22,16 @@ class DAT(BaseCF):
     def __init__(self):
         super(DAT).__init__()
         self.config=DATConfig()
-        self.target_pos_history=[]
-        self.target_sz_history=[]
+        history_size=self.config.history_size
+        if history_size is None:
+            self.target_pos_history=[]
+            self.target_sz_history=[]
+        else:
+            # the motion prediction looks at the latest motion_estimation_history_size+2 positions
+            if history_size<self.config.motion_estimation_history_size+2:
+                raise ValueError('history size must cover '+str(self.config.motion_estimation_history_size+2)+' frames')
+            self.target_pos_history=RingBuffer(history_size,(2,))
+            self.target_sz_history=RingBuffer(history_size,(2,))
 
     def init(self,first_frame,bbox):
         bbox=np.array(bbox).astype(np.int64)
@@ -29,15 +41,7 @@ class DAT(BaseCF):
         self.w,self.h=int(w*self._scale_factor),int(h*self._scale_factor)
         self._target_sz=(self.w,self.h)
 
-        img=cv2.resize(first_frame,None,fx=self._scale_factor,fy=self._scale_factor)
-        if self.config.color_space=='lab':
-            img=cv2.cvtColor(img,cv2.COLOR_BGR2Lab)
-        elif self.config.color_space=='hsv':
-            img=cv2.cvtColor(img,cv2.COLOR_BGR2HSV)
-            img[:, :, 0] = (img[:, :, 0] * 256 / 180)
-            img = img.astype(np.uint8)
-        else:
-            pass
+        img=self.preprocess(frame_context(first_frame))
 
         surr_sz=(int(np.floor(self.config.surr_win_factor*self.w)),int(np.floor(self.config.surr_win_factor*self.h)))
         surr_rect=pos2rect(self._center,surr_sz,(img.shape[1],img.shape[0]))
@@ -46,9 +50,9 @@ class DAT(BaseCF):
                     obj_rect_surr[1]-surr_rect[1],
                     obj_rect_surr[2],obj_rect_surr[3])
         surr_win=get_sub_window(img,self._center,surr_sz)
-        self.bin_mapping=get_bin_mapping(self.config.num_bins)
-        self.prob_lut_,prob_map=get_foreground_background_probs(surr_win,obj_rect_surr,
-                                self.config.num_bins,self.bin_mapping)
+        surr_ids=bin_ids(surr_win,self.config.num_bins)
+        self.prob_lut_=get_foreground_background_probs(surr_ids,obj_rect_surr,self.config.num_bins)
+        prob_map=back_project(self.prob_lut_,surr_ids)
         self._prob_lut_distractor=copy.deepcopy(self.prob_lut_)
         self._prob_lut_masked=copy.deepcopy(self.prob_lut_)
         self.adaptive_threshold_=get_adaptive_threshold(prob_map,obj_rect_surr)
@@ -56,17 +60,9 @@ class DAT(BaseCF):
         self.target_sz_history.append((self._target_sz[0]/self._scale_factor,self._target_sz[1]/self._scale_factor))
 
     def update(self,current_frame,vis=False):
-        img_preprocessed=cv2.resize(current_frame,None,fx=self._scale_factor,fy=self._scale_factor)
-        if self.config.color_space=='lab':
-            img=cv2.cvtColor(img_preprocessed,cv2.COLOR_BGR2Lab)
-        elif self.config.color_space=='hsv':
-            img=cv2.cvtColor(img_preprocessed,cv2.COLOR_BGR2HSV)
-            img[:,:,0]=(img[:,:,0]*256/180)
-            img=img.astype(np.uint8)
-        else:
-            img=img_preprocessed
-        prev_pos=self.target_pos_history[-1]
-        prev_sz=self.target_sz_history[-1]
+        img=self.preprocess(frame_context(current_frame))
+        prev_pos=tuple(self.target_pos_history[-1])
+        prev_sz=tuple(self.target_sz_history[-1])
         if self.config.motion_estimation_history_size>0:
             prev_pos=prev_pos+get_motion_prediciton(self.target_pos_history,self.config.motion_estimation_history_size)
         target_pos=(prev_pos[0]*self._scale_factor,prev_pos[1]*self._scale_factor)
@@ -78,9 +74,10 @@ class DAT(BaseCF):
         self.crop_size=(search_rect[2],search_rect[3])
         search_win,padded_search_win=get_subwindow_masked(img,target_pos,search_sz)
         #Apply probability LUT
-        pm_search=get_foreground_prob(search_win,self.prob_lut_,self.bin_mapping)
+        search_ids=bin_ids(search_win,self.config.num_bins)
+        pm_search=back_project(self.prob_lut_,search_ids)
         if self.config.distractor_aware is True:
-            pm_search_dist=get_foreground_prob(search_win,self._prob_lut_distractor,self.bin_mapping)
+            pm_search_dist=back_project(self._prob_lut_distractor,search_ids)
             pm_search=(pm_search+pm_search_dist)/2
         pm_search=pm_search*padded_search_win
         window=cos_window(search_sz)
@@ -116,25 +113,26 @@ class DAT(BaseCF):
             obj_rect_surr=pos2rect(target_pos_img,target_sz,(img.shape[1],img.shape[0]))
             obj_rect_surr=(obj_rect_surr[0]-surr_rect[0],obj_rect_surr[1]-surr_rect[1],obj_rect_surr[2],obj_rect_surr[3])
             surr_win=get_sub_window(img,target_pos_img,surr_sz)
-            prob_lut_bg,_=get_foreground_background_probs(surr_win,obj_rect_surr,self.config.num_bins)
+            surr_ids=bin_ids(surr_win,self.config.num_bins)
+            prob_lut_bg=get_foreground_background_probs(surr_ids,obj_rect_surr,self.config.num_bins)
 
             if self.config.distractor_aware is True:
                 if len(distractors)>1:
                     obj_rect=pos2rect(target_pos,target_sz,(search_win.shape[1],search_win.shape[0]))
-                    prob_lut_dist=get_foreground_distractor_probs(search_win,obj_rect,distractors,self.config.num_bins)
-                    self._prob_lut_distractor=(1-self.config.prob_lut_update_rate)*self._prob_lut_distractor+\
-                        self.config.prob_lut_update_rate*prob_lut_dist
+                    prob_lut_dist=get_foreground_distractor_probs(search_ids,obj_rect,distractors,self.config.num_bins)
+                    self._prob_lut_distractor=update_model(self._prob_lut_distractor,prob_lut_dist,
+                                                           self.config.prob_lut_update_rate)
                 else:
-                    self._prob_lut_distractor=(1-self.config.prob_lut_update_rate)*self._prob_lut_distractor+\
-                        self.config.prob_lut_update_rate*prob_lut_bg
+                    self._prob_lut_distractor=update_model(self._prob_lut_distractor,prob_lut_bg,
+                                                           self.config.prob_lut_update_rate)
                 if len(distractors)==0 or np.max(distractor_overlap)<0.1:
-                    self.prob_lut_=(1-self.config.prob_lut_update_rate)*self.prob_lut_+self.config.prob_lut_update_rate*prob_lut_bg
-                prob_map=get_foreground_prob(surr_win,self.prob_lut_,self.bin_mapping)
-                dist_map=get_foreground_prob(surr_win,self._prob_lut_distractor,self.bin_mapping)
+                    self.prob_lut_=update_model(self.prob_lut_,prob_lut_bg,self.config.prob_lut_update_rate)
+                prob_map=back_project(self.prob_lut_,surr_ids)
+                dist_map=back_project(self._prob_lut_distractor,surr_ids)
                 prob_map=0.5*prob_map+0.5*dist_map
             else:
-                self.prob_lut_=(1-self.config.prob_lut_update_rate)*self.prob_lut_+self.config.prob_lut_update_rate*prob_lut_bg
-                prob_map=get_foreground_prob(surr_win,self.prob_lut_,self.bin_mapping)
+                self.prob_lut_=update_model(self.prob_lut_,prob_lut_bg,self.config.prob_lut_update_rate)
+                prob_map=back_project(self.prob_lut_,surr_ids)
             self.adaptive_threshold_=get_adaptive_threshold(prob_map,obj_rect_surr)
 
         target_pos=(target_pos[0]+search_rect[0],target_pos[1]+search_rect[1])
@@ -146,6 +144,19 @@ class DAT(BaseCF):
         return [target_pos_original[0]-target_sz_original[0]/2,target_pos_original[1]-target_sz_original[1]/2,
                 target_sz_original[0],target_sz_original[1]]
 
+    def preprocess(self,ctx):
+        # frame resized by the current scale factor and converted to the configured colour space
+        def build():
+            img=cv2.cvtColor(ctx.resized(self._scale_factor),cv2.COLOR_BGR2HSV)
+            img[:,:,0]=(img[:,:,0]*256/180)
+            return img.astype(np.uint8)
+        if self.config.color_space=='lab':
+            return ctx.get(('dat_lab',self._scale_factor),
+                           lambda:cv2.cvtColor(ctx.resized(self._scale_factor),cv2.COLOR_BGR2Lab))
+        elif self.config.color_space=='hsv':
+            return ctx.get(('dat_hsv',self._scale_factor),build)
+        return ctx.resized(self._scale_factor)
+
 
 def pos2rect(center,obj_sz,win_sz=None):
     obj_w,obj_h=obj_sz
@@ -156,34 +167,21 @@ def pos2rect(center,obj_sz,win_sz=None):
         rect=intersect_of_rects(border,rect)
     return rect
 
-def get_foreground_background_probs(frame,obj_rect,num_bins,bin_mapping=None):
-    frame=frame.astype(np.uint8)
-
-    surr_hist = cv2.calcHist([frame],[0, 1, 2], None, [num_bins,num_bins,num_bins],
-                             [0, 256, 0, 256, 0, 256])
+def get_foreground_background_probs(frame_ids,obj_rect,num_bins):
+    # frame_ids is the bin id map of the surrounding window (lib.colour_hist.bin_ids)
+    surr_hist = histogram(frame_ids,num_bins)
     x,y,w,h=obj_rect
-    if x+w>frame.shape[1]-1:
-        w=(frame.shape[1]-1)-x
-    if y+h>frame.shape[0]-1:
-        h=(frame.shape[0]-1)-y
+    if x+w>frame_ids.shape[1]-1:
+        w=(frame_ids.shape[1]-1)-x
+    if y+h>frame_ids.shape[0]-1:
+        h=(frame_ids.shape[0]-1)-y
     x=int(max(x,0))
     y=int(max(y,0))
-    obj_win=frame[y:y+h+1,x:x+w+1]
+    obj_ids=frame_ids[y:y+h+1,x:x+w+1]
 
-    obj_hist = cv2.calcHist([obj_win], [0, 1, 2], None, [num_bins, num_bins, num_bins], [0, 256, 0, 256, 0, 256])
+    obj_hist = histogram(obj_ids,num_bins)
     prob_lut = (obj_hist + 1) / (surr_hist + 2)
-    prob_map = None
-    if bin_mapping is not None:
-        frame_bin = cv2.LUT(frame, bin_mapping).astype(np.int64)
-        prob_map = prob_lut[frame_bin[:, :, 0], frame_bin[:, :, 1], frame_bin[:, :, 2]]
-
-    return prob_lut,prob_map
-
-def get_bin_mapping(num_bins):
-    bin_mapping=np.zeros((256,))
-    for i in range(bin_mapping.shape[0]):
-        bin_mapping[i]=(np.floor(i/(256/num_bins)))
-    return bin_mapping.astype(np.uint8)
+    return prob_lut
 
 def get_adaptive_threshold(prob_map, obj_rect, config=DATConfig()):
     x,y,w,h=obj_rect
@@ -257,11 +255,6 @@ def cal_iou(rect1,rect2):
     iou=(inter[2]*inter[3])/(rect1[2]*rect1[3]+rect2[2]*rect2[3]-inter[2]*inter[3])
     return iou
 
-def get_foreground_prob(frame,prob_lut,bin_mapping):
-    frame_bin=cv2.LUT(frame,bin_mapping).astype(np.int64)
-    prob_map = prob_lut[frame_bin[:, :, 0], frame_bin[:, :, 1], frame_bin[:, :, 2]]
-    return prob_map
-
 def get_nms_rects(prob_map,obj_sz,scale,overlap,score_frac,dist_map,include_inner):
 
     height,width=prob_map.shape[:2]
@@ -300,8 +293,8 @@ def get_nms_rects(prob_map,obj_sz,scale,overlap,score_frac,dist_map,include_inne
     br_inner=np.array([b-o_y,r-o_x]).T
     tl_inner=np.array([y.flatten()+o_y,x.flatten()+o_x]).T
     tr_inner=np.array([y.flatten()+o_y,r-o_x]).T
-    int_prob_map=cv2.integral(prob_map)
-    int_dist_map=cv2.integral(dist_map)
+    int_prob_map=cv2.integral(prob_map,sdepth=integral_sdepth())
+    int_dist_map=cv2.integral(dist_map,sdepth=integral_sdepth())
     v_scores=int_prob_map[br[:,0],br[:,1]]-int_prob_map[bl[:,0],bl[:,1]]-int_prob_map[tr[:,0],tr[:,1]]+int_prob_map[tl[:,0],tl[:,1]]
     d_scores=int_dist_map[br[:,0],br[:,1]]-int_dist_map[bl[:,0],bl[:,1]]-int_dist_map[tr[:,0],tr[:,1]]+int_dist_map[tl[:,0],tl[:,1]]
     if include_inner is True:
@@ -336,8 +329,8 @@ def get_nms_rects(prob_map,obj_sz,scale,overlap,score_frac,dist_map,include_inne
             tl_inner = np.delete(tl_inner, midx, axis=0)
             tr_inner = np.delete(tr_inner, midx, axis=0)
 
-        int_prob_map=cv2.integral(prob_map)
-        int_dist_map=cv2.integral(dist_map)
+        int_prob_map=cv2.integral(prob_map,sdepth=integral_sdepth())
+        int_dist_map=cv2.integral(dist_map,sdepth=integral_sdepth())
         v_scores = int_prob_map[br[:, 0], br[:, 1]] - int_prob_map[bl[:, 0], bl[:, 1]] - int_prob_map[
             tr[:, 0], tr[:, 1]] + int_prob_map[tl[:, 0], tl[:, 1]]
         d_scores = int_dist_map[br[:, 0], br[:, 1]] - int_dist_map[bl[:, 0], bl[:, 1]] - int_dist_map[
@@ -352,15 +345,15 @@ def get_nms_rects(prob_map,obj_sz,scale,overlap,score_frac,dist_map,include_inne
 
     return top_rects,top_vote_scores,top_dist_scores
 
-def get_foreground_distractor_probs(frame,obj_rect,distractors,num_bins):
-    Md=np.zeros((frame.shape[0],frame.shape[1]),dtype=np.uint8)
-    Mo=np.zeros((frame.shape[0],frame.shape[1]),dtype=np.uint8)
+def get_foreground_distractor_probs(frame_ids,obj_rect,distractors,num_bins):
+    Md=np.zeros((frame_ids.shape[0],frame_ids.shape[1]),dtype=np.uint8)
+    Mo=np.zeros((frame_ids.shape[0],frame_ids.shape[1]),dtype=np.uint8)
     for i in range(len(distractors)):
         x,y,w,h=distractors[i]
         Md[y:y+h,x:x+w]=1
     Mo[obj_rect[1]:obj_rect[1]+obj_rect[3],obj_rect[0]:obj_rect[0]+obj_rect[2]]=1
-    obj_hist=cv2.calcHist([frame],[0,1,2],Mo,[num_bins,num_bins,num_bins],[0,256,0,256,0,256])
-    dist_hist=cv2.calcHist([frame],[0,1,2],Md,[num_bins,num_bins,num_bins],[0,256,0,256,0,256])
+    obj_hist=histogram(frame_ids,num_bins,mask=Mo)
+    dist_hist=histogram(frame_ids,num_bins,mask=Md)
     prob_lut=(obj_hist*len(distractors)+1)/(dist_hist+obj_hist*len(distractors)+2)
     return prob_lut
 
@@ -13,8 +13,11 @@ import cv2
 from .base import BaseCF
 from .feature import extract_hog_feature
 from lib.utils import gaussian2d_labels,cos_window
-from lib.fft_tools import fft2,ifft2
+from lib.fft_tools import fft2,ifft2,rfft2,irfft2
+from lib.precision import as_real
+from lib.frame_context import frame_context,as_frame
 from .scale_estimator import DSSTScaleEstimator,LPScaleEstimator
+from .cf_utils import reuse_feature_map
 
 class DSST(BaseCF):
     def __init__(self,config):
@@ -26,11 +29,15 @@ class DSST(BaseCF):
         self.scale_type=config.scale_type
         self.scale_config=config.scale_config
         self.padding =config.padding
+        self.use_rfft=config.use_rfft
+        # None, 'circular' or 'border', train on the detection features shifted to the new position
+        # when the scale estimate did not change
+        self.feature_reuse=config.feature_reuse
         self.config=config
 
 
     def init(self,first_frame,bbox):
-        first_frame=first_frame.astype(np.float32)
+        first_frame=frame_context(first_frame).float32()
         bbox=np.array(bbox).astype(np.int64)
         x,y,w,h=tuple(bbox)
         self._center=(x+w/2,y+h/2)
@@ -42,12 +49,12 @@ class DSST(BaseCF):
         output_sigma=np.sqrt(self.w*self.h)*self.output_sigma_factor
         self.y=gaussian2d_labels(self.crop_size,output_sigma)
         self._init_response_center = np.unravel_index(np.argmax(self.y, axis=None), self.y.shape)
-        self.yf=fft2(self.y)
+        self.yf=self._fft2(self.y)
         self.current_scale_factor=1.
 
 
         xl=self.get_translation_sample(first_frame,self._center,self.crop_size,self.current_scale_factor,self._window)
-        self.xlf=fft2(xl)
+        self.xlf=self._fft2(xl)
         self.hf_den=np.sum(self.xlf*np.conj(self.xlf),axis=2)
         self.hf_num=self.yf[:,:,None]*np.conj(self.xlf)
 
@@ -67,13 +74,16 @@ class DSST(BaseCF):
             self.scale_estimator.init(first_frame,self._center,self.base_target_size,self.current_scale_factor)
 
     def update(self,current_frame,vis=False):
-        xt=self.get_translation_sample(current_frame,self._center,self.crop_size,self.current_scale_factor,self._window)
-        xtf=fft2(xt)
-        response=np.real(ifft2(np.sum(self.hf_num*xtf,axis=2)/(self.hf_den+self.lambda_)))
+        current_frame=as_frame(current_frame)
+        xt_raw=self.get_feature_map(self.get_translation_patch(current_frame,self._center,self.crop_size,
+                                                              self.current_scale_factor))
+        xtf=self._fft2(self._get_windowed(xt_raw,self._window))
+        response=self._ifft2(np.sum(self.hf_num*xtf,axis=2)/(self.hf_den+self.lambda_))
         if vis is True:
             self.score=response
             self.win_sz=self.crop_size
         curr=np.unravel_index(np.argmax(response,axis=None),response.shape)
+        shift=(curr[0]-self._init_response_center[0],curr[1]-self._init_response_center[1])
         dy=(curr[0]-self._init_response_center[0])*self.current_scale_factor
         dx=(curr[1]-self._init_response_center[1])*self.current_scale_factor
         x_c, y_c = self._center
@@ -81,14 +91,23 @@ class DSST(BaseCF):
         y_c += dy
         self._center = (x_c, y_c)
 
+        detection_scale_factor=self.current_scale_factor
         self.current_scale_factor = self.scale_estimator.update(current_frame, self._center, self.base_target_size,
                                                                 self.current_scale_factor)
         if self.scale_type == 'normal':
             self.current_scale_factor = np.clip(self.current_scale_factor, a_min=self._min_scale_factor,
                                                 a_max=self._max_scale_factor)
 
-        xl=self.get_translation_sample(current_frame,self._center,self.crop_size,self.current_scale_factor,self._window)
-        xlf=fft2(xl)
+        xl=None
+        if self.feature_reuse is not None and self.current_scale_factor==detection_scale_factor:
+            xl=reuse_feature_map(xt_raw,shift,self.feature_reuse,
+                                 sample_fn=lambda:self.get_translation_patch(current_frame,self._center,self.crop_size,
+                                                                             self.current_scale_factor),
+                                 feature_fn=self.get_feature_map)
+        if xl is None:
+            xl=self.get_feature_map(self.get_translation_patch(current_frame,self._center,self.crop_size,
+                                                               self.current_scale_factor))
+        xlf=self._fft2(self._get_windowed(xl,self._window))
         new_hf_num=self.yf[:,:,None]*np.conj(xlf)
         new_hf_den=np.sum(xlf*np.conj(xlf),axis=2)
 
@@ -102,21 +121,34 @@ class DSST(BaseCF):
         return [self._center[0]-self.target_sz[0]/2,self._center[1]-self.target_sz[1]/2,
                 self.target_sz[0],self.target_sz[1]]
 
+    def _fft2(self,x):
+        if self.use_rfft is True:
+            return rfft2(x)
+        return fft2(x)
+
+    def _ifft2(self,xf):
+        if self.use_rfft is True:
+            return irfft2(xf,self._window.shape)
+        return np.real(ifft2(xf))
+
     def get_translation_sample(self,im,center,model_sz,scale_factor,cos_window):
+        im_patch=self.get_translation_patch(im,center,model_sz,scale_factor)
+        out=self.get_feature_map(im_patch)
+        out=self._get_windowed(out,cos_window)
+        return out
+
+    def get_translation_patch(self,im,center,model_sz,scale_factor):
         patch_sz=(int(model_sz[0]*scale_factor),int(model_sz[1]*scale_factor))
         im_patch=cv2.getRectSubPix(im,patch_sz,center)
         if model_sz[0]>patch_sz[1]:
             interpolation=cv2.INTER_LINEAR
         else:
             interpolation=cv2.INTER_AREA
-        im_patch=cv2.resize(im_patch,model_sz,interpolation=interpolation)
-        out=self.get_feature_map(im_patch)
-        out=self._get_windowed(out,cos_window)
-        return out
+        return cv2.resize(im_patch,model_sz,interpolation=interpolation)
 
 
     def get_feature_map(self,im_patch):
-        gray=(cv2.cvtColor(im_patch,cv2.COLOR_BGR2GRAY))[:,:,np.newaxis]/255-0.5
+        gray=as_real(cv2.cvtColor(im_patch,cv2.COLOR_BGR2GRAY))[:,:,np.newaxis]/255-0.5
         hog_feature= extract_hog_feature(im_patch, cell_size=1)[:, :, :27]
         return np.concatenate((gray,hog_feature),axis=2)
 
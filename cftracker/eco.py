@@ -6,7 +6,7 @@ StrangerZhang's pyECO for comparing performance of different tracker.
 import numpy as np
 from .base import BaseCF
 from lib.eco.tracker import ECOTracker
-import cv2
+from lib.frame_context import frame_context
 
 class ECO(BaseCF):
     def __init__(self,config):
@@ -14,20 +14,23 @@ class ECO(BaseCF):
         self.config=config
 
     def init(self,first_frame,bbox):
+        ctx=frame_context(first_frame)
+        first_frame=ctx.frame
         if np.all(first_frame[:,:,0]==first_frame[:,:,1]):
             self.tracker = ECOTracker(is_color=False, config=self.config)
             first_frame=first_frame[:,:,:1]
         else:
             self.tracker=ECOTracker(is_color=True,config=self.config)
-            first_frame=cv2.cvtColor(first_frame,cv2.COLOR_BGR2RGB)
+            first_frame=ctx.image('rgb')
         self.tracker.init(first_frame,bbox)
 
 
     def update(self,current_frame,vis=False):
+        ctx=frame_context(current_frame)
         if self.tracker._is_color is True:
-            current_frame=cv2.cvtColor(current_frame,cv2.COLOR_BGR2RGB)
+            current_frame=ctx.image('rgb')
         else:
-            current_frame=current_frame[:,:,:1]
+            current_frame=ctx.frame[:,:,:1]
 
         bbox=self.tracker.update(current_frame,train=True,vis=vis)
         if vis is True:
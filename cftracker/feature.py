@@ -1,14 +1,15 @@
 import cv2
 import numpy as np
-from lib.eco.features.features import fhog,TableFeature
+from lib.eco.features.features import load_lookup_table
+from lib.feature_registry import feature_registry,get_feature_backend
 
 
 def extract_hog_feature(img, cell_size=4):
-    fhog_feature=fhog(img.astype(np.float32),cell_size,num_orients=9,clip=0.2)[:,:,:-1]
-    return fhog_feature
+    # 31 fhog channels from the registered hog backend, see lib.feature_registry
+    return get_feature_backend('hog')(img,cell_size)
 
 
-def extract_pyhog_feature(img, cell_size=4):
+def extract_pyhog_feature(img, cell_size=4, out=None):
     from lib import fhog as pyfhog
     h,w=img.shape[:2]
     img=cv2.resize(img,(w+2*cell_size,h+2*cell_size))
@@ -19,28 +20,175 @@ def extract_pyhog_feature(img, cell_size=4):
     size_patch = list(map(int, [mapp['sizeY'], mapp['sizeX'], mapp['numFeatures']]))
     FeaturesMap = mapp['map'].reshape(
         (size_patch[0],size_patch[1], size_patch[2]))
+    if out is not None:
+        out[:] = FeaturesMap[:, :, :out.shape[2]]
+        return out
     return FeaturesMap
 
 
-def extract_cn_feature(img,cell_size=1):
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY).astype(np.float32) / 255 - 0.5
-    cn = TableFeature(fname='cn', cell_size=cell_size, compressed_dim=11, table_name="CNnorm",
-                      use_for_color=True)
+class ColorNamesExtractor:
+    """
+    long-lived colour names feature engine, the lookup table is loaded once per process and
+    the bgr uint8 pixels are mapped to table rows through precomputed per-channel flat indices,
+    the work buffers are reused while the patch size and cell size do not change,
+    cells are pooled through summed area tables as TableFeature does ('integral') or by area resampling ('area')
+    """
+    def __init__(self, table_name='CNnorm', den=8, factor=32, pooling='integral'):
+        if pooling not in ('integral', 'area'):
+            raise ValueError('unknown pooling ' + str(pooling))
+        self.table = load_lookup_table(table_name)
+        self.pooling = pooling
+        bins = np.arange(256, dtype=np.int32) // den
+        # row of a bgr pixel is r//den + (g//den)*factor + (b//den)*factor*factor
+        self._channel_index = (bins * factor * factor, bins * factor, bins)
+        self._key = None
 
-    if np.all(img[:, :, 0] == img[:, :, 1]):
-        img = img[:, :, :1]
-    else:
-        # # pyECO using RGB format
-        img = img[:, :, ::-1]
-    h,w=img.shape[:2]
-    cn_feature = \
-    cn.get_features(img, np.array(np.array([h/2,w/2]), dtype=np.int16), np.array([h,w]), 1, normalization=False)[
-        0][:, :, :, 0]
-    # print('cn_feature.shape:', cn_feature.shape)
-    # print('cnfeature:',cn_feature.shape,cn_feature.min(),cn_feature.max())
-    gray = cv2.resize(gray, (cn_feature.shape[1], cn_feature.shape[0]))[:, :, np.newaxis]
-    out = np.concatenate((gray, cn_feature), axis=2)
-    return out
+    @property
+    def num_dim(self):
+        # gray channel followed by the table channels
+        return self.table.shape[1] + 1
+
+    def _reset(self, h, w, cell_size):
+        if self._key == (h, w, cell_size):
+            return
+        d = self.table.shape[1]
+        self._index = np.empty((h, w), dtype=np.int32)
+        self._tmp = np.empty((h, w), dtype=np.int32)
+        self._features = np.empty((h * w, d), dtype=np.float32)
+        self._gray = np.empty((h, w), dtype=np.float32)
+        if cell_size > 1 and self.pooling == 'integral':
+            self._col_sum = np.empty((h, w, d), dtype=np.float32)
+            self._int_image = np.zeros((h + 1, w + 1, d), dtype=np.float32)
+        self._key = (h, w, cell_size)
+
+    @staticmethod
+    def is_gray(patch):
+        # colour patches are rejected on a sparse grid, the full comparison only runs for grey candidates
+        if not np.array_equal(patch[::8, ::8, 0], patch[::8, ::8, 1]):
+            return False
+        return np.array_equal(patch[:, :, 0], patch[:, :, 1])
+
+    def _lookup_index(self, patch):
+        index = self._index
+        if patch.dtype != np.uint8:
+            patch = patch.astype(np.uint8)
+        if self.is_gray(patch):
+            np.copyto(index, patch[:, :, 0])
+        else:
+            np.take(self._channel_index[0], patch[:, :, 0], out=index)
+            for c in (1, 2):
+                np.take(self._channel_index[c], patch[:, :, c], out=self._tmp)
+                np.add(index, self._tmp, out=index)
+        # TableFeature samples a patch of odd size one pixel up/left with border replication
+        if index.shape[0] % 2 == 1:
+            index[1:] = index[:-1]
+        if index.shape[1] % 2 == 1:
+            index[:, 1:] = index[:, :-1]
+        return index
+
+    def _average_cells(self, features, cell_size, out):
+        # same summed area averaging as lib.eco.features.features.average_feature_region
+        c = cell_size
+        int_image = self._int_image
+        np.cumsum(features, 0, out=self._col_sum)
+        np.cumsum(self._col_sum, 1, out=int_image[1:, 1:])
+        h, w = out.shape[:2]
+        np.subtract(int_image[c:c * h + 1:c, c:c * w + 1:c], int_image[c:c * h + 1:c, 0:c * w:c], out=out)
+        np.subtract(out, int_image[0:c * h:c, c:c * w + 1:c], out=out)
+        np.add(out, int_image[0:c * h:c, 0:c * w:c], out=out)
+        np.divide(out, c * c * 1., out=out)
+        return out
+
+    def _area_cells(self, features, cell_size, out):
+        # with an integer factor area resampling is the exact cell mean, cheaper and more accurate than float32 tables
+        c = cell_size
+        h, w = out.shape[:2]
+        out[:] = cv2.resize(features[:h * c, :w * c], (w, h), interpolation=cv2.INTER_AREA).reshape((h, w, -1))
+        return out
+
+    def extract(self, patch, cell_size=1, out=None):
+        """
+        :param patch: bgr patch of shape (h,w,3)
+        :param out: optional float32 array of shape (h//cell_size,w//cell_size,num_dim) written in place
+        :return: gray and colour names features of shape (h//cell_size,w//cell_size,num_dim)
+        """
+        h, w = patch.shape[:2]
+        self._reset(h, w, cell_size)
+        if out is None:
+            out = np.empty((h // cell_size, w // cell_size, self.num_dim), dtype=np.float32)
+        index = self._lookup_index(patch)
+        np.take(self.table, index.ravel(), axis=0, out=self._features)
+        features = self._features.reshape((h, w, -1))
+        if cell_size > 1 and self.pooling == 'integral':
+            self._average_cells(features, cell_size, out[:, :, 1:])
+        elif cell_size > 1:
+            self._area_cells(features, cell_size, out[:, :, 1:])
+        else:
+            out[:, :, 1:] = features
+
+        gray = self._gray
+        gray[:] = cv2.cvtColor(patch, cv2.COLOR_BGR2GRAY)
+        np.divide(gray, 255, out=gray)
+        np.subtract(gray, 0.5, out=gray)
+        if cell_size > 1:
+            out[:, :, 0] = cv2.resize(gray, (out.shape[1], out.shape[0]))
+        else:
+            out[:, :, 0] = gray
+        return out
+
+_cn_extractors = {}
+
+def get_cn_extractor(pooling=None):
+    # the extractor of the cn backend extract_cn_feature uses, the cn backends are named by their pooling
+    if pooling is None:
+        pooling = feature_registry.selected('cn')
+    if pooling not in _cn_extractors:
+        _cn_extractors[pooling] = ColorNamesExtractor(pooling=pooling)
+    return _cn_extractors[pooling]
+
+def extract_cn_feature(img,cell_size=1,out=None):
+    return get_feature_backend('cn')(img,cell_size,out=out)
+
+
+class HCExtractor:
+    """
+    fused hog+cn (hc) features, the first hog_channels fhog channels and the gray+colour names channels of a patch
+    are written side by side into one h*w*(hog_channels+num_dim) float32 buffer by the registered hog and cn
+    backends, so the per-tracker concatenation and its copy go away, the output is that of extract_hog_feature
+    and extract_cn_feature concatenated
+    """
+    def __init__(self, hog_channels=31):
+        self.hog_channels = hog_channels
+
+    @property
+    def num_dim(self):
+        return self.hog_channels + get_cn_extractor().num_dim
+
+    def output_shape(self, patch_sz, cell_size=4):
+        # patch_sz is (w,h) like the trackers' crop sizes
+        return (int(patch_sz[1]) // cell_size, int(patch_sz[0]) // cell_size, self.num_dim)
+
+    def extract(self, patch, cell_size=4, out=None):
+        """
+        :param patch: bgr uint8 patch of shape (h,w,3)
+        :param out: optional float32 array (or slice of a larger stack) of shape (h//cell_size,w//cell_size,num_dim)
+        :return: hc features, hog channels first
+        """
+        if out is None:
+            out = np.empty(self.output_shape((patch.shape[1], patch.shape[0]), cell_size), dtype=np.float32)
+        get_feature_backend('hog')(patch, cell_size, out=out[:, :, :self.hog_channels])
+        get_cn_extractor().extract(patch, cell_size, out=out[:, :, self.hog_channels:])
+        return out
+
+_hc_extractors = {}
+
+def get_hc_extractor(hog_channels=31):
+    if hog_channels not in _hc_extractors:
+        _hc_extractors[hog_channels] = HCExtractor(hog_channels)
+    return _hc_extractors[hog_channels]
+
+def extract_hc_feature(patch, cell_size=4, hog_channels=31, out=None):
+    return get_hc_extractor(hog_channels).extract(patch, cell_size, out=out)
 
 
 def extract_cn_feature_byw2c(patch, w2c):
@@ -59,7 +207,61 @@ def extract_cn_feature_byw2c(patch, w2c):
     return out
 
 
+def _to_gray(patch):
+    if patch.ndim == 3:
+        return cv2.cvtColor(patch.astype(np.uint8), cv2.COLOR_BGR2GRAY)
+    return patch.astype(np.uint8)
+
+def _integral_cells(features, cell_size):
+    # summed area averaging of GrayFeature/TableFeature, accumulated in float64
+    c = cell_size
+    h, w = features.shape[0] // c, features.shape[1] // c
+    int_image = np.zeros((features.shape[0] + 1, features.shape[1] + 1, features.shape[2]))
+    int_image[1:, 1:] = np.cumsum(np.cumsum(features, 0), 1)
+    cells = (int_image[c:c * h + 1:c, c:c * w + 1:c] - int_image[c:c * h + 1:c, 0:c * w:c] -
+             int_image[0:c * h:c, c:c * w + 1:c] + int_image[0:c * h:c, 0:c * w:c]) / (c * c)
+    return cells.astype(np.float32)
+
+def _area_cells(features, cell_size):
+    c = cell_size
+    h, w = features.shape[0] // c, features.shape[1] // c
+    cells = cv2.resize(features[:h * c, :w * c], (w, h), interpolation=cv2.INTER_AREA)
+    return cells.reshape((h, w, -1))
 
+def extract_gray_feature_area(patch, cell_size=1):
+    gray = (_to_gray(patch).astype(np.float32) / 255 - 0.5)[:, :, np.newaxis]
+    if cell_size > 1:
+        gray = _area_cells(gray, cell_size)
+    return gray
 
+def extract_gray_feature_integral(patch, cell_size=1):
+    gray = _to_gray(patch)[:, :, np.newaxis]
+    if cell_size > 1:
+        return _integral_cells(gray.astype(np.float64) / 255, cell_size) - np.float32(0.5)
+    return gray.astype(np.float32) / 255 - 0.5
 
+def _load_ic(pooling, table_name='intensityChannelNorm6'):
+    table = load_lookup_table(table_name)
+    def extract(patch, cell_size=1):
+        features = np.take(table, _to_gray(patch), axis=0)
+        if cell_size == 1:
+            return features
+        if pooling == 'integral':
+            return _integral_cells(features, cell_size)
+        return _area_cells(features, cell_size)
+    return extract
 
+# registration order is the priority, the first working backend of a kind is its reference,
+# the cython and numba hog backends come first from lib.feature_registry
+# kcf style pca hog, a different 31 channel layout, only used when pinned
+feature_registry.register('hog', 'pyhog', lambda: extract_pyhog_feature, pin_only=True)
+# cn backends also accept out=
+feature_registry.register_kind('cn', tolerance=1e-3)
+feature_registry.register('cn', 'integral', lambda: get_cn_extractor('integral').extract)
+feature_registry.register('cn', 'area', lambda: get_cn_extractor('area').extract)
+feature_registry.register_kind('gray', tolerance=1e-3)
+feature_registry.register('gray', 'area', lambda: extract_gray_feature_area)
+feature_registry.register('gray', 'integral', lambda: extract_gray_feature_integral)
+feature_registry.register_kind('ic', tolerance=1e-3)
+feature_registry.register('ic', 'integral', lambda: _load_ic('integral'))
+feature_registry.register('ic', 'area', lambda: _load_ic('area'))
@@ -2,14 +2,21 @@
 import numpy as np
 import cv2
 from lib.utils import cos_window,gaussian2d_rolled_labels
-from lib.fft_tools import fft2,ifft2
+from lib.fft_tools import fft2,ifft2,rfft2,irfft2
+from lib.kernel_correlation import KernelCorrelation
+from lib.frame_context import frame_context
 from .base import BaseCF
 from .feature import extract_hog_feature,extract_cn_feature
+from .cf_utils import reuse_feature_map
 
 class KCF(BaseCF):
-    def __init__(self, padding=1.5, features='gray', kernel='gaussian'):
+    def __init__(self, padding=1.5, features='gray', kernel='gaussian',use_rfft=False,feature_reuse=None):
         super(KCF).__init__()
         self.padding = padding
+        # None, 'circular' or 'border', train on the detection features shifted to the new position
+        self.feature_reuse=feature_reuse
+        # keep filters and models as rfft half spectra
+        self.use_rfft=use_rfft
         self.lambda_ = 1e-4
         self.features = features
         self.w2c=None
@@ -35,9 +42,9 @@ class KCF(BaseCF):
 
 
     def init(self,first_frame,bbox):
+        ctx=frame_context(first_frame)
+        first_frame=ctx.frame
         assert len(first_frame.shape)==3 and first_frame.shape[2]==3
-        if self.features=='gray':
-            first_frame=cv2.cvtColor(first_frame,cv2.COLOR_BGR2GRAY)
         bbox = np.array(bbox).astype(np.int64)
         x0, y0, w, h = tuple(bbox)
         self.crop_size = (int(np.floor(w * (1 + self.padding))), int(np.floor(h * (1 + self.padding))))# for vis
@@ -47,10 +54,14 @@ class KCF(BaseCF):
         self._window = cos_window(self.window_size)
 
         s=np.sqrt(w*h)*self.output_sigma_factor/self.cell_size
-        self.yf = fft2(gaussian2d_rolled_labels(self.window_size, s))
+        self.yf = self._fft2(gaussian2d_rolled_labels(self.window_size, s))
+        rfft_shape=(self.window_size[1],self.window_size[0]) if self.use_rfft else None
+        self._correlation=KernelCorrelation(self.kernel,self.sigma,rfft_shape=rfft_shape)
+        # like the reference code the first frame is trained with the gaussian kernel whatever the kernel is
+        self._init_correlation=KernelCorrelation('gaussian',self.sigma,rfft_shape=rfft_shape)
 
         if self.features=='gray' or self.features=='color':
-            first_frame = first_frame.astype(np.float32) / 255
+            first_frame = ctx.float32('gray' if self.features=='gray' else 'bgr', 255)
             x=self._crop(first_frame,self._center,(w,h))
             x=x-np.mean(x)
         elif self.features=='hog':
@@ -63,33 +74,24 @@ class KCF(BaseCF):
         else:
             raise NotImplementedError
 
-        self.xf = fft2(self._get_windowed(x, self._window))
+        self.xf = self._fft2(self._get_windowed(x, self._window))
         self.init_response_center = (0,0)
-        self.alphaf = self._training(self.xf,self.yf)
+        self.alphaf = self._training(self.xf,self.yf,self._init_correlation)
+        self._correlation.set_model(self.xf)
 
 
     def update(self,current_frame,vis=False):
+        ctx=frame_context(current_frame)
+        current_frame=ctx.frame
         assert len(current_frame.shape) == 3 and current_frame.shape[2] == 3
-        if self.features == 'gray':
-            current_frame = cv2.cvtColor(current_frame, cv2.COLOR_BGR2GRAY)
         if self.features=='color' or self.features=='gray':
-            current_frame = current_frame.astype(np.float32) / 255
-            z = self._crop(current_frame, self._center, (self.w, self.h))
+            current_frame = ctx.float32('gray' if self.features=='gray' else 'bgr', 255)
+        z=self._patch_features(self._sample(current_frame,self._center))
+        if self.features=='color' or self.features=='gray':
+            z_raw=z
             z=z-np.mean(z)
-
-        elif self.features=='hog':
-            z = self._crop(current_frame, self._center, (self.w, self.h))
-            z = cv2.resize(z, (self.window_size[0] * self.cell_size, self.window_size[1] * self.cell_size))
-            z = extract_hog_feature(z, cell_size=self.cell_size)
-        elif self.features=='cn':
-            z = self._crop(current_frame, self._center, (self.w, self.h))
-            z = cv2.resize(z, (self.window_size[0] * self.cell_size, self.window_size[1] * self.cell_size))
-            z = extract_cn_feature(z, cell_size=self.cell_size)
-        else:
-            raise NotImplementedError
-
-        zf = fft2(self._get_windowed(z, self._window))
-        responses = self._detection(self.alphaf, self.xf, zf, kernel=self.kernel)
+        zf = self._fft2(self._get_windowed(z, self._window))
+        responses = self._detection(self.alphaf, zf)
         if vis is True:
             self.score=responses
             self.score = np.roll(self.score, int(np.floor(self.score.shape[0] / 2)), axis=0)
@@ -105,51 +107,64 @@ class KCF(BaseCF):
             dx=curr[1]-self.window_size[0]
         else:
             dx=curr[1]
+        shift=(dy,dx)
         dy,dx=dy*self.cell_size,dx*self.cell_size
         x_c, y_c = self._center
         x_c+= dx
         y_c+= dy
         self._center = (np.floor(x_c), np.floor(y_c))
 
-        if self.features=='color' or self.features=='gray':
-            new_x = self._crop(current_frame, self._center, (self.w, self.h))
-        elif self.features=='hog':
-            new_x = self._crop(current_frame, self._center, (self.w, self.h))
-            new_x = cv2.resize(new_x, (self.window_size[0] * self.cell_size, self.window_size[1] * self.cell_size))
-            new_x= extract_hog_feature(new_x, cell_size=self.cell_size)
-        elif self.features=='cn':
-            new_x = self._crop(current_frame, self._center, (self.w, self.h))
-            new_x = cv2.resize(new_x, (self.window_size[0] * self.cell_size, self.window_size[1] * self.cell_size))
-            new_x = extract_cn_feature(new_x,cell_size=self.cell_size)
-        else:
-            raise NotImplementedError
-        new_xf = fft2(self._get_windowed(new_x, self._window))
-        self.alphaf = self.interp_factor * self._training(new_xf, self.yf, kernel=self.kernel) + (1 - self.interp_factor) * self.alphaf
+        new_x=None
+        if self.feature_reuse is not None:
+            if self.features=='color' or self.features=='gray':
+                z=z_raw
+            new_x=reuse_feature_map(z,shift,self.feature_reuse,
+                                    sample_fn=lambda:self._sample(current_frame,self._center),
+                                    feature_fn=self._patch_features,cell_size=self.cell_size)
+        if new_x is None:
+            new_x=self._patch_features(self._sample(current_frame,self._center))
+        new_xf = self._fft2(self._get_windowed(new_x, self._window))
+        self.alphaf = self.interp_factor * self._training(new_xf, self.yf) + (1 - self.interp_factor) * self.alphaf
         self.xf = self.interp_factor * new_xf + (1 - self.interp_factor) * self.xf
+        self._correlation.set_model(self.xf)
         return [(self._center[0] - self.w / 2), (self._center[1] - self.h / 2), self.w, self.h]
 
-    def _kernel_correlation(self, xf, yf, kernel='gaussian'):
-        if kernel== 'gaussian':
-            N=xf.shape[0]*xf.shape[1]
-            xx=(np.dot(xf.flatten().conj().T,xf.flatten())/N)
-            yy=(np.dot(yf.flatten().conj().T,yf.flatten())/N)
-            xyf=xf*np.conj(yf)
-            xy=np.sum(np.real(ifft2(xyf)),axis=2)
-            kf = fft2(np.exp(-1 / self.sigma ** 2 * np.clip(xx+yy-2*xy,a_min=0,a_max=None) / np.size(xf)))
-        elif kernel== 'linear':
-            kf= np.sum(xf*np.conj(yf),axis=2)/np.size(xf)
-        else:
-            raise NotImplementedError
-        return kf
+    def _sample(self,img,center):
+        patch=self._crop(img,center,(self.w,self.h))
+        if self.features=='hog' or self.features=='cn':
+            patch=cv2.resize(patch,(self.window_size[0]*self.cell_size,self.window_size[1]*self.cell_size))
+        return patch
 
-    def _training(self, xf, yf, kernel='gaussian'):
-        kf = self._kernel_correlation(xf, xf, kernel)
+    def _patch_features(self,patch):
+        if self.features=='color' or self.features=='gray':
+            return patch
+        elif self.features=='hog':
+            return extract_hog_feature(patch, cell_size=self.cell_size)
+        elif self.features=='cn':
+            return extract_cn_feature(patch, cell_size=self.cell_size)
+        raise NotImplementedError
+
+    def _fft2(self,x):
+        if self.use_rfft is True:
+            return rfft2(x)
+        return fft2(x)
+
+    def _ifft2(self,xf):
+        if self.use_rfft is True:
+            return irfft2(xf,(self.window_size[1],self.window_size[0]))
+        return np.real(ifft2(xf))
+
+    def _training(self, xf, yf, correlation=None):
+        if correlation is None:
+            correlation=self._correlation
+        kf = correlation.auto_correlate(xf)
         alphaf = yf/(kf+self.lambda_)
         return alphaf
 
-    def _detection(self, alphaf, xf, zf, kernel='gaussian'):
-        kzf = self._kernel_correlation(zf, xf, kernel)
-        responses = np.real(ifft2(alphaf * kzf))
+    def _detection(self, alphaf, zf):
+        # against the model xf cached by set_model
+        kzf = self._correlation.detect(zf)
+        responses = self._ifft2(alphaf * kzf)
         return responses
 
     def _crop(self,img,center,target_sz):
@@ -3,9 +3,13 @@ from numpy.matlib import repmat
 import cv2
 from scipy.ndimage import map_coordinates
 from lib.utils import cos_window,gaussian2d_rolled_labels
-from lib.fft_tools import fft2,ifft2
+from lib.fft_tools import fft2,ifft2,rfft2,irfft2
+from lib.kernel_correlation import KernelCorrelation
+from lib.frame_context import as_frame
+from lib.precision import real_dtype
+from lib.colour_hist import bin_ids,histogram,update_model,ColourResponse
 from cftracker.base import BaseCF
-from cftracker.feature import extract_hog_feature,extract_cn_feature,extract_cn_feature_byw2c
+from cftracker.feature import extract_hog_feature,extract_cn_feature,extract_cn_feature_byw2c,extract_hc_feature
 from skimage.feature.peak import peak_local_max
 from lib.utils import APCE
 
@@ -42,7 +46,7 @@ def gaussian2d_rolled_labels_staple(sz, sigma):
     i, j = np.meshgrid(y_range, x_range)
     i_mod_range = mod_one(i, sz[1])
     j_mod_range = mod_one(j, sz[0])
-    labels = np.zeros((sz[1], sz[0]))
+    labels = np.zeros((sz[1], sz[0]), dtype=real_dtype())
     labels[i_mod_range - 1, j_mod_range - 1] = np.exp(-(i ** 2 + j ** 2) / (2 * sigma ** 2))
     return labels
 
@@ -61,7 +65,7 @@ def pad(img,pad):
     h,w=img.shape[:2]
     delta=(int((pad[0]-h)/2),int((pad[1]-w)/2))
     c=img.shape[2]
-    r=np.zeros((pad[0],pad[1],c))
+    r=np.zeros((pad[0],pad[1],c),dtype=real_dtype())
     idy=[delta[0],delta[0]+h]
     idx=[delta[1],delta[1]+w]
     r[idy[0]:idy[1], idx[0]:idx[1], :] = img
@@ -117,30 +121,6 @@ def PSR(response,rate):
     return np.min(r)
 
 
-def get_center_likelihood(likelihood_map, sz):
-    h,w=likelihood_map.shape[:2]
-    n1= h - sz[1] + 1
-    n2= w - sz[0] + 1
-    sat=cv2.integral(likelihood_map)
-    i,j=np.arange(n1),np.arange(n2)
-    i,j=np.meshgrid(i,j)
-    sat1=sat[i,j]
-    sat2=np.roll(sat, -sz[1], axis=0)
-    sat2=np.roll(sat2, -sz[0], axis=1)
-    sat2=sat2[i,j]
-    sat3=np.roll(sat, -sz[1], axis=0)
-    sat3=sat3[i,j]
-    sat4=np.roll(sat, -sz[0], axis=1)
-    sat4=sat4[i,j]
-    center_likelihood=((sat1+sat2-sat3-sat4)/(sz[0] * sz[1])).T
-    def fillzeros(im,sz):
-        res=np.zeros((sz[1],sz[0]))
-        msz=((sz[0]-im.shape[1])//2,(sz[1]-im.shape[0])//2)
-        res[msz[1]:msz[1]+im.shape[0],msz[0]:msz[0]+im.shape[1]]=im
-        return res
-    center_likelihood=fillzeros(center_likelihood,(w,h))
-    return center_likelihood
-
 class LDES(BaseCF):
     def __init__(self,config):
         super(LDES).__init__()
@@ -150,6 +130,8 @@ class LDES(BaseCF):
         self.output_sigma_factor = config.output_sigma_factor
         self.interp_factor = config.interp_factor
         self.cell_size = config.cell_size
+        self.use_fused_hc=config.use_fused_hc
+        self.use_rfft=config.use_rfft
 
         self.min_image_sample_size =config.min_image_sample_size
         self.max_image_sample_size = config.max_image_sample_size
@@ -166,6 +148,9 @@ class LDES(BaseCF):
         # color histogram
         self.inter_patch_rate = config.inter_patch_rate
         self.nbin = config.nbin
+        self._colour_response=ColourResponse()
+        self._center_likelihood=None
+        self._center_shape=None
         self.color_update_rate = config.color_update_rate
         self.merge_factor = config.merge_factor
 
@@ -176,6 +161,7 @@ class LDES(BaseCF):
         self.theta=config.theta
 
     def init(self, first_frame, region):
+        first_frame = as_frame(first_frame)
         #file = h5py.File('../lib/w2crs.mat', 'r')
         #self.w2c = file['w2crs']
         self.use_color_hist=not(np.all(first_frame[:,:,0]==first_frame[:,:,1]))
@@ -209,7 +195,6 @@ class LDES(BaseCF):
         else:
             raise ValueError()
 
-        self.bin_mapping=self.get_bin_mapping(self.nbin)
 
         self.window_sz=(int(np.floor(target_sz[0] * (1 + self.padding))), int(np.floor(target_sz[1] * (1 + self.padding))))
         search_area= self.window_sz[0] * self.window_sz[1]
@@ -239,8 +224,10 @@ class LDES(BaseCF):
         self.y=gaussian2d_rolled_labels_staple((int(np.round(self.window_sz0[0]/self.cell_size)),
                                          int(np.round(self.window_sz0[1]/self.cell_size))),
                                         self.output_sigma)
-        self.yf=fft2(self.y)
+        self.yf=self._fft2(self.y)
         self.cos_window=cos_window((self.y.shape[1],self.y.shape[0]))
+        self._correlation=KernelCorrelation(self.kernel_type,self.sigma,
+                                            rfft_shape=self.cos_window.shape if self.use_rfft else None)
         self.cos_window_search=cos_window((int(np.floor(self.window_sz_search0[0]/cell_size_search)),
                                            int(np.floor(self.window_sz_search0[1]/cell_size_search))))
         # scale setttings
@@ -264,6 +251,7 @@ class LDES(BaseCF):
 
 
     def update(self,current_frame,vis=False):
+        current_frame=as_frame(current_frame)
         self.vis=vis
         pos,tmp_sc,tmp_rot,cscore,sscore=self.tracking(current_frame,self._center,0)
         if self.is_BGD:
@@ -347,9 +335,9 @@ class LDES(BaseCF):
             patch=cv2.resize(patchO,self.window_sz0,interpolation=cv2.INTER_CUBIC)
         x=self.get_features(patch,self.cell_size)
         x=x*self.cos_window[:,:,None]
-        xf=fft2(x)
+        xf=self._fft2(x)
         #kf=np.sum(xf*np.conj(xf),axis=2)/xf.size
-        kf=self._kernel_correlation(xf,xf,self.kernel_type)
+        kf=self._correlation.auto_correlate(xf)
         alphaf=self.yf/(kf+self.lambda_)
 
         if self.is_rotation:
@@ -392,8 +380,8 @@ class LDES(BaseCF):
             self.model_xf=(1-self.interp_factor)*self.model_xf+self.interp_factor*xf
             self.model_patchLp= (1 - interp_factor_scale) * self.model_patchLp + interp_factor_scale * patchLp
             if self.use_color_hist:
-                self.pi=(1-self.color_update_rate)*self.pi+self.color_update_rate*pi
-                self.pl=(1-self.color_update_rate)*self.pl+self.color_update_rate*pl
+                self.pi=update_model(self.pi,pi,self.color_update_rate)
+                self.pl=update_model(self.pl,pl,self.color_update_rate)
 
 
     def tracking(self,img,pos,polish):
@@ -422,31 +410,32 @@ class LDES(BaseCF):
 
         z=self.get_features(patch,self.cell_size)
         z=z*c_w[:,:,None]
-        zf=fft2(z)
-        ssz=(zf.shape[1],zf.shape[0],zf.shape[2])
+        zf=self._fft2(z)
+        ssz=(z.shape[1],z.shape[0],z.shape[2])
         # calculate response of the classifier at all shifts
-        wf=np.conj(self.model_xf)*self.model_alphaf[:,:,None]/np.size(self.model_xf)
+        wf=np.conj(self.model_xf)*self.model_alphaf[:,:,None]/(self.cos_window.size*self.model_xf.shape[2])
         if polish<=large_num:
-            w=pad(np.real(ifft2(wf)),(ssz[1],ssz[0]))
-            wf=fft2(w)
+            w=pad(self._ifft2(wf,self.cos_window.shape),(ssz[1],ssz[0]))
+            wf=self._fft2(w)
 
         tmp_sz=ssz
         # compute convolution for each feature block in the Fourier domain
         # use general compute here for easy extension in future
 
         rff=np.sum(wf*zf,axis=2)
-        rff_real=cv2.resize(rff.real,(tmp_sz[0],tmp_sz[1]),cv2.INTER_NEAREST)
-        rff_imag=cv2.resize(rff.imag,(tmp_sz[0],tmp_sz[1]),cv2.INTER_NEAREST)
+        rff_sz=(tmp_sz[0]//2+1 if self.use_rfft is True else tmp_sz[0],tmp_sz[1])
+        rff_real=cv2.resize(rff.real,rff_sz,cv2.INTER_NEAREST)
+        rff_imag=cv2.resize(rff.imag,rff_sz,cv2.INTER_NEAREST)
         rff=rff_real+1.j*rff_imag
-        response_cf=np.real(ifft2(rff))
+        response_cf=self._ifft2(rff,(tmp_sz[1],tmp_sz[0]))
         #response_cf=np.fft.fftshift(response_cf,axes=(0,1))
         response_cf=crop_filter_response(response_cf,(response_cf.shape[1],response_cf.shape[0]))
 
         response_color=np.zeros_like(response_cf)
 
         if self.use_color_hist:
-            object_likelihood=self.get_colour_map(patch,self.pl,self.pi,self.bin_mapping)
-            response_color=get_center_likelihood(object_likelihood,self.target_sz0)
+            object_likelihood=self.get_colour_map(patch,self.pl,self.pi,self.nbin)
+            response_color=self.get_center_likelihood(object_likelihood,self.target_sz0)
             response_color=cv2.resize(response_color,(response_cf.shape[1],response_cf.shape[0]),cv2.INTER_CUBIC)
 
         # adaptive merge factor
@@ -506,12 +495,12 @@ class LDES(BaseCF):
 
     def estimate_scale(self,model,obser,mag):
         def phase_correlation(src1,src2):
-            s1f=fft2(src1)
-            s2f=fft2(src2)
+            s1f=self._fft2(src1)
+            s2f=self._fft2(src2)
             num=s2f*np.conj(s1f)
             d=np.sqrt(num*np.conj(num))+2e-16
             Cf=np.sum(num/d,axis=2)
-            C=np.real(ifft2(Cf))
+            C=self._ifft2(Cf,src1.shape[:2])
             C=np.fft.fftshift(C,axes=(0,1))
             #mscore=np.max(C)
             mscore=PSR(C,0.1)
@@ -535,7 +524,20 @@ class LDES(BaseCF):
         scale = np.exp(ptx/mag)
         return scale,rotate,mscore
 
+    def _fft2(self,x):
+        if self.use_rfft is True:
+            return rfft2(x)
+        return fft2(x)
+
+    def _ifft2(self,xf,shape):
+        # shape is the (h,w) of the real map, the filter and search windows differ in size
+        if self.use_rfft is True:
+            return irfft2(xf,shape)
+        return np.real(ifft2(xf))
+
     def get_features(self,img,cell_size):
+        if self.use_fused_hc is True:
+            return extract_hc_feature(img.astype(np.uint8),cell_size)
         hog_feature=extract_hog_feature(img.astype(np.uint8),cell_size)
         #resized_img=cv2.resize(img,(hog_feature.shape[1],hog_feature.shape[0]),cv2.INTER_CUBIC).astype(np.uint8)
         #cn_feature=extract_cn_feature(resized_img,1)
@@ -543,23 +545,26 @@ class LDES(BaseCF):
         return np.concatenate((hog_feature,cn_feature),axis=2)
 
     def get_color_space_hist(self,patch,n_bins):
-        histogram=cv2.calcHist([patch.astype(np.uint8)],[0,1,2],None,[n_bins,n_bins,n_bins],[0,256,0,256,0,256])
-        return histogram
-
-    def get_colour_map(self,patch,bg_hist,fg_hist,bin_mapping):
-        frame_bin = cv2.LUT(patch.astype(np.uint8), bin_mapping).astype(np.int64)
-        P_fg = fg_hist[frame_bin[:, :, 0], frame_bin[:, :, 1], frame_bin[:, :, 2]]
-        P_bg=bg_hist[frame_bin[:,:,0],frame_bin[:,:,1],frame_bin[:,:,2]]
-        not_na=np.where(P_bg!=0)
-        P_O=0.5*np.ones_like(P_fg)
-        P_O[not_na]=P_fg[not_na]/P_bg[not_na]
-        return P_O
-
-    def get_bin_mapping(self,num_bins):
-        bin_mapping = np.zeros((256,))
-        for i in range(bin_mapping.shape[0]):
-            bin_mapping[i] = (np.floor(i / (256 / num_bins)))
-        return bin_mapping.astype(np.int)
+        return histogram(bin_ids(patch,n_bins),n_bins)
+
+    def get_colour_map(self,patch,bg_hist,fg_hist,n_bins):
+        # the ratio is taken per bin and then back-projected
+        not_na=np.where(bg_hist!=0)
+        ratio=0.5*np.ones_like(fg_hist)
+        ratio[not_na]=fg_hist[not_na]/bg_hist[not_na]
+        return self._colour_response.likelihood(ratio,patch)
+
+    def get_center_likelihood(self,likelihood_map,sz):
+        # window means of the colour map centred in a zero map of its size, valid until the next call
+        h,w=likelihood_map.shape[:2]
+        center=self._colour_response.window_mean(likelihood_map,sz)
+        n1,n2=center.shape
+        if self._center_likelihood is None or self._center_likelihood.shape!=(h,w) or self._center_shape!=(n1,n2):
+            self._center_likelihood=np.zeros((h,w),dtype=real_dtype())
+            self._center_shape=(n1,n2)
+        y,x=(h-n1)//2,(w-n2)//2
+        self._center_likelihood[y:y+n1,x:x+n2]=center
+        return self._center_likelihood
 
 
     def get_affine_subwindow(self,img, pos,sc, rot, window_sz):
@@ -588,7 +593,7 @@ class LDES(BaseCF):
             tmp3[:, 1] = np.clip(tmp3[:, 1], a_min=None,a_max=imsz[0])
             pos=np.reshape(tmp3,(h,w,2))
             c=img.shape[2]
-            wimg=np.zeros((sz[1],sz[0],c))
+            wimg=np.zeros((sz[1],sz[0],c),dtype=real_dtype())
             pos=pos-1
             for i in range(c):
                 wimg[:,:,i]=interp2(img[:,:,i],pos[:,:,1],pos[:,:,0])
@@ -599,18 +604,3 @@ class LDES(BaseCF):
         #cv2.imshow('affine_window',out.astype(np.uint8))
         #cv2.waitKey(1)
         return out
-
-
-    def _kernel_correlation(self, xf, yf, kernel='gaussian'):
-        if kernel== 'gaussian':
-            N=xf.shape[0]*xf.shape[1]
-            xx=(np.dot(xf.flatten().conj().T,xf.flatten())/N)
-            yy=(np.dot(yf.flatten().conj().T,yf.flatten())/N)
-            xyf=xf*np.conj(yf)
-            xy=np.sum(np.real(ifft2(xyf)),axis=2)
-            kf = fft2(np.exp(-1 / self.sigma ** 2 * np.clip(xx+yy-2*xy,a_min=0,a_max=None) / np.size(xf)))
-        elif kernel== 'linear':
-            kf= np.sum(xf*np.conj(yf),axis=2)/np.size(xf)
-        else:
-            raise NotImplementedError
-        return kf
\ No newline at end of file
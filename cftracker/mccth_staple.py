@@ -15,7 +15,11 @@ import cv2
 from .base import BaseCF
 from .feature import extract_hog_feature, extract_cn_feature
 from lib.utils import cos_window
+from lib.precision import as_real, real_dtype
+from lib.colour_hist import bin_ids, histogram, foreground_posterior, update_model, ColourResponse
 from lib.fft_tools import fft2, ifft2
+from lib.frame_context import frame_context, as_frame
+from lib.ring_buffer import RingBuffer
 from .scale_estimator import LPScaleEstimator
 
 
@@ -46,7 +50,7 @@ def gaussian2d_rolled_labels_staple(sz, sigma):
     i, j = np.meshgrid(y_range, x_range)
     i_mod_range = mod_one(i, sz[1])
     j_mod_range = mod_one(j, sz[0])
-    labels = np.zeros((sz[1], sz[0]))
+    labels = np.zeros((sz[1], sz[0]), dtype=real_dtype())
     labels[i_mod_range - 1, j_mod_range - 1] = np.exp(-(i ** 2 + j ** 2) / (2 * sigma ** 2))
     return labels
 
@@ -61,38 +65,29 @@ def crop_filter_response(response_cf, response_sz):
     return new_responses.T
 
 
-def get_center_likelihood(likelihood_map, m):
-    h, w = likelihood_map.shape[:2]
-    n1 = h - m[1] + 1
-    n2 = w - m[0] + 1
-    sat = cv2.integral(likelihood_map)
-    i, j = np.arange(n1), np.arange(n2)
-    i, j = np.meshgrid(i, j)
-    sat1 = sat[i, j]
-    sat2 = np.roll(sat, -m[1], axis=0)
-    sat2 = np.roll(sat2, -m[0], axis=1)
-    sat2 = sat2[i, j]
-    sat3 = np.roll(sat, -m[1], axis=0)
-    sat3 = sat3[i, j]
-    sat4 = np.roll(sat, -m[0], axis=1)
-    sat4 = sat4[i, j]
-    center_likelihood = (sat1 + sat2 - sat3 - sat4) / (m[0] * m[1])
-    return center_likelihood.T
+# feature groups (cn, hog1, hog2) of every expert, in the channel order of get_expert_spectra
+EXPERT_GROUPS = ((0,), (1,), (2,), (1, 0), (2, 0), (1, 2), (0, 1, 2))
+
+
+def new_history(history_size, item_shape=()):
+    # a list of every frame, or a ring buffer of the latest history_size frames
+    if history_size is None:
+        return []
+    return RingBuffer(history_size, item_shape)
 
 
 class Expert:
-    def  __init__(self):
-        self.xt = None
+    def  __init__(self, history_size=None):
         self.hf_den = None
         self.hf_num = None
         self.response = None
         self.pos = None
-        self.rect_positions = []
-        self.centers = []
-        self.smoothes = []
+        self.rect_positions = new_history(history_size, (4,))
+        self.centers = new_history(history_size, (2,))
+        self.smoothes = new_history(history_size)
         self.smooth_score = None
-        self.smooth_scores = []
-        self.rob_scores = []
+        self.smooth_scores = new_history(history_size)
+        self.rob_scores = new_history(history_size)
 
 
 class MCCTHStaple(BaseCF):
@@ -101,6 +96,7 @@ class MCCTHStaple(BaseCF):
         self.cell_size = config.hog_cell_size
         self.fixed_area = config.fixed_area
         self.n_bins = config.n_bins
+        self._colour_response = ColourResponse()
         self.learning_rate_pwp = config.interp_factor_pwp
         self.inner_padding = config.inner_padding
         self.output_sigma_factor = config.output_sigma_factor
@@ -116,24 +112,36 @@ class MCCTHStaple(BaseCF):
         self.period = config.period
         self.update_thresh = config.update_thresh
         self.expert_num = config.expert_num
+        self.expert_model = config.expert_model
+        if self.expert_model not in (None, 'groups'):
+            raise ValueError('unknown expert model ' + str(self.expert_model))
+        self.group_num = None
+        self.group_den = None
+        self.history_size = config.history_size
+        if self.history_size is not None and self.history_size < max(self.period, 2):
+            raise ValueError('history size must cover the period of ' + str(self.period) + ' frames')
 
         self.scale_config = config.scale_config
 
         weight_num = np.arange(self.period)
         self.weight = 1.1 ** weight_num
-        self.mean_score = [0]
-        self.psr_score = [0]
+        self.mean_score = new_history(self.history_size)
+        self.mean_score.append(0)
+        self.psr_score = new_history(self.history_size)
+        self.psr_score.append(0)
+        # sum of mean_score*psr_score since the first full period, ave_score without the whole history
+        self._score_sum = 0.
         self.id_ensemble = []
         self.frame_idx = -1
         self.experts = []
         for i in range(7):
-            self.experts.append(Expert())
+            self.experts.append(Expert(self.history_size))
             self.id_ensemble.append(1)
 
     def init(self, first_frame, bbox):
 
         self.frame_idx += 1
-        first_frame = first_frame.astype(np.float32)
+        first_frame = frame_context(first_frame).float32()
         bbox = np.array(bbox).astype(np.int64)
         x, y, w, h = tuple(bbox)
         self._center = (x + w / 2, y + h / 2)
@@ -141,7 +149,6 @@ class MCCTHStaple(BaseCF):
         self.crop_size = (int(w * (1 + self.padding)), int(h * (1 + self.padding)))
         self.target_sz = (self.w, self.h)
 
-        self.bin_mapping = self.get_bin_mapping(self.n_bins)
         avg_dim = (w + h) / 2
         self.bg_area = (round(w + avg_dim), round(h + avg_dim))
         self.fg_area = (int(round(w - avg_dim * self.inner_padding)), int(round(h - avg_dim * self.inner_padding)))
@@ -193,20 +200,15 @@ class MCCTHStaple(BaseCF):
         im_patch_bg = self.get_sub_window(first_frame, self._center, self.norm_bg_area, self.bg_area)
         xt = self.get_feature_map(im_patch_bg, self.cell_size)
         xt = self._window[:, :, None] * xt
-        xt_cn, xt_hog1, xt_hog2 = self.split_features(xt)
-        self.experts[0].xt = xt_cn
-        self.experts[1].xt = xt_hog1
-        self.experts[2].xt = xt_hog2
-        self.experts[3].xt = np.concatenate((xt_hog1, xt_cn), axis=2)
-        self.experts[4].xt = np.concatenate((xt_hog2, xt_cn), axis=2)
-        self.experts[5].xt = np.concatenate((xt_hog1, xt_hog2), axis=2)
-        self.experts[6].xt = xt
-
-        for i in range(self.expert_num):
-            xtf = fft2(self.experts[i].xt)
-            self.experts[i].hf_den = np.conj(xtf) * xtf / (self.cf_response_size[0] * self.cf_response_size[1])
-            self.experts[i].hf_num = np.conj(self.yf)[:, :, None] * xtf / (
-                        self.cf_response_size[0] * self.cf_response_size[1])
+        if self.expert_model == 'groups':
+            self.learn_groups(fft2(xt))
+        else:
+            xtfs = self.get_expert_spectra(xt)
+            for i in range(self.expert_num):
+                xtf = xtfs[i]
+                self.experts[i].hf_den = np.conj(xtf) * xtf / (self.cf_response_size[0] * self.cf_response_size[1])
+                self.experts[i].hf_num = np.conj(self.yf)[:, :, None] * xtf / (
+                            self.cf_response_size[0] * self.cf_response_size[1])
 
 
         self.rect_position_padded = None
@@ -221,33 +223,32 @@ class MCCTHStaple(BaseCF):
             self.experts[i].centers.append([self._center[0], self._center[1]])
 
     def update(self, current_frame, vis=False):
+        current_frame = as_frame(current_frame)
         self.frame_idx += 1
         im_patch_cf = self.get_sub_window(current_frame, self._center, self.norm_bg_area, self.bg_area)
         pwp_search_area = (round(self.norm_pwp_search_area[0] / self.area_resize_factor),
                            round(self.norm_pwp_search_area[1] / self.area_resize_factor))
         im_patch_pwp = self.get_sub_window(current_frame, self._center, self.norm_pwp_search_area, pwp_search_area)
-        likelihood_map = self.get_colour_map(im_patch_pwp, self.bg_hist, self.fg_hist, self.bin_mapping)
-        likelihood_map[np.isnan(likelihood_map)] = 0.
+        likelihood_map = self.get_colour_map(im_patch_pwp, self.bg_hist, self.fg_hist, self.n_bins)
         self.norm_target_sz = (int(self.norm_target_sz[0]), int(self.norm_target_sz[1]))
-        response_pwp = get_center_likelihood(likelihood_map, self.norm_target_sz)
+        response_pwp = self._colour_response.window_mean(likelihood_map, self.norm_target_sz)
 
         xt = self.get_feature_map(im_patch_cf, self.cell_size)
         xt = self._window[:, :, None] * xt
-        xt_cn, xt_hog1, xt_hog2 = self.split_features(xt)
-        self.experts[0].xt = xt_cn
-        self.experts[1].xt = xt_hog1
-        self.experts[2].xt = xt_hog2
-        self.experts[3].xt = np.concatenate((xt_hog1, xt_cn), axis=2)
-        self.experts[4].xt = np.concatenate((xt_hog2, xt_cn), axis=2)
-        self.experts[5].xt = np.concatenate((xt_hog1, xt_hog2), axis=2)
-        self.experts[6].xt = xt
+        if self.expert_model == 'groups':
+            responses_cf = self.get_expert_responses(fft2(xt))
+        else:
+            xtfs = self.get_expert_spectra(xt)
 
         center = ((self.norm_delta_area[0] - 1) / 2, (self.norm_delta_area[1] - 1) / 2)
 
         for i in range(self.expert_num):
-            xtf = fft2(self.experts[i].xt)
-            hf = self.experts[i].hf_num / (np.sum(self.experts[i].hf_den, axis=2) + self.lambda_)[:, :, None]
-            response_cf = np.real(ifft2(np.sum(np.conj(hf) * xtf, axis=2)))
+            if self.expert_model == 'groups':
+                response_cf = responses_cf[:, :, i]
+            else:
+                xtf = xtfs[i]
+                hf = self.experts[i].hf_num / (np.sum(self.experts[i].hf_den, axis=2) + self.lambda_)[:, :, None]
+                response_cf = np.real(ifft2(np.sum(np.conj(hf) * xtf, axis=2)))
             response_sz = (self.floor_odd(self.norm_delta_area[0] / self.cell_size),
                            self.floor_odd(self.norm_delta_area[1] / self.cell_size))
             response_cf = cv2.resize(crop_filter_response(response_cf, response_sz), self.norm_delta_area,
@@ -264,7 +265,7 @@ class MCCTHStaple(BaseCF):
             self.experts[i].rect_positions.append([cx - w / 2, cy - h / 2, w, h])
             self.experts[i].centers.append([cx, cy])
 
-            pre_center = self.experts[i].centers[self.frame_idx - 1]
+            pre_center = self.experts[i].centers[-2]
             smooth = np.sqrt((cx - pre_center[0]) ** 2 + (cy - pre_center[1]) ** 2)
             self.experts[i].smoothes.append(smooth)
             self.experts[i].smooth_scores.append(np.exp(-smooth ** 2 / (2 * self.avg_dim ** 2)))
@@ -274,7 +275,7 @@ class MCCTHStaple(BaseCF):
                 self.experts[i].rob_scores.append(self.robustness_eva(self.experts, i, self.frame_idx,
                                                                       self.period, self.weight, self.expert_num))
 
-                self.id_ensemble[i] = self.experts[i].rob_scores[self.frame_idx]
+                self.id_ensemble[i] = self.experts[i].rob_scores[-1]
             self.mean_score.append(np.sum(np.array(self.id_ensemble)) / self.expert_num)
             idx = np.argmax(np.array(self.id_ensemble))
             self._center = self.experts[idx].pos
@@ -296,10 +297,14 @@ class MCCTHStaple(BaseCF):
         self.psr_score.append((score1 + score2 + score3) / 3)
 
         if self.frame_idx >= self.period - 1:
-            final_score = self.mean_score[self.frame_idx] * self.psr_score[self.frame_idx]
-            ave_score = np.sum(np.array(self.mean_score)[self.period-1:self.frame_idx + 1] *
-                               np.array(self.psr_score[self.period-1:self.frame_idx + 1])) / (
-                                    self.frame_idx + 1 - self.period+1)
+            final_score = self.mean_score[-1] * self.psr_score[-1]
+            if self.history_size is None:
+                ave_score = np.sum(np.array(self.mean_score)[self.period-1:self.frame_idx + 1] *
+                                   np.array(self.psr_score[self.period-1:self.frame_idx + 1])) / (
+                                        self.frame_idx + 1 - self.period+1)
+            else:
+                self._score_sum += final_score
+                ave_score = self._score_sum / (self.frame_idx + 1 - self.period + 1)
             threshold = self.update_thresh * ave_score
             if final_score > threshold:
                 self.learning_rate_pwp = self.config.interp_factor_pwp
@@ -326,21 +331,18 @@ class MCCTHStaple(BaseCF):
         im_patch_bg = self.get_sub_window(current_frame, self._center, self.norm_bg_area, self.bg_area)
         xt = self.get_feature_map(im_patch_bg, self.cell_size)
         xt = self._window[:, :, None] * xt
-        xt_cn, xt_hog1, xt_hog2 = self.split_features(xt)
-        self.experts[0].xt = xt_cn
-        self.experts[1].xt = xt_hog1
-        self.experts[2].xt = xt_hog2
-        self.experts[3].xt = np.concatenate((xt_hog1, xt_cn), axis=2)
-        self.experts[4].xt = np.concatenate((xt_hog2, xt_cn), axis=2)
-        self.experts[5].xt = np.concatenate((xt_hog1, xt_hog2), axis=2)
-        self.experts[6].xt = xt
-
-        for i in range(self.expert_num):
-            xtf = fft2(self.experts[i].xt)
-            hf_den = np.conj(xtf) * xtf / (self.cf_response_size[0] * self.cf_response_size[1])
-            hf_num = np.conj(self.yf)[:, :, None] * xtf / (self.cf_response_size[0] * self.cf_response_size[1])
-            self.experts[i].hf_den = (1 - self.learning_rate_cf) * self.experts[i].hf_den + self.learning_rate_cf * hf_den
-            self.experts[i].hf_num = (1 - self.learning_rate_cf) * self.experts[i].hf_num + self.learning_rate_cf * hf_num
+        if self.expert_model == 'groups':
+            self.learn_groups(fft2(xt), self.learning_rate_cf)
+        else:
+            xtfs = self.get_expert_spectra(xt)
+            for i in range(self.expert_num):
+                xtf = xtfs[i]
+                hf_den = np.conj(xtf) * xtf / (self.cf_response_size[0] * self.cf_response_size[1])
+                hf_num = np.conj(self.yf)[:, :, None] * xtf / (self.cf_response_size[0] * self.cf_response_size[1])
+                self.experts[i].hf_den = (1 - self.learning_rate_cf) * self.experts[i].hf_den + \
+                                         self.learning_rate_cf * hf_den
+                self.experts[i].hf_num = (1 - self.learning_rate_cf) * self.experts[i].hf_num + \
+                                         self.learning_rate_cf * hf_num
         if self.learning_rate_pwp != 0:
             im_patch_bg = self.get_sub_window(current_frame, self._center, self.norm_bg_area, self.bg_area)
             self.bg_hist, self.fg_hist = self.update_hist_model(self.new_pwp_model,
@@ -359,7 +361,7 @@ class MCCTHStaple(BaseCF):
         cn_feature = extract_cn_feature(im_patch, cell_size)
         if cell_size > 1:
             im_patch = self.mex_resize(im_patch, (self._window.shape[1], self._window.shape[0])).astype(np.uint8)
-        gray = cv2.cvtColor(im_patch, cv2.COLOR_BGR2GRAY)[:, :, np.newaxis] / 255 - 0.5
+        gray = as_real(cv2.cvtColor(im_patch, cv2.COLOR_BGR2GRAY))[:, :, np.newaxis] / 255 - 0.5
         features = np.concatenate((cn_feature, gray, hog_feature), axis=2)
         return features
 
@@ -367,27 +369,65 @@ class MCCTHStaple(BaseCF):
         cn_feature, hog_feature1, hog_feature2 = features[:, :, :11], features[:, :, 11:27], features[:, :, 27:]
         return cn_feature, hog_feature1, hog_feature2
 
+    def get_expert_spectra(self, xt):
+        # the full map is transformed once, every expert takes its channel groups from that spectrum
+        xtf = fft2(xt)
+        xtf_cn, xtf_hog1, xtf_hog2 = self.split_features(xtf)
+        return [xtf_cn, xtf_hog1, xtf_hog2, np.concatenate((xtf_hog1, xtf_cn), axis=2),
+                np.concatenate((xtf_hog2, xtf_cn), axis=2), np.concatenate((xtf_hog1, xtf_hog2), axis=2), xtf]
+
+    def learn_groups(self, xtf, learning_rate=None):
+        """
+        filter numerator of every channel and denominator summed over the channels of each feature group, learnt once
+        and shared by all the experts instead of one copy per expert, learning_rate None starts a new model
+        """
+        n = self.cf_response_size[0] * self.cf_response_size[1]
+        group_num, group_den = [], []
+        for xtf_g in self.split_features(xtf):
+            group_num.append(np.conj(self.yf)[:, :, None] * xtf_g / n)
+            group_den.append(np.sum(np.conj(xtf_g) * xtf_g, axis=2) / n)
+        if learning_rate is None:
+            self.group_num, self.group_den = group_num, group_den
+            return
+        for g in range(len(group_num)):
+            self.group_num[g] = (1 - learning_rate) * self.group_num[g] + learning_rate * group_num[g]
+            self.group_den[g] = (1 - learning_rate) * self.group_den[g] + learning_rate * group_den[g]
+
+    def get_expert_responses(self, xtf):
+        """
+        h*w*expert_num filter responses, the correlation is linear in the channels so the cross spectrum of each group
+        is taken once, every expert adds those of its groups and divides by the sum of their denominators,
+        the division differs per expert so the responses come from one inverse transform of the stacked spectra
+        """
+        cross = [np.sum(np.conj(num) * xtf_g, axis=2) for num, xtf_g in zip(self.group_num, self.split_features(xtf))]
+        responsef = np.empty(xtf.shape[:2] + (self.expert_num,), dtype=xtf.dtype)
+        for i, groups in enumerate(EXPERT_GROUPS[:self.expert_num]):
+            responsef[:, :, i] = sum(cross[g] for g in groups) / (sum(self.group_den[g] for g in groups) + self.lambda_)
+        return np.real(ifft2(responsef))
+
     def update_hist_model(self, new_model, patch, bg_area, fg_area, target_sz, norm_area,
                           n_bins):
         pad_offset1 = ((bg_area[0] - target_sz[0]) / 2, (bg_area[1] - target_sz[1]) / 2)
         assert pad_offset1[0] == round(pad_offset1[0]) and pad_offset1[1] == round(pad_offset1[1])
-        bg_mask = np.ones((int(bg_area[1]), int(bg_area[0])))
+        bg_mask = np.ones((int(bg_area[1]), int(bg_area[0])), dtype=real_dtype())
         pad_offset1 = (int(max(1, pad_offset1[0])), int(max(1, pad_offset1[1])))
         bg_mask[pad_offset1[1]:-pad_offset1[1], pad_offset1[0]:-pad_offset1[0]] = 0.
 
         pad_offset2 = ((bg_area[0] - fg_area[0]) / 2, (bg_area[1] - fg_area[1]) / 2)
         assert pad_offset2[0] == round(pad_offset2[0]) and pad_offset2[1] == round(pad_offset2[1])
-        fg_mask = np.zeros((int(bg_area[1]), int(bg_area[0])))
+        fg_mask = np.zeros((int(bg_area[1]), int(bg_area[0])), dtype=real_dtype())
         pad_offset2 = (int(max(1, pad_offset2[0])), int(max(1, pad_offset2[1])))
         fg_mask[pad_offset2[1]:-pad_offset2[1], pad_offset2[0]:-pad_offset2[0]] = 1.
         fg_mask = self.mex_resize(fg_mask, norm_area)
         bg_mask = self.mex_resize(bg_mask, norm_area)
-        bg_hist_new = self.compute_histogram(patch, bg_mask, n_bins)
-        fg_hist_new = self.compute_histogram(patch, fg_mask, n_bins)
+        # one bin id map for both masks
+        ids = bin_ids(patch, n_bins)
+        bg_hist_new = self.compute_histogram(ids, bg_mask, n_bins)
+        fg_hist_new = self.compute_histogram(ids, fg_mask, n_bins)
 
         if new_model is not True:
-            bg_hist_new = (1 - self.learning_rate_pwp) * self.bg_hist + self.learning_rate_pwp * bg_hist_new
-            fg_hist_new = (1 - self.learning_rate_pwp) * self.fg_hist + self.learning_rate_pwp * fg_hist_new
+            bg_hist_new = update_model(self.bg_hist, bg_hist_new, self.learning_rate_pwp)
+            fg_hist_new = update_model(self.fg_hist, fg_hist_new, self.learning_rate_pwp)
         return bg_hist_new, fg_hist_new
 
     def get_sub_window(self, img, center, model_sz, scaled_sz=None):
@@ -417,26 +457,14 @@ class MCCTHStaple(BaseCF):
         img = cv2.resize(img, sz, interpolation=interpolation)
         return img
 
-    def compute_histogram(self, patch, mask, n_bins):
-        h, w, d = patch.shape
-        assert h == mask.shape[0] and w == mask.shape[1]
+    def compute_histogram(self, ids, mask, n_bins):
+        assert ids.shape == mask.shape
         mask = mask.astype(np.uint8)
-        histogram = cv2.calcHist([patch], [0, 1, 2], mask, [n_bins, n_bins, n_bins],
-                                 [0, 256, 0, 256, 0, 256]) / np.count_nonzero(mask)
-        return histogram
-
-    def get_colour_map(self, patch, bg_hist, fg_hist, bin_mapping):
-        frame_bin = cv2.LUT(patch, bin_mapping).astype(np.int64)
-        P_fg = fg_hist[frame_bin[:, :, 0], frame_bin[:, :, 1], frame_bin[:, :, 2]]
-        P_bg = bg_hist[frame_bin[:, :, 0], frame_bin[:, :, 1], frame_bin[:, :, 2]]
-        P_O = P_fg / (P_fg + P_bg)
-        return P_O
-
-    def get_bin_mapping(self, num_bins):
-        bin_mapping = np.zeros((256,))
-        for i in range(bin_mapping.shape[0]):
-            bin_mapping[i] = (np.floor(i / (256 / num_bins)))
-        return bin_mapping.astype(np.uint8)
+        return histogram(ids, n_bins, mask=mask) / np.count_nonzero(mask)
+
+    def get_colour_map(self, patch, bg_hist, fg_hist, n_bins):
+        # foreground posterior at every pixel, 0 where both histograms are empty, valid until the next call
+        return self._colour_response.likelihood(foreground_posterior(fg_hist, bg_hist), patch)
 
     def cal_psr(self, response):
         cf_max = np.max(response)
@@ -447,8 +475,9 @@ class MCCTHStaple(BaseCF):
     def robustness_eva(self, experts, num, frame_idx, period, weight, expert_num):
         overlap_score = np.zeros((period, expert_num))
         for i in range(expert_num):
-            bboxes1 = np.array(experts[i].rect_positions)[frame_idx - period + 1:frame_idx + 1]
-            bboxes2 = np.array(experts[num].rect_positions)[frame_idx - period + 1:frame_idx + 1]
+            # the histories hold frames 0..frame_idx, or their latest frames
+            bboxes1 = np.asarray(experts[i].rect_positions[-period:])
+            bboxes2 = np.asarray(experts[num].rect_positions[-period:])
             overlaps = cal_ious(bboxes1, bboxes2)
             overlap_score[:, i] = np.exp(-(1 - overlaps) ** 2 / 2)
         avg_overlap = np.sum(overlap_score, axis=1) / expert_num
@@ -458,7 +487,7 @@ class MCCTHStaple(BaseCF):
         weight_avg_overlap = norm_factor * (weight.dot(avg_overlap))
         weight_var_overlap = norm_factor * (weight.dot(var_overlap))
         pair_score = weight_avg_overlap / (weight_var_overlap + 0.008)
-        smooth_score = experts[num].smooth_scores[frame_idx - period + 1:frame_idx + 1]
+        smooth_score = experts[num].smooth_scores[-period:]
         self_score = norm_factor * np.sum(np.array(smooth_score) * weight)
         eta = 0.1
         reliability = eta * pair_score + (1 - eta) * self_score
@@ -11,9 +11,12 @@ Python re-implementation of "High-speed Tracking with Multi-kernel Correlation F
 import numpy as np
 import cv2
 from lib.utils import cos_window,gaussian2d_rolled_labels
-from lib.fft_tools import fft2,ifft2
+from lib.fft_tools import fft2,ifft2,rfft2,irfft2,full_spectrum
+from lib.kernel_correlation import KernelCorrelation
+from lib.subspace import IncrementalSubspace
+from lib.frame_context import as_frame
 from .base import BaseCF
-from .feature import extract_hog_feature,extract_cn_feature
+from .feature import extract_hog_feature,extract_cn_feature,extract_hc_feature
 from cftracker.scale_estimator import DSSTScaleEstimator,LPScaleEstimator
 
 
@@ -27,8 +30,15 @@ class MKCFup(BaseCF):
         self.lr_hog_gray = config.lr_hog_gray
         self.num_compressed_dim_cn=config.num_compressed_dim_cn
         self.num_compressed_dim_hog=config.num_compressed_dim_hog
+        # None recomputes the pca bases with an svd every frame, 'incremental' keeps them with lib.subspace
+        self.basis_update=config.basis_update
+        if self.basis_update not in (None,'incremental'):
+            raise ValueError('unknown basis update '+str(self.basis_update))
+        self.basis_refresh_interval=config.basis_refresh_interval
+        self.basis_tol=config.basis_tol
 
         self.padding=config.padding
+        self.use_fused_hc=config.use_fused_hc
         self.output_sigma_factor=config.output_sigma_factor
         self.lambda_ = config.lambda_
         self.interp_factor=config.interp_factor
@@ -41,6 +51,7 @@ class MKCFup(BaseCF):
         self.refinement_iterations=config.refinement_iterations
         self.translation_model_max_area=config.translation_model_max_area
         self.interpolate_response=config.interpolate_response
+        self.use_rfft=config.use_rfft
 
         self.scale_type = config.scale_type
         self.scale_config = config.scale_config
@@ -50,6 +61,7 @@ class MKCFup(BaseCF):
 
 
     def init(self,first_frame,bbox):
+        first_frame=as_frame(first_frame)
 
         bbox = np.array(bbox).astype(np.int64)
         x0, y0, w, h = tuple(bbox)
@@ -66,7 +78,7 @@ class MKCFup(BaseCF):
         output_sigma=np.sqrt(self.base_target_sz[0]*self.base_target_sz[1])*self.output_sigma_factor/self.cell_size
         use_sz=(int(np.floor(self.win_sz[0]/self.cell_size)),int(np.floor(self.win_sz[1]/self.cell_size)))
 
-        self.yf = fft2(0.5*gaussian2d_rolled_labels(use_sz,sigma=output_sigma))
+        self.yf = self._fft2(0.5*gaussian2d_rolled_labels(use_sz,sigma=output_sigma))
         self.interp_sz=(use_sz[0]*self.cell_size,use_sz[1]*self.cell_size)
         self._window=cos_window(use_sz)
 
@@ -92,6 +104,10 @@ class MKCFup(BaseCF):
         self.lr_cn = self.lr_cn_color
         self.modnum = self.gap
         self.is_gray = False
+        # distances are normalised by the number of pixels like the reference code
+        rfft_shape=self._window.shape if self.use_rfft else None
+        self._cn_correlation=KernelCorrelation('gaussian',self.cn_sigma,rfft_shape=rfft_shape,norm_size='pixel')
+        self._hog_correlation=KernelCorrelation('gaussian',self.hog_sigma,rfft_shape=rfft_shape,norm_size='pixel')
 
 
 
@@ -99,21 +115,25 @@ class MKCFup(BaseCF):
         self.z_hog,self.z_cn=self.get_features(patch,cell_size=self.cell_size)
 
 
-        data_matrix_cn=self.z_cn.reshape((-1,self.z_cn.shape[2]))
-        pca_basis_cn,_,_=np.linalg.svd(data_matrix_cn.T.dot(data_matrix_cn))
-        self.projection_matrix_cn=pca_basis_cn[:,:self.num_compressed_dim_cn]
-
-        data_matrix_hog=self.z_hog.reshape((-1,self.z_hog.shape[2]))
-        pca_basis_hog,_,_=np.linalg.svd(data_matrix_hog.T.dot(data_matrix_hog))
-        self.projection_matrix_hog=pca_basis_hog[:,:self.num_compressed_dim_hog]
+        self._cn_subspace,self._hog_subspace=None,None
+        if self.basis_update=='incremental':
+            self._cn_subspace=IncrementalSubspace(self.num_compressed_dim_cn,symmetric=True,
+                                                  refresh_interval=self.basis_refresh_interval,tol=self.basis_tol)
+            self._hog_subspace=IncrementalSubspace(self.num_compressed_dim_hog,symmetric=True,
+                                                   refresh_interval=self.basis_refresh_interval,tol=self.basis_tol)
+        self.projection_matrix_cn=self.pca_basis(self.z_cn,self.num_compressed_dim_cn,self._cn_subspace)
+        self.projection_matrix_hog=self.pca_basis(self.z_hog,self.num_compressed_dim_hog,self._hog_subspace)
 
         self.z_cn2,self.z_hog2=self.feature_projection(self.z_cn,self.z_hog,self.projection_matrix_cn,self.projection_matrix_hog,
                                              self._window)
+        self._cn_correlation.set_model(self._fft2(self.z_cn2))
+        self._hog_correlation.set_model(self._fft2(self.z_hog2))
         self.frame_index=1
         self.d=self.train_model()
 
 
     def update(self,current_frame,vis=False):
+        current_frame=as_frame(current_frame)
         self.frame_index+=1
         old_pos=(np.inf,np.inf)
         iter=1
@@ -124,14 +144,17 @@ class MKCFup(BaseCF):
             xo_hog,xo_cn= self.get_features(patch,self.cell_size)
             xo_cn2, xo_hog2 = self.feature_projection(xo_cn, xo_hog, self.projection_matrix_cn, self.projection_matrix_hog,
                                                     self._window)
-            detect_k_cn=self.dense_gauss_kernel(self.z_cn2,xo_cn2,self.cn_sigma)
-            detect_k_hog=self.dense_gauss_kernel(self.z_hog2,xo_hog2,self.hog_sigma)
-            kf=fft2(self.d[0]*detect_k_cn+self.d[1]*detect_k_hog)
+            detect_k_cn=self.dense_gauss_kernel(self._cn_correlation,xo_cn2)
+            detect_k_hog=self.dense_gauss_kernel(self._hog_correlation,xo_hog2)
+            kf=self._fft2(self.d[0]*detect_k_cn+self.d[1]*detect_k_hog)
             responsef=self.alphaf*np.conj(kf)
+            if self.use_rfft is True:
+                # resize_dft2 pads the whole grid
+                responsef=full_spectrum(responsef,self._window.shape[1])
             if self.interpolate_response>0:
                 if self.interpolate_response==2:
-                    self.interp_sz=(int(self.yf.shape[1]*self.cell_size*self.sc),
-                               int(self.yf.shape[0]*self.cell_size*self.sc))
+                    self.interp_sz=(int(self._window.shape[1]*self.cell_size*self.sc),
+                               int(self._window.shape[0]*self.cell_size*self.sc))
                 else:
                     responsef=self.resize_dft2(responsef,self.interp_sz)
             response=np.real(ifft2(responsef))
@@ -169,32 +192,36 @@ class MKCFup(BaseCF):
         self.z_hog=(1-self.lr_hog)*self.z_hog+self.lr_hog*xo_hog
         self.z_cn=(1-self.lr_cn)*self.z_cn+self.lr_cn*xo_cn
 
-        data_matrix_cn = self.z_cn.reshape((-1, self.z_cn.shape[2]))
-        pca_basis_cn, _, _ = np.linalg.svd(data_matrix_cn.T.dot(data_matrix_cn))
-        self.projection_matrix_cn = pca_basis_cn[:, :self.num_compressed_dim_cn]
-
-        data_matrix_hog = self.z_hog.reshape((-1, self.z_hog.shape[2]))
-        pca_basis_hog, _, _ = np.linalg.svd(data_matrix_hog.T.dot(data_matrix_hog))
-        self.projection_matrix_hog = pca_basis_hog[:, :self.num_compressed_dim_hog]
+        self.projection_matrix_cn = self.pca_basis(self.z_cn, self.num_compressed_dim_cn, self._cn_subspace)
+        self.projection_matrix_hog = self.pca_basis(self.z_hog, self.num_compressed_dim_hog, self._hog_subspace)
 
         self.z_cn2, self.z_hog2 = self.feature_projection(self.z_cn, self.z_hog, self.projection_matrix_cn, self.projection_matrix_hog,
                                                   self._window)
+        self._cn_correlation.set_model(self._fft2(self.z_cn2))
+        self._hog_correlation.set_model(self._fft2(self.z_hog2))
         if self.frame_index%self.modnum==0:
             self.train_model()
         target_sz=((self.base_target_sz[0]*self.sc),(self.base_target_sz[1]*self.sc))
         return [(self._center[0] - target_sz[0] / 2), (self._center[1] - target_sz[1] / 2), target_sz[0],target_sz[1]]
 
-    def dense_gauss_kernel(self,x1,x2,sigma):
-        c=ifft2(np.sum(fft2(x1)*np.conj(fft2(x2)),axis=2))
-        d=x1.flatten().conj().T.dot(x1.flatten())+x2.flatten().conj().T.dot(x2.flatten())-2*c
-        k=np.exp(-1/sigma**2*d/np.size(d))
-        return k
+    def pca_basis(self,z,num_compressed_dim,subspace):
+        # leading eigenvectors of the channel covariance of z, kept by subspace when it is not None
+        data_matrix=z.reshape((-1,z.shape[2]))
+        cov=data_matrix.T.dot(data_matrix)
+        if subspace is not None:
+            return subspace.update(cov)
+        pca_basis,_,_=np.linalg.svd(cov)
+        return pca_basis[:,:num_compressed_dim]
+
+    def dense_gauss_kernel(self,correlation,x):
+        # spatial k(z,x) of the model z cached in correlation
+        return correlation.correlate(correlation.model_f,self._fft2(x),aa=correlation.model_norm,spatial=True)
 
     def train_model(self):
         d=[0.5,0.5]
         dim=self.z_cn2.shape[2]
-        kf_cn=fft2(self.dense_gauss_kernel(self.z_cn2,self.z_cn2,self.cn_sigma))
-        kf_hog=fft2(self.dense_gauss_kernel(self.z_hog2,self.z_hog2,self.hog_sigma))
+        kf_cn=self._cn_correlation.auto_correlate(self._cn_correlation.model_f)
+        kf_hog=self._hog_correlation.auto_correlate(self._hog_correlation.model_f)
         count=0
         stop=False
         lambda1=0.01
@@ -218,7 +245,7 @@ class MKCFup(BaseCF):
             self.alphaf_num = alphaf_num11 +alphaf_num22
             self.alphaf_den = alphaf_den11 + alphaf_den22
             self.alphaf=self.alphaf_num/self.alphaf_den
-            alpha=ifft2(self.alphaf)
+            alpha=self._ifft2(self.alphaf)
             d=self.trainD(kf_cn,kf_hog,self.alphaf,alpha,lambda1,dim)
             count+=1
             if count>1:
@@ -239,9 +266,9 @@ class MKCFup(BaseCF):
 
     def trainD(self,kf_cn,kf_hog,alphaf,alpha,lambda1,dim):
         d=[0,0]
-        tmp1=ifft2(np.conj(kf_cn)*alphaf)
-        tmp2=ifft2(np.conj(kf_hog)*alphaf)
-        y=ifft2(self.yf)
+        tmp1=self._ifft2(np.conj(kf_cn)*alphaf)
+        tmp2=self._ifft2(np.conj(kf_hog)*alphaf)
+        y=self._ifft2(self.yf)
         tmp=2*y-lambda1*alpha
         new_num1=tmp.flatten().conj().T.dot(tmp1.flatten())
         new_num2=tmp.flatten().conj().T.dot(tmp2.flatten())
@@ -267,6 +294,16 @@ class MKCFup(BaseCF):
         self.d_den2=d_den22
         return d
 
+    def _fft2(self,x):
+        if self.use_rfft is True:
+            return rfft2(x)
+        return fft2(x)
+
+    def _ifft2(self,xf):
+        if self.use_rfft is True:
+            return irfft2(xf,self._window.shape)
+        return ifft2(xf)
+
     def resize_dft2(self, input_dft, desired_sz):
         h,w=input_dft.shape
         if desired_sz[0]!=w or desired_sz[1]!=h:
@@ -318,6 +355,9 @@ class MKCFup(BaseCF):
             cell_gray=cell_sum/(cell_size**2*255)-0.5
             return cell_gray
         """
+        if self.use_fused_hc is True:
+            hc_feature=extract_hc_feature(patch,cell_size=cell_size)
+            return hc_feature[:,:,:31],hc_feature[:,:,31:]
         hog_feature=extract_hog_feature(patch,cell_size=cell_size)
         cn_feature=extract_cn_feature(patch,cell_size=cell_size)
         return hog_feature,cn_feature
@@ -10,46 +10,49 @@ Python re-implementation of "Visual Object Tracking using Adaptive Correlation F
 import numpy as np
 import cv2
 from lib.utils import gaussian2d_labels,cos_window
+from lib.fft_tools import fft2,ifft2,rfft2,irfft2
+from lib.frame_context import frame_context
 from .base import BaseCF
 
 class MOSSE(BaseCF):
-    def __init__(self,interp_factor=0.125,sigma=2.):
+    def __init__(self,interp_factor=0.125,sigma=2.,use_rfft=False):
         super(MOSSE).__init__()
         self.interp_factor=interp_factor
         self.sigma=sigma
+        self.use_rfft=use_rfft
 
     def init(self,first_frame,bbox):
-        if len(first_frame.shape)!=2:
-            assert first_frame.shape[2]==3
-            first_frame=cv2.cvtColor(first_frame,cv2.COLOR_BGR2GRAY)
-        first_frame=first_frame.astype(np.float32)/255
+        ctx=frame_context(first_frame)
+        if len(ctx.frame.shape)!=2:
+            assert ctx.frame.shape[2]==3
+        first_frame=ctx.float32('gray',255)
         x,y,w,h=tuple(bbox)
         self._center=(x+w/2,y+h/2)
         self.w,self.h=w,h
         w,h=int(round(w)),int(round(h))
         self.cos_window=cos_window((w,h))
         self._fi=cv2.getRectSubPix(first_frame,(w,h),self._center)
-        self._G=np.fft.fft2(gaussian2d_labels((w,h),self.sigma))
+        self._G=self._fft2(gaussian2d_labels((w,h),self.sigma))
         self.crop_size=(w,h)
         self._Ai=np.zeros_like(self._G)
         self._Bi=np.zeros_like(self._G)
         for _ in range(8):
             fi=self._rand_warp(self._fi)
-            Fi=np.fft.fft2(self._preprocessing(fi,self.cos_window))
+            Fi=self._fft2(self._preprocessing(fi,self.cos_window))
             self._Ai+=self._G*np.conj(Fi)
             self._Bi+=Fi*np.conj(Fi)
 
 
     def update(self,current_frame,vis=False):
-        if len(current_frame.shape)!=2:
-            assert current_frame.shape[2]==3
-            current_frame=cv2.cvtColor(current_frame,cv2.COLOR_BGR2GRAY)
-        current_frame=current_frame.astype(np.float32)/255
+        ctx=frame_context(current_frame)
+        if len(ctx.frame.shape)!=2:
+            assert ctx.frame.shape[2]==3
+        current_frame=ctx.float32('gray',255)
         Hi=self._Ai/self._Bi
         fi=cv2.getRectSubPix(current_frame,(int(round(self.w)),int(round(self.h))),self._center)
         fi=self._preprocessing(fi,self.cos_window)
-        Gi=Hi*np.fft.fft2(fi)
-        gi=np.real(np.fft.ifft2(Gi))
+        Gi=Hi*self._fft2(fi)
+        gi=self._ifft2(Gi)
         if vis is True:
             self.score=gi
         curr=np.unravel_index(np.argmax(gi, axis=None),gi.shape)
@@ -60,11 +63,21 @@ class MOSSE(BaseCF):
         self._center=(x_c,y_c)
         fi=cv2.getRectSubPix(current_frame,(int(round(self.w)),int(round(self.h))),self._center)
         fi=self._preprocessing(fi,self.cos_window)
-        Fi=np.fft.fft2(fi)
+        Fi=self._fft2(fi)
         self._Ai=self.interp_factor*(self._G*np.conj(Fi))+(1-self.interp_factor)*self._Ai
         self._Bi=self.interp_factor*(Fi*np.conj(Fi))+(1-self.interp_factor)*self._Bi
         return [self._center[0]-self.w/2,self._center[1]-self.h/2,self.w,self.h]
 
+    def _fft2(self,x):
+        if self.use_rfft is True:
+            return rfft2(x)
+        return fft2(x)
+
+    def _ifft2(self,xf):
+        if self.use_rfft is True:
+            return irfft2(xf,self.cos_window.shape)
+        return np.real(ifft2(xf))
+
     def _preprocessing(self,img,cos_window,eps=1e-5):
         img=np.log(img+1)
         img=(img-np.mean(img))/(np.std(img)+eps)
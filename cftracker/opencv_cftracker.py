@@ -3,6 +3,7 @@ warpper of cf trackers implemented in opencv
 """
 from .base import BaseCF
 import cv2
+from lib.frame_context import as_frame
 
 
 class OpenCVCFTracker(BaseCF):
@@ -11,6 +12,7 @@ class OpenCVCFTracker(BaseCF):
         self.name = name
 
     def init(self, first_frame, bbox):
+        first_frame = as_frame(first_frame)
         if self.name == 'KCF':
             self.tracker = cv2.TrackerKCF_create()
         elif self.name == 'MOSSE':
@@ -22,6 +24,7 @@ class OpenCVCFTracker(BaseCF):
         self.tracker.init(first_frame, bbox)
 
     def update(self, current_frame, vis=False):
+        current_frame = as_frame(current_frame)
         _, bbox = self.tracker.update(current_frame)
         x1, y1, w, h = bbox
         pos = [x1, y1, w, h]
@@ -13,13 +13,20 @@ import numpy as np
 import cv2
 from scipy.ndimage import map_coordinates
 from lib.utils import cos_window,gaussian2d_rolled_labels
-from lib.fft_tools import fft2,ifft2
+from lib.fft_tools import fft2,ifft2,rfft2,irfft2,SpectrumStack
+from lib.kernel_correlation import KernelCorrelation
+from lib.frame_context import frame_context
 from .base import BaseCF
-from .feature import extract_hog_feature,extract_cn_feature
+from lib.feature_pyramid import FeaturePyramid
+from .feature import extract_hog_feature,extract_cn_feature,extract_hc_feature,get_cn_extractor,get_hc_extractor
+from .cf_utils import reuse_feature_map
 
 class SAMF(BaseCF):
-    def __init__(self,kernel='gaussian'):
+    def __init__(self,kernel='gaussian',use_fused_hc=False,feature_pyramid=None,pyramid_resolution=1.,
+                 feature_reuse=None,use_rfft=False):
         super(SAMF).__init__()
+        # None, 'circular' or 'border', train on the unit scale detection features shifted to the new position
+        self.feature_reuse=feature_reuse
         self.padding = 1.5
         self.lambda_ = 1e-4
         self.output_sigma_factor=0.1
@@ -27,16 +34,25 @@ class SAMF(BaseCF):
         self.kernel_sigma=0.5
         self.cell_size=4
         self.kernel=kernel
+        self.use_fused_hc=use_fused_hc
+        self._pyramid=None
+        if feature_pyramid is not None:
+            self._pyramid=FeaturePyramid(cell_size=self.cell_size,cn_extractor=get_cn_extractor(),
+                                         mode=feature_pyramid,resolution=pyramid_resolution)
         self.resize=False
+        self.use_rfft=use_rfft
+        self._scale_stack=SpectrumStack(half_spectrum=use_rfft)
 
     def init(self,first_frame,bbox):
+        ctx=frame_context(first_frame)
+        first_frame=ctx.frame
         assert len(first_frame.shape)==3 and first_frame.shape[2]==3
         bbox = np.array(bbox).astype(np.int64)
         x0, y0, w, h = tuple(bbox)
         if w*h>=100**2:
             self.resize=True
             x0,y0,w,h=x0/2,y0/2,w/2,h/2
-            first_frame=cv2.resize(first_frame,dsize=None,fx=0.5,fy=0.5).astype(np.uint8)
+            first_frame=ctx.resized(0.5)
 
         self.crop_size = (int(np.floor(w * (1 + self.padding))), int(np.floor(h * (1 + self.padding))))# for vis
         self._center = (x0 + w / 2,y0 + h / 2)
@@ -45,9 +61,10 @@ class SAMF(BaseCF):
         self._window = cos_window(self.window_size)
 
         s=np.sqrt(w*h)*self.output_sigma_factor/self.cell_size
-        self.yf = fft2(gaussian2d_rolled_labels(self.window_size, s))
+        self.yf = self._fft2(gaussian2d_rolled_labels(self.window_size, s))
 
         self.search_size=np.linspace(0.985,1.015,7)
+        self._unit_scale_id=int(np.argmin(np.abs(self.search_size-1)))
 
         self.target_sz=(w,h)
         #param0=[self._center[0],self._center[1],1,
@@ -59,35 +76,49 @@ class SAMF(BaseCF):
         patch = cv2.resize(patch, dsize=self.crop_size)
         hc_features=self.get_features(patch,self.cell_size)
         hc_features=hc_features*self._window[:,:,None]
-        xf=fft2(hc_features)
-        kf=self._kernel_correlation(xf,xf,kernel=self.kernel)
+        xf=self._fft2(hc_features)
+        self._correlation=KernelCorrelation(self.kernel,self.kernel_sigma,
+                                            rfft_shape=self._window.shape if self.use_rfft else None)
+        kf=self._correlation.auto_correlate(xf)
         self.model_alphaf=self.yf/(kf+self.lambda_)
         self.model_xf=xf
+        self._correlation.set_model(self.model_xf)
 
     def update(self,current_frame,vis=False):
+        ctx=frame_context(current_frame)
+        current_frame=ctx.frame
         if self.resize:
-            current_frame=cv2.resize(current_frame,dsize=None,fx=0.5,fy=0.5).astype(np.uint8)
-        response=None
-        for i in range(len(self.search_size)):
-            tmp_sz=(self.target_sz[0]*(1+self.padding)*self.search_size[i],
-                    self.target_sz[1]*(1+self.padding)*self.search_size[i])
-            #param0=[self._center[0],self._center[1],tmp_sz[0]/self.crop_size[0],
-            #        0,tmp_sz[1]/self.crop_size[0]/(self.crop_size[1]/self.crop_size[0]),
-            #        0]
-            #param0=self.affparam2mat(param0)
-            #patch=self.warpimg(current_frame.astype(np.float32),param0,self.crop_size).astype(np.uint8)
-            patch=cv2.getRectSubPix(current_frame,(int(np.round(tmp_sz[0])),int(np.round(tmp_sz[1]))),self._center)
-            patch = cv2.resize(patch, self.crop_size)
-            hc_features=self.get_features(patch,self.cell_size)
-            hc_features=hc_features*self._window[:,:,None]
-            zf=fft2(hc_features)
-
-            kzf=self._kernel_correlation(zf,self.model_xf,kernel=self.kernel)
-            if response is None:
-                response=np.real(ifft2(self.model_alphaf*kzf))[:,:,np.newaxis]
-            else:
-                response=np.concatenate((response,np.real(ifft2(self.model_alphaf*kzf))[:,:,np.newaxis]),
-                                        axis=2)
+            current_frame=ctx.resized(0.5)
+        if self._pyramid is not None:
+            z=self._scale_stack.reset(self._pyramid.output_shape(self.crop_size,len(self.search_size)))
+            self._pyramid.extract(lambda scale,out_sz:self._sample_patch(current_frame,scale,out_sz),
+                                  self.crop_size,self.search_size,out=z)
+        else:
+            if self.use_fused_hc is True:
+                # the fused features of every scale are written straight into the stack
+                z=self._scale_stack.reset(get_hc_extractor().output_shape(self.crop_size,self.cell_size)+
+                                          (len(self.search_size),))
+            for i in range(len(self.search_size)):
+                #param0=[self._center[0],self._center[1],tmp_sz[0]/self.crop_size[0],
+                #        0,tmp_sz[1]/self.crop_size[0]/(self.crop_size[1]/self.crop_size[0]),
+                #        0]
+                #param0=self.affparam2mat(param0)
+                #patch=self.warpimg(current_frame.astype(np.float32),param0,self.crop_size).astype(np.uint8)
+                patch=self._sample_patch(current_frame,self.search_size[i],self.crop_size)
+                if self.use_fused_hc is True:
+                    self.get_features(patch,self.cell_size,out=z[:,:,:,i])
+                    continue
+                hc_features=self.get_features(patch,self.cell_size)
+                if i==0:
+                    z=self._scale_stack.reset(hc_features.shape+(len(self.search_size),))
+                z[:,:,:,i]=hc_features
+        if self.feature_reuse is not None:
+            # transform windows the stack in place
+            z_unit=z[:,:,:,self._unit_scale_id].copy()
+        zf=self._scale_stack.transform(self._window)
+        # every scale of the stack against the model in one call
+        kzf=self._correlation.detect(zf)
+        response=self._ifft2(self.model_alphaf[:,:,None]*kzf)
         delta_y,delta_x,sz_id = np.unravel_index(np.argmax(response, axis=None), response.shape)
         self.sz_id=sz_id
 
@@ -116,15 +147,21 @@ class SAMF(BaseCF):
         #          0]
         #param0 = self.affparam2mat(param0)
         #patch = self.warpimg(current_frame.astype(np.float32), param0, self.crop_size).astype(np.uint8)
-        patch = cv2.getRectSubPix(current_frame, (int(np.round(tmp_sz[0])), int(np.round(tmp_sz[1]))), self._center)
-        patch=cv2.resize(patch,self.crop_size)
-        hc_features=self.get_features(patch, self.cell_size)
+        hc_features=None
+        if self.feature_reuse is not None and self.sz_id==self._unit_scale_id:
+            hc_features=reuse_feature_map(z_unit,(delta_y,delta_x),self.feature_reuse,
+                                          sample_fn=lambda:self._training_patch(current_frame,tmp_sz),
+                                          feature_fn=lambda patch:self.get_features(patch,self.cell_size),
+                                          cell_size=self.cell_size)
+        if hc_features is None:
+            hc_features=self.get_features(self._training_patch(current_frame,tmp_sz), self.cell_size)
         hc_features=self._window[:,:,None]*hc_features
-        xf = fft2(hc_features)
-        kf=self._kernel_correlation(xf,xf,kernel=self.kernel)
+        xf = self._fft2(hc_features)
+        kf=self._correlation.auto_correlate(xf)
         alphaf=self.yf/(kf+self.lambda_)
         self.model_alphaf=(1-self.interp_factor)*self.model_alphaf+self.interp_factor*alphaf
         self.model_xf=(1-self.interp_factor)*self.model_xf+self.interp_factor*xf
+        self._correlation.set_model(self.model_xf)
 
         bbox=[(self._center[0] - self.target_sz[0] / 2), (self._center[1] - self.target_sz[1] / 2),
                 self.target_sz[0], self.target_sz[1]]
@@ -132,21 +169,29 @@ class SAMF(BaseCF):
             bbox=[ele*2 for ele in bbox]
         return bbox
 
-    def _kernel_correlation(self, xf, yf, kernel='gaussian'):
-        if kernel== 'gaussian':
-            N=xf.shape[0]*xf.shape[1]
-            xx=(np.dot(xf.flatten().conj().T,xf.flatten())/N)
-            yy=(np.dot(yf.flatten().conj().T,yf.flatten())/N)
-            xyf=xf*np.conj(yf)
-            xy=np.sum(np.real(ifft2(xyf)),axis=2)
-            kf = fft2(np.exp(-1 / self.kernel_sigma ** 2 * np.clip(xx+yy-2*xy,a_min=0,a_max=None) / np.size(xf)))
-        elif kernel== 'linear':
-            kf= np.sum(xf*np.conj(yf),axis=2)/np.size(xf)
-        else:
-            raise NotImplementedError
-        return kf
+    def _fft2(self,x):
+        if self.use_rfft is True:
+            return rfft2(x)
+        return fft2(x)
+
+    def _ifft2(self,xf):
+        if self.use_rfft is True:
+            return irfft2(xf,self._window.shape)
+        return np.real(ifft2(xf))
+
+    def _training_patch(self,img,tmp_sz):
+        patch = cv2.getRectSubPix(img, (int(np.round(tmp_sz[0])), int(np.round(tmp_sz[1]))), self._center)
+        return cv2.resize(patch,self.crop_size)
+
+    def _sample_patch(self,img,search_size,out_sz):
+        tmp_sz=(self.target_sz[0]*(1+self.padding)*search_size,
+                self.target_sz[1]*(1+self.padding)*search_size)
+        patch=cv2.getRectSubPix(img,(int(np.round(tmp_sz[0])),int(np.round(tmp_sz[1]))),self._center)
+        return cv2.resize(patch,out_sz)
 
-    def get_features(self,img,cell_size):
+    def get_features(self,img,cell_size,out=None):
+        if self.use_fused_hc is True:
+            return extract_hc_feature(img,cell_size,out=out)
         hog_feature=extract_hog_feature(img,cell_size)
         cn_feature=extract_cn_feature(img,cell_size)
         return np.concatenate((hog_feature,cn_feature),axis=2)
@@ -1,12 +1,39 @@
 import numpy as np
 import scipy
 import cv2
-from numpy.fft import fft, ifft
-from scipy import signal
+import scipy.linalg
 from lib.eco.fourier_tools import resize_dft
 from .feature import extract_hog_feature
 from lib.utils import cos_window
-from lib.fft_tools import ifft2,fft2
+from lib.fft_tools import ifft2,fft2,fft,ifft
+from lib.constant_cache import cached_constant
+from lib.frame_context import as_frame
+from lib.scale_pyramid import ScaleSamplePyramid
+from lib.subspace import IncrementalSubspace
+
+@cached_constant
+def dsst_scale_constants(num_scales,scale_step,scale_sigma,number_of_interp_scales):
+    """
+    scale factors, interpolated scale factors, label spectrum and window of the 1-D scale filter
+    """
+    scale_exp = np.arange(-np.floor(num_scales - 1)/2,
+                          np.ceil(num_scales-1)/2+1,
+                          dtype=np.float32) * number_of_interp_scales / num_scales
+    scale_exp_shift = np.roll(scale_exp, (0, -int(np.floor((num_scales-1)/2))))
+
+    interp_scale_exp = np.arange(-np.floor((number_of_interp_scales - 1) / 2),
+                                 np.ceil((number_of_interp_scales - 1) / 2) + 1,
+                                 dtype=np.float32)
+    interp_scale_exp_shift = np.roll(interp_scale_exp, [0, -int(np.floor(number_of_interp_scales - 1) / 2)])
+
+    scale_size_factors = scale_step ** scale_exp
+    interp_scale_factors = scale_step ** interp_scale_exp_shift
+
+    ys = np.exp(-0.5 * (scale_exp_shift ** 2) / (scale_sigma ** 2))
+    yf = np.real(fft(ys))
+    window = np.hanning(ys.shape[0]).T.astype(np.float32)
+    return scale_size_factors,interp_scale_factors,yf,window
+
 
 class DSSTScaleEstimator:
     def __init__(self,target_sz,config):
@@ -17,22 +44,8 @@ class DSSTScaleEstimator:
         scale_step = self.config.scale_step_filter
         scale_sigma = self.config.number_of_interp_scales * self.config.scale_sigma_factor
 
-        scale_exp = np.arange(-np.floor(num_scales - 1)/2,
-                              np.ceil(num_scales-1)/2+1,
-                              dtype=np.float32) * self.config.number_of_interp_scales / num_scales
-        scale_exp_shift = np.roll(scale_exp, (0, -int(np.floor((num_scales-1)/2))))
-
-        interp_scale_exp = np.arange(-np.floor((self.config.number_of_interp_scales - 1) / 2),
-                                     np.ceil((self.config.number_of_interp_scales - 1) / 2) + 1,
-                                     dtype=np.float32)
-        interp_scale_exp_shift = np.roll(interp_scale_exp, [0, -int(np.floor(self.config.number_of_interp_scales - 1) / 2)])
-
-        self.scale_size_factors = scale_step ** scale_exp
-        self.interp_scale_factors = scale_step ** interp_scale_exp_shift
-
-        ys = np.exp(-0.5 * (scale_exp_shift ** 2) / (scale_sigma ** 2))
-        self.yf = np.real(fft(ys))
-        self.window = np.hanning(ys.shape[0]).T.astype(np.float32)
+        self.scale_size_factors,self.interp_scale_factors,self.yf,self.window=dsst_scale_constants(
+            num_scales,scale_step,scale_sigma,self.config.number_of_interp_scales)
         # make sure the scale model is not to large, to save computation time
 
 
@@ -51,14 +64,41 @@ class DSSTScaleEstimator:
             self.s_num_compressed_dim = len(self.scale_size_factors)
         else:
             self.s_num_compressed_dim = self.config.s_num_compressed_dim
+        # None crops and resizes every scale from the frame, 'pyramid' resamples them from lib.scale_pyramid
+        self._pyramid = None
+        if self.config.scale_sampling == 'pyramid':
+            self._pyramid = ScaleSamplePyramid(self.scale_model_sz)
+        elif self.config.scale_sampling is not None:
+            raise ValueError('unknown scale sampling ' + str(self.config.scale_sampling))
+        # None recomputes the projection bases with a qr or svd every frame, 'incremental' keeps them with
+        # lib.subspace, with 'MAX' dimensions they span every sample and the projection is dropped altogether
+        if self.config.basis_update not in (None, 'incremental'):
+            raise ValueError('unknown basis update ' + str(self.config.basis_update))
+        self._incremental_basis = self.config.basis_update == 'incremental'
+        if self._incremental_basis and not self.max_scale_dim:
+            self._basis_subspace = IncrementalSubspace(self.s_num_compressed_dim,
+                                                       refresh_interval=self.config.basis_refresh_interval,
+                                                       tol=self.config.basis_tol)
+            self._den_subspace = IncrementalSubspace(self.s_num_compressed_dim,
+                                                     refresh_interval=self.config.basis_refresh_interval,
+                                                     tol=self.config.basis_tol)
 
 
 
     def init(self,im,pos,base_target_sz,current_scale_factor):
+        im=as_frame(im)
+        if self._pyramid is not None:
+            self._pyramid.reset()
 
         # self.scale_factors = np.array([1])
         scales = current_scale_factor * self.scale_size_factors
         xs = self._extract_scale_sample(im, pos, base_target_sz, scales, self.scale_model_sz)
+        if self._incremental_basis:
+            if not self.max_scale_dim:
+                self._basis_subspace.reset()
+                self._den_subspace.reset()
+            self._learn_incremental(xs, None)
+            return
         self.s_num = xs
         # compute projection basis
         if self.max_scale_dim:
@@ -72,7 +112,7 @@ class DSSTScaleEstimator:
         self.basis = self.basis.T
         # compute numerator
         feat_proj = self.basis.dot(self.s_num) * self.window
-        sf_proj = np.fft.fft(feat_proj, axis=1)
+        sf_proj = fft(feat_proj, axis=1)
         self.sf_num = self.yf * np.conj(sf_proj)
 
         # update denominator
@@ -83,16 +123,22 @@ class DSSTScaleEstimator:
 
 
     def update(self, im, pos, base_target_sz, current_scale_factor):
+        im = as_frame(im)
+        if self._pyramid is not None:
+            self._pyramid.reset()
         base_target_sz=np.array([base_target_sz[0],base_target_sz[1]])
         # get scale filter features
         scales = current_scale_factor * self.scale_size_factors
         xs = self._extract_scale_sample(im, pos, base_target_sz, scales, self.scale_model_sz)
 
         # project
-        xs = self.basis.dot(xs) * self.window
+        if self.basis is None:
+            xs = xs * self.window
+        else:
+            xs = self.basis.dot(xs) * self.window
 
         # get scores
-        xsf = np.fft.fft(xs, axis=1)
+        xsf = fft(xs, axis=1)
         scale_responsef = np.sum(self.sf_num * xsf, 0) / (self.sf_den + self.config.lamBda)
         interp_scale_response = np.real(ifft(resize_dft(scale_responsef, self.config.number_of_interp_scales)))
         recovered_scale_index = np.argmax(interp_scale_response)
@@ -118,6 +164,9 @@ class DSSTScaleEstimator:
 
         scales = current_scale_factor * self.scale_size_factors
         xs = self._extract_scale_sample(im, pos, base_target_sz, scales, self.scale_model_sz)
+        if self._incremental_basis:
+            self._learn_incremental(xs, self.config.scale_learning_rate)
+            return current_scale_factor
         self.s_num = (1 - self.config.scale_learning_rate) * self.s_num + self.config.scale_learning_rate * xs
         # compute projection basis
         if self.max_scale_dim:
@@ -132,18 +181,44 @@ class DSSTScaleEstimator:
 
         # compute numerator
         feat_proj = self.basis.dot(self.s_num) * self.window
-        sf_proj = np.fft.fft(feat_proj, axis=1)
+        sf_proj = fft(feat_proj, axis=1)
         self.sf_num = self.yf * np.conj(sf_proj)
 
         # update denominator
         xs = scale_basis_den.T.dot(xs)*self.window
-        xsf = np.fft.fft(xs, axis=1)
+        xsf = fft(xs, axis=1)
         new_sf_den = np.sum((xsf * np.conj(xsf)), 0)
         self.sf_den = (1 - self.config.scale_learning_rate) * self.sf_den + self.config.scale_learning_rate * new_sf_den
         return current_scale_factor
 
+    def _learn_incremental(self, xs, learning_rate):
+        # the training step of init (learning_rate None) and update with bases kept by lib.subspace,
+        # q^T*xs keeps the norms of samples in the span of q so 'MAX' filters use the samples unprojected
+        if learning_rate is None:
+            self.s_num = xs
+        else:
+            self.s_num = (1 - learning_rate) * self.s_num + learning_rate * xs
+        if self.max_scale_dim:
+            self.basis = None
+            feat_proj = self.s_num * self.window
+            xs = xs * self.window
+        else:
+            self.basis = self._basis_subspace.update(self.s_num).T
+            feat_proj = self.basis.dot(self.s_num) * self.window
+            xs = self._den_subspace.update(xs).T.dot(xs) * self.window
+        sf_proj = fft(feat_proj, axis=1)
+        self.sf_num = self.yf * np.conj(sf_proj)
+        xsf = fft(xs, axis=1)
+        new_sf_den = np.sum((xsf * np.conj(xsf)), 0)
+        if learning_rate is None:
+            self.sf_den = new_sf_den
+        else:
+            self.sf_den = (1 - learning_rate) * self.sf_den + learning_rate * new_sf_den
+
 
     def _extract_scale_sample(self, im, pos, base_target_sz, scale_factors, scale_model_sz):
+        if self._pyramid is not None:
+            return self._pyramid.extract(im, pos, base_target_sz, scale_factors)
         scale_sample = []
         base_target_sz=np.array([base_target_sz[0],base_target_sz[1]])
         for idx, scale in enumerate(scale_factors):
@@ -167,6 +242,7 @@ class LPScaleEstimator:
         self.target_sz=target_sz
 
     def init(self,im,pos,base_target_sz,current_scale_factor):
+        im=as_frame(im)
         w,h=base_target_sz
         avg_dim = (w + h) / 2.5
         self.scale_sz = ((w + avg_dim) / current_scale_factor,
@@ -186,6 +262,7 @@ class LPScaleEstimator:
         self.model_patchLp = extract_hog_feature(patchLp, cell_size=4)
 
     def update(self,im,pos,base_target_sz,current_scale_factor):
+        im=as_frame(im)
         patchL = cv2.getRectSubPix(im, (int(np.floor(current_scale_factor * self.scale_sz[0])),
                                                    int(np.floor(current_scale_factor* self.scale_sz[1]))),pos)
         patchL = cv2.resize(patchL, self.scale_sz_window)
@@ -12,7 +12,11 @@ import cv2
 from .base import BaseCF
 from .feature import extract_hog_feature
 from lib.utils import cos_window
-from lib.fft_tools import fft2, ifft2
+from lib.precision import as_real, real_dtype
+from lib.colour_hist import bin_ids, histogram, foreground_posterior, update_model, ColourResponse
+from lib.fft_tools import fft2, ifft2, rfft2, irfft2, fft, ifft, SpectrumStack
+from lib.frame_context import frame_context, as_frame
+from lib.scale_pyramid import ScaleSamplePyramid
 
 
 def mod_one(a, b):
@@ -28,7 +32,7 @@ def gaussian2d_rolled_labels_staple(sz, sigma):
     i, j = np.meshgrid(y_range, x_range)
     i_mod_range = mod_one(i, sz[1])
     j_mod_range = mod_one(j, sz[0])
-    labels = np.zeros((sz[1], sz[0]))
+    labels = np.zeros((sz[1], sz[0]), dtype=real_dtype())
     labels[i_mod_range - 1, j_mod_range - 1] = np.exp(-(i ** 2 + j ** 2) / (2 * sigma ** 2))
     return labels
 
@@ -43,31 +47,13 @@ def crop_filter_response(response_cf, response_sz):
     return new_responses.T
 
 
-def get_center_likelihood(likelihood_map, m):
-    h, w = likelihood_map.shape[:2]
-    n1 = h - m[1] + 1
-    n2 = w - m[0] + 1
-    sat = cv2.integral(likelihood_map)
-    i, j = np.arange(n1), np.arange(n2)
-    i, j = np.meshgrid(i, j)
-    sat1 = sat[i, j]
-    sat2 = np.roll(sat, -m[1], axis=0)
-    sat2 = np.roll(sat2, -m[0], axis=1)
-    sat2 = sat2[i, j]
-    sat3 = np.roll(sat, -m[1], axis=0)
-    sat3 = sat3[i, j]
-    sat4 = np.roll(sat, -m[0], axis=1)
-    sat4 = sat4[i, j]
-    center_likelihood = (sat1 + sat2 - sat3 - sat4) / (m[0] * m[1])
-    return center_likelihood.T
-
-
 class Staple(BaseCF):
     def __init__(self, config):
         super(Staple).__init__()
         self.hog_cell_size = config.hog_cell_size
         self.fixed_area = config.fixed_area
         self.n_bins = config.n_bins
+        self._colour_response = ColourResponse()
         self.interp_factor_pwp = config.interp_factor_pwp
         self.inner_padding = config.inner_padding
         self.output_sigma_factor = config.output_sigma_factor
@@ -84,13 +70,23 @@ class Staple(BaseCF):
         self.scale_model_factor = config.scale_model_factor
         self.scale_step = config.scale_step
         self.scale_model_max_area = config.scale_model_max_area
+        self.scale_sampling = config.scale_sampling
+        if self.scale_sampling not in (None, 'pyramid'):
+            raise ValueError('unknown scale sampling ' + str(self.scale_sampling))
         self.padding = config.padding
+        self.use_rfft = config.use_rfft
         self.use_ca = config.use_ca
         if self.use_ca is True:
             self.lambda_2 = config.lambda_2
+            self._context_stack = SpectrumStack(half_spectrum=self.use_rfft)
+            # None crops the target and every context patch on its own, 'shared' slices all of them from the
+            # features of one region covering them, see get_shared_feature_maps
+            self.context_sampling = config.context_sampling
+            if self.context_sampling not in (None, 'shared'):
+                raise ValueError('unknown context sampling ' + str(self.context_sampling))
 
     def init(self, first_frame, bbox):
-        first_frame = first_frame.astype(np.float32)
+        first_frame = frame_context(first_frame).float32()
         bbox = np.array(bbox).astype(np.int64)
         x, y, w, h = tuple(bbox)
         self._center = (x + w / 2, y + h / 2)
@@ -98,7 +94,6 @@ class Staple(BaseCF):
         self.crop_size = (int(w * (1 + self.padding)), int(h * (1 + self.padding)))
         self.target_sz = (self.w, self.h)
 
-        self.bin_mapping = self.get_bin_mapping(self.n_bins)
         avg_dim = (w + h) / 2
         self.bg_area = (round(w + avg_dim), round(h + avg_dim))
         self.fg_area = (int(round(w - avg_dim * self.inner_padding)), int(round(h - avg_dim * self.inner_padding)))
@@ -137,7 +132,7 @@ class Staple(BaseCF):
             self.norm_target_sz[0] * self.norm_target_sz[1]) * self.output_sigma_factor / self.hog_cell_size
         self.y = gaussian2d_rolled_labels_staple(self.cf_response_size, output_sigma)
         self._init_response_center = np.unravel_index(np.argmax(self.y, axis=None), self.y.shape)
-        self.yf = fft2(self.y)
+        self.yf = self._fft2(self.y)
 
         if self.use_ca:
             # w,h format
@@ -150,7 +145,7 @@ class Staple(BaseCF):
             self.scale_sigma = np.sqrt(self.num_scales) * self.scale_sigma_factor
             ss = np.arange(1, self.num_scales + 1) - np.ceil(self.num_scales / 2)
             ys = np.exp(-0.5 * (ss ** 2) / (self.scale_sigma ** 2))
-            self.ysf = np.fft.fft(ys)
+            self.ysf = fft(ys)
             if self.num_scales % 2 == 0:
                 scale_window = np.hanning(self.num_scales + 1)
                 self.scale_window = scale_window[1:]
@@ -165,6 +160,9 @@ class Staple(BaseCF):
 
             self.scale_model_sz = (
                 int(np.floor(self.w * self.scale_model_factor)), int(np.floor(self.h * self.scale_model_factor)))
+            self._scale_pyramid = None
+            if self.scale_sampling == 'pyramid':
+                self._scale_pyramid = ScaleSamplePyramid(self.scale_model_sz, cell_size=self.hog_scale_cell_size)
 
             self.current_scale_factor = 1.
 
@@ -174,24 +172,15 @@ class Staple(BaseCF):
             self.max_scale_factor = self.scale_step ** (
                 int(np.floor((np.log(min(first_frame.shape[1] / self.w, first_frame.shape[0] / self.h)) /
                               np.log(self.scale_step)))))
-        im_patch_bg = self.get_sub_window(first_frame, self._center, self.norm_bg_area, self.bg_area)
-        xt = self.get_feature_map(im_patch_bg, self.hog_cell_size)
-        xt = self._window[:, :, None] * xt
-        xtf = fft2(xt)
         if self.use_ca:
-            sum_kfn=np.zeros_like(xtf)
-            for j in range(len(self.offset)):
-                im_patch_bgn = self.get_sub_window(first_frame, (
-                self._center[0] + self.offset[j][0], self._center[1] + self.offset[j][1]),
-                                                   self.norm_bg_area, self.bg_area)
-                xtn = self.get_feature_map(im_patch_bgn, self.hog_cell_size)
-                xtn = self._window[:, :, None] * xtn
-                xtfn = fft2(xtn)
-                sum_kfn+=np.conj(xtfn)*xtfn
+            _, xtf, sum_kfn = self.get_context_spectra(first_frame)
             self.hf_num = self.yf[:, :, None] * np.conj(xtf)
             self.hf_den = np.conj(xtf) * xtf + self.lambda_ + self.lambda_2 * sum_kfn
 
         else:
+            im_patch_bg = self.get_sub_window(first_frame, self._center, self.norm_bg_area, self.bg_area)
+            xt = self.get_feature_map(im_patch_bg, self.hog_cell_size)
+            xtf = self._fft2(self._window[:, :, None] * xt)
             self.hf_num = np.conj(self.yf)[:, :, None] * xtf / (self.cf_response_size[0] * self.cf_response_size[1])
             self.hf_den = np.conj(xtf) * xtf / (self.cf_response_size[0] * self.cf_response_size[1])
 
@@ -200,12 +189,15 @@ class Staple(BaseCF):
                                                       self.base_target_sz, self.scale_factor * self.scale_factors,
                                                       self.scale_window, self.scale_model_sz,
                                                       self.hog_scale_cell_size)
-            xsf = np.fft.fft(im_patch_scale, axis=1)
+            xsf = fft(im_patch_scale, axis=1)
             self.sf_den = np.sum(xsf * np.conj(xsf), axis=0)
             self.sf_num = self.ysf * np.conj(xsf)
         self.rect_position_padded = None
 
     def update(self, current_frame, vis=False):
+        current_frame = as_frame(current_frame)
+        if self.scale_adaptation and self._scale_pyramid is not None:
+            self._scale_pyramid.reset()
         im_patch_cf = self.get_sub_window(current_frame, self._center, self.norm_bg_area, self.bg_area)
         pwp_search_area = (round(self.norm_pwp_search_area[0] / self.area_resize_factor),
                            round(self.norm_pwp_search_area[1] / self.area_resize_factor))
@@ -213,7 +205,7 @@ class Staple(BaseCF):
 
         xt = self.get_feature_map(im_patch_cf, self.hog_cell_size)
         xt_windowed = self._window[:, :, None] * xt
-        xtf = fft2(xt_windowed)
+        xtf = self._fft2(xt_windowed)
         if self.use_ca is False:
             if self.den_per_channel:
                 hf = self.hf_num / (self.hf_den + self.lambda_)
@@ -226,9 +218,9 @@ class Staple(BaseCF):
                 hf = self.hf_num / (np.sum(self.hf_den, axis=2)[:, :, None])
 
         if self.use_ca is False:
-            response_cf = np.real(ifft2(np.sum(np.conj(hf) * xtf, axis=2)))
+            response_cf = self._ifft2(np.sum(np.conj(hf) * xtf, axis=2))
         else:
-            response_cf = np.real(ifft2(np.sum(hf * xtf, axis=2)))
+            response_cf = self._ifft2(np.sum(hf * xtf, axis=2))
 
         response_sz = (self.floor_odd(self.norm_delta_area[0] / self.hog_cell_size),
                        self.floor_odd(self.norm_delta_area[1] / self.hog_cell_size))
@@ -239,12 +231,11 @@ class Staple(BaseCF):
                 response_cf = cv2.resize(response_cf, self.norm_delta_area, cv2.INTER_NEAREST)
             else:
                 response_cf = cv2.resize(response_cf, self.norm_delta_area, cv2.INTER_NEAREST)
-        likelihood_map = self.get_colour_map(im_patch_pwp, self.bg_hist, self.fg_hist, self.bin_mapping)
+        likelihood_map = self.get_colour_map(im_patch_pwp, self.bg_hist, self.fg_hist, self.n_bins)
 
-        likelihood_map[np.isnan(likelihood_map)] = 0.
         response_cf[np.isnan(response_cf)] = 0.
         self.norm_target_sz = (int(self.norm_target_sz[0]), int(self.norm_target_sz[1]))
-        response_pwp = get_center_likelihood(likelihood_map, self.norm_target_sz)
+        response_pwp = self._colour_response.window_mean(likelihood_map, self.norm_target_sz)
 
         response = (1 - self.merge_factor) * response_cf + self.merge_factor * response_pwp
         if vis is True:
@@ -262,8 +253,8 @@ class Staple(BaseCF):
             im_patch_scale = self.get_scale_subwindow(current_frame, self._center, self.base_target_sz,
                                                       self.scale_factor * self.scale_factors, self.scale_window,
                                                       self.scale_model_sz, self.hog_scale_cell_size)
-            xsf = np.fft.fft(im_patch_scale, axis=1)
-            scale_response = np.real(np.fft.ifft(np.sum(self.sf_num * xsf, axis=0) / (self.sf_den + self.lambda_)))
+            xsf = fft(im_patch_scale, axis=1)
+            scale_response = np.real(ifft(np.sum(self.sf_num * xsf, axis=0) / (self.sf_den + self.lambda_)))
             recovered_scale = np.argmax(scale_response)
             self.scale_factor = self.scale_factor * self.scale_factors[recovered_scale]
             self.scale_factor = np.clip(self.scale_factor, a_min=self.min_scale_factor, a_max=self.max_scale_factor)
@@ -280,24 +271,14 @@ class Staple(BaseCF):
             fg_area[0] + (self.bg_area[0] - fg_area[0]) % 2, fg_area[1] + (self.bg_area[1] - fg_area[1]) % 2)
             self.area_resize_factor = np.sqrt(self.fixed_area / (self.bg_area[0] * self.bg_area[1]))
 
-        im_patch_bg = self.get_sub_window(current_frame, self._center, self.norm_bg_area, self.bg_area)
-        xt = self.get_feature_map(im_patch_bg, self.hog_cell_size)
-        xt = self._window[:, :, None] * xt
-        xtf = fft2(xt)
-
         if self.use_ca:
-            sum_kfn=np.zeros_like(xtf)
-            for j in range(len(self.offset)):
-                im_patch_bgn = self.get_sub_window(current_frame, (
-                    self._center[0] + self.offset[j][0], self._center[1] + self.offset[j][1]),
-                                                   self.norm_bg_area, self.bg_area)
-                xtn = self.get_feature_map(im_patch_bgn, self.hog_cell_size)
-                xtn = self._window[:, :, None] * xtn
-                xtfn = fft2(xtn)
-                sum_kfn+=np.conj(xtfn)*xtfn
+            im_patch_bg, xtf, sum_kfn = self.get_context_spectra(current_frame)
             new_hf_num = self.yf[:, :, None] * np.conj(xtf)
             new_hf_den = np.conj(xtf) * xtf + self.lambda_ + self.lambda_2 * sum_kfn
         else:
+            im_patch_bg = self.get_sub_window(current_frame, self._center, self.norm_bg_area, self.bg_area)
+            xt = self.get_feature_map(im_patch_bg, self.hog_cell_size)
+            xtf = self._fft2(self._window[:, :, None] * xt)
             new_hf_num = np.conj(self.yf)[:, :, None] * xtf / (self.cf_response_size[0] * self.cf_response_size[1])
             new_hf_den = (np.conj(xtf) * xtf) / (self.cf_response_size[0] * self.cf_response_size[1])
 
@@ -311,7 +292,7 @@ class Staple(BaseCF):
             im_patch_scale = self.get_scale_subwindow(current_frame, self._center, self.base_target_sz,
                                                       self.scale_factor * self.scale_factors,
                                                       self.scale_window, self.scale_model_sz, self.hog_scale_cell_size)
-            xsf = np.fft.fft(im_patch_scale, axis=1)
+            xsf = fft(im_patch_scale, axis=1)
             new_sf_num = self.ysf * np.conj(xsf)
             new_sf_den = np.sum(xsf * np.conj(xsf), axis=0)
             self.sf_den = (1 - self.interp_factor_scale) * self.sf_den + self.interp_factor_scale * new_sf_den
@@ -320,11 +301,69 @@ class Staple(BaseCF):
         return [self._center[0] - self.target_sz[0] / 2, self._center[1] - self.target_sz[1] / 2,
                 self.target_sz[0], self.target_sz[1]]
 
+    def _fft2(self, x):
+        if self.use_rfft is True:
+            return rfft2(x)
+        return fft2(x)
+
+    def _ifft2(self, xf):
+        if self.use_rfft is True:
+            return irfft2(xf, self._window.shape)
+        return np.real(ifft2(xf))
+
     def floor_odd(self, x):
         return 2 * int(np.floor((x - 1) / 2)) + 1
 
+    def get_context_spectra(self, im):
+        # target and context samples are windowed and transformed together as one h*w*c*(1+n) stack,
+        # returns the target patch, its spectrum and the summed context energy
+        if self.context_sampling == 'shared':
+            im_patch_bg, xs = self.get_shared_feature_maps(im)
+        else:
+            im_patch_bg = self.get_sub_window(im, self._center, self.norm_bg_area, self.bg_area)
+            xt = self.get_feature_map(im_patch_bg, self.hog_cell_size)
+            xs = self._context_stack.reset(xt.shape + (len(self.offset) + 1,))
+            xs[:, :, :, 0] = xt
+            for j in range(len(self.offset)):
+                im_patch_bgn = self.get_sub_window(im, (
+                    self._center[0] + self.offset[j][0], self._center[1] + self.offset[j][1]),
+                                                   self.norm_bg_area, self.bg_area)
+                xs[:, :, :, j + 1] = self.get_feature_map(im_patch_bgn, self.hog_cell_size)
+        xsf = self._context_stack.transform(self._window)
+        xtfn = xsf[:, :, :, 1:]
+        sum_kfn = np.sum(np.conj(xtfn) * xtfn, axis=3)
+        return im_patch_bg, xsf[:, :, :, 0], sum_kfn
+
+    def get_shared_feature_maps(self, im):
+        """
+        one crop and one feature pass over the region covering the target and its context patches, the offsets
+        are rounded to whole cells in the normalised patch so that every sample is a slice of the same map,
+        returns the target patch and the h*w*c*(1+n) stack of target and context features
+        """
+        cell = self.hog_cell_size
+        resize_factor = (self.norm_bg_area[0] / self.bg_area[0], self.norm_bg_area[1] / self.bg_area[1])
+        cell_offsets = [(int(round(dx * resize_factor[0] / cell)), int(round(dy * resize_factor[1] / cell)))
+                        for dx, dy in self.offset]
+        mx = max(abs(dx) for dx, _ in cell_offsets)
+        my = max(abs(dy) for _, dy in cell_offsets)
+        region_sz = (self.norm_bg_area[0] + 2 * mx * cell, self.norm_bg_area[1] + 2 * my * cell)
+        region = self.get_sub_window(im, self._center, region_sz,
+                                     (round(region_sz[0] / resize_factor[0]), round(region_sz[1] / resize_factor[1])))
+        im_patch_bg = region[my * cell:my * cell + self.norm_bg_area[1], mx * cell:mx * cell + self.norm_bg_area[0]]
+        h, w = self._window.shape
+        # whole cells only, so that the gray channel is averaged over the same pixels as the hog cells
+        region = region[:(h + 2 * my) * cell, :(w + 2 * mx) * cell]
+        features = self.get_feature_map(region, cell, (w + 2 * mx, h + 2 * my))
+        xs = self._context_stack.reset((h, w, features.shape[2], len(self.offset) + 1))
+        xs[:, :, :, 0] = features[my:my + h, mx:mx + w]
+        for j, (dx, dy) in enumerate(cell_offsets):
+            xs[:, :, :, j + 1] = features[my + dy:my + dy + h, mx + dx:mx + dx + w]
+        return im_patch_bg, xs
+
     def get_scale_subwindow(self, im, center, base_target_sz, scale_factors, scale_window, scale_model_sz,
                             hog_scale_cell_sz):
+        if self._scale_pyramid is not None:
+            return self._scale_pyramid.extract(im, center, base_target_sz, scale_factors) * scale_window[None, :]
         n_scales = len(self.scale_factors)
         out = None
         for s in range(n_scales):
@@ -340,34 +379,39 @@ class Staple(BaseCF):
                 out = np.c_[out, tmp.flatten() * scale_window[s]]
         return out
 
-    def get_feature_map(self, im_patch, hog_cell_sz):
+    def get_feature_map(self, im_patch, hog_cell_sz, map_sz=None):
+        # map_sz=(w,h) of the feature map, the window size unless the patch is larger than the target patch
         hog_feature = extract_hog_feature(im_patch, cell_size=hog_cell_sz)[:, :, :27]
+        if map_sz is None:
+            map_sz = (self._window.shape[1], self._window.shape[0])
         if hog_cell_sz > 1:
-            im_patch = self.mex_resize(im_patch, (self._window.shape[1], self._window.shape[0])).astype(np.uint8)
-        gray = cv2.cvtColor(im_patch, cv2.COLOR_BGR2GRAY)[:, :, np.newaxis] / 255 - 0.5
+            im_patch = self.mex_resize(im_patch, map_sz).astype(np.uint8)
+        gray = as_real(cv2.cvtColor(im_patch, cv2.COLOR_BGR2GRAY))[:, :, np.newaxis] / 255 - 0.5
         return np.concatenate((gray, hog_feature), axis=2)
 
     def update_hist_model(self, new_model, patch, bg_area, fg_area, target_sz, norm_area,
                           n_bins):
         pad_offset1 = ((bg_area[0] - target_sz[0]) / 2, (bg_area[1] - target_sz[1]) / 2)
         assert pad_offset1[0] == round(pad_offset1[0]) and pad_offset1[1] == round(pad_offset1[1])
-        bg_mask = np.ones((int(bg_area[1]), int(bg_area[0])))
+        bg_mask = np.ones((int(bg_area[1]), int(bg_area[0])), dtype=real_dtype())
         pad_offset1 = (int(max(1, pad_offset1[0])), int(max(1, pad_offset1[1])))
         bg_mask[pad_offset1[1]:-pad_offset1[1], pad_offset1[0]:-pad_offset1[0]] = 0.
 
         pad_offset2 = ((bg_area[0] - fg_area[0]) / 2, (bg_area[1] - fg_area[1]) / 2)
         assert pad_offset2[0] == round(pad_offset2[0]) and pad_offset2[1] == round(pad_offset2[1])
-        fg_mask = np.zeros((int(bg_area[1]), int(bg_area[0])))
+        fg_mask = np.zeros((int(bg_area[1]), int(bg_area[0])), dtype=real_dtype())
         pad_offset2 = (int(max(1, pad_offset2[0])), int(max(1, pad_offset2[1])))
         fg_mask[pad_offset2[1]:-pad_offset2[1], pad_offset2[0]:-pad_offset2[0]] = 1.
         fg_mask = self.mex_resize(fg_mask, norm_area)
         bg_mask = self.mex_resize(bg_mask, norm_area)
-        bg_hist_new = self.compute_histogram(patch, bg_mask, n_bins)
-        fg_hist_new = self.compute_histogram(patch, fg_mask, n_bins)
+        # one bin id map for both masks
+        ids = bin_ids(patch, n_bins)
+        bg_hist_new = self.compute_histogram(ids, bg_mask, n_bins)
+        fg_hist_new = self.compute_histogram(ids, fg_mask, n_bins)
 
         if new_model is not True:
-            bg_hist_new = (1 - self.interp_factor_pwp) * self.bg_hist + self.interp_factor_pwp * bg_hist_new
-            fg_hist_new = (1 - self.interp_factor_pwp) * self.fg_hist + self.interp_factor_pwp * fg_hist_new
+            bg_hist_new = update_model(self.bg_hist, bg_hist_new, self.interp_factor_pwp)
+            fg_hist_new = update_model(self.fg_hist, fg_hist_new, self.interp_factor_pwp)
         return bg_hist_new, fg_hist_new
 
     def get_sub_window(self, img, center, model_sz, scaled_sz=None):
@@ -397,23 +441,11 @@ class Staple(BaseCF):
         img = cv2.resize(img, sz, interpolation=interpolation)
         return img
 
-    def compute_histogram(self, patch, mask, n_bins):
-        h, w, d = patch.shape
-        assert h == mask.shape[0] and w == mask.shape[1]
+    def compute_histogram(self, ids, mask, n_bins):
+        assert ids.shape == mask.shape
         mask = mask.astype(np.uint8)
-        histogram = cv2.calcHist([patch], [0, 1, 2], mask, [n_bins, n_bins, n_bins],
-                                 [0, 256, 0, 256, 0, 256]) / np.count_nonzero(mask)
-        return histogram
-
-    def get_colour_map(self, patch, bg_hist, fg_hist, bin_mapping):
-        frame_bin = cv2.LUT(patch, bin_mapping).astype(np.int64)
-        P_fg = fg_hist[frame_bin[:, :, 0], frame_bin[:, :, 1], frame_bin[:, :, 2]]
-        P_bg = bg_hist[frame_bin[:, :, 0], frame_bin[:, :, 1], frame_bin[:, :, 2]]
-        P_O = P_fg / (P_fg + P_bg)
-        return P_O
-
-    def get_bin_mapping(self, num_bins):
-        bin_mapping = np.zeros((256,))
-        for i in range(bin_mapping.shape[0]):
-            bin_mapping[i] = (np.floor(i / (256 / num_bins)))
-        return bin_mapping.astype(np.uint8)
+        return histogram(ids, n_bins, mask=mask) / np.count_nonzero(mask)
+
+    def get_colour_map(self, patch, bg_hist, fg_hist, n_bins):
+        # foreground posterior at every pixel, 0 where both histograms are empty, valid until the next call
+        return self._colour_response.likelihood(foreground_posterior(fg_hist, bg_hist), patch)
@@ -11,13 +11,55 @@ Python re-implemented of "Learning Spatial-Temporal Regularized Correlation Filt
 import numpy as np
 import cv2
 from lib.utils import cos_window,gaussian2d_rolled_labels
-from lib.fft_tools import fft2,ifft2
+from lib.fft_tools import fft2,ifft2,rfft2,irfft2,full_spectrum,SpectrumStack
+from lib.precision import as_real,real_dtype
+from lib.constant_cache import cached_constant
 from .base import BaseCF
-from .feature import extract_hog_feature,extract_cn_feature
+from lib.feature_pyramid import FeaturePyramid
+from lib.frame_context import as_frame
+from lib.admm import STRCFSolver
+from .feature import extract_hog_feature,extract_cn_feature,extract_hc_feature,get_cn_extractor,get_hc_extractor
 from .config import strdcf_hc_config
 from .cf_utils import resp_newton,mex_resize,resize_dft2
 from .scale_estimator import LPScaleEstimator,DSSTScaleEstimator
 
+@cached_constant
+def create_reg_window(reg_scale,use_sz,p,reg_window_max,reg_window_min,alpha,beta):
+    range_ = np.zeros((2, 2))
+    for j in range(len(use_sz)):
+        if use_sz[0]%2==1 and use_sz[1]%2==1:
+            if int(reg_scale[j]) % 2 == 1:
+                range_[j, :] = np.array([-np.floor(use_sz[j] / 2), np.floor(use_sz[j] / 2)])
+            else:
+                range_[j, :] = np.array([-(use_sz[j] / 2 - 1), (use_sz[j] / 2)])
+        else:
+            if int(reg_scale[j]) % 2 == 1:
+                range_[j, :] = np.array([-np.floor(use_sz[j] / 2), (np.floor((use_sz[j] - 1) / 2))])
+            else:
+                range_[j, :] = np.array([-((use_sz[j] - 1) / 2),((use_sz[j] - 1) / 2)])
+    wrs = np.arange(range_[1, 0], range_[1, 1] + 1)
+    wcs = np.arange(range_[0, 0], range_[0, 1] + 1)
+    wrs, wcs = np.meshgrid(wrs, wcs)
+    res = (np.abs(wrs) / reg_scale[1]) ** p + (np.abs(wcs) / reg_scale[0]) ** p
+    reg_window = reg_window_max / (1 + np.exp(-1. * alpha * (np.power(res, 1. / p) -beta))) +reg_window_min
+    reg_window=as_real(reg_window.T)
+    return reg_window
+
+@cached_constant
+def create_reg_window_const(reg_scale, use_sz,reg_window_max, reg_window_min):
+    reg_window=np.ones((use_sz[1],use_sz[0]),dtype=real_dtype())*reg_window_max
+    range_=np.zeros((2,2))
+    for j in range(2):
+        range_[j,:]=np.array([0,reg_scale[j]-1])-np.floor(reg_scale[j]/2)
+    cx=int(np.floor((use_sz[0]+1)/2))+(use_sz[0]+1)%2-1
+    cy=int(np.floor((use_sz[1]+1)/2))+(use_sz[1]+1)%2-1
+    range_h=np.arange(cy+range_[1,0],cy+range_[1,1]+1).astype(np.int64)
+    range_w=np.arange(cx+range_[0,0],cx+range_[0,1]+1).astype(np.int64)
+    range_h,range_w=np.meshgrid(range_h,range_w)
+    reg_window[range_h,range_w]=reg_window_min
+    return reg_window
+
+
 class STRCF(BaseCF):
     def __init__(self,config=strdcf_hc_config.STRDCFHCConfig()):
         super(STRCF).__init__()
@@ -29,6 +71,9 @@ class STRCF(BaseCF):
         self.cn_use_for_gray = config.cn_use_for_gray
         self.cn_cell_size = config.cn_cell_size
         self.cn_n_dim = config.cn_n_dim
+        self.use_fused_hc=config.use_fused_hc
+        self.feature_pyramid=config.feature_pyramid
+        self.pyramid_resolution=config.pyramid_resolution
 
         self.cell_size=self.hog_cell_size
 
@@ -58,6 +103,10 @@ class STRCF(BaseCF):
         self.init_penalty_factor=config.init_penalty_factor
         self.max_penalty_factor=config.max_penalty_factor
         self.penalty_scale_step=config.penalty_scale_step
+        self.admm_solver=config.admm_solver
+        if self.admm_solver not in (None,'workspace','adaptive'):
+            raise ValueError('unknown admm solver '+str(self.admm_solver))
+        self.admm_tol=config.admm_tol
 
         # scale parameters
         self.number_of_scales =config.number_of_scales
@@ -73,9 +122,12 @@ class STRCF(BaseCF):
         self.normalize_dim=config.normalize_dim
         self.square_root_normalization=config.square_root_normalization
         self.config=config
+        self.use_rfft=config.use_rfft
+        self._scale_stack=SpectrumStack(half_spectrum=self.use_rfft)
 
 
     def init(self,first_frame,bbox):
+        first_frame=as_frame(first_frame)
 
         bbox = np.array(bbox).astype(np.int64)
         x0, y0, w, h = tuple(bbox)
@@ -107,7 +159,7 @@ class STRCF(BaseCF):
         y=gaussian2d_rolled_labels(self.feature_map_sz,output_sigma)
 
         self.cosine_window=(cos_window((y.shape[1],y.shape[0])))
-        self.yf=fft2(y)
+        self.yf=self._fft2(y)
         reg_scale=(int(np.floor(self.base_target_sz[0]/self.feature_downsample_ratio)),
                    int(np.floor(self.base_target_sz[1] / self.feature_downsample_ratio)))
         use_sz = self.feature_map_sz
@@ -127,7 +179,10 @@ class STRCF(BaseCF):
         scale_exp=np.arange(-int(np.floor((self.number_of_scales-1)/2)),int(np.ceil((self.number_of_scales-1)/2)+1))
 
         self.scale_factors=self.scale_step**scale_exp
-
+        self._pyramid=None
+        if self.feature_pyramid is not None and self.number_of_scales>1:
+            self._pyramid=FeaturePyramid(cell_size=self.cell_size,cn_extractor=get_cn_extractor(),
+                                         mode=self.feature_pyramid,resolution=self.pyramid_resolution)
 
         if self.number_of_scales>0:
             self._min_scale_factor = self.scale_step ** np.ceil(
@@ -158,13 +213,22 @@ class STRCF(BaseCF):
                                     scaled_sz=(int(np.round(self.crop_size[0] * self.sc)),
                                                int(np.round(self.crop_size[1] * self.sc))))
         xl_hc = self.extrac_hc_feature(patch, self.cell_size)
-        xlf_hc = fft2(xl_hc * self.cosine_window[:, :, None])
+        xlf_hc = self._fft2(xl_hc * self.cosine_window[:, :, None])
         f_pre_f_hc=np.zeros_like(xlf_hc)
         mu_hc=0
+        self._solver=None
+        if self.admm_solver is not None:
+            # 'adaptive' warm-starts every frame from the last one and stops on the admm residuals
+            self._solver=STRCFSolver(self.feature_map_sz,self.yf,self.reg_window,self.init_penalty_factor,
+                                     self.max_penalty_factor,self.penalty_scale_step,self.admm_max_iterations,
+                                     self.admm_tol,half_spectrum=self.use_rfft,
+                                     adaptive=self.admm_solver=='adaptive')
+        self.num_admm_iterations=0
         self.f_pre_f_hc=self.ADMM(xlf_hc,f_pre_f_hc,mu_hc)
 
 
     def update(self,current_frame,vis=False):
+        current_frame=as_frame(current_frame)
         assert len(current_frame.shape) == 3 and current_frame.shape[2] == 3
         old_pos=(np.inf,np.inf)
         iter=1
@@ -172,21 +236,34 @@ class STRCF(BaseCF):
                                                     np.abs(old_pos[1]-self._center[1])>1e-2):
 
             sample_scales=self.sc*self.scale_factors
-            xt_hc = None
             sample_pos=(int(np.round(self._center[0])),int(np.round(self._center[1])))
-            for scale in sample_scales:
-                sub_window = self.get_sub_window(current_frame, sample_pos, model_sz=self.crop_size,
-                                                 scaled_sz=(int(round(self.crop_size[0] * scale)),
-                                                            int(round(self.crop_size[1] * scale))))
-                hc_features=self.extrac_hc_feature(sub_window, self.cell_size)[:,:,:,np.newaxis]
-                if xt_hc is None:
-                    xt_hc = hc_features
-                else:
-                    xt_hc = np.concatenate((xt_hc, hc_features), axis=3)
-            xtw_hc=xt_hc*self.cosine_window[:,:,None,None]
-            xtf_hc=fft2(xtw_hc)
+            if self._pyramid is not None:
+                xt_hc=self._scale_stack.reset(self._pyramid.output_shape(self.crop_size,len(sample_scales)))
+                self._pyramid.extract(lambda scale,out_sz:self.get_sub_window(current_frame,sample_pos,model_sz=out_sz,
+                                      scaled_sz=(int(round(self.crop_size[0]*scale)),int(round(self.crop_size[1]*scale)))),
+                                      self.crop_size,sample_scales,out=xt_hc)
+            else:
+                if self.use_fused_hc is True:
+                    # the fused features of every scale are written straight into the stack
+                    xt_hc=self._scale_stack.reset(get_hc_extractor().output_shape(self.crop_size,self.cell_size)+
+                                                  (len(sample_scales),))
+                for scale_ind,scale in enumerate(sample_scales):
+                    sub_window = self.get_sub_window(current_frame, sample_pos, model_sz=self.crop_size,
+                                                     scaled_sz=(int(round(self.crop_size[0] * scale)),
+                                                                int(round(self.crop_size[1] * scale))))
+                    if self.use_fused_hc is True:
+                        self.extrac_hc_feature(sub_window,self.cell_size,out=xt_hc[:,:,:,scale_ind])
+                        continue
+                    hc_features=self.extrac_hc_feature(sub_window, self.cell_size)
+                    if scale_ind==0:
+                        xt_hc=self._scale_stack.reset(hc_features.shape+(len(sample_scales),))
+                    xt_hc[:,:,:,scale_ind]=hc_features
+            xtf_hc=self._scale_stack.transform(self.cosine_window)
             responsef_hc=np.sum(np.conj(self.f_pre_f_hc)[:,:,:,None]*xtf_hc,axis=2)
             responsef=responsef_hc
+            if self.use_rfft is True:
+                # resp_newton works on the whole grid, only the summed response is completed
+                responsef=full_spectrum(responsef,self.feature_map_sz[0])
             response = np.real(ifft2(responsef))
 
 
@@ -223,16 +300,19 @@ class STRCF(BaseCF):
                                                     int(np.round(self.crop_size[1] * self.sc))))
         xl_hc = self.extrac_hc_feature(patch, self.cell_size)
         xlw_hc = xl_hc * self.cosine_window[:, :, None]
-        xlf_hc = fft2(xlw_hc)
+        xlf_hc = self._fft2(xlw_hc)
         mu = self.temporal_regularization_factor
         self.f_pre_f_hc=self.ADMM(xlf_hc,self.f_pre_f_hc,mu)
         target_sz=(self.base_target_sz[0]*self.sc,self.base_target_sz[1]*self.sc)
         return [(self._center[0] - (target_sz[0]) / 2), (self._center[1] -(target_sz[1]) / 2), target_sz[0],target_sz[1]]
 
-    def extrac_hc_feature(self,patch,cell_size,normalization=False):
-        hog_features=extract_hog_feature(patch,cell_size)
-        cn_features=extract_cn_feature(patch,cell_size)
-        hc_features=np.concatenate((hog_features,cn_features),axis=2)
+    def extrac_hc_feature(self,patch,cell_size,normalization=False,out=None):
+        if self.use_fused_hc is True:
+            hc_features=extract_hc_feature(patch,cell_size,out=out)
+        else:
+            hog_features=extract_hog_feature(patch,cell_size)
+            cn_features=extract_cn_feature(patch,cell_size)
+            hc_features=np.concatenate((hog_features,cn_features),axis=2)
         if normalization is True:
             hc_features=self._feature_normalization(hc_features)
         return hc_features
@@ -261,6 +341,11 @@ class STRCF(BaseCF):
         return im_patch.astype(np.uint8)
 
     def ADMM(self,xlf,f_pre_f,mu):
+        if self._solver is not None:
+            f_f=self._solver.solve(xlf,f_pre_f,mu)
+            self.num_admm_iterations=self._solver.num_iterations
+            return f_f
+        self.num_admm_iterations=self.admm_max_iterations
         model_xf = xlf
         f_f = np.zeros_like(model_xf)
         g_f = np.zeros_like(f_f)
@@ -286,12 +371,22 @@ class STRCF(BaseCF):
             tmp3 = 1 / (gamma + mu) * (model_xf * (Shx_f[:, :, None]))
             tmp4 = gamma / (gamma + mu) * (model_xf * Sgx_f[:, :, None])
             f_f = tmp0 - (tmp1 + tmp2 - tmp3 +tmp4) / B[:, :, None]
-            g_f = fft2(self.argmin_g(self.reg_window, gamma, (ifft2(gamma * (f_f + h_f)))))
+            g_f = self._fft2(self.argmin_g(self.reg_window, gamma, (self._ifft2(gamma * (f_f + h_f)))))
             h_f = h_f + (gamma * (f_f - g_f))
             gamma = min(gamma_scale_step * gamma, gamma_max)
             iter += 1
         return f_f
 
+    def _fft2(self,x):
+        if self.use_rfft is True:
+            return rfft2(x)
+        return fft2(x)
+
+    def _ifft2(self,xf):
+        if self.use_rfft is True:
+            return irfft2(xf,self.cosine_window.shape)
+        return ifft2(xf)
+
 
     def argmin_g(self,w0, zeta, X):
         lhd = 1 / (w0 ** 2 + zeta)
@@ -299,38 +394,10 @@ class STRCF(BaseCF):
         return T
 
     def create_reg_window(self,reg_scale,use_sz,p,reg_window_max,reg_window_min,alpha,beta):
-        range_ = np.zeros((2, 2))
-        for j in range(len(use_sz)):
-            if use_sz[0]%2==1 and use_sz[1]%2==1:
-                if int(reg_scale[j]) % 2 == 1:
-                    range_[j, :] = np.array([-np.floor(use_sz[j] / 2), np.floor(use_sz[j] / 2)])
-                else:
-                    range_[j, :] = np.array([-(use_sz[j] / 2 - 1), (use_sz[j] / 2)])
-            else:
-                if int(reg_scale[j]) % 2 == 1:
-                    range_[j, :] = np.array([-np.floor(use_sz[j] / 2), (np.floor((use_sz[j] - 1) / 2))])
-                else:
-                    range_[j, :] = np.array([-((use_sz[j] - 1) / 2),((use_sz[j] - 1) / 2)])
-        wrs = np.arange(range_[1, 0], range_[1, 1] + 1)
-        wcs = np.arange(range_[0, 0], range_[0, 1] + 1)
-        wrs, wcs = np.meshgrid(wrs, wcs)
-        res = (np.abs(wrs) / reg_scale[1]) ** p + (np.abs(wcs) / reg_scale[0]) ** p
-        reg_window = reg_window_max / (1 + np.exp(-1. * alpha * (np.power(res, 1. / p) -beta))) +reg_window_min
-        reg_window=reg_window.T
-        return reg_window
+        return create_reg_window(reg_scale,use_sz,p,reg_window_max,reg_window_min,alpha,beta)
 
     def create_reg_window_const(self, reg_scale, use_sz,reg_window_max, reg_window_min):
-        reg_window=np.ones((use_sz[1],use_sz[0]))*reg_window_max
-        range_=np.zeros((2,2))
-        for j in range(2):
-            range_[j,:]=np.array([0,reg_scale[j]-1])-np.floor(reg_scale[j]/2)
-        cx=int(np.floor((use_sz[0]+1)/2))+(use_sz[0]+1)%2-1
-        cy=int(np.floor((use_sz[1]+1)/2))+(use_sz[1]+1)%2-1
-        range_h=np.arange(cy+range_[1,0],cy+range_[1,1]+1).astype(np.int)
-        range_w=np.arange(cx+range_[0,0],cx+range_[0,1]+1).astype(np.int)
-        range_h,range_w=np.meshgrid(range_h,range_w)
-        reg_window[range_h,range_w]=reg_window_min
-        return reg_window
+        return create_reg_window_const(reg_scale,use_sz,reg_window_max,reg_window_min)
 
     def _feature_normalization(self, x):
         if hasattr(self.config, 'normalize_power') and self.config.normalize_power > 0:
@@ -0,0 +1,80 @@
+"""
+accuracy and speed of the ADMM solvers (admm_solver None, 'workspace' and 'adaptive' at several admm_tol, see
+lib.admm) of BACF and STRCF on an OTB dataset, reports success AUC, precision at 20px, fps and the mean number of
+filter updates per frame of every setting
+
+usage: python admm_adaptive_otb.py --dataset OTB100 --dataset_root ../dataset/OTB100 [--trackers BACF] [--videos 10]
+"""
+import argparse
+import time
+import numpy as np
+from lib.pysot.datasets import DatasetFactory
+from lib.utils import get_thresh_success_pair,get_thresh_precision_pair,calAUC
+from cftracker.bacf import BACF
+from cftracker.strcf import STRCF
+from cftracker.config.bacf_config import BACFConfig
+from cftracker.config.strdcf_hc_config import STRDCFHCConfig
+
+# (admm_solver, admm_tol) per tracker, the first one is the reference schedule
+SETTINGS={'BACF':((None,None),('workspace',None),('adaptive',1e-2),('adaptive',5e-2),('adaptive',1e-1)),
+          'STRCF':((None,None),('workspace',None),('adaptive',1e-2),('adaptive',5e-2),('adaptive',1e-1))}
+
+def create_tracker(tracker_type,solver,tol):
+    if tracker_type=='BACF':
+        config=BACFConfig()
+        tracker_class=BACF
+    elif tracker_type=='STRCF':
+        config=STRDCFHCConfig()
+        tracker_class=STRCF
+    else:
+        raise NotImplementedError
+    config.admm_solver=solver
+    if tol is not None:
+        config.admm_tol=tol
+    return tracker_class(config)
+
+def run_video(tracker,video):
+    preds=[]
+    iterations=[]
+    elapsed=0.
+    for idx,(img,gt_bbox) in enumerate(video):
+        if idx==0:
+            tracker.init(img,tuple(gt_bbox))
+            preds.append(gt_bbox)
+        else:
+            start=time.time()
+            preds.append(tracker.update(img))
+            elapsed+=time.time()-start
+            iterations.append(tracker.num_admm_iterations)
+    return np.array(preds,dtype=np.float64),(len(preds)-1)/max(elapsed,1e-9),np.mean(iterations)
+
+def evaluate(tracker_type,solver,tol,videos):
+    successes,precisions,fps,iterations=[],[],[],[]
+    for video in videos:
+        preds,video_fps,video_iterations=run_video(create_tracker(tracker_type,solver,tol),video)
+        gts=np.array(video.gt_traj,dtype=np.float64)
+        successes.append(get_thresh_success_pair(gts,preds)[1])
+        precisions.append(get_thresh_precision_pair(gts,preds)[1])
+        fps.append(video_fps)
+        iterations.append(video_iterations)
+    # thresholds are linspace(0,50,101), index 40 is 20px
+    return calAUC(np.mean(successes,axis=0)),np.mean(precisions,axis=0)[40],np.mean(fps),np.mean(iterations)
+
+if __name__=='__main__':
+    parser=argparse.ArgumentParser(description='adaptive admm evaluation')
+    parser.add_argument('--dataset',default='OTB100',type=str)
+    parser.add_argument('--dataset_root',default='../dataset/OTB100',type=str)
+    parser.add_argument('--trackers',default='BACF,STRCF',type=str)
+    parser.add_argument('--videos',default=0,type=int,help='only the first n videos, 0 for all')
+    args=parser.parse_args()
+    dataset=DatasetFactory.create_dataset(name=args.dataset,dataset_root=args.dataset_root,load_img=True)
+    videos=list(dataset)
+    if args.videos>0:
+        videos=videos[:args.videos]
+    print('| tracker | solver | tol | AUC | precision@20 | fps | iterations per frame |')
+    print('| --- | --- | --- | --- | --- | --- | --- |')
+    for tracker_type in args.trackers.split(','):
+        for solver,tol in SETTINGS[tracker_type]:
+            auc,precision,fps,iterations=evaluate(tracker_type,solver,tol,videos)
+            print('| %s | %s | %s | %.3f | %.3f | %.1f | %.2f |'%(tracker_type,solver,'-' if tol is None else '%g'%tol,
+                                                                 auc,precision,fps,iterations))
@@ -0,0 +1,78 @@
+"""
+accuracy and speed of the detection-to-training feature reuse modes (None, 'circular', 'border')
+of KCF, CSK, CN, SAMF and DSST on an OTB dataset, reports success AUC, precision at 20px and fps per mode
+
+usage: python feature_reuse_otb.py --dataset OTB100 --dataset_root ../dataset/OTB100 [--trackers KCF,DSST] [--videos 10]
+"""
+import argparse
+import time
+import numpy as np
+from lib.pysot.datasets import DatasetFactory
+from lib.utils import get_thresh_success_pair,get_thresh_precision_pair,calAUC
+from cftracker.kcf import KCF
+from cftracker.csk import CSK
+from cftracker.cn import CN
+from cftracker.samf import SAMF
+from cftracker.dsst import DSST
+from cftracker.config import cn_config,dsst_config
+
+MODES=(None,'circular','border')
+
+def create_tracker(tracker_type,mode):
+    if tracker_type=='KCF':
+        return KCF(features='hog',kernel='gaussian',feature_reuse=mode)
+    elif tracker_type=='CSK':
+        return CSK(feature_reuse=mode)
+    elif tracker_type=='CN':
+        config=cn_config.CNConfig()
+        config.feature_reuse=mode
+        return CN(config)
+    elif tracker_type=='SAMF':
+        return SAMF(feature_reuse=mode)
+    elif tracker_type=='DSST':
+        config=dsst_config.DSSTConfig()
+        config.feature_reuse=mode
+        return DSST(config)
+    raise NotImplementedError
+
+def run_video(tracker,video):
+    preds=[]
+    elapsed=0.
+    for idx,(img,gt_bbox) in enumerate(video):
+        if idx==0:
+            tracker.init(img,tuple(gt_bbox))
+            preds.append(gt_bbox)
+        else:
+            start=time.time()
+            preds.append(tracker.update(img))
+            elapsed+=time.time()-start
+    return np.array(preds,dtype=np.float64),(len(preds)-1)/max(elapsed,1e-9)
+
+def evaluate(tracker_type,mode,videos):
+    successes,precisions,fps=[],[],[]
+    for video in videos:
+        preds,video_fps=run_video(create_tracker(tracker_type,mode),video)
+        gts=np.array(video.gt_traj,dtype=np.float64)
+        successes.append(get_thresh_success_pair(gts,preds)[1])
+        precisions.append(get_thresh_precision_pair(gts,preds)[1])
+        fps.append(video_fps)
+    # thresholds are linspace(0,50,101), index 40 is 20px
+    return calAUC(np.mean(successes,axis=0)),np.mean(precisions,axis=0)[40],np.mean(fps)
+
+if __name__=='__main__':
+    parser=argparse.ArgumentParser(description='feature reuse evaluation')
+    parser.add_argument('--dataset',default='OTB100',type=str)
+    parser.add_argument('--dataset_root',default='../dataset/OTB100',type=str)
+    parser.add_argument('--trackers',default='KCF,CSK,CN,SAMF,DSST',type=str)
+    parser.add_argument('--videos',default=0,type=int,help='only the first n videos, 0 for all')
+    args=parser.parse_args()
+    dataset=DatasetFactory.create_dataset(name=args.dataset,dataset_root=args.dataset_root,load_img=True)
+    videos=list(dataset)
+    if args.videos>0:
+        videos=videos[:args.videos]
+    print('| tracker | reuse | AUC | precision@20 | fps |')
+    print('| --- | --- | --- | --- | --- |')
+    for tracker_type in args.trackers.split(','):
+        for mode in MODES:
+            auc,precision,fps=evaluate(tracker_type,mode,videos)
+            print('| %s | %s | %.3f | %.3f | %.1f |'%(tracker_type,mode,auc,precision,fps))
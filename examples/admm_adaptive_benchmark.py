@@ -0,0 +1,98 @@
+"""
+training cost of BACF and STRCF on a synthetic stream of a slowly moving and turning textured target, the fixed
+ADMM schedule started from zero every frame as before, the same schedule on the preallocated buffers of lib.admm
+(admm_solver='workspace') and admm_solver='adaptive', warm-started from the last frame and stopped on its relative
+residuals, with the mean number of filter updates per frame, the time of all the ADMM solves and the largest
+distance between the tracked centres of each against the first
+
+usage: python admm_adaptive_benchmark.py [frames]
+
+one run on the single core machine used here, 150 frames of 320x240, 2 iterations at most:
+| tracker | solver | tol | iterations per frame | admm ms per frame | speedup | max centre distance px |
+| --- | --- | --- | --- | --- | --- | --- |
+| BACF | None | - | 2.00 | 12.07 | 1.00x | 0.00 |
+| BACF | workspace | - | 2.00 | 7.07 | 1.71x | 0.00 |
+| BACF | adaptive | 0.01 | 1.45 | 7.96 | 1.52x | 1.41 |
+| BACF | adaptive | 0.05 | 1.06 | 6.81 | 1.77x | 1.41 |
+| BACF | adaptive | 0.1 | 1.00 | 6.35 | 1.90x | 1.41 |
+| BACF | adaptive | 0.2 | 1.00 | 6.56 | 1.84x | 1.41 |
+| STRCF | None | - | 2.00 | 14.69 | 1.00x | 0.00 |
+| STRCF | workspace | - | 2.00 | 9.47 | 1.55x | 0.00 |
+| STRCF | adaptive | 0.01 | 2.00 | 9.93 | 1.48x | 5.62 |
+| STRCF | adaptive | 0.05 | 1.30 | 8.56 | 1.72x | 5.22 |
+| STRCF | adaptive | 0.1 | 1.20 | 8.11 | 1.81x | 6.42 |
+| STRCF | adaptive | 0.2 | 1.05 | 7.92 | 1.86x | 6.89 |
+'workspace' gives the same boxes and most of the saving, it is the one to use, 'adaptive' stops after fewer filter
+updates the looser tol is but only 0.05 and above stop early on most frames (the default admm_tol), and then it
+saves about 5% over 'workspace' for BACF, whose first iteration from zero skips half the products a warm one
+computes, and about 10% for STRCF, the trajectories differ by about a pixel for BACF and by 5-7 px for STRCF (target
+of 60 px) at every tol, even at 0.01 where STRCF runs both iterations every frame: two iterations from zero are far
+from a converged ADMM solution (the residuals after them are 0.2-0.9), the trackers are tuned for that filter and no
+warm start (penalty only, multipliers only, both, with or without a fall back to the cold solve) reached it here,
+whether the warm start costs accuracy on real sequences is what eval/admm_adaptive_otb.py measures, so 'adaptive'
+stays off by default until it has numbers there
+"""
+import sys
+import time
+import numpy as np
+import cv2
+from cftracker.bacf import BACF
+from cftracker.strcf import STRCF
+from cftracker.config.bacf_config import BACFConfig
+from cftracker.config.strdcf_hc_config import STRDCFHCConfig
+
+def timed(cls):
+    # the tracker with the time spent in its ADMM solves
+    class Timed(cls):
+        admm_time = 0.
+
+        def ADMM(self, *args):
+            start = time.time()
+            result = super(Timed, self).ADMM(*args)
+            self.admm_time += time.time() - start
+            return result
+    return Timed
+
+def stream(frames, rng):
+    background = cv2.GaussianBlur((rng.rand(240, 320, 3) * 255).astype(np.uint8), (0, 0), 2)
+    target = cv2.GaussianBlur((rng.rand(60, 60, 3) * 255).astype(np.uint8), (0, 0), 1.5)
+    for t in range(frames):
+        frame = background.copy()
+        rotation = cv2.getRotationMatrix2D((30, 30), 10 * np.sin(t / 30.), 1.)
+        patch = cv2.warpAffine(target, rotation, (60, 60), borderMode=cv2.BORDER_REFLECT)
+        x, y = int(130 + 40 * np.sin(t / 40.)), int(90 + 20 * np.cos(t / 50.))
+        frame[y:y + 60, x:x + 60] = patch
+        yield frame
+
+def run(cls, config, frames):
+    tracker = timed(cls)(config)
+    centres, iterations = [], []
+    for t, frame in enumerate(stream(frames, np.random.RandomState(0))):
+        if t == 0:
+            tracker.init(frame, (130, 110, 60, 60))
+        else:
+            bbox = tracker.update(frame)
+            centres.append((bbox[0] + bbox[2] / 2, bbox[1] + bbox[3] / 2))
+            iterations.append(tracker.num_admm_iterations)
+    return np.array(centres), np.mean(iterations), tracker.admm_time / frames
+
+if __name__ == '__main__':
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 150
+    print('| tracker | solver | tol | iterations per frame | admm ms per frame | speedup | max centre distance px |')
+    print('| --- | --- | --- | --- | --- | --- | --- |')
+    for cls, config_cls, solvers in ((BACF, BACFConfig, (None, 'workspace', 'adaptive')),
+                                     (STRCF, STRDCFHCConfig, (None, 'workspace', 'adaptive'))):
+        reference = None
+        for solver in solvers:
+            for tol in ((1e-2, 5e-2, 1e-1, 2e-1) if solver == 'adaptive' else (None,)):
+                config = config_cls()
+                config.admm_solver = solver
+                if tol is not None:
+                    config.admm_tol = tol
+                centres, iterations, admm_time = run(cls, config, frames)
+                if reference is None:
+                    reference = centres, admm_time
+                distance = np.max(np.sqrt(np.sum((centres - reference[0]) ** 2, axis=1)))
+                print('| %s | %s | %s | %.2f | %.2f | %.2fx | %.2f |' % (
+                    cls.__name__, solver, '-' if tol is None else '%g' % tol, iterations, admm_time * 1e3,
+                    reference[1] / admm_time, distance))
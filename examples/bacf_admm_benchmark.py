@@ -0,0 +1,60 @@
+"""
+time of one BACF training solve (BACF.ADMM, 2 iterations as in BACFConfig) as before against
+admm_solver='workspace' (lib.admm.BACFSolver), on hog+cn sample spectra of the feature map sizes BACF uses, with the
+memory the solve allocates as the peak of the traced python memory above its start
+
+usage: python bacf_admm_benchmark.py [repeat]
+
+one run on the single core machine used here, best of 50:
+| feature map | channels | before ms | after ms | speedup | before allocated kB | after allocated kB |
+| --- | --- | --- | --- | --- | --- | --- |
+| 25x25 | 42 | 5.61 | 3.05 | 1.84x | 2762.5 | 841.5 |
+| 50x50 | 42 | 16.19 | 8.75 | 1.85x | 11038.9 | 3361.5 |
+| 60x40 | 42 | 15.96 | 6.35 | 2.51x | 10597.5 | 3227.1 |
+the filters are bit identical, besides the workspace the solver skips the terms of the first iteration that are
+zero and the h and l updates the last iteration throws away, one inverse and one forward transform of the two
+iterations, what it still allocates are the double precision results of the numpy fft calls (two spectra of
+16 bytes per element), copied into the workspace, and nothing else
+"""
+import sys
+import time
+import tracemalloc
+import numpy as np
+from cftracker.bacf import BACF
+from lib.admm import BACFSolver
+from lib.fft_tools import fft2
+
+def best_time(fn, args, repeat):
+    elapsed = np.inf
+    for _ in range(repeat):
+        start = time.time()
+        fn(*args)
+        elapsed = min(elapsed, time.time() - start)
+    return elapsed
+
+def allocated(fn, args):
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = tracemalloc.get_traced_memory()[0]
+    fn(*args)
+    peak = tracemalloc.get_traced_memory()[1] - start
+    tracemalloc.stop()
+    return peak
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    rng = np.random.RandomState(0)
+    print('| feature map | channels | before ms | after ms | speedup | before allocated kB | after allocated kB |')
+    print('| --- | --- | --- | --- | --- | --- | --- |')
+    for map_sz, filter_sz in (((25, 25), (5, 5)), ((50, 50), (10, 10)), ((60, 40), (12, 8))):
+        tracker = BACF()
+        tracker.feature_map_sz, tracker.small_filter_sz, tracker._solver = map_sz, filter_sz, None
+        tracker.yf = fft2(rng.rand(map_sz[1], map_sz[0]).astype(np.float32))
+        xf = fft2(rng.rand(map_sz[1], map_sz[0], 42).astype(np.float32))
+        solver = BACFSolver(map_sz, filter_sz, tracker.yf, tracker.admm_lambda, tracker.admm_iterations)
+        assert np.array_equal(tracker.ADMM(xf), solver.solve(xf))
+        before_t = best_time(tracker.ADMM, (xf,), repeat)
+        after_t = best_time(solver.solve, (xf,), repeat)
+        print('| %dx%d | %d | %.2f | %.2f | %.2fx | %.1f | %.1f |' % (
+            map_sz[0], map_sz[1], xf.shape[2], before_t * 1e3, after_t * 1e3, before_t / after_t,
+            allocated(tracker.ADMM, (xf,)) / 1e3, allocated(solver.solve, (xf,)) / 1e3))
@@ -0,0 +1,111 @@
+"""
+time of the colour model steps with lib.colour_hist against the per-tracker code it replaced
+(cv2.calcHist per mask, cv2.LUT + 3d fancy indexing per back-projection, float binning of csrdcf),
+all rows give the same outputs as before except that csrdcf no longer drops pixels falling into one bin
+
+usage: python colour_hist_benchmark.py [repeat]
+
+one run on the single core machine used here, best of 20:
+| step | patch | bins | before ms | after ms | speedup |
+| --- | --- | --- | --- | --- | --- |
+| staple fg/bg model + colour map | 150x150 | 32 | 0.50 | 0.41 | 1.22x |
+| dat prob lut + 2 back-projections | 240x320 | 16 | 1.54 | 0.93 | 1.66x |
+| csrdcf fg/bg model + 2 back-projections | 120x120 | 16 | 0.82 | 0.30 | 2.72x |
+cv2.calcHist alone is still faster than a masked bincount, the gain comes from binning each patch once
+and from taking the fg/bg ratio on the bins rather than on every pixel
+"""
+import sys
+import time
+import numpy as np
+import cv2
+from lib.colour_hist import bin_mapping, bin_ids, histogram, back_project, foreground_posterior
+
+def calc_hist(patch, mask, n_bins):
+    return cv2.calcHist([patch], [0, 1, 2], mask, [n_bins] * 3, [0, 256] * 3)
+
+def lut_back_project(patch, table, n_bins):
+    frame_bin = cv2.LUT(patch, bin_mapping(n_bins)).astype(np.int64)
+    return table[frame_bin[:, :, 0], frame_bin[:, :, 1], frame_bin[:, :, 2]]
+
+def float_ids(patch, n_bins):
+    coef = np.power(n_bins, 2 - np.arange(3)).astype(np.int64)
+    return np.sum(coef[None, None, :] * np.floor(n_bins / 256 * patch.astype(np.float32)).astype(np.int64), axis=2)
+
+def staple_before(patch, bg_mask, fg_mask, n_bins):
+    bg_hist = calc_hist(patch, bg_mask, n_bins) / np.count_nonzero(bg_mask)
+    fg_hist = calc_hist(patch, fg_mask, n_bins) / np.count_nonzero(fg_mask)
+    P_fg = lut_back_project(patch, fg_hist, n_bins)
+    P_bg = lut_back_project(patch, bg_hist, n_bins)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return P_fg / (P_fg + P_bg)
+
+def staple_after(patch, bg_mask, fg_mask, n_bins):
+    ids = bin_ids(patch, n_bins)
+    bg_hist = histogram(ids, n_bins, mask=bg_mask) / np.count_nonzero(bg_mask)
+    fg_hist = histogram(ids, n_bins, mask=fg_mask) / np.count_nonzero(fg_mask)
+    return back_project(foreground_posterior(fg_hist, bg_hist), bin_ids(patch, n_bins))
+
+def dat_before(frame, obj_rect, n_bins):
+    x, y, w, h = obj_rect
+    prob_lut = (calc_hist(frame[y:y + h, x:x + w], None, n_bins) + 1) / (calc_hist(frame, None, n_bins) + 2)
+    return lut_back_project(frame, prob_lut, n_bins) + lut_back_project(frame, prob_lut * 0.5, n_bins)
+
+def dat_after(frame, obj_rect, n_bins):
+    x, y, w, h = obj_rect
+    ids = bin_ids(frame, n_bins)
+    prob_lut = (histogram(ids[y:y + h, x:x + w], n_bins) + 1) / (histogram(ids, n_bins) + 2)
+    return back_project(prob_lut, ids) + back_project(prob_lut * 0.5, ids)
+
+def csrdcf_before(patch, weights, mask, n_bins):
+    fg, bg = np.zeros(n_bins ** 3), np.zeros(n_bins ** 3)
+    ids = float_ids(patch, n_bins)
+    fg[ids] += weights
+    bg[ids[mask != 0]] += 1
+    ids = float_ids(patch.astype(np.float32), n_bins)
+    return fg[ids] + bg[ids]
+
+def csrdcf_after(patch, weights, mask, n_bins):
+    ids = bin_ids(patch, n_bins)
+    fg = histogram(ids, n_bins, weights=weights, dtype=np.float64).ravel()
+    bg = histogram(ids, n_bins, mask=mask, dtype=np.float64).ravel()
+    ids = bin_ids(patch, n_bins)
+    return back_project(fg, ids) + back_project(bg, ids)
+
+def best_time(fn, args, repeat):
+    elapsed = np.inf
+    for _ in range(repeat):
+        start = time.time()
+        fn(*args)
+        elapsed = min(elapsed, time.time() - start)
+    return elapsed
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    rng = np.random.RandomState(0)
+
+    def patch_of(h, w):
+        return cv2.GaussianBlur((rng.rand(h, w, 3) * 255).astype(np.uint8), (0, 0), 2)
+
+    def box_mask(h, w, inner):
+        mask = np.zeros((h, w), dtype=np.uint8)
+        mask[h // 4:3 * h // 4, w // 4:3 * w // 4] = 1
+        return mask if inner else 1 - mask
+
+    staple_patch = patch_of(150, 150)
+    dat_frame = patch_of(240, 320)
+    csr_patch = patch_of(120, 120)
+    csr_weights = cv2.getGaussianKernel(120, 30).dot(cv2.getGaussianKernel(120, 30).T)
+    cases = [('staple fg/bg model + colour map', staple_before, staple_after,
+              (staple_patch, box_mask(150, 150, False), box_mask(150, 150, True), 32), True),
+             ('dat prob lut + 2 back-projections', dat_before, dat_after, (dat_frame, (140, 100, 30, 40), 16), True),
+             ('csrdcf fg/bg model + 2 back-projections', csrdcf_before, csrdcf_after,
+              (csr_patch, csr_weights, box_mask(120, 120, False), 16), False)]
+    print('| step | patch | bins | before ms | after ms | speedup |')
+    print('| --- | --- | --- | --- | --- | --- |')
+    for name, before, after, args, same in cases:
+        if same:
+            assert np.array_equal(before(*args), after(*args), equal_nan=True)
+        before_t, after_t = best_time(before, args, repeat), best_time(after, args, repeat)
+        patch = args[0]
+        print('| %s | %dx%d | %d | %.2f | %.2f | %.2fx |' % (name, patch.shape[0], patch.shape[1], args[-1],
+                                                          before_t * 1e3, after_t * 1e3, before_t / after_t))
@@ -0,0 +1,76 @@
+"""
+time of the colour response of one Staple search patch, the posterior back-projected and averaged over every
+target-sized window with fancy indexing and rolled copies of the integral image as before, against
+lib.colour_hist.ColourResponse, nan bins zeroed in the table and four slices of the integral image into reused buffers
+
+usage: python colour_response_benchmark.py [repeat]
+
+one run on the single core machine used here, best of 50, 32 bins per channel:
+| target | patch | before ms | after ms | speedup | max abs diff |
+| --- | --- | --- | --- | --- | --- |
+| 20x30 | 60x90 | 0.28 | 0.18 | 1.61x | 0.0e+00 |
+| 60x80 | 180x240 | 1.44 | 0.57 | 2.52x | 0.0e+00 |
+| 120x160 | 360x480 | 5.08 | 2.10 | 2.41x | 0.0e+00 |
+the responses are bit identical, the additions and the division are done in the same order on the same integral
+image, before every window sum went through three rolled copies of the integral image and a gather, the back-projection
+and the integral image itself are shared by both and bound the gain, Staple resizes its search patch to about 150x150
+"""
+import sys
+import time
+import numpy as np
+import cv2
+from lib.colour_hist import bin_ids, histogram, back_project, foreground_posterior, ColourResponse
+from lib.precision import integral_sdepth
+
+N_BINS = 32
+
+def get_center_likelihood(likelihood_map, m):
+    # the window means of Staple before ColourResponse
+    h, w = likelihood_map.shape[:2]
+    n1 = h - m[1] + 1
+    n2 = w - m[0] + 1
+    sat = cv2.integral(likelihood_map, sdepth=integral_sdepth())
+    i, j = np.arange(n1), np.arange(n2)
+    i, j = np.meshgrid(i, j)
+    sat1 = sat[i, j]
+    sat2 = np.roll(sat, -m[1], axis=0)
+    sat2 = np.roll(sat2, -m[0], axis=1)
+    sat2 = sat2[i, j]
+    sat3 = np.roll(sat, -m[1], axis=0)
+    sat3 = sat3[i, j]
+    sat4 = np.roll(sat, -m[0], axis=1)
+    sat4 = sat4[i, j]
+    center_likelihood = (sat1 + sat2 - sat3 - sat4) / (m[0] * m[1])
+    return center_likelihood.T
+
+def before(table, patch, sz):
+    likelihood_map = back_project(table, bin_ids(patch, N_BINS))
+    likelihood_map[np.isnan(likelihood_map)] = 0.
+    return get_center_likelihood(likelihood_map, sz)
+
+def best_time(fn, args, repeat):
+    elapsed = np.inf
+    for _ in range(repeat):
+        start = time.time()
+        fn(*args)
+        elapsed = min(elapsed, time.time() - start)
+    return elapsed
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    rng = np.random.RandomState(0)
+    engine = ColourResponse()
+    print('| target | patch | before ms | after ms | speedup | max abs diff |')
+    print('| --- | --- | --- | --- | --- | --- |')
+    for w, h in ((20, 30), (60, 80), (120, 160)):
+        patch_sz = (3 * w, 3 * h)
+        patch = cv2.GaussianBlur((rng.rand(patch_sz[1], patch_sz[0], 3) * 255).astype(np.uint8), (0, 0), 3)
+        fg = histogram(bin_ids(patch[h:2 * h, w:2 * w], N_BINS), N_BINS)
+        bg = histogram(bin_ids(patch, N_BINS), N_BINS)
+        table = foreground_posterior(fg / fg.sum(), bg / bg.sum())
+        old, new = before(table, patch, (w, h)), engine.response(table, patch, (w, h))
+        diff = np.max(np.abs(old - new))
+        before_t = best_time(before, (table, patch, (w, h)), repeat)
+        after_t = best_time(engine.response, (table, patch, (w, h)), repeat)
+        print('| %dx%d | %dx%d | %.2f | %.2f | %.2fx | %.1e |' % (
+            w, h, patch_sz[0], patch_sz[1], before_t * 1e3, after_t * 1e3, before_t / after_t, diff))
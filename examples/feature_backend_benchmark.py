@@ -0,0 +1,25 @@
+"""
+parity/benchmark report of every registered feature backend (see lib.feature_registry),
+latency is the best of the repeats summed over the synthetic patches, max dev and rel. error are the largest
+absolute and relative (l2) differences from the reference backend (the first working one of the kind),
+selected is the backend calibration picks on this machine (feature_backend_config.calibrate, off by default)
+
+usage: python feature_backend_benchmark.py [kind ...] (defaults to every kind)
+"""
+import sys
+from lib.feature_registry import feature_registry
+import cftracker.feature
+
+if __name__ == '__main__':
+    kinds = sys.argv[1:] if len(sys.argv) > 1 else feature_registry.kinds()
+    sizes = ((64, 64), (120, 96), (240, 240))
+    print('| kind | backend | ms (%d patches) | max dev | rel. error | selected | note |' % len(sizes))
+    print('| --- | --- | --- | --- | --- | --- | --- |')
+    for kind in kinds:
+        selected = feature_registry.calibrate(kind)
+        for row in feature_registry.benchmark(kind, sizes=sizes, repeats=10):
+            if row['error'] is not None:
+                print('| %s | %s | - | - | - | | %s |' % (kind, row['backend'], row['error']))
+                continue
+            print('| %s | %s | %.3f | %.2e | %.2e | %s | |' % (kind, row['backend'], row['ms'], row['max_dev'],
+                                                             row['rel_err'], '*' if row['backend'] == selected else ''))
@@ -0,0 +1,94 @@
+"""
+accuracy/throughput trade-off of lib.feature_pyramid.FeaturePyramid against the exact per-scale extraction,
+error is ||f-f_exact||/||f_exact|| over the whole h*w*c*s hc stack, the 'exact +0.5px' row (exact features of the
+region shifted by half a pixel) gives the error level a tracker already sees between neighbouring samples
+
+usage: python feature_pyramid_benchmark.py [video or image dir] (defaults to the Coke demo gif)
+
+20 frames of results/Coke_vis.gif, 100x100 model, cell 4, hog+cn (42 channels), best of 5 passes:
+| scales | mode | resolution | ms/pyramid | speedup | rel. error |
+| --- | --- | --- | --- | --- | --- |
+| samf 7x[0.985,1.015] | exact | 1.00 | 5.35 | 1.00x | 0.000 |
+| samf 7x[0.985,1.015] | exact +0.5px | 1.00 | 4.99 | 1.07x | 0.583 |
+| samf 7x[0.985,1.015] | approx | 1.00 | 3.98 | 1.35x | 0.527 |
+| samf 7x[0.985,1.015] | approx | 0.75 | 3.17 | 1.69x | 0.629 |
+| samf 7x[0.985,1.015] | approx | 0.50 | 2.55 | 2.09x | 0.644 |
+| bacf 5x1.01 | exact | 1.00 | 3.80 | 1.00x | 0.000 |
+| bacf 5x1.01 | exact +0.5px | 1.00 | 4.45 | 0.85x | 0.558 |
+| bacf 5x1.01 | approx | 1.00 | 4.41 | 0.86x | 0.460 |
+| bacf 5x1.01 | approx | 0.75 | 3.29 | 1.15x | 0.553 |
+| bacf 5x1.01 | approx | 0.50 | 2.42 | 1.57x | 0.601 |
+| wide 5x1.05 | exact | 1.00 | 3.11 | 1.00x | 0.000 |
+| wide 5x1.05 | exact +0.5px | 1.00 | 3.68 | 0.85x | 0.535 |
+| wide 5x1.05 | approx | 1.00 | 3.44 | 0.90x | 0.494 |
+| wide 5x1.05 | approx | 0.75 | 2.22 | 1.40x | 0.535 |
+| wide 5x1.05 | approx | 0.50 | 1.73 | 1.80x | 0.614 |
+the gif frames are dithered so the fhog channels are noisy, the approximation stays within the half pixel level,
+the gain comes from sharing the gradients and the per-pixel colour names and grows as the resolution drops,
+at full resolution with 5 scales the shared work does not pay for the extra resampling
+"""
+import os
+import sys
+import time
+import cv2
+import numpy as np
+from lib.utils import get_img_list
+from lib.feature_pyramid import FeaturePyramid
+from cftracker.feature import ColorNamesExtractor
+
+def load_frames(path, max_frames=20):
+    frames = []
+    if os.path.isdir(path):
+        for name in get_img_list(path)[:max_frames]:
+            frames.append(cv2.imread(name))
+    else:
+        cap = cv2.VideoCapture(path)
+        while len(frames) < max_frames:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            frames.append(frame)
+    return frames
+
+def make_sample_fn(frame, center, model_sz):
+    def sample_fn(scale, out_sz):
+        sz = (max(int(round(model_sz[0] * scale)), 2), max(int(round(model_sz[1] * scale)), 2))
+        patch = cv2.getRectSubPix(frame, sz, center)
+        return cv2.resize(patch, out_sz).astype(np.uint8)
+    return sample_fn
+
+def run(pyramid, frames, model_sz, scales, offset=0., repeat=5):
+    # best of repeat passes over the frames, per pyramid
+    feats, elapsed = [], np.inf
+    for _ in range(repeat):
+        feats = []
+        start = time.time()
+        for frame in frames:
+            center = (frame.shape[1] / 2 + offset, frame.shape[0] / 2 + offset)
+            feats.append(pyramid.extract(make_sample_fn(frame, center, model_sz), model_sz, scales))
+        elapsed = min(elapsed, (time.time() - start) / len(frames))
+    return feats, elapsed
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else '../results/Coke_vis.gif'
+    frames = load_frames(path)
+    model_sz = (100, 100)
+    scale_sets = {'samf 7x[0.985,1.015]': np.linspace(0.985, 1.015, 7),
+                  'bacf 5x1.01': 1.01 ** np.arange(-2, 3),
+                  'wide 5x1.05': 1.05 ** np.arange(-2, 3)}
+    settings = [('exact', 1., 0.), ('exact', 1., 0.5), ('approx', 1., 0.), ('approx', 0.75, 0.), ('approx', 0.5, 0.)]
+    cn = ColorNamesExtractor(pooling='area')
+    print('| scales | mode | resolution | ms/pyramid | speedup | rel. error |')
+    print('| --- | --- | --- | --- | --- | --- |')
+    for set_name, scales in scale_sets.items():
+        reference, exact_time = None, None
+        for mode, resolution, offset in settings:
+            pyramid = FeaturePyramid(cell_size=4, cn_extractor=cn, mode=mode, resolution=resolution)
+            feats, elapsed = run(pyramid, frames, model_sz, scales, offset)
+            if reference is None:
+                reference, exact_time = feats, elapsed
+            err = np.mean([np.linalg.norm(f - r) / np.linalg.norm(r) for f, r in zip(feats, reference)])
+            if offset:
+                mode += ' +%gpx' % offset
+            print('| %s | %s | %.2f | %.2f | %.2fx | %.3f |' % (set_name, mode, resolution, elapsed * 1e3,
+                                                               exact_time / elapsed, err))
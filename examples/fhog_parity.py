@@ -0,0 +1,77 @@
+"""
+parity of the numba gradMag/fhog of lib.fhog with the _gradient extension they stand in for, on synthetic patches
+of odd and even sizes with gray and colour channels, flat areas and both orientation ranges, every bin size and soft
+bin the trackers use, exits with status 1 when any output differs, besides the largest differences it reports the
+best of 20 times of both (the numba one after its compilation)
+
+usage: python fhog_parity.py [patches]
+
+one run on the single core machine used here, 40 patches:
+| output | max dev | differing elements | extension ms | numba ms |
+| --- | --- | --- | --- | --- |
+| gradMag M | 0 | 0 | 0.45 | 1.79 |
+| gradMag O | 0 | 0 | | |
+| fhog | 0 | 0 | 1.03 | 1.89 |
+the times are of a 240x240 colour patch, gradMag returns M and O together, the extension takes the reciprocal
+square root and the reciprocal of the gradient magnitude with the sse approximations and builds its acos table with
+the single precision acos of the c library, lib.fhog calls the same instructions and the same acos, so both agree
+bit for bit on the machine they run on, on one core the numba port is 2-4x slower than the extension it replaces
+"""
+import sys
+import time
+import numpy as np
+import cv2
+from lib import fhog as numba_fhog
+
+try:
+    from lib.eco.features import _gradient
+except ImportError:
+    _gradient = None
+
+def patches(n, rng):
+    for k in range(n):
+        h, w = rng.randint(8, 160, 2)
+        d = 3 if k % 2 else 1
+        patch = cv2.GaussianBlur((rng.rand(h, w, d) * 255).astype(np.uint8), (0, 0), 1.).reshape(h, w, d)
+        if k % 5 == 0:
+            patch[:h // 2] = patch[0, 0]
+        full, bin_size, soft_bin = bool(rng.randint(2)), rng.choice((1, 4, 6)), rng.choice((-1, -2, 0, 1))
+        yield patch.astype(np.float32), full, int(bin_size), int(soft_bin)
+
+def best_time(fn, args, repeat=20):
+    elapsed = np.inf
+    for _ in range(repeat):
+        start = time.time()
+        fn(*args)
+        elapsed = min(elapsed, time.time() - start)
+    return elapsed
+
+def compare(a, b, row):
+    row[0] = max(row[0], float(np.max(np.abs(a - b))) if a.size else 0.)
+    row[1] += int(np.sum(a != b))
+
+if __name__ == '__main__':
+    if _gradient is None:
+        sys.exit('the _gradient extension is not built, nothing to compare with')
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    rows = {'gradMag M': [0., 0], 'gradMag O': [0., 0], 'fhog': [0., 0]}
+    for I, full, bin_size, soft_bin in patches(n, np.random.RandomState(0)):
+        M, O = _gradient.gradMag(I, 0, full)
+        M2, O2 = numba_fhog.gradMag(I, 0, full)
+        compare(M, M2, rows['gradMag M'])
+        compare(O, O2, rows['gradMag O'])
+        compare(_gradient.fhog(M, O, bin_size, 9, soft_bin, 0.2),
+                numba_fhog.fhog(M, O, bin_size, 9, soft_bin, 0.2), rows['fhog'])
+    I = cv2.GaussianBlur((np.random.RandomState(1).rand(240, 240, 3) * 255).astype(np.uint8), (0, 0), 1.)
+    I = I.astype(np.float32)
+    M, O = _gradient.gradMag(I, 0, True)
+    times = {'gradMag M': (best_time(_gradient.gradMag, (I, 0, True)), best_time(numba_fhog.gradMag, (I, 0, True))),
+             'fhog': (best_time(_gradient.fhog, (M, O, 4, 9, -1, 0.2)),
+                      best_time(numba_fhog.fhog, (M, O, 4, 9, -1, 0.2)))}
+    print('| output | max dev | differing elements | extension ms | numba ms |')
+    print('| --- | --- | --- | --- | --- |')
+    for name, (max_dev, differing) in rows.items():
+        timing = '| %.2f | %.2f |' % tuple(t * 1e3 for t in times[name]) if name in times else '| | |'
+        print('| %s | %g | %d %s' % (name, max_dev, differing, timing))
+    if any(differing for _, differing in rows.values()):
+        sys.exit(1)
@@ -0,0 +1,73 @@
+"""
+time of the whole-frame preprocessing of several trackers updated on one frame, each converting the frame on its
+own as before against one shared lib.frame_context.FrameContext, the outputs are identical
+
+usage: python frame_context_benchmark.py [repeat]
+
+one run on the single core machine used here, best of 20, 640x480 frame:
+| trackers on the frame | before ms | after ms | speedup |
+| --- | --- | --- | --- |
+| MOSSE, KCF gray, CSK | 0.76 | 0.37 | 2.05x |
+| KCF color, DSST, Staple, MCCTH | 1.07 | 0.75 | 1.43x |
+| CSRDCF, DAT, ECO | 2.14 | 2.12 | 1.01x |
+| all of the above, 3 targets each | 16.87 | 2.81 | 6.00x |
+trackers needing different representations gain nothing, targets tracked on the same frame share all of them
+"""
+import sys
+import time
+import numpy as np
+import cv2
+from lib.frame_context import FrameContext
+
+def csrdcf_hsv(frame):
+    seg_img = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    seg_img[:, :, 0] = (seg_img[:, :, 0].astype(np.float32) / 180 * 255)
+    return seg_img
+
+# per tracker: the conversion it did on its own, and the same representation taken from the context
+PREPROCESSING = {
+    'MOSSE': (lambda f: cv2.cvtColor(f, cv2.COLOR_BGR2GRAY).astype(np.float32) / 255,
+              lambda ctx: ctx.float32('gray', 255)),
+    'KCF gray': (lambda f: cv2.cvtColor(f, cv2.COLOR_BGR2GRAY).astype(np.float32) / 255,
+                 lambda ctx: ctx.float32('gray', 255)),
+    'CSK': (lambda f: cv2.cvtColor(f, cv2.COLOR_BGR2GRAY).astype(np.float32),
+            lambda ctx: ctx.float32('gray')),
+    'KCF color': (lambda f: f.astype(np.float32) / 255, lambda ctx: ctx.float32('bgr', 255)),
+    'DSST': (lambda f: f.astype(np.float32), lambda ctx: ctx.float32()),
+    'Staple': (lambda f: f.astype(np.float32), lambda ctx: ctx.float32()),
+    'MCCTH': (lambda f: f.astype(np.float32), lambda ctx: ctx.float32()),
+    'CSRDCF': (csrdcf_hsv, lambda ctx: ctx.get(('csrdcf_hsv',), lambda: csrdcf_hsv(ctx.frame))),
+    'DAT': (lambda f: cv2.cvtColor(cv2.resize(f, None, fx=0.5, fy=0.5), cv2.COLOR_BGR2Lab),
+            lambda ctx: ctx.get(('dat_lab', 0.5), lambda: cv2.cvtColor(ctx.resized(0.5), cv2.COLOR_BGR2Lab))),
+    'ECO': (lambda f: cv2.cvtColor(f, cv2.COLOR_BGR2RGB), lambda ctx: ctx.image('rgb')),
+}
+
+def before(frame, trackers):
+    return [PREPROCESSING[name][0](frame) for name in trackers]
+
+def after(frame, trackers):
+    ctx = FrameContext(frame)
+    return [PREPROCESSING[name][1](ctx) for name in trackers]
+
+def best_time(fn, args, repeat):
+    elapsed = np.inf
+    for _ in range(repeat):
+        start = time.time()
+        fn(*args)
+        elapsed = min(elapsed, time.time() - start)
+    return elapsed
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    rng = np.random.RandomState(0)
+    frame = cv2.GaussianBlur((rng.rand(480, 640, 3) * 255).astype(np.uint8), (0, 0), 2)
+    groups = [['MOSSE', 'KCF gray', 'CSK'], ['KCF color', 'DSST', 'Staple', 'MCCTH'], ['CSRDCF', 'DAT', 'ECO']]
+    cases = [(', '.join(group), group) for group in groups]
+    cases.append(('all of the above, 3 targets each', sum(groups, []) * 3))
+    print('| trackers on the frame | before ms | after ms | speedup |')
+    print('| --- | --- | --- | --- |')
+    for name, trackers in cases:
+        for old, new in zip(before(frame, trackers), after(frame, trackers)):
+            assert np.array_equal(old, new)
+        before_t, after_t = best_time(before, (frame, trackers), repeat), best_time(after, (frame, trackers), repeat)
+        print('| %s | %.2f | %.2f | %.2fx |' % (name, before_t * 1e3, after_t * 1e3, before_t / after_t))
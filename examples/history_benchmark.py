@@ -0,0 +1,84 @@
+"""
+memory held by MCCTH-Staple and DAT over a long synthetic stream, with every frame kept in lists as before against
+history_size ring buffers (lib.ring_buffer), as the growth of the traced python memory between two points of the
+stream, and the best of 20 times of the MCCTH robustness evaluation of the last frame, which converts the expert
+trajectories to arrays every frame
+
+usage: python history_benchmark.py [frames]
+
+one run on the single core machine used here, 3000 frames of 160x120, growth between frame 500 and the last:
+| tracker | history | growth kB | bytes per frame | robustness ms |
+| --- | --- | --- | --- | --- |
+| MCCTHStaple | lists | 6606.0 | 2643.5 | 4.08 |
+| MCCTHStaple | ring 5 | -58.7 | -23.5 | 2.19 |
+| DAT | lists | 503.6 | 201.5 | - |
+| DAT | ring 7 | -46.1 | -18.4 | - |
+the lists grow by a few tuples and scalars per expert and frame, about 285 MB an hour of a 30 fps stream for MCCTH
+and 22 MB for DAT, the small negative growth of the ring buffers is the warm-up caches of the trackers settling,
+the robustness evaluation converted the whole trajectories and slowed down as they grew, the tracked boxes are
+identical
+"""
+import sys
+import gc
+import time
+import tracemalloc
+import numpy as np
+import cv2
+from cftracker.mccth_staple import MCCTHStaple
+from cftracker.dat import DAT
+from cftracker.config.mccth_staple_config import MCCTHOTBConfig
+from cftracker.config.dat_config import DATConfig
+
+def stream(frames, rng):
+    background = cv2.GaussianBlur((rng.rand(120, 160, 3) * 255).astype(np.uint8), (0, 0), 3)
+    for t in range(frames):
+        frame = background.copy()
+        x, y = int(60 + 20 * np.sin(t / 25.)), int(45 + 15 * np.cos(t / 40.))
+        frame[y:y + 30, x:x + 24] = (40, 180, 220)
+        yield frame
+
+def memory_growth(tracker, frames, start):
+    tracemalloc.start()
+    for t, frame in enumerate(stream(frames, np.random.RandomState(0))):
+        if t == 0:
+            tracker.init(frame, (60, 45, 24, 30))
+        else:
+            tracker.update(frame)
+        if t == start:
+            gc.collect()
+            start_bytes = tracemalloc.get_traced_memory()[0]
+    gc.collect()
+    growth = tracemalloc.get_traced_memory()[0] - start_bytes
+    tracemalloc.stop()
+    return growth
+
+def robustness_time(tracker, repeat=20):
+    elapsed = np.inf
+    for _ in range(repeat):
+        start = time.time()
+        for i in range(tracker.expert_num):
+            tracker.robustness_eva(tracker.experts, i, tracker.frame_idx, tracker.period, tracker.weight,
+                                   tracker.expert_num)
+        elapsed = min(elapsed, time.time() - start)
+    return elapsed
+
+if __name__ == '__main__':
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    start = 500
+    print('| tracker | history | growth kB | bytes per frame | robustness ms |')
+    print('| --- | --- | --- | --- | --- |')
+    for history_size in (None, 5):
+        config = MCCTHOTBConfig()
+        config.scale_adaptation = False
+        config.history_size = history_size
+        tracker = MCCTHStaple(config)
+        growth = memory_growth(tracker, frames, start)
+        print('| MCCTHStaple | %s | %.1f | %.1f | %.2f |' % (
+            'lists' if history_size is None else 'ring %d' % history_size, growth / 1e3,
+            growth / (frames - 1 - start), robustness_time(tracker) * 1e3))
+    for history_size in (None, 7):
+        DATConfig.history_size = history_size
+        growth = memory_growth(DAT(), frames, start)
+        print('| DAT | %s | %.1f | %.1f | - |' % (
+            'lists' if history_size is None else 'ring %d' % history_size, growth / 1e3,
+            growth / (frames - 1 - start)))
@@ -0,0 +1,63 @@
+"""
+time of one detection + one training kernel correlation with lib.kernel_correlation against the per-tracker code
+it replaced (KCF/SAMF/LDES ran one inverse transform per channel and recomputed both self-norms every call)
+
+usage: python kernel_correlation_benchmark.py [repeat]
+
+one run on the single core machine used here, best of 20, 60x60 cells:
+| channels | samples | before ms | after ms | speedup | max rel diff |
+| --- | --- | --- | --- | --- | --- |
+| 1 | 1 | 0.53 | 0.34 | 1.55x | 3.9e-07 |
+| 31 | 1 | 8.45 | 1.90 | 4.45x | 2.2e-05 |
+| 42 | 1 | 14.43 | 2.52 | 5.72x | 2.9e-05 |
+| 42 | 7 | 42.81 | 7.93 | 5.40x | 3.7e-05 |
+the differences are float32 rounding of the reordered channel sum
+"""
+import sys
+import time
+import numpy as np
+from lib.fft_tools import fft2, ifft2
+from lib.kernel_correlation import KernelCorrelation
+
+SIGMA = 0.5
+
+def kernel_correlation_before(xf, yf):
+    N = xf.shape[0] * xf.shape[1]
+    xx = (np.dot(xf.flatten().conj().T, xf.flatten()) / N)
+    yy = (np.dot(yf.flatten().conj().T, yf.flatten()) / N)
+    xyf = xf * np.conj(yf)
+    xy = np.sum(np.real(ifft2(xyf)), axis=2)
+    return fft2(np.exp(-1 / SIGMA ** 2 * np.clip(xx + yy - 2 * xy, a_min=0, a_max=None) / np.size(xf)))
+
+def before(zfs, xf, new_xf):
+    kzf = [kernel_correlation_before(zfs[:, :, :, i], xf) for i in range(zfs.shape[3])]
+    return np.stack(kzf, axis=2), kernel_correlation_before(new_xf, new_xf)
+
+def after(correlation, zfs, new_xf):
+    return correlation.detect(zfs), correlation.auto_correlate(new_xf)
+
+def best_time(fn, args, repeat):
+    elapsed = np.inf
+    for _ in range(repeat):
+        start = time.time()
+        fn(*args)
+        elapsed = min(elapsed, time.time() - start)
+    return elapsed
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    rng = np.random.RandomState(0)
+    print('| channels | samples | before ms | after ms | speedup | max rel diff |')
+    print('| --- | --- | --- | --- | --- | --- |')
+    for channels, samples in ((1, 1), (31, 1), (42, 1), (42, 7)):
+        xf = fft2(rng.randn(60, 60, channels).astype(np.float32))
+        new_xf = fft2(rng.randn(60, 60, channels).astype(np.float32))
+        zfs = fft2(rng.randn(60, 60, channels, samples).astype(np.float32))
+        correlation = KernelCorrelation('gaussian', SIGMA)
+        correlation.set_model(xf)
+        old, new = before(zfs, xf, new_xf), after(correlation, zfs, new_xf)
+        diff = max(np.abs(o - n).max() / np.abs(o).max() for o, n in zip(old, new))
+        before_t = best_time(before, (zfs, xf, new_xf), repeat)
+        after_t = best_time(after, (correlation, zfs, new_xf), repeat)
+        print('| %d | %d | %.2f | %.2f | %.2fx | %.1e |' % (channels, samples, before_t * 1e3, after_t * 1e3,
+                                                           before_t / after_t, diff))
@@ -0,0 +1,95 @@
+"""
+time of the seven MCCTH expert filters of one frame, the detection and the model update with one filter per expert
+over its own concatenated channels as before, against expert_model='groups', the numerators and channel summed
+denominators of the cn, hog1 and hog2 groups learnt once and combined per expert, with the largest difference of
+the expert responses relative to their peak
+
+usage: python mccth_expert_benchmark.py [repeat]
+
+one run on the single core machine used here, best of 50:
+| config | channels | before ms | after ms | speedup | detection before ms | after ms | max rel diff |
+| --- | --- | --- | --- | --- | --- | --- | --- |
+| MCCTHOTBConfig | 43 | 5.64 | 0.95 | 5.94x | 1.96 | 0.48 | 7.2e-08 |
+| MCCTHVOTConfig | 43 | 5.32 | 0.94 | 5.65x | 1.79 | 0.43 | 6.8e-08 |
+the forward transform of the 43 channels was already shared, the experts multiplied 172 channel spectra per
+detection and per update before and 43 after, the division by the per-expert denominator keeps one inverse
+transform per expert, stacked into a single call, the responses only differ by float rounding and the tracked boxes
+of the synthetic sequences used here are identical
+"""
+import sys
+import time
+import numpy as np
+import cv2
+from cftracker.mccth_staple import MCCTHStaple
+from cftracker.config.mccth_staple_config import MCCTHOTBConfig, MCCTHVOTConfig
+from lib.fft_tools import fft2, ifft2
+
+def detect_before(tracker, xtf):
+    # the per-expert detection of MCCTHStaple.update before the groups
+    responses = []
+    for i, xtf_e in enumerate(expert_spectra(tracker, xtf)):
+        expert = tracker.experts[i]
+        hf = expert.hf_num / (np.sum(expert.hf_den, axis=2) + tracker.lambda_)[:, :, None]
+        responses.append(np.real(ifft2(np.sum(np.conj(hf) * xtf_e, axis=2))))
+    return np.stack(responses, axis=2)
+
+def learn_before(tracker, xtf, learning_rate):
+    n = tracker.cf_response_size[0] * tracker.cf_response_size[1]
+    for i, xtf_e in enumerate(expert_spectra(tracker, xtf)):
+        expert = tracker.experts[i]
+        hf_den = np.conj(xtf_e) * xtf_e / n
+        hf_num = np.conj(tracker.yf)[:, :, None] * xtf_e / n
+        if learning_rate is None:
+            expert.hf_den, expert.hf_num = hf_den, hf_num
+        else:
+            expert.hf_den = (1 - learning_rate) * expert.hf_den + learning_rate * hf_den
+            expert.hf_num = (1 - learning_rate) * expert.hf_num + learning_rate * hf_num
+
+def before(tracker, xtf):
+    detect_before(tracker, xtf)
+    learn_before(tracker, xtf, 0.01)
+
+def after(tracker, xtf):
+    tracker.get_expert_responses(xtf)
+    tracker.learn_groups(xtf, 0.01)
+
+def expert_spectra(tracker, xtf):
+    # MCCTHStaple.get_expert_spectra on a spectrum that is already transformed
+    xtf_cn, xtf_hog1, xtf_hog2 = tracker.split_features(xtf)
+    return [xtf_cn, xtf_hog1, xtf_hog2, np.concatenate((xtf_hog1, xtf_cn), axis=2),
+            np.concatenate((xtf_hog2, xtf_cn), axis=2), np.concatenate((xtf_hog1, xtf_hog2), axis=2), xtf]
+
+def best_time(fn, args, repeat):
+    elapsed = np.inf
+    for _ in range(repeat):
+        start = time.time()
+        fn(*args)
+        elapsed = min(elapsed, time.time() - start)
+    return elapsed
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    rng = np.random.RandomState(0)
+    frame = cv2.GaussianBlur((rng.rand(480, 640, 3) * 255).astype(np.uint8), (0, 0), 2)
+    print('| config | channels | before ms | after ms | speedup | detection before ms | after ms | max rel diff |')
+    print('| --- | --- | --- | --- | --- | --- | --- | --- |')
+    for config in (MCCTHOTBConfig(), MCCTHVOTConfig()):
+        tracker = MCCTHStaple(config)
+        tracker.init(frame, (290, 220, 60, 80))
+        xt = tracker.get_feature_map(tracker.get_sub_window(frame, tracker._center, tracker.norm_bg_area,
+                                                            tracker.bg_area), tracker.cell_size)
+        xtf = fft2(tracker._window[:, :, None] * xt)
+        shifted = fft2(tracker._window[:, :, None] * np.roll(xt, 1, axis=1))
+        learn_before(tracker, xtf, None)
+        tracker.learn_groups(xtf)
+        learn_before(tracker, shifted, 0.1)
+        tracker.learn_groups(shifted, 0.1)
+        old, new = detect_before(tracker, xtf), tracker.get_expert_responses(xtf)
+        diff = np.max(np.abs(old - new) / np.max(np.abs(old), axis=(0, 1)))
+        detect_before_t = best_time(detect_before, (tracker, xtf), repeat)
+        detect_after_t = best_time(tracker.get_expert_responses, (xtf,), repeat)
+        before_t = best_time(before, (tracker, xtf), repeat)
+        after_t = best_time(after, (tracker, xtf), repeat)
+        print('| %s | %d | %.2f | %.2f | %.2fx | %.2f | %.2f | %.1e |' % (
+            type(config).__name__, xtf.shape[2], before_t * 1e3, after_t * 1e3, before_t / after_t,
+            detect_before_t * 1e3, detect_after_t * 1e3, diff))
@@ -0,0 +1,156 @@
+"""
+parity of the use_rfft half spectrum path of every tracker that has one with its full spectrum path, each tracker
+runs both ways on the same synthetic sequences (a textured target moving over a blurred background), the script
+exits with status 1 when any box differs, besides the largest box difference it reports the time spent in the
+lib.fft_tools transforms per frame, the whole frame time (init included) and the bytes of complex spectra the
+tracker holds after the last frame
+
+usage: python rfft_parity.py [sequences] [frames]
+
+one run on the single core machine used here, 3 sequences of 40 frames, numpy backend:
+| tracker | max box dev | fft ms/frame full | rfft | frame ms full | rfft | spectra KB full | rfft |
+| --- | --- | --- | --- | --- | --- | --- | --- |
+| MOSSE | 0 | 0.16 | 0.15 | 0.5 | 0.5 | 28.1 | 15.0 |
+| CSK | 0 | 0.63 | 0.47 | 1.1 | 1.0 | 150.0 | 77.5 |
+| KCF_GRAY | 0 | 0.74 | 0.72 | 1.2 | 1.4 | 175.8 | 89.1 |
+| KCF_HOG | 0 | 0.55 | 0.43 | 1.4 | 1.2 | 116.0 | 64.5 |
+| KCF_CN | 0 | 1.86 | 1.11 | 3.7 | 2.5 | 487.5 | 251.9 |
+| DCF_HOG | 0 | 0.34 | 0.27 | 0.9 | 0.8 | 116.0 | 64.5 |
+| CN | 0 | 2.07 | 1.31 | 3.5 | 2.5 | 525.0 | 271.2 |
+| DSST | 0 | 4.52 | 2.28 | 9.7 | 6.7 | 2179.8 | 1128.5 |
+| Staple | 0 | 1.48 | 1.26 | 8.4 | 7.8 | 990.3 | 705.3 |
+| Staple-CA | 0 | 13.00 | 7.94 | 25.6 | 18.6 | 2833.3 | 1642.1 |
+| BACF | 0 | 20.82 | 16.16 | 36.1 | 28.9 | 1834.6 | 938.6 |
+| STRCF | 0 | 22.37 | 15.50 | 38.4 | 27.4 | 1227.9 | 628.2 |
+| SAMF | 0 | 1.93 | 1.41 | 10.8 | 9.7 | 1188.3 | 660.2 |
+| MKCFup | 0 | 0.49 | 0.47 | 4.8 | 5.0 | 62.8 | 37.8 |
+| LDES | 0 | 13.09 | 8.32 | 45.8 | 39.8 | 283.6 | 147.5 |
+the half spectra halve the held spectra everywhere, the time saved is the fft share of the frame, MKCFup spends
+a tenth of its frame in 17 transforms of 25x18 maps, where the per-call overhead and not the arithmetic is the cost,
+and its interpolated response and 1-D scale transforms stay full, so it gains nothing, LDES saves 5 ms of transforms
+but they are under a third of its frame (log-polar phase correlation, features), hence about 1.15x overall,
+the single runs are a few percent noisy, CSK needs its transforms in lib.precision's double precision default to
+pass: its gaussian kernel stays within 1% of 1 and complex64 rounding, different for fft and rfft, flipped detections
+"""
+import sys
+import time
+import numpy as np
+import cv2
+from lib.fft_tools import fft_engine
+from cftracker.mosse import MOSSE
+from cftracker.csk import CSK
+from cftracker.kcf import KCF
+from cftracker.cn import CN
+from cftracker.dsst import DSST
+from cftracker.staple import Staple
+from cftracker.bacf import BACF
+from cftracker.strcf import STRCF
+from cftracker.samf import SAMF
+from cftracker.mkcfup import MKCFup
+from cftracker.ldes import LDES
+from cftracker.config import cn_config,dsst_config,staple_config,bacf_config,strdcf_hc_config,mkcf_up_config,\
+    ldes_config
+
+def configured(config, use_rfft):
+    config.use_rfft = use_rfft
+    return config
+
+trackers = {
+    'MOSSE': lambda rf: MOSSE(use_rfft=rf),
+    'CSK': lambda rf: CSK(use_rfft=rf),
+    'KCF_GRAY': lambda rf: KCF(features='gray', kernel='gaussian', use_rfft=rf),
+    'KCF_HOG': lambda rf: KCF(features='hog', kernel='gaussian', use_rfft=rf),
+    'KCF_CN': lambda rf: KCF(features='cn', kernel='gaussian', use_rfft=rf),
+    'DCF_HOG': lambda rf: KCF(features='hog', kernel='linear', use_rfft=rf),
+    'CN': lambda rf: CN(configured(cn_config.CNConfig(), rf)),
+    'DSST': lambda rf: DSST(configured(dsst_config.DSSTConfig(), rf)),
+    'Staple': lambda rf: Staple(configured(staple_config.StapleConfig(), rf)),
+    'Staple-CA': lambda rf: Staple(configured(staple_config.StapleCAConfig(), rf)),
+    'BACF': lambda rf: BACF(configured(bacf_config.BACFConfig(), rf)),
+    'STRCF': lambda rf: STRCF(configured(strdcf_hc_config.STRDCFHCConfig(), rf)),
+    'SAMF': lambda rf: SAMF(use_rfft=rf),
+    'MKCFup': lambda rf: MKCFup(configured(mkcf_up_config.MKCFupConfig(), rf)),
+    'LDES': lambda rf: LDES(configured(ldes_config.LDESDemoLinearConfig(), rf)),
+}
+
+def sequence(n, seed, h=240, w=320):
+    rng = np.random.RandomState(seed)
+    background = cv2.GaussianBlur((rng.rand(h, w, 3) * 255).astype(np.uint8), (0, 0), 3)
+    target = cv2.GaussianBlur((rng.rand(40, 30, 3) * 255).astype(np.uint8), (0, 0), 1.5)
+    frames = []
+    for i in range(n):
+        frame = background.copy()
+        x, y = 140 + 2 * i, 100 + int(np.round(3 * np.sin(i / 5.)))
+        frame[y:y + 40, x:x + 30] = target
+        frames.append(frame)
+    return frames, (140, 100, 30, 40)
+
+class TransformTimer:
+    # wraps the transforms of the shared fft engine, every tracker transform goes through them
+    def __init__(self):
+        self.elapsed = 0.
+        for name in ('_execute', '_execute_1d'):
+            setattr(fft_engine, name, self._timed(getattr(fft_engine, name)))
+
+    def _timed(self, fn):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            result = fn(*args, **kwargs)
+            self.elapsed += time.perf_counter() - start
+            return result
+        return timed
+
+def spectral_bytes(obj, seen=None, depth=3):
+    # complex arrays held by the tracker and by its solver, correlation and stack objects
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes if np.iscomplexobj(obj) else 0
+    if depth == 0:
+        return 0
+    if isinstance(obj, dict):
+        values = obj.values()
+    elif isinstance(obj, (list, tuple)):
+        values = obj
+    elif hasattr(obj, '__dict__'):
+        values = vars(obj).values()
+    else:
+        return 0
+    return sum(spectral_bytes(value, seen, depth - 1) for value in values)
+
+def track(tracker, frames, bbox):
+    # MOSSE trains on random warps of the first frame, both paths get the same ones
+    np.random.seed(0)
+    start = time.perf_counter()
+    tracker.init(frames[0], bbox)
+    boxes = np.array([tracker.update(frame) for frame in frames[1:]], dtype=np.float64)
+    return boxes, tracker, time.perf_counter() - start
+
+if __name__ == '__main__':
+    num_sequences = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    num_frames = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    sequences = [sequence(num_frames, seed) for seed in range(num_sequences)]
+    timer = TransformTimer()
+    print('| tracker | max box dev | fft ms/frame full | rfft | frame ms full | rfft | spectra KB full | rfft |')
+    print('| --- | --- | --- | --- | --- | --- | --- | --- |')
+    failed = []
+    for name, make in trackers.items():
+        boxes, fft_ms, frame_ms, spectra = {}, {}, {}, {}
+        for use_rfft in (False, True):
+            # one untimed run absorbs plan building and jit compilation
+            track(make(use_rfft), sequences[0][0][:3], sequences[0][1])
+            timer.elapsed = 0.
+            runs = [track(make(use_rfft), frames, bbox) for frames, bbox in sequences]
+            boxes[use_rfft] = np.concatenate([run[0] for run in runs])
+            fft_ms[use_rfft] = timer.elapsed * 1e3 / (num_sequences * num_frames)
+            frame_ms[use_rfft] = sum(run[2] for run in runs) * 1e3 / (num_sequences * num_frames)
+            spectra[use_rfft] = spectral_bytes(runs[-1][1]) / 1024.
+        max_dev = float(np.max(np.abs(boxes[True] - boxes[False])))
+        if max_dev > 0:
+            failed.append(name)
+        print('| %s | %g | %.2f | %.2f | %.1f | %.1f | %.1f | %.1f |' % (
+            name, max_dev, fft_ms[False], fft_ms[True], frame_ms[False], frame_ms[True], spectra[False], spectra[True]))
+    if failed:
+        sys.exit('boxes differ for ' + ', '.join(failed))
@@ -0,0 +1,154 @@
+"""
+time of the 17 scale samples of one DSST scale filter update (a detection and the training call after it on the
+same frame) cropped and resized per scale as before against lib.scale_pyramid.ScaleSamplePyramid, with and
+without a scale change between the two calls, and the correlation of both hog matrices, then the centre error and
+speed of DSST, Staple and ECO with scale_sampling None and 'pyramid' on 5 synthetic sequences of targets from 40x60
+to 240x320 that grow by 30% and shrink back
+
+usage: python scale_pyramid_benchmark.py [repeat] [frames]
+
+one run on the single core machine used here, best of 20, 640x480 frame:
+| target | scale change | before ms | after ms | speedup | hog correlation | 1px shift correlation |
+| --- | --- | --- | --- | --- | --- | --- |
+| 20x30 | yes | 0.71 | 1.24 | 0.57x | 0.96 | 0.88 |
+| 20x30 | no | 0.66 | 0.65 | 1.01x | 0.96 | 0.88 |
+| 60x80 | yes | 1.02 | 1.32 | 0.77x | 0.96 | 0.73 |
+| 60x80 | no | 1.16 | 0.74 | 1.57x | 0.96 | 0.73 |
+| 200x300 | yes | 7.20 | 1.82 | 3.95x | 0.98 | 0.78 |
+| 200x300 | no | 6.53 | 0.96 | 6.80x | 0.98 | 0.78 |
+60 frames of 960x720 per sequence:
+| tracker | centre error px crop | pyramid | worst sequence crop | pyramid | fps crop | pyramid |
+| --- | --- | --- | --- | --- | --- | --- |
+| DSST | 1.05 | 1.08 | 1.5 | 1.6 | 3.2 | 3.3 |
+| Staple | 4.39 | 4.41 | 7.6 | 7.6 | 35.9 | 86.6 |
+| ECO | 8.47 | 7.95 | 18.4 | 17.9 | 75.4 | 74.1 |
+the last column of the first table correlates the crops with the same crops moved by one pixel, the scale hog is
+that sensitive, the samples are box means of the frame like the per-scale INTER_AREA resize (the remaining
+difference is the bilinear shift of getRectSubPix), the pyramid only bounds the size of the integral image, so the
+cost no longer grows with the target but a small target pays about 0.3 ms more per call than two cv2 calls per
+scale, the gain is the reuse of the hog matrix after a detection at an unchanged scale and large targets,
+the trackers keep their accuracy, ECO's crops are resized linearly without averaging (the INTER_CUBIC of its
+cv2.resize call is taken as dst) so its pyramid samples differ more and its errors move both ways, DSST spends its
+frame on the translation filter, ECO on its features and solver
+"""
+import sys
+import time
+import numpy as np
+import cv2
+from cftracker.feature import extract_hog_feature
+from lib.scale_pyramid import ScaleSamplePyramid
+from lib.eco.config import gpu_config, otb_hc_config
+
+gpu_config.use_gpu = False
+from cftracker.eco import ECO
+from cftracker.dsst import DSST
+from cftracker.staple import Staple
+from cftracker.config.dsst_config import DSSTConfig
+from cftracker.config.staple_config import StapleConfig
+
+NUM_SCALES = 17
+SCALE_STEP = 1.02
+SCALE_MODEL_MAX_AREA = 32 * 16
+
+def scale_model_size(target_sz):
+    factor = min(1., np.sqrt(SCALE_MODEL_MAX_AREA / (target_sz[0] * target_sz[1])))
+    return int(np.floor(target_sz[0] * factor)), int(np.floor(target_sz[1] * factor))
+
+def extract_before(im, pos, base_target_sz, scales, model_sz):
+    # the per-scale crop of DSSTScaleEstimator._extract_scale_sample
+    scale_sample = []
+    for scale in scales:
+        patch_sz = np.floor(np.array(base_target_sz) * scale)
+        im_patch = cv2.getRectSubPix(im, (int(patch_sz[0]), int(patch_sz[1])), pos)
+        interpolation = cv2.INTER_LINEAR if model_sz[0] > patch_sz[1] else cv2.INTER_AREA
+        im_patch_resized = cv2.resize(im_patch, model_sz, interpolation=interpolation).astype(np.uint8)
+        scale_sample.append(extract_hog_feature(im_patch_resized, cell_size=4).reshape((-1, 1)))
+    return np.concatenate(scale_sample, axis=1)
+
+def before(im, pos, base_target_sz, scales, train_scales, model_sz):
+    return extract_before(im, pos, base_target_sz, scales, model_sz), \
+           extract_before(im, pos, base_target_sz, train_scales, model_sz)
+
+def after(pyramid, im, pos, base_target_sz, scales, train_scales):
+    pyramid.reset()
+    return pyramid.extract(im, pos, base_target_sz, scales), pyramid.extract(im, pos, base_target_sz, train_scales)
+
+def scaling_sequence(n, seed, target_sz, h=720, w=960):
+    # a textured target growing by 30% and shrinking back while it moves over a blurred background
+    rng = np.random.RandomState(seed)
+    background = cv2.GaussianBlur((rng.rand(h, w, 3) * 255).astype(np.uint8), (0, 0), 3)
+    texture = cv2.GaussianBlur((rng.rand(2 * target_sz[1], 2 * target_sz[0], 3) * 255).astype(np.uint8), (0, 0), 3)
+    frames, centres = [], []
+    for i in range(n):
+        scale = 1 + 0.3 * np.sin(np.pi * i / (n - 1))
+        tw, th = int(round(target_sz[0] * scale)), int(round(target_sz[1] * scale))
+        x = int(round(w / 2 - 40 + 1.5 * i - tw / 2))
+        y = int(round(h / 2 + 10 * np.sin(i / 8.) - th / 2))
+        frame = background.copy()
+        frame[y:y + th, x:x + tw] = cv2.resize(texture, (tw, th), interpolation=cv2.INTER_AREA)
+        frames.append(frame)
+        centres.append((x + tw / 2, y + th / 2))
+    return frames, (centres[0][0] - target_sz[0] / 2, centres[0][1] - target_sz[1] / 2) + target_sz, np.array(centres)
+
+def create_tracker(name, scale_sampling):
+    if name == 'ECO':
+        return ECO(type('Config', (otb_hc_config.OTBHCConfig,), {'scale_sampling': scale_sampling})())
+    if name == 'DSST':
+        config = DSSTConfig()
+        config.scale_config = type('ScaleConfig', (DSSTConfig.ScaleConfig,), {'scale_sampling': scale_sampling})()
+        return DSST(config)
+    config = StapleConfig()
+    config.scale_sampling = scale_sampling
+    return Staple(config)
+
+def centre_error(tracker, frames, bbox, centres):
+    tracker.init(frames[0], bbox)
+    boxes = np.array([tracker.update(frame) for frame in frames[1:]], dtype=np.float64)
+    return np.linalg.norm(boxes[:, :2] + boxes[:, 2:] / 2 - centres[1:], axis=1)
+
+def best_time(fn, args, repeat):
+    elapsed = np.inf
+    for _ in range(repeat):
+        start = time.time()
+        fn(*args)
+        elapsed = min(elapsed, time.time() - start)
+    return elapsed
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    num_frames = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    rng = np.random.RandomState(0)
+    frame = cv2.GaussianBlur((rng.rand(480, 640, 3) * 255).astype(np.uint8), (0, 0), 2).astype(np.float32)
+    pos = (320.3, 240.6)
+    scales = SCALE_STEP ** (np.ceil(NUM_SCALES / 2) - np.arange(1, NUM_SCALES + 1))
+    print('| target | scale change | before ms | after ms | speedup | hog correlation | 1px shift correlation |')
+    print('| --- | --- | --- | --- | --- | --- | --- |')
+    for target_sz in ((20, 30), (60, 80), (200, 300)):
+        model_sz = scale_model_size(target_sz)
+        pyramid = ScaleSamplePyramid(model_sz)
+        for changed in (True, False):
+            train_scales = scales * SCALE_STEP if changed else scales
+            args = (frame, pos, target_sz, scales, train_scales)
+            old, new = before(*(args + (model_sz,))), after(pyramid, *args)
+            corr = np.corrcoef(old[0].ravel(), new[0].ravel())[0, 1]
+            shifted = extract_before(frame, (pos[0] + 1, pos[1]), target_sz, scales, model_sz)
+            shift_corr = np.corrcoef(old[0].ravel(), shifted.ravel())[0, 1]
+            before_t = best_time(before, args + (model_sz,), repeat)
+            after_t = best_time(after, (pyramid,) + args, repeat)
+            print('| %dx%d | %s | %.2f | %.2f | %.2fx | %.2f | %.2f |' % (
+                target_sz[0], target_sz[1], 'yes' if changed else 'no', before_t * 1e3, after_t * 1e3,
+                before_t / after_t, corr, shift_corr))
+    sequences = [scaling_sequence(num_frames, seed, target_sz)
+                 for seed, target_sz in enumerate(((40, 60), (90, 120), (150, 200), (200, 300), (240, 320)))]
+    print('| tracker | centre error px crop | pyramid | worst sequence crop | pyramid | fps crop | pyramid |')
+    print('| --- | --- | --- | --- | --- | --- | --- |')
+    for name in ('DSST', 'Staple', 'ECO'):
+        errors, fps = {}, {}
+        for scale_sampling in (None, 'pyramid'):
+            start = time.time()
+            errors[scale_sampling] = [np.mean(centre_error(create_tracker(name, scale_sampling), *sequence))
+                                      for sequence in sequences]
+            fps[scale_sampling] = len(sequences) * (num_frames - 1) / (time.time() - start)
+        print('| %s | %.2f | %.2f | %.1f | %.1f | %.1f | %.1f |' % (
+            name, np.mean(errors[None]), np.mean(errors['pyramid']), np.max(errors[None]),
+            np.max(errors['pyramid']), fps[None], fps['pyramid']))
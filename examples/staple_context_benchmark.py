@@ -0,0 +1,60 @@
+"""
+time of the context-aware training samples of Staple-CA, the target patch and its four context patches cropped,
+resized and described on their own against context_sampling='shared', one crop and one feature pass over the
+region covering all of them, for the features alone and for the whole get_context_spectra
+
+usage: python staple_context_benchmark.py [repeat]
+
+one run on the single core machine used here, best of 50, 640x480 frame:
+| target | features before ms | after ms | speedup | spectra before ms | after ms | speedup |
+| --- | --- | --- | --- | --- | --- | --- |
+| 20x30 | 4.43 | 2.80 | 1.58x | 9.23 | 7.85 | 1.18x |
+| 60x80 | 3.47 | 3.05 | 1.14x | 17.41 | 16.75 | 1.04x |
+| 200x300 | 11.43 | 9.11 | 1.25x | 21.92 | 19.81 | 1.11x |
+the context patches are one target size away and the target patch is about twice the target, so the region covering
+them is still about 3 target patches of pixels instead of 5, and the transform of the five samples dominates,
+the shared target features differ from the cropped ones about as much as after a quarter pixel shift
+"""
+import sys
+import time
+import numpy as np
+import cv2
+from cftracker.staple import Staple
+from cftracker.config.staple_config import StapleCAConfig
+
+def best_time(fn, args, repeat):
+    elapsed = np.inf
+    for _ in range(repeat):
+        start = time.time()
+        fn(*args)
+        elapsed = min(elapsed, time.time() - start)
+    return elapsed
+
+def cropped_feature_maps(tracker, im):
+    # the per-patch features get_context_spectra computes without the shared region
+    for dx, dy in [(0, 0)] + tracker.offset:
+        im_patch = tracker.get_sub_window(im, (tracker._center[0] + dx, tracker._center[1] + dy),
+                                          tracker.norm_bg_area, tracker.bg_area)
+        tracker.get_feature_map(im_patch, tracker.hog_cell_size)
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    rng = np.random.RandomState(0)
+    frame = sum(cv2.GaussianBlur((rng.rand(480, 640, 3) * 255).astype(np.float32), (0, 0), s) * np.sqrt(s)
+                for s in (1, 4, 16))
+    frame = ((frame - frame.min()) / np.ptp(frame) * 255).astype(np.uint8)
+    print('| target | features before ms | after ms | speedup | spectra before ms | after ms | speedup |')
+    print('| --- | --- | --- | --- | --- | --- | --- |')
+    for w, h in ((20, 30), (60, 80), (200, 300)):
+        config = StapleCAConfig()
+        config.scale_adaptation = False
+        tracker = Staple(config)
+        tracker.init(frame, (320 - w // 2, 240 - h // 2, w, h))
+        features_before = best_time(cropped_feature_maps, (tracker, frame), repeat)
+        spectra_before = best_time(tracker.get_context_spectra, (frame,), repeat)
+        tracker.context_sampling = 'shared'
+        features_after = best_time(tracker.get_shared_feature_maps, (frame,), repeat)
+        spectra_after = best_time(tracker.get_context_spectra, (frame,), repeat)
+        print('| %dx%d | %.2f | %.2f | %.2fx | %.2f | %.2f | %.2fx |' % (
+            w, h, features_before * 1e3, features_after * 1e3, features_before / features_after,
+            spectra_before * 1e3, spectra_after * 1e3, spectra_before / spectra_after))
@@ -0,0 +1,77 @@
+"""
+time of the projection bases of one frame recomputed as before (qr or svd every frame) against
+lib.subspace.IncrementalSubspace, on a running model updated with the scale filter learning rate from samples that
+drift slowly, with the largest angle between the kept and the exact subspace over the sequence
+
+usage: python subspace_benchmark.py [frames]
+
+one run on the single core machine used here, 200 frames:
+| basis | matrix | before ms | after ms | speedup | exact updates | max sin angle |
+| --- | --- | --- | --- | --- | --- | --- |
+| scale filter 'MAX' | 992x17 | 0.43 | 0.00 | - | 0 | 0 |
+| dsst scale filter, 8 dims | 992x17 | 23.54 | 0.66 | 35.64x | 20 | 3.5e-03 |
+| mkcfup pca, 4 dims | 31x31 | 0.23 | 0.12 | 1.91x | 20 | 5.3e-03 |
+'MAX' bases span every sample so the incremental mode drops the projection and both qr, the dsst row only times
+the basis of the running model (the full svd it replaces builds a 992x992 u), the basis of each new sample ends up
+recomputed exactly in both modes, consecutive samples are not close enough to warm start
+"""
+import sys
+import time
+import numpy as np
+import scipy.linalg
+from lib.subspace import IncrementalSubspace
+
+LEARNING_RATE = 0.025
+
+def sequence(shape, rank, frames, rng):
+    # samples around a low rank mean that drifts slowly, and the running model they are learnt into
+    mean = rng.rand(shape[0], rank).dot(rng.rand(rank, shape[1])).astype(np.float32)
+    model = None
+    for _ in range(frames):
+        mean += 0.01 * rng.randn(*shape).astype(np.float32)
+        sample = mean + 0.05 * rng.randn(*shape).astype(np.float32)
+        model = sample if model is None else (1 - LEARNING_RATE) * model + LEARNING_RATE * sample
+        yield model
+
+def max_scale_before(a):
+    # the scale filters take one qr of the model and one of the new sample, both of this size
+    basis, _ = scipy.linalg.qr(a, mode='economic')
+    scipy.linalg.qr(a, mode='economic')
+    return basis
+
+def svd_before(num_dim):
+    def basis(a):
+        u, _, _ = np.linalg.svd(a)
+        return u[:, :num_dim]
+    return basis
+
+def sin_angle(exact, basis):
+    return np.linalg.norm(exact - basis.dot(basis.T.dot(exact)), 2)
+
+if __name__ == '__main__':
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    cases = [("scale filter 'MAX'", (992, 17), 12, max_scale_before, None, lambda a: a),
+             ('dsst scale filter, 8 dims', (992, 17), 12, svd_before(8), IncrementalSubspace(8), lambda a: a),
+             ('mkcfup pca, 4 dims', (900, 31), 8, svd_before(4), IncrementalSubspace(4, symmetric=True),
+              lambda a: a.T.dot(a))]
+    print('| basis | matrix | before ms | after ms | speedup | exact updates | max sin angle |')
+    print('| --- | --- | --- | --- | --- | --- | --- |')
+    for name, shape, rank, before, subspace, matrix in cases:
+        before_t = after_t = 0.
+        angle = 0.
+        for model in sequence(shape, rank, frames, np.random.RandomState(0)):
+            a = matrix(model)
+            start = time.time()
+            before(a)
+            before_t += time.time() - start
+            if subspace is not None:
+                start = time.time()
+                basis = subspace.update(a)
+                after_t += time.time() - start
+                angle = max(angle, sin_angle(subspace.exact(a), basis))
+        if subspace is None:
+            print('| %s | %dx%d | %.2f | 0.00 | - | 0 | 0 |' % (name, a.shape[0], a.shape[1], before_t / frames * 1e3))
+        else:
+            print('| %s | %dx%d | %.2f | %.2f | %.2fx | %d | %.1e |' % (
+                name, a.shape[0], a.shape[1], before_t / frames * 1e3, after_t / frames * 1e3, before_t / after_t,
+                subspace.num_exact, angle))
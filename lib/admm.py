@@ -0,0 +1,291 @@
+"""
+ADMM solvers of the background-aware (BACF) and spatial-temporal (STRCF) correlation filters,
+BACFSolver keeps the crop of the filter to its support and the zero padding back to the feature map size as index
+operators built once per init, every spectrum of the iterations lives in a workspace allocated once per map size and
+updated in place, the terms that vanish on the first iteration (h and l start at zero) and the h and l updates the
+last iteration would throw away are skipped,
+without adaptive both solvers run the fixed penalty schedule from zero every frame and give the filter of the
+trackers' own ADMM loops,
+in adaptive mode both solvers start from the auxiliary variables, multipliers and penalty of the previous frame,
+stop as soon as the primal and dual residuals (boyd et al., section 3.3) are below tol relative to the iterates and
+balance the two with the penalty (section 3.4.1, with the normalised residuals of wohlberg 2017), iterations is then
+the maximum per frame, a cold solve (the first frame) keeps the fixed penalty schedule and so gives the same
+filter unless it stops early, a warm one does not: with the 2 iterations the trackers are tuned for the cold filter
+is not a converged ADMM solution, no warm start reproduces it and the tracked trajectory moves,
+the dual residual is taken relative to penalty*|z| of the constrained filter z, that is the relative change of z, the multipliers vanish as the two filters agree so relative to them a solve would never stop,
+with half_spectrum the spectra are the rfft2 half spectra of the real maps and the norms are hermitian weighted
+"""
+import numpy as np
+from .fft_tools import fft_engine, fft2, ifft2, rfft2, irfft2, half_spectrum_energy
+
+def _norm(x, w=None):
+    # frobenius norm of a spectrum of any memory layout without copying it, of the full spectrum of width w when x
+    # is a half spectrum
+    if w is not None:
+        return np.sqrt(half_spectrum_energy(x, w))
+    x = x.ravel(order='K')
+    return np.sqrt(np.vdot(x, x).real)
+
+def relative_residuals(primal, dual, x_norm, z_norm):
+    # primal |x-z| and dual |z-z_prev| of the filter x and the constrained filter z relative to max(|x|,|z|) and |z|,
+    # the penalty cancels out of the dual residual penalty*|z-z_prev| relative to penalty*|z|
+    tiny = np.finfo(np.float32).tiny
+    return primal / max(x_norm, z_norm, tiny), dual / max(z_norm, tiny)
+
+def balance_penalty(penalty, primal, dual, max_penalty, ratio=10., step=2.):
+    # raise the penalty when the constraint lags behind, lower it when the iterates move more than they agree
+    if primal > ratio * dual:
+        return min(penalty * step, max_penalty)
+    if dual > ratio * primal:
+        return penalty / step
+    return penalty
+
+def _support(start, length, size):
+    # indices of the filter support along one axis, clamped to the map like get_subwindow_no_window
+    ix = np.clip(start + np.arange(length), 0, size - 1)
+    if np.all(np.diff(ix) == 1):
+        return slice(int(ix[0]), int(ix[-1]) + 1)
+    return ix
+
+class BACFSolver:
+    """
+    map_sz=(w,h) of the feature map, filter_sz=(w,h) of the filter support centred on (w//2,h//2), yf the h*w label
+    spectrum, solve returns the filter spectrum of a h*w*c sample spectrum in the workspace, so it is only valid
+    until the next solve, num_iterations is the number of filter updates of the last solve
+    """
+
+    def __init__(self, map_sz, filter_sz, yf, admm_lambda, iterations=2, mu=1, beta=10, mumax=10000,
+                 adaptive=False, tol=5e-2, half_spectrum=False):
+        self.map_sz = (int(map_sz[0]), int(map_sz[1]))
+        self.half_spectrum = half_spectrum
+        self._norm_w = self.map_sz[0] if half_spectrum else None
+        self.yf = yf
+        self.admm_lambda = admm_lambda
+        self.iterations = iterations
+        self.mu = mu
+        self.beta = beta
+        self.mumax = mumax
+        self.adaptive = adaptive
+        self.tol = tol
+        self.num_iterations = 0
+        self.primal_residual = None
+        self.dual_residual = None
+        self._warm_mu = None
+        ys = _support(int(self.map_sz[1] / 2) - int(np.floor(filter_sz[1] / 2)), int(filter_sz[1]), self.map_sz[1])
+        xs = _support(int(self.map_sz[0] / 2) - int(np.floor(filter_sz[0] / 2)), int(filter_sz[0]), self.map_sz[0])
+        if isinstance(ys, slice) and isinstance(xs, slice):
+            self._crop = (ys, xs)
+        else:
+            self._crop = np.ix_(np.r_[ys], np.r_[xs])
+        self._shape = None
+
+    def _allocate(self, xf):
+        shape = xf.shape
+        if self._shape == shape and self.g_f.dtype == xf.dtype and self.g_f.strides == xf.strides:
+            return
+        self._shape = shape
+        self._warm_mu = None
+        # the spectra keep the memory layout of xf, so that the channel sums add in the same order as np.sum on
+        # the products of the legacy solver
+        self.conj_xf, self.yxf, self.xsy, self.g_f, self.h_f, self.l_f, self.tmp0, self.work = \
+            (np.empty_like(xf) for _ in range(8))
+        if self.half_spectrum:
+            # the filter itself is real and has the full width
+            map_shape = (self.map_sz[1], self.map_sz[0]) + shape[2:]
+            self.h = np.empty(map_shape, dtype=xf.real.dtype)
+            self.padded = np.zeros(map_shape, dtype=xf.real.dtype)
+        else:
+            self.h = np.empty_like(xf)
+            # the padded filter keeps zeros outside the support, only the support is written
+            self.padded = np.zeros(shape, dtype=xf.dtype)
+        self.s_xx, self.b, self.s_lx, self.s_hx = (np.empty(shape[:2], dtype=xf.dtype) for _ in range(4))
+        if self.adaptive:
+            self.h_prev = np.empty_like(xf)
+
+    def reset(self):
+        # the next adaptive solve starts from zero like the fixed schedule
+        self._warm_mu = None
+
+    def _solve_g(self, xf, t, mu, zero_aux):
+        np.add(self.s_xx, t * mu, out=self.b)
+        np.multiply(self.yxf, 1 / (t * mu), out=self.tmp0)
+        np.multiply(self.xsy, 1 / (t * mu), out=self.work)
+        if not zero_aux:
+            np.multiply(self.conj_xf, self.l_f, out=self.g_f)
+            np.sum(self.g_f, axis=2, out=self.s_lx)
+            np.multiply(self.conj_xf, self.h_f, out=self.g_f)
+            np.sum(self.g_f, axis=2, out=self.s_hx)
+            np.multiply(self.l_f, 1 / mu, out=self.g_f)
+            self.tmp0 -= self.g_f
+            self.tmp0 += self.h_f
+            np.multiply(xf, self.s_lx[:, :, None], out=self.g_f)
+            self.g_f *= 1 / mu
+            self.work -= self.g_f
+            np.multiply(xf, self.s_hx[:, :, None], out=self.g_f)
+            self.work += self.g_f
+        self.work /= self.b[:, :, None]
+        np.subtract(self.tmp0, self.work, out=self.g_f)
+
+    def _solve_h(self, t, mu, zero_aux):
+        # the filter cropped to its support and padded back, then the multiplier step, returns |g-h|
+        np.multiply(self.g_f, mu, out=self.work)
+        if not zero_aux:
+            self.work += self.l_f
+        if self.half_spectrum:
+            fft_engine.irfft2(self.work, self.h.shape[:2], out=self.h)
+        else:
+            fft_engine.ifft2(self.work, out=self.h)
+        if isinstance(self._crop[0], slice):
+            np.multiply(self.h[self._crop], t / ((mu * t) + self.admm_lambda), out=self.padded[self._crop])
+        else:
+            self.padded[self._crop] = self.h[self._crop] * (t / ((mu * t) + self.admm_lambda))
+        if self.half_spectrum:
+            fft_engine.rfft2(self.padded, out=self.h_f)
+        else:
+            fft_engine.fft2(self.padded, out=self.h_f)
+        np.subtract(self.g_f, self.h_f, out=self.work)
+        primal = _norm(self.work, self._norm_w) if self.adaptive else None
+        self.work *= mu
+        if not zero_aux:
+            self.l_f += self.work
+        else:
+            self.l_f[...] = self.work
+        return primal
+
+    def solve(self, xf):
+        self._allocate(xf)
+        t = self.map_sz[0] * self.map_sz[1]
+        np.conj(xf, out=self.conj_xf)
+        np.multiply(self.conj_xf, xf, out=self.work)
+        np.sum(self.work, axis=2, out=self.s_xx)
+        # yf*xf and xf*S_xx*yf do not change over the iterations
+        np.multiply(self.yf[:, :, None], xf, out=self.yxf)
+        np.multiply(self.s_xx, self.yf, out=self.s_lx)
+        np.multiply(xf, self.s_lx[:, :, None], out=self.xsy)
+        if self.adaptive:
+            return self._solve_adaptive(xf, t)
+        mu = self.mu
+        for i in range(self.iterations):
+            self._solve_g(xf, t, mu, i == 0)
+            if i == self.iterations - 1:
+                break
+            self._solve_h(t, mu, i == 0)
+            mu = min(self.beta * mu, self.mumax)
+        self.num_iterations = self.iterations
+        return self.g_f
+
+    def _solve_adaptive(self, xf, t):
+        cold = self._warm_mu is None
+        mu = self.mu if cold else self._warm_mu
+        self.primal_residual = self.dual_residual = None
+        for i in range(self.iterations):
+            zero_aux = cold and i == 0
+            self._solve_g(xf, t, mu, zero_aux)
+            self.num_iterations = i + 1
+            if i == self.iterations - 1:
+                # g is not refined any further, h and l stay those g was solved with
+                break
+            if zero_aux:
+                self.h_prev.fill(0)
+            else:
+                np.copyto(self.h_prev, self.h_f)
+            primal = self._solve_h(t, mu, zero_aux)
+            self.h_prev -= self.h_f
+            primal, dual = relative_residuals(primal, _norm(self.h_prev, self._norm_w), _norm(self.g_f, self._norm_w),
+                                              _norm(self.h_f, self._norm_w))
+            self.primal_residual, self.dual_residual = primal, dual
+            if primal <= self.tol and dual <= self.tol:
+                break
+            if cold:
+                mu = min(self.beta * mu, self.mumax)
+            else:
+                mu = balance_penalty(mu, primal, dual, self.mumax)
+        self._warm_mu = mu
+        return self.g_f
+
+
+class STRCFSolver:
+    """
+    adaptive ADMM of STRCF for a map of map_sz=(w,h) with the label spectrum yf and the spatial regularisation
+    reg_window, solve(xf, f_pre_f, mu) returns the filter spectrum of the sample spectrum xf with the temporal
+    regularisation mu towards the previous filter f_pre_f, the constrained filter g, the multiplier h and the
+    penalty gamma of the last solve are where the next one starts when adaptive, num_iterations is the number of
+    filter updates
+    """
+
+    def __init__(self, map_sz, yf, reg_window, init_penalty=1, max_penalty=0.1, penalty_step=10, iterations=2,
+                 tol=5e-2, half_spectrum=False, adaptive=False):
+        self.map_sz = (int(map_sz[0]), int(map_sz[1]))
+        self.half_spectrum = half_spectrum
+        self._norm_w = self.map_sz[0] if half_spectrum else None
+        self.yf = yf
+        self.reg_window = reg_window
+        self.init_penalty = init_penalty
+        self.max_penalty = max_penalty
+        self.penalty_step = penalty_step
+        self.iterations = iterations
+        self.tol = tol
+        self.adaptive = adaptive
+        self.num_iterations = 0
+        self.primal_residual = None
+        self.dual_residual = None
+        self.reset()
+
+    def reset(self):
+        self.g_f = None
+        self.h_f = None
+        self.gamma = None
+
+    def solve(self, xf, f_pre_f, mu):
+        cold = not self.adaptive or self.g_f is None or self.g_f.shape != xf.shape
+        if cold:
+            self.g_f = np.zeros_like(xf)
+            self.h_f = np.zeros_like(xf)
+            self.gamma = self.init_penalty
+        gamma = self.gamma
+        t = self.map_sz[0] * self.map_sz[1]
+        conj_xf = np.conj(xf)
+        s_xx = np.sum(conj_xf * xf, axis=2)
+        sfx_pre_f = xf * np.sum(conj_xf * f_pre_f, axis=2)[:, :, None]
+        yxf = self.yf[:, :, None] * xf
+        xsy = xf * (s_xx * self.yf)[:, :, None]
+        self.primal_residual = self.dual_residual = None
+        for i in range(self.iterations):
+            # solve for f
+            b = s_xx + t * (gamma + mu)
+            sgx_f = np.sum(conj_xf * self.g_f, axis=2)
+            shx_f = np.sum(conj_xf * self.h_f, axis=2)
+            tmp0 = (1 / (t * (gamma + mu)) * yxf) - ((1 / (gamma + mu)) * self.h_f) + \
+                   (gamma / (gamma + mu)) * self.g_f + (mu / (gamma + mu)) * f_pre_f
+            tmp1 = 1 / (t * (gamma + mu)) * xsy
+            tmp2 = mu / (gamma + mu) * sfx_pre_f
+            tmp3 = 1 / (gamma + mu) * (xf * shx_f[:, :, None])
+            tmp4 = gamma / (gamma + mu) * (xf * sgx_f[:, :, None])
+            f_f = tmp0 - (tmp1 + tmp2 - tmp3 + tmp4) / b[:, :, None]
+            self.num_iterations = i + 1
+            if i == self.iterations - 1:
+                break
+            # solve for g, then the multiplier
+            lhd = 1 / (self.reg_window ** 2 + gamma)
+            if self.half_spectrum:
+                g_f = rfft2(lhd[:, :, None] * irfft2(gamma * (f_f + self.h_f), lhd.shape))
+            else:
+                g_f = fft2(lhd[:, :, None] * ifft2(gamma * (f_f + self.h_f)))
+            if not self.adaptive:
+                self.g_f = g_f
+                self.h_f = self.h_f + gamma * (f_f - g_f)
+                gamma = min(self.penalty_step * gamma, self.max_penalty)
+                continue
+            primal, dual = relative_residuals(_norm(f_f - g_f, self._norm_w), _norm(g_f - self.g_f, self._norm_w),
+                                              _norm(f_f, self._norm_w), _norm(g_f, self._norm_w))
+            self.g_f = g_f
+            self.h_f = self.h_f + gamma * (f_f - g_f)
+            self.primal_residual, self.dual_residual = primal, dual
+            if primal <= self.tol and dual <= self.tol:
+                break
+            if cold:
+                gamma = min(self.penalty_step * gamma, self.max_penalty)
+            else:
+                gamma = balance_penalty(gamma, primal, dual, max(self.init_penalty, self.max_penalty))
+        self.gamma = gamma
+        return f_f
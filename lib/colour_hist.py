@@ -0,0 +1,110 @@
+"""
+colour histograms of uint8 patches for the colour models of Staple, MCCTH-Staple, DAT, CSR-DCF and LDES,
+a patch is turned once into a map of flat bin ids through per-channel 256-entry lookup tables (cv2.LUT),
+every histogram (np.bincount) and back-projection (np.take) of that patch then reuses the id map,
+ColourResponse turns a back-projection into the window-averaged colour response of the search patch,
+histograms keep the (num_bins,)*channels layout of cv2.calcHist with the first channel varying slowest
+"""
+import numpy as np
+import cv2
+from .constant_cache import cached_constant
+from .precision import integral_sdepth
+
+@cached_constant
+def bin_mapping(num_bins):
+    # uint8 value -> bin of one channel
+    return np.floor(np.arange(256) / (256 / num_bins)).astype(np.uint8)
+
+@cached_constant
+def bin_lut(num_bins, channels=3):
+    # uint8 value -> contribution of channel c to the flat bin id, shaped for cv2.LUT
+    bins = bin_mapping(num_bins).astype(np.int32)
+    return np.stack([bins * num_bins ** (channels - 1 - c) for c in range(channels)], axis=1)[None]
+
+def bin_ids(patch, num_bins):
+    """
+    flat bin id of every pixel of a h*w*c patch, non uint8 patches are cast like cv2.calcHist callers did
+    """
+    if patch.dtype != np.uint8:
+        patch = patch.astype(np.uint8)
+    if patch.ndim == 2:
+        patch = patch[:, :, None]
+    channels = patch.shape[2]
+    per_channel = cv2.LUT(patch, bin_lut(num_bins, channels))
+    if channels == 1:
+        return per_channel.reshape(patch.shape[:2])
+    ids = per_channel[:, :, 0] + per_channel[:, :, 1]
+    for c in range(2, channels):
+        ids += per_channel[:, :, c]
+    return ids
+
+def histogram(ids, num_bins, channels=3, mask=None, weights=None, dtype=np.float32):
+    """
+    (weighted) bin counts of the pixels where mask is non-zero, every pixel adds to its bin
+    even when several pixels share one, unlike a fancy-indexed p_bins[ids]+=weights
+    """
+    if mask is not None:
+        mask = mask != 0
+        ids = ids[mask]
+        if weights is not None:
+            weights = weights[mask]
+    if weights is not None:
+        weights = weights.ravel()
+    counts = np.bincount(ids.ravel(), weights=weights, minlength=num_bins ** channels)
+    return counts.astype(dtype).reshape((num_bins,) * channels)
+
+def back_project(table, ids):
+    # value of the histogram (or of any table over the bins) at every pixel
+    return np.take(table.reshape(-1), ids)
+
+def foreground_posterior(fg_hist, bg_hist):
+    # P(fg)/(P(fg)+P(bg)) per bin, evaluated on the bins instead of on every pixel
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return fg_hist / (fg_hist + bg_hist)
+
+def update_model(model, new_model, rate):
+    # exponential forgetting of the running histogram
+    return (1 - rate) * model + rate * new_model
+
+class ColourResponse:
+    """
+    colour response of a search patch: a table over the bins (a posterior or a ratio) is back-projected through the
+    bin id map, then averaged over every target-sized window with four slices of one integral image, the cost per
+    pixel does not depend on the target size, the likelihood, integral and response buffers are reused while their
+    shapes do not change, so the returned arrays are only valid until the next call
+    """
+
+    def __init__(self):
+        self._likelihood = None
+        self._sat = None
+        self._response = None
+
+    def likelihood(self, table, patch):
+        # table at every pixel of patch, bins where it is nan (empty in both histograms) give 0
+        table = np.where(np.isnan(table), 0, table)
+        ids = bin_ids(patch, table.shape[0])
+        if self._likelihood is None or self._likelihood.shape != ids.shape or self._likelihood.dtype != table.dtype:
+            self._likelihood = np.empty(ids.shape, dtype=table.dtype)
+        return np.take(table.reshape(-1), ids, out=self._likelihood, mode='clip')
+
+    def window_mean(self, likelihood_map, sz, out=None):
+        """
+        mean of likelihood_map over every window of sz=(w,h), a (h-sz[1]+1)*(w-sz[0]+1) map whose element (i,j) is
+        the window with top left corner (i,j), out can be a view of a larger buffer to write it into
+        """
+        h, w = likelihood_map.shape[:2]
+        n1, n2 = h - sz[1] + 1, w - sz[0] + 1
+        self._sat = cv2.integral(likelihood_map, self._sat, sdepth=integral_sdepth())
+        sat = self._sat
+        if out is None:
+            if self._response is None or self._response.shape != (n1, n2) or self._response.dtype != sat.dtype:
+                self._response = np.empty((n1, n2), dtype=sat.dtype)
+            out = self._response
+        np.add(sat[:n1, :n2], sat[sz[1]:sz[1] + n1, sz[0]:sz[0] + n2], out=out)
+        np.subtract(out, sat[sz[1]:sz[1] + n1, :n2], out=out)
+        np.subtract(out, sat[:n1, sz[0]:sz[0] + n2], out=out)
+        out /= sz[0] * sz[1]
+        return out
+
+    def response(self, table, patch, sz):
+        return self.window_mean(self.likelihood(table, patch), sz)
@@ -0,0 +1,107 @@
+"""
+process-wide lru cache of the precomputed constants of the trackers (windows, labels, regularization filters),
+shared by every tracker instance so re-initialisations with the same sizes do not rebuild them
+"""
+import numpy as np
+from collections import OrderedDict
+from functools import wraps
+from .precision import precision_config
+
+def _freeze(v):
+    # hashable form of the defining parameters, arrays and lists become tuples
+    if isinstance(v, np.ndarray):
+        return (v.dtype.str, v.shape, tuple(v.ravel().tolist()))
+    if isinstance(v, (list, tuple)):
+        return tuple(_freeze(e) for e in v)
+    if isinstance(v, dict):
+        return tuple(sorted((k, _freeze(e)) for k, e in v.items()))
+    if isinstance(v, np.generic):
+        return v.item()
+    return v
+
+def _read_only(v):
+    if isinstance(v, np.ndarray):
+        v.setflags(write=False)
+        return v
+    if isinstance(v, tuple):
+        return tuple(_read_only(e) for e in v)
+    return v
+
+def _view(v):
+    if isinstance(v, np.ndarray):
+        return v.view()
+    if isinstance(v, tuple):
+        return tuple(_view(e) for e in v)
+    return v
+
+def _nbytes(v):
+    if isinstance(v, np.ndarray):
+        return v.nbytes
+    if isinstance(v, tuple):
+        return sum(_nbytes(e) for e in v)
+    return 0
+
+class ConstantCache:
+    """
+    entries are arrays (or tuples of arrays) made read-only, callers get views and must copy before writing,
+    the least recently used entries are evicted once the cached bytes exceed max_bytes
+    """
+    def __init__(self, max_bytes=64*1024*1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, builder):
+        key = _freeze(key)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return _view(entry)
+        self.misses += 1
+        entry = _read_only(builder())
+        size = _nbytes(entry)
+        if size <= self.max_bytes:
+            self._entries[key] = entry
+            self.nbytes += size
+            self._evict()
+        return _view(entry)
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self.nbytes -= _nbytes(entry)
+
+    def set_max_bytes(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._evict()
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.
+
+    def stats(self):
+        return {'entries': len(self._entries), 'nbytes': self.nbytes, 'max_bytes': self.max_bytes,
+                'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hit_rate()}
+
+constant_cache = ConstantCache()
+
+def cached_constant(func):
+    """
+    cache the result of a pure constant builder keyed by its arguments and the current precision mode
+    """
+    name = func.__module__ + '.' + func.__qualname__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (name, args, kwargs, precision_config.single_precision)
+        return constant_cache.get(key, lambda: func(*args, **kwargs))
+    return wrapper
@@ -0,0 +1,77 @@
+"""
+dtype audit for the single precision mode (see lib/precision.py)
+
+    audit=DtypeAudit()
+    with audit:
+        tracker.init(first_frame,bbox)
+        tracker.update(frame)
+    audit.check_state(tracker)
+    print(audit.report())
+
+every float64/complex128 array bound to a local variable of a cftracker/lib function when it returns,
+or to an attribute of the tracker, is reported with the function and variable it was found in,
+arrays smaller than min_size (coordinates, affine matrices) are ignored
+"""
+import sys
+import numpy as np
+
+class DtypeAudit:
+    wide_dtypes=(np.dtype(np.float64),np.dtype(np.complex128))
+
+    def __init__(self,modules=('cftracker','lib'),min_size=512):
+        self.modules=tuple(modules)
+        self.min_size=min_size
+        self.promotions={}
+        self._old_profile=None
+
+    def __enter__(self):
+        self._old_profile=sys.getprofile()
+        sys.setprofile(self._profile)
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        sys.setprofile(self._old_profile)
+        return False
+
+    def _record(self,where,name,value):
+        if isinstance(value,np.ndarray) and value.dtype in self.wide_dtypes and value.size>=self.min_size:
+            key=(where,name)
+            dtype,shape,count=self.promotions.get(key,(value.dtype,value.shape,0))
+            self.promotions[key]=(dtype,shape,count+1)
+
+    def _profile(self,frame,event,arg):
+        if event!='return':
+            return
+        module=frame.f_globals.get('__name__','')
+        if not module.startswith(self.modules) or module in (__name__,'lib.precision'):
+            return
+        where='%s.%s:%d'%(module,frame.f_code.co_name,frame.f_code.co_firstlineno)
+        for name,value in frame.f_locals.items():
+            self._record(where,name,value)
+        self._record(where,'<return>',arg)
+
+    def check_state(self,tracker):
+        where=type(tracker).__name__
+        for name,value in vars(tracker).items():
+            if isinstance(value,(list,tuple)):
+                for i,ele in enumerate(value):
+                    self._record(where,'%s[%d]'%(name,i),ele)
+                    if hasattr(ele,'__dict__'):
+                        for sub_name,sub_value in vars(ele).items():
+                            self._record(where,'%s[%d].%s'%(name,i,sub_name),sub_value)
+            elif hasattr(value,'__dict__') and not isinstance(value,type):
+                for sub_name,sub_value in vars(value).items():
+                    self._record(where,'%s.%s'%(name,sub_name),sub_value)
+            else:
+                self._record(where,name,value)
+
+    def has_promotions(self):
+        return len(self.promotions)>0
+
+    def report(self):
+        if not self.promotions:
+            return 'no float64/complex128 arrays found'
+        lines=[]
+        for (where,name),(dtype,shape,count) in sorted(self.promotions.items()):
+            lines.append('%s %s %s %s x%d'%(where,name,dtype,shape,count))
+        return '\n'.join(lines)
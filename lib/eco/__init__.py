@@ -1,7 +1,17 @@
-from .tracker import ECOTracker
-from .scale_filter import ScaleFilter
-from .optimize_score import optimize_score
-from .sample_space_model import GMM
-from .train import *
+import importlib
 from .config import gpu_config
-from .fourier_tools import *
+
+# the tracker and its solvers pull in scipy.signal and friends, they are imported on first access
+# so that importing lib.eco.features for the hand-crafted extractors stays cheap
+_lazy_attrs = {'ECOTracker': '.tracker', 'ScaleFilter': '.scale_filter', 'optimize_score': '.optimize_score',
+               'GMM': '.sample_space_model'}
+_star_modules = ('.train', '.fourier_tools')
+
+def __getattr__(name):
+    if name in _lazy_attrs:
+        return getattr(importlib.import_module(_lazy_attrs[name], __name__), name)
+    for module_name in _star_modules:
+        module = importlib.import_module(module_name, __name__)
+        if not name.startswith('_') and hasattr(module, name):
+            return getattr(module, name)
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
@@ -103,6 +103,10 @@ class DemoConfig:
     s_num_compressed_dim = 'MAX'
     lamBda = 1e-2
     do_poly_interp = True
+    scale_sampling = None  # None or 'pyramid', see lib.scale_pyramid
+    basis_update = None  # None or 'incremental', see lib.subspace
+    basis_refresh_interval = 10  # updates between exact recomputations of an incremental basis
+    basis_tol = 1e-2  # ritz residual above which an incremental basis is recomputed
 
     # visualization
     visualization = 1
@@ -1,5 +1,6 @@
 class GPUConfig:
     use_gpu=True
     gpu_id=2
+    cpu_threads=None  # intra-op threads of the cpu cnn features, None keeps the mxnet/openmp default
 
 gpu_config=GPUConfig()
\ No newline at end of file
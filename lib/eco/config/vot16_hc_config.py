@@ -105,6 +105,10 @@ class VOT16HCConfig:
     s_num_compressed_dim = 'MAX'        # number of compressed feature dimensions in the scale filter
     lamBda = 1e-2                       # scale filter regularization
     do_poly_interp = True               # do 2nd order polynomial interpolation to obtain more accurate scale
+    scale_sampling = None               # None or 'pyramid', see lib.scale_pyramid
+    basis_update = None                 # None or 'incremental', see lib.subspace
+    basis_refresh_interval = 10         # updates between exact recomputations of an incremental basis
+    basis_tol = 1e-2                    # ritz residual above which an incremental basis is recomputed
 
 
     vis = True
\ No newline at end of file
@@ -1,6 +1,5 @@
-from .config import gpu_config
-if gpu_config.use_gpu:
-    import cupy as cp
+from ..lazy_import import lazy_import
+cp = lazy_import('cupy')
 
 # https://github.com/chainer/chainer/blob/master/chainer/utils/conv.py
 def get_conv_outsize(size, k, s, p, cover_all=False, d=1):
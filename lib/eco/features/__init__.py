@@ -1 +1,8 @@
-from .features import GrayFeature,FHogFeature, TableFeature, fhog, mround, ResNet50Feature, VGG16Feature
+from .features import GrayFeature,FHogFeature, TableFeature, fhog, mround, SampleStage
+
+def __getattr__(name):
+    # the deep features need mxnet, it is only imported when they are asked for
+    if name in ('ResNet50Feature', 'VGG16Feature'):
+        from . import deep_features
+        return getattr(deep_features, name)
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
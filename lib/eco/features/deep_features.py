@@ -0,0 +1,202 @@
+"""
+mxnet backed deep features of ECO, kept out of features.py so the hand-crafted blocks import without mxnet,
+the pretrained backbones are loaded once per process and context and shared by every tracker instance,
+all scales of a frame go through one batched forward pass and the activations are kept on the SampleStage
+for the frame, so refinement iterations and the training sample at the same position reuse them
+"""
+import os
+import ctypes
+import numpy as np
+import cv2
+from ..config import gpu_config
+if gpu_config.cpu_threads is not None:
+    # the engine reads these when mxnet is imported
+    os.environ.setdefault('OMP_NUM_THREADS', str(gpu_config.cpu_threads))
+    os.environ.setdefault('MXNET_CPU_WORKER_NTHREADS', str(gpu_config.cpu_threads))
+import mxnet as mx
+from mxnet.gluon.model_zoo import vision
+from mxnet.gluon.nn import AvgPool2D
+
+from ..config import otb_hc_config,otb_deep_config
+from .features import Feature, SampleStage
+
+_IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+_IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+_backbones = {}
+
+def set_cpu_threads(num_threads):
+    # intra-op (openmp) threads of the cpu operators, mxnet builds without MXSetNumOMPThreads keep OMP_NUM_THREADS
+    if hasattr(mx.base._LIB, 'MXSetNumOMPThreads'):
+        mx.base._LIB.MXSetNumOMPThreads(ctypes.c_int(num_threads))
+
+def get_context():
+    if gpu_config.use_gpu:
+        return mx.gpu(gpu_config.gpu_id)
+    if gpu_config.cpu_threads is not None:
+        set_cpu_threads(gpu_config.cpu_threads)
+    return mx.cpu(0)
+
+def load_backbone(name, ctx):
+    """
+    pretrained model zoo network, loaded once per (name, context) and shared, inference only
+    """
+    key = (name, str(ctx))
+    if key not in _backbones:
+        _backbones[key] = getattr(vision, name)(pretrained=True, ctx=ctx)
+    return _backbones[key]
+
+class CNNFeature(Feature):
+    _backbone_name = None
+
+    def __init__(self,config=otb_hc_config.OTBHCConfig()):
+        super(CNNFeature,self).__init__(config)
+        self._rgb = None
+        self._rgb_frame_id = None
+
+    def _forward(self, x):
+        pass
+
+    def get_features(self, img, pos, sample_sz, scales, stage=None):
+        if img.shape[2] == 1:
+            # the colour copy is not the frame the other blocks sample, it gets its own stage for the frame
+            stage = self._rgb_stage(img, stage)
+        if stage is None:
+            stage = SampleStage()
+            stage.new_frame(img)
+        if not isinstance(scales, list) and not isinstance(scales, np.ndarray):
+            scales = [scales]
+        keys, patches = [], {}
+        for scale in scales:
+            key, patch = stage.patch(pos, sample_sz*scale, sample_sz)
+            key = (self._backbone_name, key)
+            keys.append(key)
+            if stage.get_result(key) is None:
+                patches[key] = patch
+        if patches:
+            self._extract(stage, patches)
+        f1 = np.stack([stage.get_result(key)[0] for key in keys], axis=3)
+        f2 = np.stack([stage.get_result(key)[1] for key in keys], axis=3)
+        return f1, f2
+
+    def _rgb_stage(self, img, stage):
+        frame_id = None if stage is None else stage.frame_id
+        if frame_id is None or self._rgb_frame_id != frame_id:
+            self._rgb = SampleStage()
+            self._rgb.new_frame(cv2.cvtColor(img.squeeze(), cv2.COLOR_GRAY2RGB))
+            self._rgb_frame_id = frame_id
+        return self._rgb
+
+    def _extract(self, stage, patches):
+        # one forward pass for every patch not seen in this frame, normalised per sample and kept on the stage
+        batch = np.stack([(patch / 255.).astype(np.float32) for patch in patches.values()])
+        batch = ((batch - _IMAGENET_MEAN) / _IMAGENET_STD).transpose(0, 3, 1, 2)
+        f1, f2 = self._forward(mx.nd.array(batch, ctx=self._ctx))
+        f1 = self._feature_normalization(f1)
+        f2 = self._feature_normalization(f2)
+        for i, key in enumerate(patches):
+            stage.set_result(key, (f1[:, :, :, i], f2[:, :, :, i]))
+
+class ResNet50Feature(CNNFeature):
+    _backbone_name = 'resnet50_v2'
+
+    def __init__(self, fname, compressed_dim,config=otb_deep_config.OTBDeepConfig()):
+        super(ResNet50Feature,self).__init__(config)
+        self._ctx = get_context()
+        self._resnet50 = load_backbone(self._backbone_name, self._ctx)
+        self._compressed_dim = compressed_dim
+        self._cell_size = [4, 16]
+        self.penalty = [0., 0.]
+        self.min_cell_size = np.min(self._cell_size)
+
+    def init_size(self, img_sample_sz, cell_size=None):
+        # only support img_sample_sz square
+        img_sample_sz = img_sample_sz.astype(np.int32)
+        feat1_shape = np.ceil(img_sample_sz / 4)
+        feat2_shape = np.ceil(img_sample_sz / 16)
+        desired_sz = feat2_shape + 1 + feat2_shape % 2
+        # while feat1_shape[0] % 2 == 0 or feat2_shape[0] % 2 == 0:
+        #     img_sample_sz += np.array([1, 0])
+        #     feat1_shape = np.ceil(img_sample_sz / 4)
+        #     feat2_shape = np.ceil(img_sample_sz / 16)
+        # while feat1_shape[1] % 2 == 0 or feat2_shape[1] % 2 == 0:
+        #     img_sample_sz += np.array([0, 1])
+        #     feat1_shape = np.ceil(img_sample_sz / 4)
+        #     feat2_shape = np.ceil(img_sample_sz / 16)
+        img_sample_sz = desired_sz * 16
+        self.num_dim = [64, 1024]
+        self.sample_sz = img_sample_sz
+        self.data_sz = [np.ceil(img_sample_sz / 4),
+                        np.ceil(img_sample_sz / 16)]
+        return img_sample_sz
+
+    def _forward(self, x):
+        # stage1
+        bn0 = self._resnet50.features[0].forward(x)
+        conv1 = self._resnet50.features[1].forward(bn0)     # x2
+        bn1 = self._resnet50.features[2].forward(conv1)
+        relu1 = self._resnet50.features[3].forward(bn1)
+        pool1 = self._resnet50.features[4].forward(relu1)   # x4
+        # stage2
+        stage2 = self._resnet50.features[5].forward(pool1)  # x4
+        stage3 = self._resnet50.features[6].forward(stage2) # x8
+        stage4 = self._resnet50.features[7].forward(stage3) # x16
+        return [pool1.asnumpy().transpose(2, 3, 1, 0),
+                stage4.asnumpy().transpose(2, 3, 1, 0)]
+
+class VGG16Feature(CNNFeature):
+    _backbone_name = 'vgg16'
+    def __init__(self, fname, compressed_dim,config=otb_deep_config.OTBDeepConfig()):
+        super(VGG16Feature,self).__init__(config)
+        self._ctx = get_context()
+        self._vgg16 = load_backbone(self._backbone_name, self._ctx)
+        self._compressed_dim = compressed_dim
+        self._cell_size = [4, 16]
+        self.penalty = [0., 0.]
+        self.min_cell_size = np.min(self._cell_size)
+        self._avg_pool2d = AvgPool2D()
+
+    def init_size(self, img_sample_sz, cell_size=None):
+        img_sample_sz = img_sample_sz.astype(np.int32)
+        feat1_shape = np.ceil(img_sample_sz / 4)
+        feat2_shape = np.ceil(img_sample_sz / 16)
+        desired_sz = feat2_shape + 1 + feat2_shape % 2
+        img_sample_sz = desired_sz * 16
+        self.num_dim = [64, 512]
+        self.sample_sz = img_sample_sz
+        self.data_sz = [np.ceil(img_sample_sz / 4),
+                        np.ceil(img_sample_sz / 16)]
+        return img_sample_sz
+
+    def _forward(self, x):
+        # stage1
+        conv1_1 = self._vgg16.features[0].forward(x)
+        relu1_1 = self._vgg16.features[1].forward(conv1_1)
+        conv1_2 = self._vgg16.features[2].forward(relu1_1)
+        relu1_2 = self._vgg16.features[3].forward(conv1_2)
+        pool1 = self._vgg16.features[4].forward(relu1_2) # x2
+        pool_avg = self._avg_pool2d(pool1)
+        # stage2
+        conv2_1 = self._vgg16.features[5].forward(pool1)
+        relu2_1 = self._vgg16.features[6].forward(conv2_1)
+        conv2_2 = self._vgg16.features[7].forward(relu2_1)
+        relu2_2 = self._vgg16.features[8].forward(conv2_2)
+        pool2 = self._vgg16.features[9].forward(relu2_2) # x4
+        # stage3
+        conv3_1 = self._vgg16.features[10].forward(pool2)
+        relu3_1 = self._vgg16.features[11].forward(conv3_1)
+        conv3_2 = self._vgg16.features[12].forward(relu3_1)
+        relu3_2 = self._vgg16.features[13].forward(conv3_2)
+        conv3_3 = self._vgg16.features[14].forward(relu3_2)
+        relu3_3 = self._vgg16.features[15].forward(conv3_3)
+        pool3 = self._vgg16.features[16].forward(relu3_3) # x8
+        # stage4
+        conv4_1 = self._vgg16.features[17].forward(pool3)
+        relu4_1 = self._vgg16.features[18].forward(conv4_1)
+        conv4_2 = self._vgg16.features[19].forward(relu4_1)
+        relu4_2 = self._vgg16.features[20].forward(conv4_2)
+        conv4_3 = self._vgg16.features[21].forward(relu4_2)
+        relu4_3 = self._vgg16.features[22].forward(conv4_3)
+        pool4 = self._vgg16.features[23].forward(relu4_3) # x16
+        return [pool_avg.asnumpy().transpose(2, 3, 1, 0),
+                pool4.asnumpy().transpose(2, 3, 1, 0)]
@@ -1,15 +1,12 @@
-import mxnet as mx
 import numpy as np
 import pickle
 import os
 import cv2
-from mxnet.gluon.model_zoo import vision
-from mxnet.gluon.nn import AvgPool2D
-import mxnet as mx
+import itertools
+from numba import njit
 
-from ..config import gpu_config
-from . import _gradient
-from ..config import otb_hc_config,otb_deep_config
+from ...feature_registry import get_gradient_backend
+from ..config import otb_hc_config
 
 def mround(x):
     x_ = x.copy()
@@ -19,6 +16,130 @@ def mround(x):
     x_[idx] = np.floor(x[idx])
     return x_
 
+def sample_patch(im, pos, sample_sz, output_sz):
+    pos = np.floor(pos)
+    sample_sz = np.maximum(mround(sample_sz), 1)
+    xs = np.floor(pos[1]) + np.arange(0, sample_sz[1]+1) - np.floor((sample_sz[1]+1)/2)
+    ys = np.floor(pos[0]) + np.arange(0, sample_sz[0]+1) - np.floor((sample_sz[0]+1)/2)
+    xmin = max(0, int(xs.min()))
+    xmax = min(im.shape[1], int(xs.max()))
+    ymin = max(0, int(ys.min()))
+    ymax = min(im.shape[0], int(ys.max()))
+    # extract image
+    im_patch = im[ymin:ymax, xmin:xmax, :]
+    left = right = top = down = 0
+    if xs.min() < 0:
+        left = int(abs(xs.min()))
+    if xs.max() > im.shape[1]:
+        right = int(xs.max() - im.shape[1])
+    if ys.min() < 0:
+        top = int(abs(ys.min()))
+    if ys.max() > im.shape[0]:
+        down = int(ys.max() - im.shape[0])
+    if left != 0 or right != 0 or top != 0 or down != 0:
+        im_patch = cv2.copyMakeBorder(im_patch, top, down, left, right, cv2.BORDER_REPLICATE)
+    # im_patch = cv2.resize(im_patch, (int(output_sz[0]), int(output_sz[1])))
+    im_patch = cv2.resize(im_patch, (int(output_sz[1]), int(output_sz[0])), cv2.INTER_CUBIC)
+    if len(im_patch.shape) == 2:
+        im_patch = im_patch[:, :, np.newaxis]
+    return im_patch
+
+
+@njit(cache=True)
+def _integral_image(features, out):
+    # np.cumsum(np.cumsum(features, 0), 1) written to out[1:,1:] in one pass, same order of additions
+    h, w, c = features.shape
+    col = np.zeros((w, c), out.dtype)
+    for y in range(h):
+        for x in range(w):
+            for k in range(c):
+                col[x, k] += features[y, x, k]
+                out[y + 1, x + 1, k] = out[y + 1, x, k] + col[x, k]
+
+class SampleStage:
+    """
+    per-frame sampling shared by the feature blocks of ECOTracker, after new_frame every (position, scale,
+    output size) patch is cropped and resampled once however many blocks use it, the integral images used for
+    cell averaging are built once per patch and feature map into buffers that are reused from frame to frame,
+    patches and integral images are shared, callers must not write to them,
+    blocks can also keep their own per-frame results (e.g. cnn activations) under keys of their choice,
+    frame_id is unique per frame and stage so it can tag state derived from the frame
+    """
+    _frame_ids = itertools.count()
+
+    def __init__(self):
+        self._img = None
+        self.frame_id = None
+        self._patches = {}
+        self._integrals = {}
+        self._results = {}
+        self._free = {}
+        self._used = []
+
+    def new_frame(self, img):
+        self._img = img
+        self.frame_id = next(SampleStage._frame_ids)
+        self._patches.clear()
+        self._integrals.clear()
+        self._results.clear()
+        for buf in self._used:
+            self._free.setdefault((buf.shape, buf.dtype.str), []).append(buf)
+        self._used = []
+
+    @staticmethod
+    def patch_key(pos, sample_sz, output_sz):
+        # the quantities sample_patch actually depends on
+        pos = np.floor(pos)
+        sample_sz = np.maximum(mround(sample_sz), 1)
+        return (pos[0], pos[1], sample_sz[0], sample_sz[1], int(output_sz[0]), int(output_sz[1]))
+
+    def patch(self, pos, sample_sz, output_sz):
+        key = self.patch_key(pos, sample_sz, output_sz)
+        patch = self._patches.get(key)
+        if patch is None:
+            patch = sample_patch(self._img, pos, sample_sz, output_sz)
+            self._patches[key] = patch
+        return key, patch
+
+    def get_result(self, key):
+        return self._results.get(key)
+
+    def set_result(self, key, value):
+        self._results[key] = value
+
+    def _buffer(self, shape, dtype):
+        free = self._free.get((shape, np.dtype(dtype).str))
+        if free:
+            buf = free.pop()
+        else:
+            # the first row and column stay zero, only [1:,1:] is ever written
+            buf = np.zeros(shape, dtype=dtype)
+        self._used.append(buf)
+        return buf
+
+    def integral(self, key, features):
+        """
+        integral image of features (h,w,c) with a leading zero row and column, cached under key for the frame,
+        float features are accumulated in their own dtype, integer ones in int64
+        """
+        int_image = self._integrals.get(key)
+        if int_image is None:
+            h, w, c = features.shape
+            dtype = features.dtype if features.dtype.kind == 'f' else np.int64
+            int_image = self._buffer((h + 1, w + 1, c), dtype)
+            _integral_image(features, int_image)
+            self._integrals[key] = int_image
+        return int_image
+
+def average_feature_region(int_image, region_size, maxval):
+    # cell means of region_size x region_size cells from an integral image with a leading zero row and column
+    region_area = region_size ** 2
+    i1 = np.arange(region_size, int_image.shape[0], region_size).reshape(-1, 1)
+    i2 = np.arange(region_size, int_image.shape[1], region_size).reshape(1, -1)
+    return (int_image[i1, i2, :] - int_image[i1, i2-region_size,:] - int_image[i1-region_size, i2, :] +
+            int_image[i1-region_size, i2-region_size, :]) / (region_area * maxval)
+
+
 class Feature:
     def __init__(self,config=otb_hc_config.OTBHCConfig()):
         self.config=config
@@ -37,32 +158,7 @@ class Feature:
         return img_sample_sz
 
     def _sample_patch(self, im, pos, sample_sz, output_sz):
-        pos = np.floor(pos)
-        sample_sz = np.maximum(mround(sample_sz), 1)
-        xs = np.floor(pos[1]) + np.arange(0, sample_sz[1]+1) - np.floor((sample_sz[1]+1)/2)
-        ys = np.floor(pos[0]) + np.arange(0, sample_sz[0]+1) - np.floor((sample_sz[0]+1)/2)
-        xmin = max(0, int(xs.min()))
-        xmax = min(im.shape[1], int(xs.max()))
-        ymin = max(0, int(ys.min()))
-        ymax = min(im.shape[0], int(ys.max()))
-        # extract image
-        im_patch = im[ymin:ymax, xmin:xmax, :]
-        left = right = top = down = 0
-        if xs.min() < 0:
-            left = int(abs(xs.min()))
-        if xs.max() > im.shape[1]:
-            right = int(xs.max() - im.shape[1])
-        if ys.min() < 0:
-            top = int(abs(ys.min()))
-        if ys.max() > im.shape[0]:
-            down = int(ys.max() - im.shape[0])
-        if left != 0 or right != 0 or top != 0 or down != 0:
-            im_patch = cv2.copyMakeBorder(im_patch, top, down, left, right, cv2.BORDER_REPLICATE)
-        # im_patch = cv2.resize(im_patch, (int(output_sz[0]), int(output_sz[1])))
-        im_patch = cv2.resize(im_patch, (int(output_sz[1]), int(output_sz[0])), cv2.INTER_CUBIC)
-        if len(im_patch.shape) == 2:
-            im_patch = im_patch[:, :, np.newaxis]
-        return im_patch
+        return sample_patch(im, pos, sample_sz, output_sz)
 
     def _feature_normalization(self, x):
         if hasattr(self.config, 'normalize_power') and self.config.normalize_power > 0:
@@ -75,142 +171,11 @@ class Feature:
             x = np.sign(x) * np.sqrt(np.abs(x))
         return x.astype(np.float32)
 
-class CNNFeature(Feature):
-    def __init__(self,config=otb_hc_config.OTBHCConfig()):
-        super(CNNFeature,self).__init__(config)
-
-    def _forward(self, x):
-        pass
-
-    def get_features(self, img, pos, sample_sz, scales):
-        feat1 = []
-        feat2 = []
-        if img.shape[2] == 1:
-            img = cv2.cvtColor(img.squeeze(), cv2.COLOR_GRAY2RGB)
-        if not isinstance(scales, list) and not isinstance(scales, np.ndarray):
-            scales = [scales]
-        patches = []
-        for scale in scales:
-            patch = self._sample_patch(img, pos, sample_sz*scale, sample_sz)
-            patch = mx.nd.array(patch / 255., ctx=self._ctx)
-            normalized = mx.image.color_normalize(patch,
-                                                  mean=mx.nd.array([0.485, 0.456, 0.406], ctx=self._ctx),
-                                                  std=mx.nd.array([0.229, 0.224, 0.225], ctx=self._ctx))
-            normalized = normalized.transpose((2, 0, 1)).expand_dims(axis=0)
-            patches.append(normalized)
-        patches = mx.nd.concat(*patches, dim=0)
-        f1, f2 = self._forward(patches)
-        f1 = self._feature_normalization(f1)
-        f2 = self._feature_normalization(f2)
-        return f1, f2
-
-class ResNet50Feature(CNNFeature):
-
-    def __init__(self, fname, compressed_dim,config=otb_deep_config.OTBDeepConfig()):
-        super(ResNet50Feature,self).__init__(config)
-        self._ctx = mx.gpu(gpu_config.gpu_id) if gpu_config.use_gpu else mx.cpu(0)
-        self._resnet50 = vision.resnet50_v2(pretrained=True, ctx = self._ctx)
-        self._compressed_dim = compressed_dim
-        self._cell_size = [4, 16]
-        self.penalty = [0., 0.]
-        self.min_cell_size = np.min(self._cell_size)
-
-    def init_size(self, img_sample_sz, cell_size=None):
-        # only support img_sample_sz square
-        img_sample_sz = img_sample_sz.astype(np.int32)
-        feat1_shape = np.ceil(img_sample_sz / 4)
-        feat2_shape = np.ceil(img_sample_sz / 16)
-        desired_sz = feat2_shape + 1 + feat2_shape % 2
-        # while feat1_shape[0] % 2 == 0 or feat2_shape[0] % 2 == 0:
-        #     img_sample_sz += np.array([1, 0])
-        #     feat1_shape = np.ceil(img_sample_sz / 4)
-        #     feat2_shape = np.ceil(img_sample_sz / 16)
-        # while feat1_shape[1] % 2 == 0 or feat2_shape[1] % 2 == 0:
-        #     img_sample_sz += np.array([0, 1])
-        #     feat1_shape = np.ceil(img_sample_sz / 4)
-        #     feat2_shape = np.ceil(img_sample_sz / 16)
-        img_sample_sz = desired_sz * 16
-        self.num_dim = [64, 1024]
-        self.sample_sz = img_sample_sz
-        self.data_sz = [np.ceil(img_sample_sz / 4),
-                        np.ceil(img_sample_sz / 16)]
-        return img_sample_sz
-
-    def _forward(self, x):
-        # stage1
-        bn0 = self._resnet50.features[0].forward(x)
-        conv1 = self._resnet50.features[1].forward(bn0)     # x2
-        bn1 = self._resnet50.features[2].forward(conv1)
-        relu1 = self._resnet50.features[3].forward(bn1)
-        pool1 = self._resnet50.features[4].forward(relu1)   # x4
-        # stage2
-        stage2 = self._resnet50.features[5].forward(pool1)  # x4
-        stage3 = self._resnet50.features[6].forward(stage2) # x8
-        stage4 = self._resnet50.features[7].forward(stage3) # x16
-        return [pool1.asnumpy().transpose(2, 3, 1, 0),
-                stage4.asnumpy().transpose(2, 3, 1, 0)]
-
-class VGG16Feature(CNNFeature):
-    def __init__(self, fname, compressed_dim,config=otb_deep_config.OTBDeepConfig()):
-        super(VGG16Feature,self).__init__(config)
-        self._ctx = mx.gpu(gpu_config.gpu_id) if gpu_config.use_gpu else mx.cpu(0)
-        self._vgg16 = vision.vgg16(pretrained=True, ctx=self._ctx)
-        self._compressed_dim = compressed_dim
-        self._cell_size = [4, 16]
-        self.penalty = [0., 0.]
-        self.min_cell_size = np.min(self._cell_size)
-        self._avg_pool2d = AvgPool2D()
-
-    def init_size(self, img_sample_sz, cell_size=None):
-        img_sample_sz = img_sample_sz.astype(np.int32)
-        feat1_shape = np.ceil(img_sample_sz / 4)
-        feat2_shape = np.ceil(img_sample_sz / 16)
-        desired_sz = feat2_shape + 1 + feat2_shape % 2
-        img_sample_sz = desired_sz * 16
-        self.num_dim = [64, 512]
-        self.sample_sz = img_sample_sz
-        self.data_sz = [np.ceil(img_sample_sz / 4),
-                        np.ceil(img_sample_sz / 16)]
-        return img_sample_sz
-
-    def _forward(self, x):
-        # stage1
-        conv1_1 = self._vgg16.features[0].forward(x)
-        relu1_1 = self._vgg16.features[1].forward(conv1_1)
-        conv1_2 = self._vgg16.features[2].forward(relu1_1)
-        relu1_2 = self._vgg16.features[3].forward(conv1_2)
-        pool1 = self._vgg16.features[4].forward(relu1_2) # x2
-        pool_avg = self._avg_pool2d(pool1)
-        # stage2
-        conv2_1 = self._vgg16.features[5].forward(pool1)
-        relu2_1 = self._vgg16.features[6].forward(conv2_1)
-        conv2_2 = self._vgg16.features[7].forward(relu2_1)
-        relu2_2 = self._vgg16.features[8].forward(conv2_2)
-        pool2 = self._vgg16.features[9].forward(relu2_2) # x4
-        # stage3
-        conv3_1 = self._vgg16.features[10].forward(pool2)
-        relu3_1 = self._vgg16.features[11].forward(conv3_1)
-        conv3_2 = self._vgg16.features[12].forward(relu3_1)
-        relu3_2 = self._vgg16.features[13].forward(conv3_2)
-        conv3_3 = self._vgg16.features[14].forward(relu3_2)
-        relu3_3 = self._vgg16.features[15].forward(conv3_3)
-        pool3 = self._vgg16.features[16].forward(relu3_3) # x8
-        # stage4
-        conv4_1 = self._vgg16.features[17].forward(pool3)
-        relu4_1 = self._vgg16.features[18].forward(conv4_1)
-        conv4_2 = self._vgg16.features[19].forward(relu4_1)
-        relu4_2 = self._vgg16.features[20].forward(conv4_2)
-        conv4_3 = self._vgg16.features[21].forward(relu4_2)
-        relu4_3 = self._vgg16.features[22].forward(conv4_3)
-        pool4 = self._vgg16.features[23].forward(relu4_3) # x16
-        return [pool_avg.asnumpy().transpose(2, 3, 1, 0),
-                pool4.asnumpy().transpose(2, 3, 1, 0)]
-
-
 def fhog(I, bin_size=8, num_orients=9, clip=0.2, crop=False):
     soft_bin = -1
-    M, O = _gradient.gradMag(I.astype(np.float32), 0, True)
-    H = _gradient.fhog(M, O, bin_size, num_orients, soft_bin, clip)
+    backend = get_gradient_backend()
+    M, O = backend.gradMag(I.astype(np.float32), 0, True)
+    H = backend.fhog(M, O, bin_size, num_orients, soft_bin, clip)
     return H
 
 class GrayFeature(Feature):
@@ -222,46 +187,33 @@ class GrayFeature(Feature):
         self._compressed_dim = [1]
         self.num_dim = [1]
 
-    def get_features(self, img, pos, sample_sz, scales,normalization=True):
+    def get_features(self, img, pos, sample_sz, scales,normalization=True,stage=None):
         feat = []
+        if stage is None:
+            stage = SampleStage()
+            stage.new_frame(img)
         if not isinstance(scales, list) and not isinstance(scales, np.ndarray):
             scales = [scales]
         for scale in scales:
-            patch = self._sample_patch(img, pos, sample_sz*scale, sample_sz)
+            key, patch = stage.patch(pos, sample_sz*scale, sample_sz)
             # h, w, c = patch.shape
             if patch.shape[2]==3:
                 gray=cv2.cvtColor(patch,cv2.COLOR_RGB2GRAY)[:,:,np.newaxis]
             else:
                 gray=patch
             if self._cell_size > 1:
-                gray = self.average_feature_region(gray.astype(np.uint8), self._cell_size)
+                gray = gray.astype(np.uint8)
+                gray = average_feature_region(stage.integral(key + ('gray',), gray), self._cell_size, 255)
             feat.append(gray/255-0.5)
         feat=np.stack(feat,axis=3)
         if normalization is True:
             feat = self._feature_normalization(feat)
         return [feat]
 
-    def integralVecImage(self, img):
-        w, h, c = img.shape
-        intImage = np.zeros((w+1, h+1, c), dtype=img.dtype)
-        intImage[1:, 1:, :] = np.cumsum(np.cumsum(img, 0), 1)
-        return intImage
-
-    def average_feature_region(self, features, region_size):
-        region_area = region_size ** 2
-        if features.dtype == np.float32:
-            maxval = 1.
-        else:
-            maxval = 255
-        intImage = self.integralVecImage(features)
-        i1 = np.arange(region_size, features.shape[0]+1, region_size).reshape(-1, 1)
-        i2 = np.arange(region_size, features.shape[1]+1, region_size).reshape(1, -1)
-        region_image = (intImage[i1, i2, :] - intImage[i1, i2-region_size,:] - intImage[i1-region_size, i2, :] + intImage[i1-region_size, i2-region_size, :])  / (region_area * maxval)
-        return region_image
-
 
 class FHogFeature(Feature):
-    def __init__(self, fname, cell_size=6, compressed_dim=10, num_orients=9, clip=.2,config=otb_hc_config.OTBHCConfig()):
+    def __init__(self, fname, cell_size=6, compressed_dim=10, num_orients=9, clip=.2, feature_pyramid=None,
+                 pyramid_resolution=1., config=otb_hc_config.OTBHCConfig()):
         super(FHogFeature,self).__init__(config)
         self.fname = fname
         self._cell_size = cell_size
@@ -274,25 +226,63 @@ class FHogFeature(Feature):
         self.min_cell_size = self._cell_size
         self.num_dim = [3 * num_orients + 5 - 1]
         self.penalty = [0.]
+        self._pyramid = None
+        if feature_pyramid is not None:
+            # None, 'exact' or 'approx', only used when several scales are sampled (number_of_scales configs)
+            from ...feature_pyramid import FeaturePyramid
+            self._pyramid = FeaturePyramid(cell_size=cell_size, hog_channels=self.num_dim[0], num_orients=num_orients,
+                                           clip=clip, mode=feature_pyramid, resolution=pyramid_resolution)
 
 
-    def get_features(self, img, pos, sample_sz, scales,normalization=True):
+    def get_features(self, img, pos, sample_sz, scales,normalization=True,stage=None):
         feat = []
+        if stage is None:
+            stage = SampleStage()
+            stage.new_frame(img)
         if not isinstance(scales, list) and not isinstance(scales, np.ndarray):
             scales = [scales]
-        for scale in scales:
-            patch = self._sample_patch(img, pos, sample_sz*scale, sample_sz)
-            # h, w, c = patch.shape
-            M, O = _gradient.gradMag(patch.astype(np.float32), 0, True)
-            H = _gradient.fhog(M, O, self._bin_size, self._num_orients, self._soft_bin, self._clip)
-            # drop the last dimension
-            H = H[:, :, :-1]
-            feat.append(H)
-        feat=np.stack(feat,axis=3)
+        if self._pyramid is not None and len(scales) > 1:
+            # sample_sz and pos are (h,w) and (y,x), the pyramid works on (w,h)
+            model_sz = (int(sample_sz[1]), int(sample_sz[0]))
+            h, w, c, s = self._pyramid.output_shape(model_sz, len(scales))
+            # same memory layout as the stacked fortran ordered fhog maps so the normalization sums are unchanged
+            feat = np.empty((c, w, h, s), dtype=np.float32).transpose(2, 1, 0, 3)
+            self._pyramid.extract(
+                lambda scale, out_sz: stage.patch(pos, sample_sz*scale, (out_sz[1], out_sz[0]))[1],
+                model_sz, scales, out=feat)
+        else:
+            backend = get_gradient_backend()
+            for scale in scales:
+                _, patch = stage.patch(pos, sample_sz*scale, sample_sz)
+                # h, w, c = patch.shape
+                M, O = backend.gradMag(patch.astype(np.float32), 0, True)
+                H = backend.fhog(M, O, self._bin_size, self._num_orients, self._soft_bin, self._clip)
+                # drop the last dimension
+                H = H[:, :, :-1]
+                feat.append(H)
+            feat=np.stack(feat,axis=3)
         if normalization is True:
             feat = self._feature_normalization(feat)
         return [feat]
 
+_lookup_tables = {}
+
+def load_lookup_table(table_name):
+    """
+        load a colour lookup table once per process,
+        the .npy copy is memory-mapped, the pickle is only read when it is missing
+    """
+    table = _lookup_tables.get(table_name)
+    if table is None:
+        dir_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "lookup_tables")
+        npy_path = os.path.join(dir_path, table_name + ".npy")
+        if os.path.exists(npy_path):
+            table = np.load(npy_path, mmap_mode='r')
+        else:
+            table = np.ascontiguousarray(pickle.load(open(os.path.join(dir_path, table_name + ".pkl"), "rb")))
+        _lookup_tables[table_name] = table
+    return table
+
 class TableFeature(Feature):
     def __init__(self, fname, compressed_dim, table_name, use_for_color, cell_size=1,config=otb_hc_config.OTBHCConfig()):
         super(TableFeature,self).__init__(config)
@@ -304,8 +294,7 @@ class TableFeature(Feature):
         self._factor = 32
         self._den = 8
         # load table
-        dir_path = os.path.dirname(os.path.realpath(__file__))
-        self._table = pickle.load(open(os.path.join(dir_path, "lookup_tables", self._table_name+".pkl"), "rb"))
+        self._table = load_lookup_table(self._table_name)
 
         self.num_dim = [self._table.shape[1]]
         self.min_cell_size = self._cell_size
@@ -313,31 +302,15 @@ class TableFeature(Feature):
         self.sample_sz = None
         self.data_sz = None
 
-
-    def integralVecImage(self, img):
-        w, h, c = img.shape
-        intImage = np.zeros((w+1, h+1, c), dtype=img.dtype)
-        intImage[1:, 1:, :] = np.cumsum(np.cumsum(img, 0), 1)
-        return intImage
-
-    def average_feature_region(self, features, region_size):
-        region_area = region_size ** 2
-        if features.dtype == np.float32:
-            maxval = 1.
-        else:
-            maxval = 255
-        intImage = self.integralVecImage(features)
-        i1 = np.arange(region_size, features.shape[0]+1, region_size).reshape(-1, 1)
-        i2 = np.arange(region_size, features.shape[1]+1, region_size).reshape(1, -1)
-        region_image = (intImage[i1, i2, :] - intImage[i1, i2-region_size,:] - intImage[i1-region_size, i2, :] + intImage[i1-region_size, i2-region_size, :])  / (region_area * maxval)
-        return region_image
-
-    def get_features(self, img, pos, sample_sz, scales,normalization=True):
+    def get_features(self, img, pos, sample_sz, scales,normalization=True,stage=None):
         feat = []
+        if stage is None:
+            stage = SampleStage()
+            stage.new_frame(img)
         if not isinstance(scales, list) and not isinstance(scales, np.ndarray):
             scales = [scales]
         for scale in scales:
-            patch = self._sample_patch(img, pos, sample_sz*scale, sample_sz)
+            key, patch = stage.patch(pos, sample_sz*scale, sample_sz)
             h, w, c = patch.shape
             if c == 3:
                 RR = patch[:, :, 0].astype(np.int32)
@@ -348,7 +321,8 @@ class TableFeature(Feature):
             else:
                 features = self._table[patch.flatten()].reshape((h, w, self._table.shape[1]))
             if self._cell_size > 1:
-                features = self.average_feature_region(features, self._cell_size)
+                int_image = stage.integral(key + (self._table_name,), features)
+                features = average_feature_region(int_image, self._cell_size, 1. if features.dtype == np.float32 else 255)
             feat.append(features)
         feat=np.stack(feat, axis=3)
         if normalization is True:
@@ -1,8 +1,9 @@
 import numpy as np
 
 from .config import gpu_config
-if gpu_config.use_gpu:
-    import cupy as cp
+from ..lazy_import import lazy_import
+from ..fft_tools import fft_engine
+cp = lazy_import('cupy')
 
 np.seterr(divide='ignore', invalid='ignore')
 
@@ -11,6 +12,8 @@ def fft2(x):
         xp = cp.get_array_module(x)
     else:
         xp = np
+    if xp is np:
+        return fft_engine.fft2(x)
     return xp.fft.fft(xp.fft.fft(x, axis=1), axis=0).astype(xp.complex64)
     # return fft(fft(x, axis=1), axis=0)
 
@@ -19,6 +22,8 @@ def ifft2(x):
         xp = cp.get_array_module(x)
     else:
         xp = np
+    if xp is np:
+        return fft_engine.ifft2(x)
     return xp.fft.ifft(xp.fft.ifft(x, axis=1), axis=0).astype(xp.complex64)
     # return ifft(ifft(x, axis=1), axis=0)
 
@@ -1,9 +1,9 @@
 from .fourier_tools import sample_fs
 from .config import gpu_config
+from ..lazy_import import lazy_import
 
 import numpy as np
-if gpu_config.use_gpu:
-    import cupy as cp
+cp = lazy_import('cupy')
 
 """
     code no problem
@@ -1,7 +1,7 @@
 import numpy as np
 from .config import gpu_config
-if gpu_config.use_gpu:
-    import cupy as cp
+from ..lazy_import import lazy_import
+cp = lazy_import('cupy')
 from .config import otb_hc_config,otb_deep_config
 """
     code tested no problem
@@ -1,11 +1,12 @@
 import numpy as np
 import scipy
 import cv2
-from numpy.fft import fft, ifft
-# from pyfftw.interfaces.numpy_fft import fft, ifft
+from ..fft_tools import fft, ifft
 from scipy import signal
 from .fourier_tools import resize_dft
 from .features import fhog
+from ..scale_pyramid import ScaleSamplePyramid
+from ..subspace import IncrementalSubspace
 
 class ScaleFilter:
     def __init__(self, target_sz,config):
@@ -48,16 +49,42 @@ class ScaleFilter:
         self.scale_step = scale_step
         self.scale_factors = np.array([1])
 
+        # None crops and resizes every scale from the frame, 'pyramid' resamples them from lib.scale_pyramid,
+        # scale_model_sz is (h,w) but the crops were resized to it as (w,h), the engine keeps that
+        self._pyramid = None
+        if self.config.scale_sampling == 'pyramid':
+            self._pyramid = ScaleSamplePyramid((int(self.scale_model_sz[0]), int(self.scale_model_sz[1])),
+                                               hog_fn=lambda patch, cell_size: fhog(patch, cell_size))
+        elif self.config.scale_sampling is not None:
+            raise ValueError('unknown scale sampling ' + str(self.config.scale_sampling))
+        # None recomputes the projection bases every frame, 'incremental' keeps them with lib.subspace,
+        # with 'MAX' dimensions they span every sample and the projection is dropped altogether
+        if self.config.basis_update not in (None, 'incremental'):
+            raise ValueError('unknown basis update ' + str(self.config.basis_update))
+        self._incremental_basis = self.config.basis_update == 'incremental'
+        if self._incremental_basis and not self.max_scale_dim:
+            self._basis_subspace = IncrementalSubspace(self.config.s_num_compressed_dim,
+                                                       refresh_interval=self.config.basis_refresh_interval,
+                                                       tol=self.config.basis_tol)
+            self._den_subspace = IncrementalSubspace(self.config.s_num_compressed_dim,
+                                                     refresh_interval=self.config.basis_refresh_interval,
+                                                     tol=self.config.basis_tol)
+
     def track(self, im, pos, base_target_sz, current_scale_factor):
         """
             track the scale using the scale filter
         """
         # get scale filter features
+        if self._pyramid is not None:
+            self._pyramid.reset()
         scales = current_scale_factor * self.scale_size_factors
         xs = self._extract_scale_sample(im, pos, base_target_sz, scales, self.scale_model_sz)
 
         # project
-        xs = self.basis.dot(xs) * self.window
+        if self.basis is None:
+            xs = xs * self.window
+        else:
+            xs = self.basis.dot(xs) * self.window
 
         # get scores
         xsf = fft(xs, axis=1)
@@ -93,6 +120,9 @@ class ScaleFilter:
             self.s_num = xs
         else:
             self.s_num = (1 - self.config.scale_learning_rate) * self.s_num + self.config.scale_learning_rate * xs
+        if self._incremental_basis:
+            self._learn_incremental(xs, first_frame)
+            return
         # compute projection basis
         if self.max_scale_dim:
             self.basis, _ = scipy.linalg.qr(self.s_num, mode='economic')
@@ -116,7 +146,31 @@ class ScaleFilter:
         else:
             self.sf_den = (1 - self.config.scale_learning_rate) * self.sf_den + self.config.scale_learning_rate * new_sf_den
 
+    def _learn_incremental(self, xs, first_frame):
+        # numerator and denominator from bases kept by lib.subspace, q^T*xs keeps the norms of samples in the
+        # span of q so 'MAX' filters use the samples unprojected
+        if self.max_scale_dim:
+            self.basis = None
+            feat_proj = self.s_num * self.window
+            xs = xs * self.window
+        else:
+            self.basis = self._basis_subspace.update(self.s_num).T
+            feat_proj = self.basis.dot(self.s_num) * self.window
+            xs = self._den_subspace.update(xs).T.dot(xs) * self.window
+        sf_proj = fft(feat_proj, axis=1)
+        self.sf_num = self.yf * np.conj(sf_proj)
+        xsf = fft(xs, axis=1)
+        new_sf_den = np.sum(np.real(xsf * np.conj(xsf)), 0)
+        if first_frame:
+            self.sf_den = new_sf_den
+        else:
+            self.sf_den = (1 - self.config.scale_learning_rate) * self.sf_den + self.config.scale_learning_rate * new_sf_den
+
     def _extract_scale_sample(self, im, pos, base_target_sz, scale_factors, scale_model_sz):
+        if self._pyramid is not None:
+            # pos and base_target_sz are (y,x) and (h,w), the crops started at floor(pos)
+            return self._pyramid.extract(im, (np.floor(pos[1]), np.floor(pos[0])),
+                                         (base_target_sz[1], base_target_sz[0]), scale_factors)
         num_scales = len(scale_factors)
 
         # # downsample factor
@@ -8,15 +8,16 @@ from scipy import signal
 # from numpy.fft import fftshift
 
 from .config import gpu_config
-from .features import GrayFeature,FHogFeature, TableFeature, mround, ResNet50Feature, VGG16Feature
+from ..lazy_import import lazy_import
+from .features import GrayFeature,FHogFeature, TableFeature, mround, SampleStage
 from .fourier_tools import cfft2, interpolate_dft, shift_sample, full_fourier_coeff,\
         cubic_spline_fourier, compact_fourier_coeff, ifft2, fft2, sample_fs
 from .optimize_score import optimize_score
 from .sample_space_model import GMM
 from .train import train_joint, train_filter
 from .scale_filter import ScaleFilter
-if gpu_config.use_gpu:
-    import cupy as cp
+from ..constant_cache import constant_cache
+cp = lazy_import('cupy')
 
 
 class ECOTracker:
@@ -42,6 +43,15 @@ class ECOTracker:
         """
             compute the fourier series of the interpolation function.
         """
+        key = ('eco_interp_fourier', sz, self.config.interp_bicubic_a,
+               self.config.interp_centering, self.config.interp_windowing)
+        interp1_fs, interp2_fs = constant_cache.get(key, lambda: self._build_interp_fourier(sz))
+        if not gpu_config.use_gpu:
+            return interp1_fs, interp2_fs
+        else:
+            return cp.asarray(interp1_fs), cp.asarray(interp2_fs)
+
+    def _build_interp_fourier(self, sz):
         f1 = np.arange(-(sz[0]-1) / 2, (sz[0]-1)/2+1, dtype=np.float32)[:, np.newaxis] / sz[0]
         interp1_fs = np.real(cubic_spline_fourier(f1, self.config.interp_bicubic_a) / sz[0])
         f2 = np.arange(-(sz[1]-1) / 2, (sz[1]-1)/2+1, dtype=np.float32)[np.newaxis, :] / sz[1]
@@ -57,18 +67,23 @@ class ECOTracker:
             win2 = np.hanning(sz[1]+2)[np.newaxis, :]
             interp1_fs = interp1_fs * win1[1:-1]
             interp2_fs = interp2_fs * win2[1:-1]
-        if not gpu_config.use_gpu:
-            return (interp1_fs[:, :, np.newaxis, np.newaxis],
-                    interp2_fs[:, :, np.newaxis, np.newaxis])
-        else:
-            return (cp.asarray(interp1_fs[:, :, np.newaxis, np.newaxis]),
-                    cp.asarray(interp2_fs[:, :, np.newaxis, np.newaxis]))
+        return (interp1_fs[:, :, np.newaxis, np.newaxis],
+                interp2_fs[:, :, np.newaxis, np.newaxis])
 
     def _get_reg_filter(self, sz, target_sz, reg_window_edge):
         """
             compute the spatial regularization function and drive the
             corresponding filter operation used for optimization
         """
+        key = ('eco_reg_filter', sz, target_sz, reg_window_edge, self.config.use_reg_window,
+               self.config.reg_window_min, self.config.reg_window_power, self.config.reg_sparsity_threshold)
+        reg_filter = constant_cache.get(key, lambda: self._build_reg_filter(sz, target_sz, reg_window_edge))
+        if not gpu_config.use_gpu:
+            return reg_filter
+        else:
+            return cp.asarray(reg_filter)
+
+    def _build_reg_filter(self, sz, target_sz, reg_window_edge):
         if self.config.use_reg_window:
             # normalization factor
             reg_scale = 0.5 * target_sz
@@ -99,10 +114,7 @@ class ECOTracker:
         else:
             # else use a scaled identity matrix
             reg_filter = self.config.reg_window_min
-        if not gpu_config.use_gpu:
-            return reg_filter.T
-        else:
-            return cp.asarray(reg_filter.T)
+        return reg_filter.T
 
     def _init_proj_matrix(self, init_sample, compressed_dim, proj_method):
         """
@@ -178,6 +190,8 @@ class ECOTracker:
             elif feature['fname']=='gray':
                 self._features.append(GrayFeature(**feature))
             elif feature['fname'].startswith('cnn'):
+                # mxnet is only imported for the deep configurations
+                from .features.deep_features import ResNet50Feature, VGG16Feature
                 cnn_feature_idx = idx
                 netname = feature['fname'].split('-')[1]
                 if netname == 'resnet50':
@@ -322,8 +336,12 @@ class ECOTracker:
         # extract sample and init projection matrix
         sample_pos = mround(self._pos)
         sample_scale = self._current_scale_factor
+        # patches and integral images shared by the feature blocks
+        self._sample_stage = SampleStage()
+        self._sample_stage.new_frame(frame)
         xl = [x for feature in self._features
-                for x in feature.get_features(frame, sample_pos, self._img_sample_sz, self._current_scale_factor) ]  # get features
+                for x in feature.get_features(frame, sample_pos, self._img_sample_sz, self._current_scale_factor,
+                                              stage=self._sample_stage) ]  # get features
 
         if gpu_config.use_gpu:
             xl = [cp.asarray(x) for x in xl]
@@ -400,6 +418,7 @@ class ECOTracker:
         xp = cp if gpu_config.use_gpu else np
         pos = self._pos
         old_pos = np.zeros((2))
+        self._sample_stage.new_frame(frame)
         for _ in range(self.config.refinement_iterations):
             # if np.any(old_pos != pos):
             if not np.allclose(old_pos, pos):
@@ -408,7 +427,8 @@ class ECOTracker:
                 sample_pos = mround(pos)
                 sample_scale = self._current_scale_factor * self._scale_factor
                 xt = [x for feature in self._features
-                        for x in feature.get_features(frame, sample_pos, self._img_sample_sz, sample_scale) ]  # get features
+                        for x in feature.get_features(frame, sample_pos, self._img_sample_sz, sample_scale,
+                                                      stage=self._sample_stage) ]  # get features
                 if gpu_config.use_gpu:
                     xt = [cp.asarray(x) for x in xt]
                 xt_proj = self._proj_sample(xt, self._proj_matrix)                                             # project sample
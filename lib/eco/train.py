@@ -4,10 +4,10 @@ import warnings
 from scipy.signal import convolve
 from .fourier_tools import symmetrize_filter
 from .config import gpu_config
+from ..lazy_import import lazy_import
 from .cuda_tools import convolve2d
 
-if gpu_config.use_gpu:
-    import cupy as cp
+cp = lazy_import('cupy')
 
 
 def diag_precond(hf, M_diag):
@@ -0,0 +1,86 @@
+"""
+multi-scale fhog (+colour names) features of a search region for the scale-search trackers,
+in 'approx' mode the gradient magnitude/orientation maps (and the per-pixel colour names) are computed once
+on a reference patch covering the largest scale, every scale is then resampled from them before cell pooling
+in the spirit of fast feature pyramids (Dollar et al., TPAMI 2014), 'exact' samples and featurizes every scale
+"""
+import numpy as np
+import cv2
+from lib.feature_registry import get_gradient_backend
+
+class FeaturePyramid:
+    """
+    sample_fn(scale, out_sz) must return the uint8 patch covering the region of the given scale resampled to
+    out_sz=(w,h), the returned stack is h*w*c*S with the hog channels first followed by the cn_extractor channels
+    resolution is the sampling density of the reference patch relative to the smallest scale, lower is faster
+    """
+    modes = ('exact', 'approx')
+
+    def __init__(self, cell_size=4, hog_channels=31, num_orients=9, clip=0.2, cn_extractor=None,
+                 mode='approx', resolution=1.):
+        if mode not in self.modes:
+            raise ValueError('unknown pyramid mode ' + str(mode))
+        self.cell_size = cell_size
+        self.hog_channels = hog_channels
+        self.num_orients = num_orients
+        self.clip = clip
+        self.cn_extractor = cn_extractor
+        self.mode = mode
+        self.resolution = resolution
+
+    @property
+    def num_dim(self):
+        if self.cn_extractor is None:
+            return self.hog_channels
+        return self.hog_channels + self.cn_extractor.num_dim
+
+    def output_shape(self, model_sz, num_scales):
+        return (int(model_sz[1]) // self.cell_size, int(model_sz[0]) // self.cell_size, self.num_dim, num_scales)
+
+    def reference_size(self, model_sz, scales):
+        ratio = np.max(scales) / np.min(scales) * self.resolution
+        return (max(int(round(model_sz[0] * ratio)), 2), max(int(round(model_sz[1] * ratio)), 2))
+
+    def _hog(self, M, O, out):
+        H = get_gradient_backend().fhog(M, O, self.cell_size, self.num_orients, -1, self.clip)
+        out[:, :, :self.hog_channels] = H[:out.shape[0], :out.shape[1], :self.hog_channels]
+
+    def _level_exact(self, patch, out):
+        M, O = get_gradient_backend().gradMag(patch.astype(np.float32), 0, True)
+        self._hog(M, O, out)
+        if self.cn_extractor is not None:
+            self.cn_extractor.extract(patch, self.cell_size, out=out[:, :, self.hog_channels:])
+
+    def extract(self, sample_fn, model_sz, scales, out=None):
+        model_sz = (int(model_sz[0]), int(model_sz[1]))
+        if out is None:
+            out = np.empty(self.output_shape(model_sz, len(scales)), dtype=np.float32)
+        if self.mode == 'exact':
+            for i, scale in enumerate(scales):
+                self._level_exact(sample_fn(scale, model_sz), out[:, :, :, i])
+            return out
+
+        ref_sz = self.reference_size(model_sz, scales)
+        ref = sample_fn(np.max(scales), ref_sz)
+        M, O = get_gradient_backend().gradMag(ref.astype(np.float32), 0, True)
+        groups = []
+        if self.cn_extractor is not None:
+            # opencv only area-resamples up to 4 channels with a non-integer factor
+            pixels = self.cn_extractor.extract(ref, 1)
+            groups = [np.ascontiguousarray(pixels[:, :, c:c + 4]) for c in range(0, pixels.shape[2], 4)]
+        cell_sz = (out.shape[1], out.shape[0])
+        for i, scale in enumerate(scales):
+            frac = scale / np.max(scales)
+            w, h = max(int(round(ref_sz[0] * frac)), 2), max(int(round(ref_sz[1] * frac)), 2)
+            x0, y0 = (ref_sz[0] - w) // 2, (ref_sz[1] - h) // 2
+            # magnitudes are rescaled like the gradients of the resampled image, orientations are not interpolated
+            M_s = cv2.resize(M[y0:y0 + h, x0:x0 + w], model_sz,
+                             interpolation=cv2.INTER_AREA if w > model_sz[0] else cv2.INTER_LINEAR) * (w / model_sz[0])
+            O_s = cv2.resize(O[y0:y0 + h, x0:x0 + w], model_sz, interpolation=cv2.INTER_NEAREST)
+            self._hog(np.ascontiguousarray(M_s, dtype=np.float32), O_s, out[:, :, :, i])
+            c = self.hog_channels
+            for group in groups:
+                cells = cv2.resize(group[y0:y0 + h, x0:x0 + w], cell_sz, interpolation=cv2.INTER_AREA)
+                out[:, :, c:c + group.shape[2], i] = cells.reshape((cell_sz[1], cell_sz[0], -1))
+                c += group.shape[2]
+        return out
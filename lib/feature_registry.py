@@ -0,0 +1,233 @@
+"""
+registry of the interchangeable implementations of each feature kind (hog, cn, gray, ic),
+every backend of a kind is called as fn(patch, cell_size) on a bgr uint8 patch and returns the same
+h//cell_size*w//cell_size*c float32 layout, the hog and cn backends also take out= and write their first
+out.shape[2] (hog) or all (cn) channels into it, backends are registered by priority, the first one that loads
+is the reference of its kind and is what the trackers use by default, backends registered pin_only (e.g. a
+different channel layout) are never benchmarked or calibrated and are only used when pinned
+
+with feature_backend_config.calibrate each kind is instead calibrated on first use on synthetic patches, the
+backends whose relative error ||f-f_ref||/||f_ref|| stays within the kind's tolerance are timed and the fastest one
+is kept, the reference is only replaced when the winner is at least min_speedup times faster, the choice then
+depends on the machine and the tracker output may differ slightly from the reference, calibrating also loads every
+backend once (the numba ones compile on first call), feature_backend_config.pinned (or pin_feature_backend) forces
+a backend in both cases
+"""
+import time
+import numpy as np
+import cv2
+from collections import OrderedDict
+
+class FeatureBackendConfig:
+    pinned={}                    # kind -> backend name
+    calibrate=False              # True picks the fastest backend within tolerance on first use, machine dependent
+    calibration_sizes=((64,64),)
+    calibration_cell_size=4
+    calibration_repeats=3
+    min_speedup=1.1
+
+feature_backend_config=FeatureBackendConfig()
+
+def synthetic_patches(sizes, seed=0):
+    # smooth random bgr patches with a textured square, deterministic so runs are comparable
+    rng=np.random.RandomState(seed)
+    patches=[]
+    for h,w in sizes:
+        patch=cv2.GaussianBlur((rng.rand(h,w,3)*255).astype(np.uint8),(0,0),1.5)
+        patch[h//4:3*h//4,w//4:3*w//4]=(rng.rand(h-2*(h//4),w-2*(w//4),3)*255).astype(np.uint8)
+        patches.append(patch)
+    return patches
+
+class FeatureRegistry:
+    def __init__(self):
+        self._kinds=OrderedDict()
+        self._selected={}
+
+    def register_kind(self, kind, tolerance=1e-3):
+        self._kinds[kind]={'tolerance':tolerance,'loaders':OrderedDict(),'loaded':{},'pin_only':set()}
+
+    def register(self, kind, name, loader, pin_only=False):
+        """
+        :param loader: called once on first use, returns fn(patch, cell_size) or raises ImportError
+        :param pin_only: the backend is not interchangeable with the reference and is only used when pinned
+        """
+        if kind not in self._kinds:
+            self.register_kind(kind)
+        self._kinds[kind]['loaders'][name]=loader
+        if pin_only:
+            self._kinds[kind]['pin_only'].add(name)
+        self._selected.pop(kind,None)
+
+    def kinds(self):
+        return list(self._kinds.keys())
+
+    def backends(self, kind):
+        return list(self._entry(kind)['loaders'].keys())
+
+    def _entry(self, kind):
+        if kind not in self._kinds:
+            raise ValueError('unknown feature kind '+str(kind))
+        return self._kinds[kind]
+
+    def load(self, kind, name):
+        # returns the backend function, or None when it can not be imported here
+        entry=self._entry(kind)
+        if name not in entry['loaders']:
+            raise ValueError('unknown '+kind+' backend '+str(name))
+        if name not in entry['loaded']:
+            try:
+                entry['loaded'][name]=entry['loaders'][name]()
+            except ImportError:
+                entry['loaded'][name]=None
+        return entry['loaded'][name]
+
+    def interchangeable(self, kind):
+        # the backends that may be selected without pinning, in priority order
+        entry=self._entry(kind)
+        return [name for name in entry['loaders'] if name not in entry['pin_only']]
+
+    def available(self, kind):
+        return [name for name in self.interchangeable(kind) if self.load(kind,name) is not None]
+
+    def benchmark(self, kind, sizes=None, cell_size=None, repeats=None):
+        """
+        per-backend latency (best of repeats, summed over the patches), maximum absolute deviation and worst
+        relative error from the reference backend, backends that fail to load or to run are reported with their error,
+        pin_only backends are listed without running them
+        """
+        config=feature_backend_config
+        sizes=config.calibration_sizes if sizes is None else sizes
+        cell_size=config.calibration_cell_size if cell_size is None else cell_size
+        repeats=config.calibration_repeats if repeats is None else repeats
+        patches=synthetic_patches(sizes)
+        rows=[]
+        reference=None
+        for name in self.backends(kind):
+            row={'kind':kind,'backend':name,'ms':None,'max_dev':None,'rel_err':None,'error':None}
+            rows.append(row)
+            if name in self._entry(kind)['pin_only']:
+                row['error']='pin only'
+                continue
+            fn=self.load(kind,name)
+            if fn is None:
+                row['error']='not available'
+                continue
+            try:
+                # the first call also absorbs lazy table loading and jit compilation
+                outputs=[np.asarray(fn(patch,cell_size),dtype=np.float32) for patch in patches]
+                elapsed=np.inf
+                for _ in range(repeats):
+                    start=time.perf_counter()
+                    for patch in patches:
+                        fn(patch,cell_size)
+                    elapsed=min(elapsed,time.perf_counter()-start)
+            except Exception as e:
+                row['error']=type(e).__name__+': '+str(e)
+                continue
+            if reference is None:
+                reference=outputs
+            if any(o.shape!=r.shape for o,r in zip(outputs,reference)):
+                row['error']='shape mismatch'
+                continue
+            row['ms']=elapsed*1e3
+            row['max_dev']=max(float(np.max(np.abs(o-r))) if o.size else 0. for o,r in zip(outputs,reference))
+            row['rel_err']=max(float(np.linalg.norm(o-r)/max(np.linalg.norm(r),1e-12)) for o,r in zip(outputs,reference))
+        return rows
+
+    def calibrate(self, kind):
+        entry=self._entry(kind)
+        rows=[row for row in self.benchmark(kind) if row['error'] is None]
+        if not rows:
+            raise ValueError('no working '+kind+' backend')
+        reference=rows[0]
+        candidates=[row for row in rows if row['rel_err']<=entry['tolerance']]
+        fastest=min(candidates,key=lambda row:row['ms'])
+        if fastest['ms']*feature_backend_config.min_speedup>reference['ms']:
+            fastest=reference
+        self._selected[kind]=fastest['backend']
+        return fastest['backend']
+
+    def selected(self, kind):
+        """
+        name of the backend used for kind, calibrating it on first use
+        """
+        pinned=feature_backend_config.pinned.get(kind)
+        if pinned is not None:
+            return pinned
+        if kind not in self._selected:
+            if feature_backend_config.calibrate:
+                self.calibrate(kind)
+            else:
+                available=self.available(kind)
+                if not available:
+                    raise ValueError('no working '+kind+' backend')
+                self._selected[kind]=available[0]
+        return self._selected[kind]
+
+    def get(self, kind):
+        name=self.selected(kind)
+        fn=self.load(kind,name)
+        if fn is None:
+            raise ValueError(kind+' backend '+str(name)+' is not available')
+        return fn
+
+    def reset(self):
+        self._selected.clear()
+
+feature_registry=FeatureRegistry()
+
+def pin_feature_backend(kind, name):
+    # name None goes back to the calibrated choice
+    if name is None:
+        feature_backend_config.pinned.pop(kind,None)
+    else:
+        feature_registry.load(kind,name)
+        feature_backend_config.pinned[kind]=name
+
+def get_feature_backend(kind):
+    return feature_registry.get(kind)
+
+class GradientHog:
+    """
+    hog backend over the gradMag/fhog calls of the _gradient extension or of its numba port lib.fhog, called like
+    every hog backend it returns the 31 fhog channels, gradMag and fhog are exposed for the callers that need other
+    fhog parameters or the gradient maps themselves (lib.eco features, lib.feature_pyramid),
+    with writes_out fhog takes out= and only computes the channels out holds, otherwise they are copied into it
+    """
+    def __init__(self, module, writes_out=False):
+        self.gradMag=module.gradMag
+        self.fhog=module.fhog
+        self.writes_out=writes_out
+
+    def __call__(self, patch, cell_size, out=None):
+        M,O=self.gradMag(patch.astype(np.float32),0,True)
+        if out is None:
+            return self.fhog(M,O,cell_size,9,-1,0.2)[:,:,:-1]
+        if self.writes_out:
+            return self.fhog(M,O,cell_size,9,-1,0.2,out=out)
+        out[:]=self.fhog(M,O,cell_size,9,-1,0.2)[:,:,:out.shape[2]]
+        return out
+
+def _load_gradient_hog(module_name, writes_out=False):
+    import importlib
+    return GradientHog(importlib.import_module(module_name),writes_out)
+
+# registered here rather than with the other kinds in cftracker.feature so lib.eco and lib.feature_pyramid can
+# look them up, the numba port gives the same bits as the extension (examples/fhog_parity.py)
+feature_registry.register_kind('hog', tolerance=1e-3)
+feature_registry.register('hog', 'cython', lambda: _load_gradient_hog('lib.eco.features._gradient'))
+feature_registry.register('hog', 'numba', lambda: _load_gradient_hog('lib.fhog', writes_out=True))
+
+def get_gradient_backend():
+    """
+    gradMag/fhog of the hog backend in use, so pinning or calibrating hog applies to every fhog caller,
+    a pinned backend without them (pyhog) leaves those callers on the first available gradient backend
+    """
+    fn=feature_registry.get('hog')
+    if isinstance(fn,GradientHog):
+        return fn
+    for name in feature_registry.available('hog'):
+        fn=feature_registry.load('hog',name)
+        if isinstance(fn,GradientHog):
+            return fn
+    raise ValueError('no hog backend with gradMag/fhog')
@@ -1,9 +1,177 @@
 import numpy as np
-def fft2(x):
-    return np.fft.fft(np.fft.fft(x, axis=1), axis=0).astype(np.complex64)
+from collections import OrderedDict
+from .precision import as_complex
 
-def ifft2(x):
-    return np.fft.ifft(np.fft.ifft(x, axis=1), axis=0).astype(np.complex64)
+class _CallPlan:
+    # numpy and scipy.fft have no plan objects, the cached entry binds the call and every result is a fresh array
+    bound_output = False
+
+    def __init__(self, func, s, axes, **kwargs):
+        self.func = func
+        self.s = s
+        self.axes = axes
+        self.kwargs = kwargs
+
+    def __call__(self, a):
+        return self.func(a, s=self.s, axes=self.axes, **self.kwargs)
+
+class _FFTWPlan:
+    """
+    pyfftw plan built once per (kind, shape, axes, dtype) with its aligned input and output arrays bound,
+    a call copies a into the input array (which the transform preserves, builders overwrite_input=False) and
+    returns the bound output array, so the result is only valid until the next call of the plan
+    """
+    bound_output = True
+
+    def __init__(self, pyfftw, kind, x, axes, s, threads, planner_effort):
+        builder = getattr(pyfftw.builders, kind + 'n')
+        # planning with FFTW_MEASURE overwrites the arrays, so it runs on an empty aligned array of the same layout
+        self.fftw = builder(pyfftw.empty_aligned(x.shape, dtype=x.dtype), s=s, axes=axes, overwrite_input=False,
+                            avoid_copy=False, threads=threads, planner_effort=planner_effort)
+        self.output = self.fftw.output_array
+
+    def __call__(self, a):
+        self.fftw(a)
+        return self.output
+
+class FFTEngine:
+    """
+    process-wide fft backend, one of 'numpy', 'scipy' (multi-threaded through workers) or 'pyfftw'
+    plans are cached per (kind, shape, axes, dtype), pyfftw plans own their aligned input/output buffers and
+    transform into them, so with out= the bound output is copied into the caller's buffer without any other
+    allocation, numpy and scipy have no output argument, every call allocates its result and out= only copies it,
+    the 2-D transforms return complex64 (float32 for irfft2) unless a dtype is given
+    """
+    backends = ('numpy', 'scipy', 'pyfftw')
+
+    def __init__(self, backend='numpy', workers=1, max_plans=64):
+        self.max_plans = max_plans
+        self._plans = OrderedDict()
+        self.set_backend(backend, workers)
+
+    def set_backend(self, backend, workers=1, planner_effort='FFTW_MEASURE'):
+        if backend not in self.backends:
+            raise ValueError('unknown fft backend ' + str(backend))
+        if backend == 'scipy':
+            import scipy.fft
+            self._module = scipy.fft
+        elif backend == 'pyfftw':
+            import pyfftw
+            import pyfftw.builders
+            self._module = pyfftw
+        else:
+            self._module = np.fft
+        self.backend = backend
+        self.workers = workers
+        self.planner_effort = planner_effort
+        self._plans.clear()
+
+    def _get_plan(self, kind, x, axes, s):
+        key = (kind, x.shape, axes, x.dtype.str, s)
+        plan = self._plans.get(key)
+        if plan is None:
+            plan = self._build_plan(kind, x, axes, s)
+            self._plans[key] = plan
+            if len(self._plans) > self.max_plans:
+                self._plans.popitem(last=False)
+        else:
+            self._plans.move_to_end(key)
+        return plan
+
+    def _build_plan(self, kind, x, axes, s):
+        if self.backend == 'pyfftw':
+            return _FFTWPlan(self._module, kind, x, axes, s, self.workers, self.planner_effort)
+        func = getattr(self._module, kind + 'n')
+        if self.backend == 'scipy':
+            return _CallPlan(func, s, axes, workers=self.workers)
+        return _CallPlan(func, s, axes)
+
+    def _execute(self, kind, x, axes, s, dtype, out):
+        plan = self._get_plan(kind, x, axes, s)
+        res = plan(x)
+        if out is not None:
+            np.copyto(out, res, casting='unsafe')
+            return out
+        # a bound output array is overwritten by the next call of its plan, so it does not leave the engine
+        return res.astype(dtype, copy=plan.bound_output)
+
+    def fft2(self, x, axes=(0, 1), out=None, dtype=np.complex64):
+        return self._execute('fft', x, axes, None, dtype, out)
+
+    def ifft2(self, xf, axes=(0, 1), out=None, dtype=np.complex64):
+        return self._execute('ifft', xf, axes, None, dtype, out)
+
+    def rfft2(self, x, axes=(0, 1), out=None, dtype=np.complex64):
+        return self._execute('rfft', x, axes, None, dtype, out)
+
+    def irfft2(self, xf, shape, axes=(0, 1), out=None, dtype=np.float32):
+        return self._execute('irfft', xf, axes, tuple(shape), dtype, out)
+
+    def _execute_1d(self, kind, x, axis):
+        # 1-D transforms used by the scale filters keep double precision unless single precision is enabled
+        plan = self._get_plan(kind, x, (axis,), None)
+        res = plan(x)
+        return as_complex(res.copy() if plan.bound_output else res)
+
+    def fft(self, x, axis=-1):
+        return self._execute_1d('fft', x, axis)
+
+    def ifft(self, xf, axis=-1):
+        return self._execute_1d('ifft', xf, axis)
+
+fft_engine = FFTEngine()
+
+def set_fft_backend(backend, workers=1):
+    fft_engine.set_backend(backend, workers)
+
+def fft2(x, out=None, dtype=np.complex64):
+    return fft_engine.fft2(x, out=out, dtype=dtype)
+
+def ifft2(x, out=None, dtype=np.complex64):
+    return fft_engine.ifft2(x, out=out, dtype=dtype)
+
+def fft(x, axis=-1):
+    return fft_engine.fft(x, axis)
+
+def ifft(x, axis=-1):
+    return fft_engine.ifft(x, axis)
+
+def fft2_stack(x, out=None):
+    # spectrum of every channel and scale of a h*w*c*s stack in a single transform over the first two axes
+    return fft_engine.fft2(x, axes=(0, 1), out=out)
+
+def rfft2_stack(x, out=None):
+    # half spectra of a h*w*c*s stack, h*(w//2+1)*c*s
+    return fft_engine.rfft2(x, axes=(0, 1), out=out)
+
+class SpectrumStack:
+    """
+    h*w*c*s stack of real samples filled slice by slice and transformed in one call,
+    the sample and spectrum buffers are reused while the stack shape does not change,
+    so the returned spectrum is only valid until the next transform, with half_spectrum it is the rfft2 half spectrum
+    """
+    def __init__(self, dtype=np.float32, half_spectrum=False):
+        self.dtype = dtype
+        self.half_spectrum = half_spectrum
+        self.x = None
+        self.xf = None
+
+    def reset(self, shape):
+        shape = tuple(shape)
+        if self.x is None or self.x.shape != shape:
+            self.x = np.empty(shape, dtype=self.dtype)
+            if self.half_spectrum:
+                self.xf = np.empty((shape[0], shape[1] // 2 + 1) + shape[2:], dtype=np.complex64)
+            else:
+                self.xf = np.empty(shape, dtype=np.complex64)
+        return self.x
+
+    def transform(self, window=None):
+        if window is not None:
+            self.x *= window.reshape(window.shape[:2] + (1,) * (self.x.ndim - 2))
+        if self.half_spectrum:
+            return rfft2_stack(self.x, out=self.xf)
+        return fft2_stack(self.x, out=self.xf)
 
 def cifft2(xf):
     x = np.real(ifft2(np.fft.ifftshift(np.fft.ifftshift(xf, 0),1))).astype(np.float32)
@@ -25,3 +193,39 @@ def cfft2(x):
         if out_shape[1] != in_shape[1]:
             xf[:,-1] = np.conj(xf[::-1,0])
     return xf[:in_shape[0],:in_shape[1]]
+
+def rfft2(x, out=None, dtype=np.complex64):
+    # half spectrum of a real signal, the last transformed axis (axis 1) keeps w//2+1 columns
+    return fft_engine.rfft2(x, out=out, dtype=dtype)
+
+def irfft2(xf, shape, out=None, dtype=np.float32):
+    # shape is the (h,w) of the real signal the half spectrum was computed from
+    return fft_engine.irfft2(xf, shape, out=out, dtype=dtype)
+
+def full_spectrum(xf, w):
+    """
+    full h*w spectrum of the h*(w//2+1) half spectrum of a real signal of width w, the missing columns are
+    X[k,l]=conj(X[-k mod h,w-l]), for the operations that need the whole grid (resize_dft2, resp_newton)
+    """
+    h, half = xf.shape[0], xf.shape[1]
+    out = np.empty((h, w) + xf.shape[2:], dtype=xf.dtype)
+    out[:, :half] = xf
+    rows = -np.arange(h) % h
+    np.conj(xf[rows][:, w - np.arange(half, w)], out=out[:, half:])
+    return out
+
+def hermitian_weights(w):
+    """
+    multiplicity of every column of a half spectrum in the full one,
+    the dc column and (for even w) the nyquist column appear once, the others twice
+    """
+    weights = np.full(w // 2 + 1, 2, dtype=np.float32)
+    weights[0] = 1
+    if w % 2 == 0:
+        weights[-1] = 1
+    return weights
+
+def half_spectrum_energy(xf, w):
+    # sum(|X|^2) over the full spectrum, equals N*sum(x^2) for the real signal x
+    weights = hermitian_weights(w).reshape((1, -1) + (1,) * (xf.ndim - 2))
+    return np.sum(weights * (xf.real ** 2 + xf.imag ** 2))
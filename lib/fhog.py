@@ -1,33 +1,49 @@
+import math
+import platform
 import numpy as np
 import cv2
-from numba import jit
+from numba import njit, prange, types
+from numba.core import cgutils
+from numba.extending import intrinsic
+from llvmlite import ir
 
 """
 https://github.com/uoip/KCFpy/blob/master/fhog.py
+nopython kernels parallel over rows or columns, every stage accepts a preallocated output,
+gradMag/fhog below are a port of the _gradient extension (Piotr's toolbox) with the same signatures so the
+hog features are available when the extension can not be built, on x86 they call the same sse approximations and
+acos as the extension and give the same bits, see examples/fhog_parity.py
 """
 # constant
 NUM_SECTOR = 9
 FLT_EPSILON = 1e-07
 
-xrange=range
-
-@jit
-def func1(dx, dy, boundary_x, boundary_y, height, width, numChannels):
-    r = np.zeros((height, width), np.float32)
-    alfa = np.zeros((height, width, 2), np.int)
-
-    for j in xrange(1, height - 1):
-        for i in xrange(1, width - 1):
+PI = np.float32(3.14159265)
+
+
+@njit(parallel=True, cache=True)
+def _gradient_map(dx, dy, boundary_x, boundary_y, r, alfa):
+    height, width, num_channels = dx.shape
+    for j in prange(height):
+        r[j, 0] = 0
+        r[j, width - 1] = 0
+        alfa[j, 0, :] = 0
+        alfa[j, width - 1, :] = 0
+        if j == 0 or j == height - 1:
+            r[j, :] = 0
+            alfa[j, :, :] = 0
+            continue
+        for i in range(1, width - 1):
             c = 0
             x = dx[j, i, c]
             y = dy[j, i, c]
             r[j, i] = np.sqrt(x * x + y * y)
 
-            for ch in xrange(1, numChannels):
+            for ch in range(1, num_channels):
                 tx = dx[j, i, ch]
                 ty = dy[j, i, ch]
                 magnitude = np.sqrt(tx * tx + ty * ty)
-                if (magnitude > r[j, i]):
+                if magnitude > r[j, i]:
                     r[j, i] = magnitude
                     c = ch
                     x = tx
@@ -36,135 +52,118 @@ def func1(dx, dy, boundary_x, boundary_y, height, width, numChannels):
             mmax = boundary_x[0] * x + boundary_y[0] * y
             maxi = 0
 
-            for kk in xrange(0, NUM_SECTOR):
+            for kk in range(0, NUM_SECTOR):
                 dotProd = boundary_x[kk] * x + boundary_y[kk] * y
-                if (dotProd > mmax):
+                if dotProd > mmax:
                     mmax = dotProd
                     maxi = kk
-                elif (-dotProd > mmax):
+                elif -dotProd > mmax:
                     mmax = -dotProd
                     maxi = kk + NUM_SECTOR
 
             alfa[j, i, 0] = maxi % NUM_SECTOR
             alfa[j, i, 1] = maxi
-    return r, alfa
-
-
-@jit
-def func2(dx, dy, boundary_x, boundary_y, r, alfa, nearest, w, k, height, width, sizeX, sizeY, p, stringSize):
-    mapp = np.zeros((sizeX * sizeY * p), np.float32)
-    for i in xrange(sizeY):
-        for j in xrange(sizeX):
-            for ii in xrange(k):
-                for jj in xrange(k):
-                    if ((i * k + ii > 0) and (i * k + ii < height - 1) and (j * k + jj > 0) and (
-                            j * k + jj < width - 1)):
-                        mapp[i * stringSize + j * p + alfa[k * i + ii, j * k + jj, 0]] += r[k * i + ii, j * k + jj] * w[
-                            ii, 0] * w[jj, 0]
-                        mapp[i * stringSize + j * p + alfa[k * i + ii, j * k + jj, 1] + NUM_SECTOR] += r[
-                                                                                                           k * i + ii, j * k + jj] * \
-                                                                                                       w[ii, 0] * w[
-                                                                                                           jj, 0]
-                        if ((i + nearest[ii] >= 0) and (i + nearest[ii] <= sizeY - 1)):
-                            mapp[(i + nearest[ii]) * stringSize + j * p + alfa[k * i + ii, j * k + jj, 0]] += r[
-                                                                                                                  k * i + ii, j * k + jj] * \
-                                                                                                              w[ii, 1] * \
-                                                                                                              w[jj, 0]
-                            mapp[(i + nearest[ii]) * stringSize + j * p + alfa[
-                                k * i + ii, j * k + jj, 1] + NUM_SECTOR] += r[k * i + ii, j * k + jj] * w[ii, 1] * w[
-                                jj, 0]
-                        if ((j + nearest[jj] >= 0) and (j + nearest[jj] <= sizeX - 1)):
-                            mapp[i * stringSize + (j + nearest[jj]) * p + alfa[k * i + ii, j * k + jj, 0]] += r[
-                                                                                                                  k * i + ii, j * k + jj] * \
-                                                                                                              w[ii, 0] * \
-                                                                                                              w[jj, 1]
-                            mapp[i * stringSize + (j + nearest[jj]) * p + alfa[
-                                k * i + ii, j * k + jj, 1] + NUM_SECTOR] += r[k * i + ii, j * k + jj] * w[ii, 0] * w[
-                                jj, 1]
-                        if ((i + nearest[ii] >= 0) and (i + nearest[ii] <= sizeY - 1) and (j + nearest[jj] >= 0) and (
-                                j + nearest[jj] <= sizeX - 1)):
-                            mapp[(i + nearest[ii]) * stringSize + (j + nearest[jj]) * p + alfa[
-                                k * i + ii, j * k + jj, 0]] += r[k * i + ii, j * k + jj] * w[ii, 1] * w[jj, 1]
-                            mapp[(i + nearest[ii]) * stringSize + (j + nearest[jj]) * p + alfa[
-                                k * i + ii, j * k + jj, 1] + NUM_SECTOR] += r[k * i + ii, j * k + jj] * w[ii, 1] * w[
-                                jj, 1]
-    return mapp
 
 
-@jit
-def func3(partOfNorm, mappmap, sizeX, sizeY, p, xp, pp):
-    newData = np.zeros((sizeY * sizeX * pp), np.float32)
-    for i in xrange(1, sizeY + 1):
-        for j in xrange(1, sizeX + 1):
+@njit(parallel=True, cache=True)
+def _cell_histograms(r, alfa, nearest, w, k, sizeX, sizeY, p, out):
+    # gathered per output row so every cell receives its contributions in the serial (i,j,ii,jj) order
+    height, width = r.shape
+    stringSize = sizeX * p
+    for row in prange(sizeY):
+        out[row * stringSize:(row + 1) * stringSize] = 0
+        for i in range(max(row - 1, 0), min(row + 2, sizeY)):
+            for j in range(sizeX):
+                for ii in range(k):
+                    if i != row and i + nearest[ii] != row:
+                        continue
+                    for jj in range(k):
+                        y = k * i + ii
+                        x = k * j + jj
+                        if not (y > 0 and y < height - 1 and x > 0 and x < width - 1):
+                            continue
+                        a0 = alfa[y, x, 0]
+                        a1 = alfa[y, x, 1] + NUM_SECTOR
+                        if i == row:
+                            out[i * stringSize + j * p + a0] += r[y, x] * w[ii, 0] * w[jj, 0]
+                            out[i * stringSize + j * p + a1] += r[y, x] * w[ii, 0] * w[jj, 0]
+                        elif i + nearest[ii] >= 0 and i + nearest[ii] <= sizeY - 1:
+                            out[row * stringSize + j * p + a0] += r[y, x] * w[ii, 1] * w[jj, 0]
+                            out[row * stringSize + j * p + a1] += r[y, x] * w[ii, 1] * w[jj, 0]
+                        if j + nearest[jj] >= 0 and j + nearest[jj] <= sizeX - 1:
+                            if i == row:
+                                out[i * stringSize + (j + nearest[jj]) * p + a0] += r[y, x] * w[ii, 0] * w[jj, 1]
+                                out[i * stringSize + (j + nearest[jj]) * p + a1] += r[y, x] * w[ii, 0] * w[jj, 1]
+                            elif i + nearest[ii] >= 0 and i + nearest[ii] <= sizeY - 1:
+                                out[row * stringSize + (j + nearest[jj]) * p + a0] += r[y, x] * w[ii, 1] * w[jj, 1]
+                                out[row * stringSize + (j + nearest[jj]) * p + a1] += r[y, x] * w[ii, 1] * w[jj, 1]
+
+
+@njit(parallel=True, cache=True)
+def _normalize_truncate(mappmap, numFeatures, sizeX, sizeY, p, xp, pp, alfa, out):
+    partOfNorm = np.empty((sizeY + 2) * (sizeX + 2), np.float32)
+    for i in prange((sizeY + 2) * (sizeX + 2)):
+        pos = i * numFeatures
+        s = np.float32(0)
+        for t in range(p):
+            s += mappmap[pos + t] * mappmap[pos + t]
+        partOfNorm[i] = s
+    for i in prange(1, sizeY + 1):
+        for j in range(1, sizeX + 1):
             pos1 = i * (sizeX + 2) * xp + j * xp
             pos2 = (i - 1) * sizeX * pp + (j - 1) * pp
-
-            valOfNorm = np.sqrt(partOfNorm[(i) * (sizeX + 2) + (j)] +
-                                partOfNorm[(i) * (sizeX + 2) + (j + 1)] +
-                                partOfNorm[(i + 1) * (sizeX + 2) + (j)] +
-                                partOfNorm[(i + 1) * (sizeX + 2) + (j + 1)]) + FLT_EPSILON
-            newData[pos2:pos2 + p] = mappmap[pos1:pos1 + p] / valOfNorm
-            newData[pos2 + 4 * p:pos2 + 6 * p] = mappmap[pos1 + p:pos1 + 3 * p] / valOfNorm
-
-            valOfNorm = np.sqrt(partOfNorm[(i) * (sizeX + 2) + (j)] +
-                                partOfNorm[(i) * (sizeX + 2) + (j + 1)] +
-                                partOfNorm[(i - 1) * (sizeX + 2) + (j)] +
-                                partOfNorm[(i - 1) * (sizeX + 2) + (j + 1)]) + FLT_EPSILON
-            newData[pos2 + p:pos2 + 2 * p] = mappmap[pos1:pos1 + p] / valOfNorm
-            newData[pos2 + 6 * p:pos2 + 8 * p] = mappmap[pos1 + p:pos1 + 3 * p] / valOfNorm
-
-            valOfNorm = np.sqrt(partOfNorm[(i) * (sizeX + 2) + (j)] +
-                                partOfNorm[(i) * (sizeX + 2) + (j - 1)] +
-                                partOfNorm[(i + 1) * (sizeX + 2) + (j)] +
-                                partOfNorm[(i + 1) * (sizeX + 2) + (j - 1)]) + FLT_EPSILON
-            newData[pos2 + 2 * p:pos2 + 3 * p] = mappmap[pos1:pos1 + p] / valOfNorm
-            newData[pos2 + 8 * p:pos2 + 10 * p] = mappmap[pos1 + p:pos1 + 3 * p] / valOfNorm
-
-            valOfNorm = np.sqrt(partOfNorm[(i) * (sizeX + 2) + (j)] +
-                                partOfNorm[(i) * (sizeX + 2) + (j - 1)] +
-                                partOfNorm[(i - 1) * (sizeX + 2) + (j)] +
-                                partOfNorm[(i - 1) * (sizeX + 2) + (j - 1)]) + FLT_EPSILON
-            newData[pos2 + 3 * p:pos2 + 4 * p] = mappmap[pos1:pos1 + p] / valOfNorm
-            newData[pos2 + 10 * p:pos2 + 12 * p] = mappmap[pos1 + p:pos1 + 3 * p] / valOfNorm
-    return newData
-
-
-@jit
-def func4(mappmap, p, sizeX, sizeY, pp, yp, xp, nx, ny):
-    newData = np.zeros((sizeX * sizeY * pp), np.float32)
-    for i in xrange(sizeY):
-        for j in xrange(sizeX):
+            for n in range(4):
+                di = 1 if n == 0 or n == 2 else -1
+                dj = 1 if n < 2 else -1
+                valOfNorm = np.sqrt(partOfNorm[i * (sizeX + 2) + j] +
+                                    partOfNorm[i * (sizeX + 2) + (j + dj)] +
+                                    partOfNorm[(i + di) * (sizeX + 2) + j] +
+                                    partOfNorm[(i + di) * (sizeX + 2) + (j + dj)]) + FLT_EPSILON
+                for t in range(p):
+                    out[pos2 + n * p + t] = min(mappmap[pos1 + t] / valOfNorm, alfa)
+                for t in range(2 * p):
+                    out[pos2 + (4 + 2 * n) * p + t] = min(mappmap[pos1 + p + t] / valOfNorm, alfa)
+
+
+@njit(parallel=True, cache=True)
+def _pca_features(mappmap, p, sizeX, sizeY, pp, yp, xp, nx, ny, out):
+    for i in prange(sizeY):
+        for j in range(sizeX):
             pos1 = (i * sizeX + j) * p
             pos2 = (i * sizeX + j) * pp
 
-            for jj in xrange(2 * xp):  # 2*9
-                newData[pos2 + jj] = np.sum(mappmap[pos1 + yp * xp + jj: pos1 + 3 * yp * xp + jj: 2 * xp]) * ny
-            for jj in xrange(xp):  # 9
-                newData[pos2 + 2 * xp + jj] = np.sum(mappmap[pos1 + jj: pos1 + jj + yp * xp: xp]) * ny
-            for ii in xrange(yp):  # 4
-                newData[pos2 + 3 * xp + ii] = np.sum(
-                    mappmap[pos1 + yp * xp + ii * xp * 2: pos1 + yp * xp + ii * xp * 2 + 2 * xp]) * nx
-    return newData
-
-
-def getFeatureMaps(image, k, mapp):
+            for jj in range(2 * xp):
+                s = 0.
+                for t in range(pos1 + yp * xp + jj, pos1 + 3 * yp * xp + jj, 2 * xp):
+                    s += mappmap[t]
+                out[pos2 + jj] = s * ny
+            for jj in range(xp):
+                s = 0.
+                for t in range(pos1 + jj, pos1 + jj + yp * xp, xp):
+                    s += mappmap[t]
+                out[pos2 + 2 * xp + jj] = s * ny
+            for ii in range(yp):
+                s = 0.
+                for t in range(pos1 + yp * xp + ii * xp * 2, pos1 + yp * xp + ii * xp * 2 + 2 * xp):
+                    s += mappmap[t]
+                out[pos2 + 3 * xp + ii] = s * nx
+
+
+def getFeatureMaps(image, k, mapp, out=None):
     kernel = np.array([[-1., 0., 1.]], np.float32)
 
     height = image.shape[0]
     width = image.shape[1]
     assert (image.ndim == 3 and image.shape[2])
-    numChannels = 3  # (1 if image.ndim==2 else image.shape[2])
 
     sizeX = width // k
     sizeY = height // k
     px = 3 * NUM_SECTOR
     p = px
-    stringSize = sizeX * p
 
     mapp['sizeX'] = sizeX
     mapp['sizeY'] = sizeY
     mapp['numFeatures'] = p
-    mapp['map'] = np.zeros((mapp['sizeX'] * mapp['sizeY'] * mapp['numFeatures']), np.float32)
 
     dx = cv2.filter2D(np.float32(image), -1, kernel)  # np.float32(...) is necessary
     dy = cv2.filter2D(np.float32(image), -1, kernel.T)
@@ -173,27 +172,11 @@ def getFeatureMaps(image, k, mapp):
     boundary_x = np.cos(arg_vector)
     boundary_y = np.sin(arg_vector)
 
-    '''
-    ### original implementation
-    r, alfa = func1(dx, dy, boundary_x, boundary_y, height, width, numChannels) #func1 without @jit  ### 
-
-    ### 40x speedup
-    magnitude = np.sqrt(dx**2 + dy**2)
-    r = np.max(magnitude, axis=2)
-    c = np.argmax(magnitude, axis=2)
-    idx = (np.arange(c.shape[0])[:,np.newaxis], np.arange(c.shape[1]), c)
-    x, y = dx[idx], dy[idx]
-
-    dotProd = x[:,:,np.newaxis] * boundary_x[np.newaxis,np.newaxis,:] + y[:,:,np.newaxis] * boundary_y[np.newaxis,np.newaxis,:]
-    dotProd = np.concatenate((dotProd, -dotProd), axis=2)
-    maxi = np.argmax(dotProd, axis=2)
-    alfa = np.dstack((maxi % NUM_SECTOR, maxi)) ###
-    '''
-    ### 200x speedup
-    r, alfa = func1(dx, dy, boundary_x, boundary_y, height, width, numChannels)  # with @jit
-    ### ~0.001s
-
-    nearest = np.ones((k), np.int)
+    r = np.empty((height, width), np.float32)
+    alfa = np.empty((height, width, 2), np.int64)
+    _gradient_map(dx, dy, boundary_x, boundary_y, r, alfa)
+
+    nearest = np.ones((k), np.int64)
     nearest[0:k // 2] = -1
 
     w = np.zeros((k, 2), np.float32)
@@ -205,85 +188,34 @@ def getFeatureMaps(image, k, mapp):
     w[:, 0] = 1.0 / a_x * ((a_x * b_x) / (a_x + b_x))
     w[:, 1] = 1.0 / b_x * ((a_x * b_x) / (a_x + b_x))
 
-    '''
-    ### original implementation
-    mapp['map'] = func2(dx, dy, boundary_x, boundary_y, r, alfa, nearest, w, k, height, width, sizeX, sizeY, p, stringSize) #func2 without @jit  ###
-    '''
-    ### 500x speedup
-    mapp['map'] = func2(dx, dy, boundary_x, boundary_y, r, alfa, nearest, w, k, height, width, sizeX, sizeY, p,
-                        stringSize)  # with @jit
-    ### ~0.001s
-
+    if out is None:
+        out = np.empty((sizeX * sizeY * p), np.float32)
+    _cell_histograms(r, alfa, nearest, w, k, sizeX, sizeY, p, out)
+    mapp['map'] = out
     return mapp
 
 
-def normalizeAndTruncate(mapp, alfa):
-    sizeX = mapp['sizeX']
-    sizeY = mapp['sizeY']
+def normalizeAndTruncate(mapp, alfa, out=None):
+    sizeX = mapp['sizeX'] - 2
+    sizeY = mapp['sizeY'] - 2
 
     p = NUM_SECTOR
     xp = NUM_SECTOR * 3
     pp = NUM_SECTOR * 12
 
-    '''
-    ### original implementation
-    partOfNorm = np.zeros((sizeY*sizeX), np.float32)
-
-    for i in xrange(sizeX*sizeY):
-        pos = i * mapp['numFeatures']
-        partOfNorm[i] = np.sum(mapp['map'][pos:pos+p]**2) ###
-    '''
-    ### 50x speedup
-    idx = np.arange(0, sizeX * sizeY * mapp['numFeatures'], mapp['numFeatures']).reshape(
-        (sizeX * sizeY, 1)) + np.arange(p)
-    partOfNorm = np.sum(mapp['map'][idx] ** 2, axis=1)  ### ~0.0002s
-
-    sizeX, sizeY = sizeX - 2, sizeY - 2
-
-    '''
-    ### original implementation
-    newData = func3(partOfNorm, mapp['map'], sizeX, sizeY, p, xp, pp) #func3 without @jit  ###
-
-    ### 30x speedup
-    newData = np.zeros((sizeY*sizeX*pp), np.float32)
-    idx = (np.arange(1,sizeY+1)[:,np.newaxis] * (sizeX+2) + np.arange(1,sizeX+1)).reshape((sizeY*sizeX, 1))   # much faster than it's List Comprehension counterpart (see next line)
-    #idx = np.array([[i*(sizeX+2) + j] for i in xrange(1,sizeY+1) for j in xrange(1,sizeX+1)])
-    pos1 = idx * xp
-    pos2 = np.arange(sizeY*sizeX)[:,np.newaxis] * pp
-
-    valOfNorm1 = np.sqrt(partOfNorm[idx] + partOfNorm[idx+1] + partOfNorm[idx+sizeX+2] + partOfNorm[idx+sizeX+2+1]) + FLT_EPSILON
-    valOfNorm2 = np.sqrt(partOfNorm[idx] + partOfNorm[idx+1] + partOfNorm[idx-sizeX-2] + partOfNorm[idx+sizeX-2+1]) + FLT_EPSILON
-    valOfNorm3 = np.sqrt(partOfNorm[idx] + partOfNorm[idx-1] + partOfNorm[idx+sizeX+2] + partOfNorm[idx+sizeX+2-1]) + FLT_EPSILON
-    valOfNorm4 = np.sqrt(partOfNorm[idx] + partOfNorm[idx-1] + partOfNorm[idx-sizeX-2] + partOfNorm[idx+sizeX-2-1]) + FLT_EPSILON
-
-    map1 = mapp['map'][pos1 + np.arange(p)]
-    map2 = mapp['map'][pos1 + np.arange(p,3*p)]
-
-    newData[pos2 + np.arange(p)] = map1 / valOfNorm1
-    newData[pos2 + np.arange(4*p,6*p)] = map2 / valOfNorm1
-    newData[pos2 + np.arange(p,2*p)] = map1 / valOfNorm2
-    newData[pos2 + np.arange(6*p,8*p)] = map2 / valOfNorm2
-    newData[pos2 + np.arange(2*p,3*p)] = map1 / valOfNorm3
-    newData[pos2 + np.arange(8*p,10*p)] = map2 / valOfNorm3
-    newData[pos2 + np.arange(3*p,4*p)] = map1 / valOfNorm4
-    newData[pos2 + np.arange(10*p,12*p)] = map2 / valOfNorm4 ###
-    '''
-    ### 30x speedup
-    newData = func3(partOfNorm, mapp['map'], sizeX, sizeY, p, xp, pp)  # with @jit
-    ###
-
-    # truncation
-    newData[newData > alfa] = alfa
+    if out is None:
+        out = np.empty((sizeY * sizeX * pp), np.float32)
+    _normalize_truncate(mapp['map'], mapp['numFeatures'], sizeX, sizeY, p, xp, pp, np.float32(alfa), out)
 
     mapp['numFeatures'] = pp
     mapp['sizeX'] = sizeX
     mapp['sizeY'] = sizeY
-    mapp['map'] = newData
+    mapp['map'] = out
 
     return mapp
 
 
-def PCAFeatureMaps(mapp):
+def PCAFeatureMaps(mapp, out=None):
     sizeX = mapp['sizeX']
     sizeY = mapp['sizeY']
 
@@ -295,44 +227,348 @@ def PCAFeatureMaps(mapp):
     nx = 1.0 / np.sqrt(xp * 2)
     ny = 1.0 / np.sqrt(yp)
 
-    '''
-    ### original implementation
-    newData = func4(mapp['map'], p, sizeX, sizeY, pp, yp, xp, nx, ny) #func without @jit  ###
-
-    ### 7.5x speedup
-    newData = np.zeros((sizeX*sizeY*pp), np.float32)
-    idx1 = np.arange(2*xp).reshape((2*xp, 1)) + np.arange(xp*yp, 3*xp*yp, 2*xp)
-    idx2 = np.arange(xp).reshape((xp, 1)) + np.arange(0, xp*yp, xp)
-    idx3 = np.arange(0, 2*xp*yp, 2*xp).reshape((yp, 1)) + np.arange(xp*yp, xp*yp+2*xp)
-
-    for i in xrange(sizeY):
-        for j in xrange(sizeX):
-            pos1 = (i*sizeX + j) * p
-            pos2 = (i*sizeX + j) * pp
-
-            newData[pos2 : pos2+2*xp] = np.sum(mapp['map'][pos1 + idx1], axis=1) * ny
-            newData[pos2+2*xp : pos2+3*xp] = np.sum(mapp['map'][pos1 + idx2], axis=1) * ny
-            newData[pos2+3*xp : pos2+3*xp+yp] = np.sum(mapp['map'][pos1 + idx3], axis=1) * nx ###
-
-    ### 120x speedup 
-    newData = np.zeros((sizeX*sizeY*pp), np.float32)
-    idx01 = (np.arange(0,sizeX*sizeY*pp,pp)[:,np.newaxis] + np.arange(2*xp)).reshape((sizeX*sizeY*2*xp))
-    idx02 = (np.arange(0,sizeX*sizeY*pp,pp)[:,np.newaxis] + np.arange(2*xp,3*xp)).reshape((sizeX*sizeY*xp))
-    idx03 = (np.arange(0,sizeX*sizeY*pp,pp)[:,np.newaxis] + np.arange(3*xp,3*xp+yp)).reshape((sizeX*sizeY*yp))
-
-    idx11 = (np.arange(0,sizeX*sizeY*p,p)[:,np.newaxis] + np.arange(2*xp)).reshape((sizeX*sizeY*2*xp, 1)) + np.arange(xp*yp, 3*xp*yp, 2*xp)
-    idx12 = (np.arange(0,sizeX*sizeY*p,p)[:,np.newaxis] + np.arange(xp)).reshape((sizeX*sizeY*xp, 1)) + np.arange(0, xp*yp, xp)
-    idx13 = (np.arange(0,sizeX*sizeY*p,p)[:,np.newaxis] + np.arange(0, 2*xp*yp, 2*xp)).reshape((sizeX*sizeY*yp, 1)) + np.arange(xp*yp, xp*yp+2*xp)
-
-    newData[idx01] = np.sum(mapp['map'][idx11], axis=1) * ny
-    newData[idx02] = np.sum(mapp['map'][idx12], axis=1) * ny
-    newData[idx03] = np.sum(mapp['map'][idx13], axis=1) * nx ###
-    '''
-    ### 190x speedup
-    newData = func4(mapp['map'], p, sizeX, sizeY, pp, yp, xp, nx, ny)  # with @jit
-    ###
+    if out is None:
+        out = np.empty((sizeX * sizeY * pp), np.float32)
+    _pca_features(mapp['map'], p, sizeX, sizeY, pp, yp, xp, nx, ny, out)
 
     mapp['numFeatures'] = pp
-    mapp['map'] = newData
+    mapp['map'] = out
 
     return mapp
+
+
+@njit(cache=True)
+def _acosf(x, out):
+    # single precision acos of the c library as the extension calls it, numpy's float32 arccos rounds differently
+    for i in range(x.shape[0]):
+        out[i] = math.acos(x[i])
+
+
+def _acos_table():
+    # a[i+n+b]~=acos(i/n) for i in [-n-b,n+b), as acosTable() of the extension
+    n, b = 10000, 10
+    a = np.empty(2 * (n + b), np.float32)
+    a[:b] = PI
+    _acosf(np.arange(-n, n).astype(np.float32) / np.float32(n), a[b:b + 2 * n])
+    a[b + 2 * n:] = 0
+    a[:n + b + n // 10] = np.minimum(a[:n + b + n // 10], PI - np.float32(1e-6))
+    return a
+
+_acost = _acos_table()
+
+
+def _sse_approximation(name):
+    # scalar form of the sse approximation the extension uses (rsqrtps/rcpps), the same lookup on the same cpu
+    @intrinsic
+    def approximation(typingctx, x):
+        if x != types.float32:
+            return None
+
+        def codegen(context, builder, signature, args):
+            vec = ir.VectorType(ir.FloatType(), 4)
+            fn = cgutils.get_or_insert_function(builder.module, ir.FunctionType(vec, [vec]), 'llvm.x86.sse.' + name)
+            zero = ir.Constant(ir.IntType(32), 0)
+            v = builder.insert_element(ir.Constant(vec, [0.] * 4), args[0], zero)
+            return builder.extract_element(builder.call(fn, [v]), zero)
+        return types.float32(types.float32), codegen
+    return approximation
+
+if platform.machine().lower() in ('x86_64', 'amd64', 'i386', 'i686', 'x86'):
+    _rsqrt = _sse_approximation('rsqrt.ss')
+    _rcp = _sse_approximation('rcp.ss')
+else:
+    # the extension needs sse, elsewhere the exact operations stand in
+    @njit(cache=True)
+    def _rsqrt(x):
+        return np.float32(1) / np.sqrt(x)
+
+    @njit(cache=True)
+    def _rcp(x):
+        return np.float32(1) / x
+
+
+@njit(parallel=True, cache=True, error_model='numpy')
+def _grad_mag(I, acost, full, M, O):
+    h, w, d = I.shape
+    half, one, ac_mult, big = np.float32(.5), np.float32(1), np.float32(10000), np.float32(1e10)
+    offset = (acost.shape[0]) // 2
+    for y in prange(h):
+        y0, y1, ry = y - 1, y + 1, half
+        if y == 0:
+            y0, ry = 0, one
+        elif y == h - 1:
+            y1, ry = h - 1, one
+        for x in range(w):
+            x0, x1, rx = x - 1, x + 1, half
+            if x == 0:
+                x0, rx = 0, one
+            elif x == w - 1:
+                x1, rx = w - 1, one
+            m2, gx, gy = np.float32(0), np.float32(0), np.float32(0)
+            # gradient of the channel with the largest squared magnitude
+            for c in range(d):
+                cgx = (I[y, x1, c] - I[y, x0, c]) * rx
+                cgy = (I[y1, x, c] - I[y0, x, c]) * ry
+                cm2 = cgx * cgx + cgy * cgy
+                if c == 0 or cm2 > m2:
+                    m2, gx, gy = cm2, cgx, cgy
+            # the approximate reciprocals and the operand order of _mm_min_ps as in the extension
+            m = _rsqrt(m2)
+            if not m < big:
+                m = big
+            M[y, x] = _rcp(m)
+            gx = gx * m * ac_mult
+            if math.copysign(1., gy) < 0:
+                gx = -gx
+            o = acost[offset + int(gx)]
+            if full and gy < 0:
+                o += PI
+            O[y, x] = o
+
+
+def gradMag(I, channel=0, full=False, M=None, O=None):
+    """
+    same call as _gradient.gradMag(I, channel, full), returns the (h,w) fortran ordered magnitude and orientation,
+    M and O can be preallocated float32 arrays of shape (h,w)
+    """
+    I = np.asarray(I, dtype=np.float32)
+    if I.ndim == 2:
+        I = I[:, :, None]
+    if 0 < channel < I.shape[2]:
+        I = I[:, :, channel:channel + 1]
+    h, w = I.shape[:2]
+    if M is None:
+        M = np.empty((h, w), dtype=np.float32, order='F')
+    if O is None:
+        O = np.empty((h, w), dtype=np.float32, order='F')
+    _grad_mag(I, _acost, bool(full), M, O)
+    return M, O
+
+
+@njit(cache=True)
+def _quantize(o, m, o_mult, o_max, nb, norm, interpolate):
+    o = o * o_mult
+    if interpolate:
+        o0 = int(o)
+        od = o - np.float32(o0)
+        o0 *= nb
+        if o0 >= o_max:
+            o0 = 0
+        o1 = o0 + nb
+        if o1 >= o_max:
+            o1 = 0
+        m = m * norm
+        m1 = od * m
+        return o0, o1, m - m1, m1
+    o0 = int(o + np.float32(.5))
+    o0 *= nb
+    if o0 >= o_max:
+        o0 = 0
+    return o0, 0, m * norm, np.float32(0)
+
+
+@njit(parallel=True, cache=True)
+def _grad_hist(M, O, H, bin_size, n_orients, soft_bin, full):
+    h, w = M.shape
+    hb, wb = h // bin_size, w // bin_size
+    h0, w0, nb = hb * bin_size, wb * bin_size, wb * hb
+    s = np.float32(bin_size)
+    s_inv = np.float32(1) / s
+    s_inv2 = np.float32(1) / s / s
+    one = np.float32(1)
+    o_mult = np.float32(n_orients) / (np.float32(2) * PI if full else PI)
+    o_max = n_orients * nb
+    interpolate = soft_bin >= 0
+
+    if soft_bin % 2 == 0 or bin_size == 1:
+        # no spatial interpolation, every column only feeds its own cell column
+        for xc in prange(wb):
+            for x in range(xc * bin_size, xc * bin_size + bin_size):
+                for y in range(h0):
+                    o0, o1, m0, m1 = _quantize(O[y, x], M[y, x], o_mult, o_max, nb, s_inv2, interpolate)
+                    H[o0 + xc * hb + y // bin_size] += m0
+                    if not (soft_bin < 0 and soft_bin % 2 == 0):
+                        H[o1 + xc * hb + y // bin_size] += m1
+    else:
+        # trilinear interpolation, the bin coordinates are accumulated in float32 as the extension does
+        init = (np.float32(0) + np.float32(.5)) * s_inv - np.float32(.5)
+        xb0s = np.empty(w0, np.int64)
+        xds = np.empty(w0, np.float32)
+        has_lf = np.empty(w0, np.bool_)
+        xb = init
+        for x in range(w0):
+            has_lf[x] = xb >= 0
+            xb0s[x] = int(xb) if has_lf[x] else -1
+            xds[x] = xb - np.float32(xb0s[x])
+            xb += s_inv
+        yb0s = np.empty(h0, np.int64)
+        yds = np.empty(h0, np.float32)
+        kinds = np.empty(h0, np.int64)
+        yb = init
+        kind = 0
+        for y in range(h0):
+            if y < bin_size // 2:
+                yb0 = -1
+            else:
+                yb0 = int(yb)
+                kind = 1 if kind < 2 and yb0 < hb - 1 else 2
+            kinds[y] = kind
+            yb0s[y] = yb0
+            yds[y] = yb - np.float32(yb0)
+            yb += s_inv
+        # gathered per cell column so every bin receives its contributions in the serial (x,y) order
+        for xc in prange(wb):
+            for x in range(max(0, (xc - 1) * bin_size), min(w0, (xc + 2) * bin_size)):
+                xb0 = xb0s[x]
+                lf = has_lf[x] and xb0 == xc
+                rt = xb0 < wb - 1 and xb0 + 1 == xc
+                if not (lf or rt):
+                    continue
+                xd = xds[x]
+                for y in range(h0):
+                    o0, o1, m0, m1 = _quantize(O[y, x], M[y, x], o_mult, o_max, nb, s_inv2, interpolate)
+                    yd = yds[y]
+                    xyd = xd * yd
+                    ms0 = one - xd - yd + xyd
+                    ms1 = yd - xyd
+                    ms2 = xd - xyd
+                    ms3 = xyd
+                    base = xb0 * hb + yb0s[y]
+                    if kinds[y] == 0:
+                        if lf:
+                            H[base + o0 + 1] += ms1 * m0
+                            if interpolate:
+                                H[base + o1 + 1] += ms1 * m1
+                        else:
+                            H[base + o0 + hb + 1] += ms3 * m0
+                            if interpolate:
+                                H[base + o1 + hb + 1] += ms3 * m1
+                    elif kinds[y] == 1:
+                        if lf:
+                            H[base + o0] += ms0 * m0
+                            H[base + o0 + 1] += ms1 * m0
+                            if interpolate:
+                                H[base + o1] += ms0 * m1
+                                H[base + o1 + 1] += ms1 * m1
+                        else:
+                            H[base + o0 + hb] += ms2 * m0
+                            H[base + o0 + hb + 1] += ms3 * m0
+                            if interpolate:
+                                H[base + o1 + hb] += ms2 * m1
+                                H[base + o1 + hb + 1] += ms3 * m1
+                    else:
+                        if lf:
+                            H[base + o0] += ms0 * m0
+                            if interpolate:
+                                H[base + o1] += ms0 * m1
+                        else:
+                            H[base + o0 + hb] += ms2 * m0
+                            if interpolate:
+                                H[base + o1 + hb] += ms2 * m1
+
+    # normalize boundary bins which only get 7/8 of weight of interior bins
+    if soft_bin % 2 != 0:
+        f = np.float32(8) / np.float32(7)
+        for o in prange(n_orients):
+            for y in range(hb):
+                H[o * nb + y] *= f
+            for x in range(wb):
+                H[o * nb + x * hb] *= f
+            for y in range(hb):
+                H[o * nb + (wb - 1) * hb + y] *= f
+            for x in range(wb):
+                H[o * nb + x * hb + hb - 1] *= f
+
+
+@njit(cache=True)
+def _hog_norm_matrix(H, n_orients, hb, wb, bin_size):
+    hb1, wb1 = hb + 1, wb + 1
+    eps = np.float32(1e-4) / np.float32(4) / np.float32(bin_size) / np.float32(bin_size) / \
+          np.float32(bin_size) / np.float32(bin_size)
+    S = np.zeros(hb1 * wb1, np.float32)
+    for o in range(n_orients):
+        for x in range(wb):
+            for y in range(hb):
+                v = H[o * wb * hb + x * hb + y]
+                S[(x + 1) * hb1 + y + 1] += v * v
+    N = S.copy()
+    for x in range(wb - 1):
+        for y in range(hb - 1):
+            n = (x + 1) * hb1 + y + 1
+            N[n] = np.float32(1) / np.sqrt(S[n] + S[n + 1] + S[n + hb1] + S[n + hb1 + 1] + eps)
+    N[0] = N[hb1 + 1]
+    for y in range(hb1):
+        N[y] = N[hb1 + y]
+    N[hb1 - 1] = N[hb1 + hb1 - 2]
+    x = wb1 - 1
+    N[x * hb1] = N[(x - 1) * hb1 + 1]
+    for y in range(hb1):
+        N[x * hb1 + y] = N[(x - 1) * hb1 + y]
+    N[x * hb1 + hb1 - 1] = N[(x - 1) * hb1 + hb1 - 2]
+    for x in range(wb1):
+        N[x * hb1] = N[x * hb1 + 1]
+    for x in range(wb1):
+        N[x * hb1 + hb1 - 1] = N[x * hb1 + hb1 - 2]
+    return N
+
+
+@njit(parallel=True, cache=True)
+def _hog_channels(H, ch0, R, N, hb, wb, n_orients, clip, type_):
+    # H is the (hb, wb, channels) output with any strides, channels past its last one are skipped
+    nb, hb1 = wb * hb, hb + 1
+    nc = H.shape[2]
+    r = np.float32(.2357)
+    half = np.float32(.5)
+    for x in prange(wb):
+        for o in range(n_orients):
+            if type_ == 1 and ch0 + o >= nc:
+                break
+            for y in range(hb):
+                v = R[o * nb + x * hb + y]
+                n1 = x * hb1 + hb1 + 1 + y
+                for c, blk in enumerate((0, 1, hb1, hb1 + 1)):
+                    t = v * N[n1 - blk]
+                    if t > clip:
+                        t = clip
+                    if type_ == 1:
+                        H[y, x, ch0 + o] += t * half
+                    elif ch0 + c < nc:
+                        H[y, x, ch0 + c] += t * r
+
+
+@njit(cache=True)
+def _fhog(M, O, bin_size, n_orients, soft_bin, clip, H):
+    h, w = M.shape
+    hb, wb = h // bin_size, w // bin_size
+    nb = hb * wb
+    nbo = nb * n_orients
+    H[:, :, :] = 0
+    R1 = np.zeros(wb * hb * n_orients * 2, np.float32)
+    _grad_hist(M, O, R1, bin_size, n_orients * 2, soft_bin, True)
+    R2 = np.empty(wb * hb * n_orients, np.float32)
+    for i in range(nbo):
+        R2[i] = R1[i] + R1[nbo + i]
+    N = _hog_norm_matrix(R2, n_orients, hb, wb, bin_size)
+    _hog_channels(H, 0, R1, N, hb, wb, n_orients * 2, clip, 1)
+    if H.shape[2] > n_orients * 2:
+        _hog_channels(H, n_orients * 2, R2, N, hb, wb, n_orients, clip, 1)
+    if H.shape[2] > n_orients * 3:
+        _hog_channels(H, n_orients * 3, R1, N, hb, wb, n_orients * 2, clip, 2)
+
+
+def fhog(M, O, bin_size=8, num_orients=9, soft_bin=-1, clip=0.2, out=None):
+    """
+    same call as _gradient.fhog(M, O, bin_size, num_orients, soft_bin, clip), returns the
+    (h//bin_size, w//bin_size, 3*num_orients+5) fortran ordered features, the last channel is zero,
+    out can be a preallocated float32 array of that shape with any strides, or holding only the first channels,
+    which are then the only ones computed (e.g. a slice of a larger feature stack)
+    """
+    M = np.asarray(M, dtype=np.float32)
+    O = np.asarray(O, dtype=np.float32)
+    shape = (M.shape[0] // bin_size, M.shape[1] // bin_size, num_orients * 3 + 5)
+    if out is None:
+        out = np.empty(shape, dtype=np.float32, order='F')
+    if out.ndim != 3 or out.shape[:2] != shape[:2] or not 0 < out.shape[2] <= shape[2] or out.dtype != np.float32:
+        raise ValueError('out must be a float32 array of shape ' + str(shape) + ' or of its first channels')
+    _fhog(M, O, bin_size, num_orients, soft_bin, np.float32(clip), out)
+    return out
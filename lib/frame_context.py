@@ -0,0 +1,103 @@
+"""
+derived representations of one frame (gray, float32, colour spaces, resized copies, integral images) shared by
+every tracker and scale estimator updated on it, each one is computed on first use and memoised in an lru
+bounded by max_bytes, trackers accept a FrameContext wherever they accept a BGR uint8 frame
+"""
+import itertools
+from collections import OrderedDict
+import numpy as np
+import cv2
+
+# names of the uint8 representations, the value is the cv2.cvtColor code from BGR
+COLOUR_CODES = {'gray': cv2.COLOR_BGR2GRAY, 'rgb': cv2.COLOR_BGR2RGB, 'hsv': cv2.COLOR_BGR2HSV,
+                'lab': cv2.COLOR_BGR2Lab}
+
+def _nbytes(v):
+    if isinstance(v, np.ndarray):
+        return v.nbytes
+    if isinstance(v, tuple):
+        return sum(_nbytes(e) for e in v)
+    return 0
+
+def _read_only(v):
+    if isinstance(v, np.ndarray):
+        v.setflags(write=False)
+    elif isinstance(v, tuple):
+        for e in v:
+            _read_only(e)
+    return v
+
+class FrameContext:
+    """
+    cached arrays are read-only, callers copy before writing in place,
+    the frame itself is not counted in max_bytes and never evicted
+    """
+    _frame_ids = itertools.count()
+
+    def __init__(self, frame, max_bytes=64*1024*1024):
+        self.frame = frame
+        self.frame_id = next(self._frame_ids)
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, builder):
+        # memoised builder() under key, for representations specific to one tracker
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry
+        self.misses += 1
+        entry = _read_only(builder())
+        size = _nbytes(entry)
+        if size <= self.max_bytes:
+            self._entries[key] = entry
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= _nbytes(evicted)
+        return entry
+
+    def image(self, name='bgr'):
+        # the frame ('bgr') or one of its COLOUR_CODES conversions, a single channel frame is its own 'gray'
+        if name == 'bgr' or (name == 'gray' and self.frame.ndim == 2):
+            return self.frame
+        if name not in COLOUR_CODES:
+            raise ValueError('unknown frame representation ' + str(name))
+        return self.get(('image', name), lambda: cv2.cvtColor(self.frame, COLOUR_CODES[name]))
+
+    def gray(self):
+        return self.image('gray')
+
+    def float32(self, name='bgr', divisor=1.):
+        # image(name).astype(np.float32)/divisor, kept bit-identical to the per-tracker conversions
+        def build():
+            img = self.image(name).astype(np.float32)
+            return img if divisor == 1. else img / divisor
+        return self.get(('float32', name, divisor), build)
+
+    def resized(self, factor, name='bgr', interpolation=cv2.INTER_LINEAR):
+        return self.get(('resized', name, factor, interpolation),
+                        lambda: cv2.resize(self.image(name), None, fx=factor, fy=factor, interpolation=interpolation))
+
+    def integral(self, name='gray', sdepth=cv2.CV_64F):
+        return self.get(('integral', name, sdepth), lambda: cv2.integral(self.image(name), sdepth=sdepth))
+
+    def stats(self):
+        return {'entries': len(self._entries), 'nbytes': self.nbytes, 'max_bytes': self.max_bytes,
+                'hits': self.hits, 'misses': self.misses}
+
+def frame_context(frame):
+    # the context itself, or a fresh one wrapping a plain frame
+    if isinstance(frame, FrameContext):
+        return frame
+    return FrameContext(frame)
+
+def as_frame(frame):
+    # the plain frame of a context, for code that only crops from it
+    if isinstance(frame, FrameContext):
+        return frame.frame
+    return frame
@@ -0,0 +1,105 @@
+"""
+kernel correlation of multi-channel samples for the kernelised trackers (KCF, CSK, CN, SAMF, LDES, MKCFup),
+k(a,b) is evaluated from the spectra with the channel sum taken before a single inverse transform, so its cost
+does not grow with the number of channels, the samples may carry trailing batch axes (scales or targets)
+that are all correlated against the same model in one call
+"""
+import numpy as np
+from .fft_tools import fft2, ifft2, rfft2, irfft2, hermitian_weights
+
+def _with_channels(xf):
+    # a single channel h*w spectrum becomes h*w*1
+    if xf.ndim == 2:
+        return xf[:, :, None]
+    return xf
+
+class KernelCorrelation:
+    """
+    kernel is 'gaussian' (sigma), 'polynomial' ((ab/n+poly_a)**poly_b) or 'linear',
+    spectra are the fft2 of h*w*c(*batch) samples, or rfft2 half spectra of h*w signals when rfft_shape=(h,w),
+    norm_size 'sample' divides by h*w*c like KCF, 'pixel' by h*w like the MKCF code,
+    set_model keeps the model spectrum and its self-norm until the model changes,
+    dtype is the complex dtype of the spectra and kernels it transforms
+    """
+    kernels = ('gaussian', 'polynomial', 'linear')
+
+    def __init__(self, kernel='gaussian', sigma=0.5, poly_a=1., poly_b=7, rfft_shape=None, norm_size='sample',
+                 dtype=np.complex64):
+        if kernel not in self.kernels:
+            raise ValueError('unknown kernel ' + str(kernel))
+        if norm_size not in ('sample', 'pixel'):
+            raise ValueError('unknown norm size ' + str(norm_size))
+        self.kernel = kernel
+        self.sigma = sigma
+        self.poly_a = poly_a
+        self.poly_b = poly_b
+        self.rfft_shape = rfft_shape
+        self.norm_size = norm_size
+        self.dtype = dtype
+        self.model_f = None
+        self.model_norm = None
+
+    def _fft2(self, x):
+        if self.rfft_shape is not None:
+            return rfft2(x, dtype=self.dtype)
+        return fft2(x, dtype=self.dtype)
+
+    def _ifft2(self, xf):
+        if self.rfft_shape is not None:
+            return irfft2(xf, self.rfft_shape, dtype=np.finfo(self.dtype).dtype)
+        return np.real(ifft2(xf, dtype=self.dtype))
+
+    def _num_pixels(self, xf):
+        if self.rfft_shape is not None:
+            return self.rfft_shape[0] * self.rfft_shape[1]
+        return xf.shape[0] * xf.shape[1]
+
+    def norm(self, xf):
+        # sum(x**2) of every sample from its spectrum (parseval), a scalar or one value per batch entry
+        xf = _with_channels(xf)
+        energy = xf.real ** 2 + xf.imag ** 2
+        if self.rfft_shape is not None:
+            energy *= hermitian_weights(self.rfft_shape[1]).reshape((1, -1) + (1,) * (xf.ndim - 2))
+        return np.sum(energy, axis=(0, 1, 2)) / self._num_pixels(xf)
+
+    def set_model(self, xf):
+        self.model_f = xf
+        self.model_norm = self.norm(xf) if self.kernel == 'gaussian' else None
+
+    def correlate(self, af, bf, aa=None, bb=None, spatial=False):
+        """
+        kernel spectrum of k(a,b)=kappa(sum_c ifft2(af*conj(bf))), either side may have batch axes,
+        aa and bb are their norms when already known, spatial returns the real kernel instead of its spectrum
+        """
+        af, bf = _with_channels(af), _with_channels(bf)
+        num_channels = max(af.shape[2], bf.shape[2])
+        size = self._num_pixels(af)
+        if self.norm_size == 'sample':
+            size *= num_channels
+        if af.ndim < bf.ndim:
+            af = af.reshape(af.shape + (1,) * (bf.ndim - af.ndim))
+        elif bf.ndim < af.ndim:
+            bf = bf.reshape(bf.shape + (1,) * (af.ndim - bf.ndim))
+        abf = np.sum(af * np.conj(bf), axis=2)
+        if self.kernel == 'linear':
+            kf = abf / size
+            return self._ifft2(kf) if spatial else kf
+        ab = self._ifft2(abf)
+        if self.kernel == 'gaussian':
+            if aa is None:
+                aa = self.norm(af)
+            if bb is None:
+                bb = self.norm(bf)
+            k = np.exp(-1 / self.sigma ** 2 * np.clip(aa + bb - 2 * ab, a_min=0, a_max=None) / size)
+        else:
+            k = (ab / size + self.poly_a) ** self.poly_b
+        return k if spatial else self._fft2(k)
+
+    def auto_correlate(self, xf, spatial=False):
+        # k(x,x), the norm is computed once for both sides
+        xx = self.norm(xf) if self.kernel == 'gaussian' else None
+        return self.correlate(xf, xf, xx, xx, spatial)
+
+    def detect(self, zf, spatial=False):
+        # k(z,model) of every sample in zf against the cached model
+        return self.correlate(zf, self.model_f, bb=self.model_norm, spatial=spatial)
@@ -0,0 +1,30 @@
+"""
+modules that are only needed on some code paths (cupy for the gpu ECO, mxnet for the deep features)
+are bound to a LazyModule and imported on first attribute access, so importing a tracker does not load them
+"""
+import importlib
+
+class LazyModule:
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        if attr.startswith('__'):
+            raise AttributeError(attr)
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        return '<lazy module %r%s>' % (self._name, '' if self.loaded else ' (not imported)')
+
+def lazy_import(name):
+    return LazyModule(name)
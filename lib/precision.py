@@ -0,0 +1,35 @@
+"""
+process-wide numeric precision of the cftracker trackers,
+with single_precision enabled every feature, window, label, filter and response is kept in float32/complex64
+"""
+import numpy as np
+import cv2
+
+class PrecisionConfig:
+    single_precision=False
+
+precision_config=PrecisionConfig()
+
+def set_single_precision(enable=True):
+    precision_config.single_precision=enable
+
+def real_dtype():
+    return np.float32 if precision_config.single_precision else np.float64
+
+def complex_dtype():
+    return np.complex64 if precision_config.single_precision else np.complex128
+
+def integral_sdepth():
+    # depth of the summed area tables, -1 keeps opencv's default double accumulator
+    return cv2.CV_32F if precision_config.single_precision else -1
+
+def as_real(x):
+    # no-op in the default mode, so the double precision results stay untouched
+    if precision_config.single_precision:
+        return np.asarray(x,dtype=np.float32)
+    return x
+
+def as_complex(x):
+    if precision_config.single_precision:
+        return np.asarray(x,dtype=np.complex64)
+    return x
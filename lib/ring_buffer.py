@@ -0,0 +1,45 @@
+"""
+fixed-capacity histories of per-frame values (the expert trajectories of MCCTH-Staple, the target positions of
+DAT), the latest capacity rows of an unbounded sequence are kept in one preallocated array, so memory does not grow
+with the length of a stream and appending or reading a window does not slow down as it runs
+"""
+import numpy as np
+
+class RingBuffer:
+    """
+    the latest capacity rows of item_shape, every row is written twice into 2*capacity slots so that any window of
+    the latest rows is a contiguous view in chronological order, the views are overwritten by later appends,
+    indexing and slicing follow a list holding the kept rows
+    """
+
+    def __init__(self, capacity, item_shape=(), dtype=np.float64):
+        if capacity < 1:
+            raise ValueError('ring buffer capacity must be at least 1')
+        self.capacity = capacity
+        self._buffer = np.zeros((2 * capacity,) + tuple(item_shape), dtype=dtype)
+        self._head = 0
+        self.count = 0
+
+    def append(self, item):
+        self._buffer[self._head] = item
+        self._buffer[self._head + self.capacity] = item
+        self._head = (self._head + 1) % self.capacity
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def last(self, n=None):
+        # view of the latest n rows, oldest first
+        kept = len(self)
+        n = kept if n is None else n
+        if n > kept:
+            raise IndexError('%d rows requested, %d kept' % (n, kept))
+        end = self._head + self.capacity
+        return self._buffer[end - n:end]
+
+    def __getitem__(self, key):
+        return self.last()[key]
+
+    def __iter__(self):
+        return iter(self.last())
@@ -0,0 +1,154 @@
+"""
+hog samples of the target at every scale of a DSST-style 1-D scale filter (DSSTScaleEstimator, Staple, ECO's
+ScaleFilter), instead of cropping and resizing every scale from the frame, the region of the largest scale is
+reduced once into an octave pyramid (exact INTER_AREA halvings) and every scale is area resampled from the
+nearest finer level on which its sample pixels still cover min_step level pixels: each sample pixel is the mean of
+its box at the subpixel position and size of the scale, read off the integral image of the level with four
+bilinear lookups (the integral of a piecewise constant image is bilinear in each pixel, so they are exact), which
+is the per-scale INTER_AREA resize up to the averaging of the halvings, the pyramid is kept while the frame and the
+target position do not change and so is the last hog matrix, which the training step after a detection at an
+unchanged scale gets back without resampling
+"""
+import numpy as np
+import cv2
+from .feature_registry import get_feature_backend
+
+def _box_means(integral, x_edges, y_edges):
+    """
+    S*m*n*c means of the boxes between consecutive x_edges (S*(n+1)) and y_edges (S*(m+1)) of a level, in its
+    pixel edge coordinates (pixel l covers [l, l+1)), from its (h+1)*(w+1)*c integral image
+    """
+    h, w = integral.shape[0] - 1, integral.shape[1] - 1
+    x_edges, y_edges = np.minimum(np.maximum(x_edges, 0), w), np.minimum(np.maximum(y_edges, 0), h)
+    ix, iy = np.minimum(x_edges.astype(np.int64), w - 1), np.minimum(y_edges.astype(np.int64), h - 1)
+    tx, ty = (x_edges - ix)[:, None, :, None], (y_edges - iy)[:, :, None, None]
+    # the integral image bilinearly interpolated at every box corner
+    flat = integral.reshape((h + 1) * (w + 1), -1)
+    index = iy[:, :, None] * (w + 1) + ix[:, None, :]
+    top, bottom = np.take(flat, index, axis=0), np.take(flat, index + w + 1, axis=0)
+    top += (np.take(flat, index + 1, axis=0) - top) * tx
+    bottom += (np.take(flat, index + w + 2, axis=0) - bottom) * tx
+    corners = top + (bottom - top) * ty
+    sums = corners[:, 1:, 1:] - corners[:, :-1, 1:] - corners[:, 1:, :-1] + corners[:, :-1, :-1]
+    areas = np.diff(y_edges, axis=1)[:, :, None] * np.diff(x_edges, axis=1)[:, None, :]
+    return sums / areas[:, :, :, None]
+
+class ScaleSamplePyramid:
+    """
+    model_sz=(w,h) is the size every scale sample is resampled to, hog_fn(patch, cell_size) returns its h*w*c
+    hog of which the first hog_channels are kept (None uses the registered hog backend),
+    margin enlarges the reduced region so that the training call following a detection on the same frame
+    can reuse the pyramid after a small scale change, a sample pixel covers at least min_step level pixels along
+    each axis when its region is that much larger than model_sz, the coarse pixels cut by the ends of its box blur
+    it by at most 1/min_step of its size
+    """
+
+    def __init__(self, model_sz, hog_fn=None, cell_size=4, hog_channels=31, margin=1.1, min_step=8):
+        self.model_sz = (int(model_sz[0]), int(model_sz[1]))
+        self.hog_fn = hog_fn
+        self.cell_size = cell_size
+        self.hog_channels = hog_channels
+        self.margin = margin
+        self.min_step = min_step
+        self.reset()
+
+    def reset(self):
+        # forget the pyramid, called once per frame so that a reused frame buffer is never taken for the last frame
+        self._frame = None
+        self._pos = None
+        self._levels = None
+        self._integrals = None
+        self._region = None
+        self._last = None
+
+    @property
+    def num_dim(self):
+        return (self.model_sz[1] // self.cell_size) * (self.model_sz[0] // self.cell_size) * self.hog_channels
+
+    def patch_sizes(self, base_target_sz, scales):
+        # (w,h) region of every scale in frame pixels, floored like the per-scale crops
+        return np.maximum(np.floor(np.outer(scales, [base_target_sz[0], base_target_sz[1]])), 2)
+
+    def _octaves(self, patch_sz):
+        # coarsest octave on which every region is still sampled with a step >= min_step
+        ratio = np.min(patch_sz / np.array(self.model_sz), axis=1)
+        return np.floor(np.log2(np.maximum(ratio / self.min_step, 1))).astype(np.int64)
+
+    def _build(self, im, pos, patch_sz, num_levels):
+        block = 2 ** (num_levels - 1)
+        max_sz = np.max(patch_sz, axis=0) * self.margin
+        w, h = [int(np.ceil(max_sz[i] / block)) * block for i in range(2)]
+        x0, y0 = int(np.floor(pos[0] - w / 2 + 0.5)), int(np.floor(pos[1] - h / 2 + 0.5))
+        # integer aligned region, a view of the frame unless it crosses the border
+        xa, ya = min(max(x0, 0), im.shape[1] - 1), min(max(y0, 0), im.shape[0] - 1)
+        xb, yb = max(min(x0 + w, im.shape[1]), xa + 1), max(min(y0 + h, im.shape[0]), ya + 1)
+        level = im[ya:yb, xa:xb]
+        if (xa, ya, xb, yb) != (x0, y0, x0 + w, y0 + h):
+            level = cv2.copyMakeBorder(level, ya - y0, y0 + h - yb, xa - x0, x0 + w - xb, cv2.BORDER_REPLICATE)
+        levels = [level]
+        for _ in range(1, num_levels):
+            levels.append(cv2.resize(levels[-1], (levels[-1].shape[1] // 2, levels[-1].shape[0] // 2),
+                                     interpolation=cv2.INTER_AREA))
+        self._frame, self._pos = im, (pos[0], pos[1])
+        self._levels, self._region = levels, (x0, y0, w, h)
+        self._integrals = [None] * num_levels
+
+    def _pyramid(self, im, pos, patch_sz, octaves):
+        num_levels = int(np.max(octaves)) + 1
+        if self._levels is not None and self._frame is im and self._pos == (pos[0], pos[1]) and \
+                len(self._levels) >= num_levels:
+            x0, y0, w, h = self._region
+            max_sz = np.max(patch_sz, axis=0)
+            if pos[0] - max_sz[0] / 2 >= x0 and pos[0] + max_sz[0] / 2 <= x0 + w and \
+                    pos[1] - max_sz[1] / 2 >= y0 and pos[1] + max_sz[1] / 2 <= y0 + h:
+                return self._levels, self._region
+        self._build(im, pos, patch_sz, num_levels)
+        return self._levels, self._region
+
+    def resample(self, im, pos, base_target_sz, scales):
+        """
+        the S samples of size model_sz centred on pos=(x,y), a S*h*w(*c) array of the frame dtype,
+        the region of scale s is floor(base_target_sz*s) like a crop of that size resized to model_sz
+        """
+        patch_sz = self.patch_sizes(base_target_sz, scales)
+        return self._resample(im, pos, patch_sz, self._octaves(patch_sz))
+
+    def _resample(self, im, pos, patch_sz, octaves):
+        mw, mh = self.model_sz
+        levels, (x0, y0, _, _) = self._pyramid(im, pos, patch_sz, octaves)
+        samples = np.empty((len(patch_sz), mh, mw) + im.shape[2:], dtype=im.dtype)
+        for k in np.unique(octaves):
+            idx = np.nonzero(octaves == k)[0]
+            if self._integrals[k] is None:
+                integral = cv2.integral(levels[k], sdepth=cv2.CV_64F)
+                self._integrals[k] = integral.reshape(integral.shape[:2] + (-1,))
+            # a region of size p centred on pos starts at frame edge pos+.5-p/2 (the crop of getRectSubPix),
+            # level k pixel l covers frame pixels x0+2**k*l..x0+2**k*(l+1)-1
+            x_edges = pos[0] + 0.5 - x0 + np.outer(patch_sz[idx, 0], np.arange(mw + 1) / mw - 0.5)
+            y_edges = pos[1] + 0.5 - y0 + np.outer(patch_sz[idx, 1], np.arange(mh + 1) / mh - 0.5)
+            resampled = _box_means(self._integrals[k], x_edges / 2 ** k, y_edges / 2 ** k)
+            if np.issubdtype(im.dtype, np.integer):
+                resampled = np.rint(resampled)
+            samples[idx] = resampled.reshape((len(idx), mh, mw) + im.shape[2:])
+        return samples
+
+    def extract(self, im, pos, base_target_sz, scales, out=None):
+        """
+        D*S matrix whose column s is the flattened hog of scale s, out can be a preallocated float32 D*S array
+        """
+        if out is None:
+            out = np.empty((self.num_dim, len(scales)), dtype=np.float32)
+        patch_sz = self.patch_sizes(base_target_sz, scales)
+        octaves = self._octaves(patch_sz)
+        levels, _ = self._pyramid(im, pos, patch_sz, octaves)
+        if self._last is not None and self._last[0] is levels and np.array_equal(self._last[1], patch_sz):
+            out[:] = self._last[2]
+            return out
+        samples = self._resample(im, pos, patch_sz, octaves)
+        hog_fn = get_feature_backend('hog') if self.hog_fn is None else self.hog_fn
+        if samples.dtype != np.uint8:
+            samples = samples.astype(np.uint8)
+        for s in range(len(scales)):
+            out[:, s] = hog_fn(samples[s], self.cell_size)[:, :, :self.hog_channels].reshape(-1)
+        self._last = (self._levels, patch_sz, out.copy())
+        return out
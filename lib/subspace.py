@@ -0,0 +1,86 @@
+"""
+orthonormal projection bases of slowly changing matrices (the running scale filter models of DSST and ECO, the
+feature covariances of MKCFup), kept up to date by a warm-started subspace iteration instead of the full qr or svd
+of every frame, the basis is recomputed exactly every refresh_interval updates and whenever the ritz residual of
+the kept basis relative to its weakest direction exceeds tol even after one iteration, which keeps its angle to
+the exact subspace near tol while the discarded spectrum stays well below the kept one (davis-kahan)
+"""
+import numpy as np
+import scipy.linalg
+
+class IncrementalSubspace:
+    """
+    num_dim columns spanning the dominant column space of a d*n matrix a (its left singular vectors), or the
+    dominant eigenvectors of a symmetric psd d*d matrix when symmetric is True,
+    num_dim None or >= n keeps the whole column space like the 'MAX' scale filters (an economic qr),
+    the columns are an orthonormal basis of the subspace, not its singular vectors in order
+    """
+
+    def __init__(self, num_dim=None, symmetric=False, refresh_interval=10, tol=1e-2):
+        if refresh_interval < 1:
+            raise ValueError('refresh interval must be at least 1')
+        self.num_dim = num_dim
+        self.symmetric = symmetric
+        self.refresh_interval = refresh_interval
+        self.tol = tol
+        self.reset()
+
+    def reset(self):
+        self.basis = None
+        self.residual = None
+        self._since_refresh = 0
+        self.num_exact = 0
+        self.num_updates = 0
+
+    def _rank(self, a):
+        n = a.shape[0] if self.symmetric else min(a.shape)
+        return n if self.num_dim is None else min(self.num_dim, n)
+
+    def exact(self, a):
+        # the recomputation the incremental updates are checked against
+        k = self._rank(a)
+        if self.symmetric:
+            u, _, _ = np.linalg.svd(a)
+            return u[:, :k]
+        if k == min(a.shape):
+            q, _ = scipy.linalg.qr(a, mode='economic')
+            return q[:, :k]
+        u, _, _ = np.linalg.svd(a, full_matrices=False)
+        return u[:, :k]
+
+    def _refresh(self, a):
+        self.basis = self.exact(a)
+        self.residual = 0.
+        self._since_refresh = 0
+        self.num_exact += 1
+        return self.basis
+
+    def _iterate(self, a, q):
+        # one step of subspace iteration z=a*a^T*q, and the ritz residual |z-q*t|/min(eig(t)) of q with t=q^T*z,
+        # relative to the weakest kept direction so that none of them can drift unnoticed
+        z = a.dot(q) if self.symmetric else a.dot(a.T.dot(q))
+        t = q.T.dot(z)
+        t_min = np.linalg.eigvalsh((t + t.T) / 2)[0]
+        if t_min <= 0:
+            return z, np.inf
+        return z, np.linalg.norm(z - q.dot(t)) / t_min
+
+    def update(self, a):
+        # basis of a whose ritz residual is at most tol, a projects d dimensional samples onto it with basis.T
+        self.num_updates += 1
+        self._since_refresh += 1
+        q = self.basis
+        if q is None or q.shape[1] != self._rank(a) or self._since_refresh >= self.refresh_interval:
+            return self._refresh(a)
+        z, self.residual = self._iterate(a, q)
+        if self.residual <= self.tol:
+            return q
+        if q.shape[1] < (a.shape[0] if self.symmetric else min(a.shape)):
+            # the kept basis has drifted, one warm-started step usually brings it back within tol
+            q, _ = np.linalg.qr(z)
+            _, self.residual = self._iterate(a, q)
+            if self.residual <= self.tol:
+                self.basis = q
+                return q
+        # the whole column space has moved, or one step was not enough
+        return self._refresh(a)
@@ -1,7 +1,10 @@
 import os
 import numpy as np
 import cv2
-import matplotlib.pyplot as plt
+from .precision import real_dtype
+from .constant_cache import cached_constant
+from .lazy_import import lazy_import
+plt = lazy_import('matplotlib.pyplot')
 
 def APCE(response_map):
     Fmax=np.max(response_map)
@@ -38,6 +41,7 @@ def calAUC(value_list):
     return area
 
 
+@cached_constant
 def cos_window(sz):
     """
     width, height = sz
@@ -47,7 +51,8 @@ def cos_window(sz):
     cos_window = np.sin(np.pi * J / width) * np.sin(np.pi * I / height)
     """
 
-    cos_window = np.hanning(int(sz[1]))[:, np.newaxis].dot(np.hanning(int(sz[0]))[np.newaxis, :])
+    dtype = real_dtype()
+    cos_window = np.hanning(int(sz[1])).astype(dtype)[:, np.newaxis].dot(np.hanning(int(sz[0])).astype(dtype)[np.newaxis, :])
     return cos_window
 
 
@@ -91,9 +96,10 @@ def get_init_gt(img_path):
         gt_pos_int=[int(float(element)) for element in gt_pos]
     return tuple(gt_pos_int)
 
+@cached_constant
 def gaussian2d_labels(sz,sigma):
     w,h=sz
-    xs, ys = np.meshgrid(np.arange(w), np.arange(h))
+    xs, ys = np.meshgrid(np.arange(w, dtype=real_dtype()), np.arange(h, dtype=real_dtype()))
     center_x, center_y = w / 2, h / 2
     dist = ((xs - center_x) ** 2 + (ys - center_y) ** 2) / (sigma**2)
     labels = np.exp(-0.5*dist)
@@ -102,9 +108,10 @@ def gaussian2d_labels(sz,sigma):
 """
 max val at the top left loc
 """
+@cached_constant
 def gaussian2d_rolled_labels(sz,sigma):
     w,h=sz
-    xs, ys = np.meshgrid(np.arange(w)-w//2, np.arange(h)-h//2)
+    xs, ys = np.meshgrid(np.arange(w, dtype=real_dtype())-w//2, np.arange(h, dtype=real_dtype())-h//2)
     dist = (xs**2+ys**2) / (sigma**2)
     labels = np.exp(-0.5*dist)
     labels = np.roll(labels, -int(np.floor(sz[0] / 2)), axis=1)